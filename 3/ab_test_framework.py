@@ -5,7 +5,7 @@ Measures the effectiveness of different messages and schedules on volunteer enga
 import uuid
 import json
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, Iterable, List, Optional, Any, Tuple
 from enum import Enum
 from dataclasses import dataclass, asdict
 import pandas as pd
@@ -14,6 +14,8 @@ from scipy import stats
 import asyncio
 import logging
 
+from ab_test_store import ABTestStore, VariantAccumulator, CONTINUOUS_FIELDS, stable_bucket
+
 logger = logging.getLogger(__name__)
 
 class TestStatus(Enum):
@@ -111,8 +113,17 @@ class ABTestFramework:
     def __init__(self, database=None):
         self.database = database
         self.active_tests: Dict[str, TestConfiguration] = {}
-        self.participant_assignments: Dict[str, List[ParticipantAssignment]] = {}
-        self.test_events: List[TestEvent] = []
+        self.store = ABTestStore()
+    
+    @property
+    def participant_assignments(self) -> Dict[str, List[ParticipantAssignment]]:
+        """Assignments per test in assignment order; add them through self.store"""
+        return self.store.participant_assignments
+    
+    @property
+    def test_events(self) -> List[TestEvent]:
+        """All tracked events in order; add them through self.store"""
+        return self.store.test_events
         
     async def create_test(self, test_config: Dict[str, Any]) -> str:
         """Create a new A/B test configuration"""
@@ -173,7 +184,7 @@ class ABTestFramework:
         test.updated_at = datetime.now()
         
         # Initialize participant assignment tracking
-        self.participant_assignments[test_id] = []
+        self.store.start_test(test_id)
         
         if self.database:
             await self._update_test_in_db(test)
@@ -191,10 +202,9 @@ class ABTestFramework:
             return None
         
         # Check if user already assigned
-        existing_assignments = self.participant_assignments.get(test_id, [])
-        for assignment in existing_assignments:
-            if assignment.user_id == user_id:
-                return assignment.variant_id
+        existing_variant = self.store.get_variant(test_id, user_id)
+        if existing_variant is not None:
+            return existing_variant
         
         # Check if user meets target audience criteria
         if not self._user_matches_criteria(user_profile or {}, test.target_audience_filters):
@@ -212,25 +222,62 @@ class ABTestFramework:
             metadata=user_profile or {}
         )
         
-        if test_id not in self.participant_assignments:
-            self.participant_assignments[test_id] = []
-        self.participant_assignments[test_id].append(assignment)
+        self.store.add_assignment(assignment)
         
         logger.info(f"Assigned user {user_id} to variant {variant_id} in test {test_id}")
         return variant_id
     
+    def assign_participants(self, test_id: str,
+                            users: Iterable[Tuple[str, Dict[str, Any]]]) -> Dict[str, Optional[str]]:
+        """Assign many (user_id, user_profile) pairs at once.
+
+        Returns user_id -> variant_id, with None for users outside the target
+        audience. Existing assignments are looked up once, so this stays linear
+        for campaign-sized audiences.
+        """
+        if test_id not in self.active_tests:
+            return {}
+        
+        test = self.active_tests[test_id]
+        if test.status != TestStatus.ACTIVE:
+            return {}
+        
+        assigned = self.store.variant_map(test_id)
+        assigned_at = datetime.now()
+        results = {}
+        new_assignments = 0
+        
+        for user_id, user_profile in users:
+            if user_id in assigned:
+                results[user_id] = assigned[user_id]
+                continue
+            
+            if not self._user_matches_criteria(user_profile or {}, test.target_audience_filters):
+                results[user_id] = None
+                continue
+            
+            variant_id = self._assign_variant(test, user_id)
+            self.store.add_assignment(ParticipantAssignment(
+                user_id=user_id,
+                test_id=test_id,
+                variant_id=variant_id,
+                variant_type=test.test_type,
+                assigned_at=assigned_at,
+                metadata=user_profile or {}
+            ))
+            results[user_id] = variant_id
+            new_assignments += 1
+        
+        logger.info(f"Assigned {new_assignments} new users in test {test_id} ({len(results)} requested)")
+        return results
+    
     async def track_event(self, test_id: str, user_id: str, event_type: str, metadata: Dict[str, Any] = None):
         """Track an event for A/B test analysis"""
         if test_id not in self.active_tests:
             return
         
         # Find user's variant assignment
-        variant_id = None
-        assignments = self.participant_assignments.get(test_id, [])
-        for assignment in assignments:
-            if assignment.user_id == user_id:
-                variant_id = assignment.variant_id
-                break
+        variant_id = self.store.get_variant(test_id, user_id)
         
         if not variant_id:
             return
@@ -245,20 +292,55 @@ class ABTestFramework:
             metadata=metadata or {}
         )
         
-        self.test_events.append(event)
+        self.store.add_event(event)
         
         if self.database:
             await self._save_event_to_db(event)
         
         logger.debug(f"Tracked event {event_type} for user {user_id} in test {test_id}")
     
+    async def track_events(self, test_id: str, events: List[Tuple[str, str, Dict[str, Any]]]) -> int:
+        """Track many (user_id, event_type, metadata) events with one database write.
+
+        Events for users without an assignment are ignored, as in track_event.
+        Returns the number of events recorded.
+        """
+        if test_id not in self.active_tests:
+            return 0
+        
+        assigned = self.store.variant_map(test_id)
+        timestamp = datetime.now()
+        tracked = []
+        
+        for user_id, event_type, metadata in events:
+            variant_id = assigned.get(user_id)
+            if not variant_id:
+                continue
+            tracked.append(TestEvent(
+                event_id=str(uuid.uuid4()),
+                test_id=test_id,
+                user_id=user_id,
+                variant_id=variant_id,
+                event_type=event_type,
+                timestamp=timestamp,
+                metadata=metadata or {}
+            ))
+        
+        for event in tracked:
+            self.store.add_event(event)
+        
+        if self.database and tracked:
+            await self._save_events_to_db(tracked)
+        
+        logger.debug(f"Tracked {len(tracked)} events in test {test_id}")
+        return len(tracked)
+    
     async def calculate_results(self, test_id: str) -> List[TestResults]:
         """Calculate statistical results for an A/B test"""
         if test_id not in self.active_tests:
             return []
         
         test = self.active_tests[test_id]
-        assignments = self.participant_assignments.get(test_id, [])
         
         # Get all variants
         all_variants = []
@@ -270,36 +352,28 @@ class ABTestFramework:
         results = []
         
         for variant_id, variant_name in all_variants:
-            # Get participants for this variant
-            variant_participants = [a for a in assignments if a.variant_id == variant_id]
-            variant_user_ids = [p.user_id for p in variant_participants]
-            
-            # Get events for this variant
-            variant_events = [e for e in self.test_events 
-                            if e.test_id == test_id and e.user_id in variant_user_ids]
+            # Get participants and running aggregates for this variant from the store's indexes
+            variant_user_ids = self.store.variant_users(test_id, variant_id)
+            accumulator = self.store.accumulator(test_id, variant_id)
             
             # Calculate primary metric
-            primary_value = self._calculate_metric(
-                test.primary_metric, variant_user_ids, variant_events
-            )
+            primary_value = self._calculate_metric(test.primary_metric, accumulator)
             
             # Calculate secondary metrics
             secondary_values = {}
             for metric in test.secondary_metrics:
-                secondary_values[metric.value] = self._calculate_metric(
-                    metric, variant_user_ids, variant_events
-                )
+                secondary_values[metric.value] = self._calculate_metric(metric, accumulator)
             
             # Calculate statistical significance (vs. control variant)
             p_value, confidence_interval, lift = self._calculate_significance(
-                test, variant_id, variant_user_ids, variant_events, primary_value
+                test, variant_id, variant_user_ids, primary_value
             )
             
             result = TestResults(
                 test_id=test_id,
                 variant_id=variant_id,
                 variant_name=variant_name,
-                sample_size=len(variant_participants),
+                sample_size=len(variant_user_ids),
                 primary_metric_value=primary_value,
                 secondary_metrics=secondary_values,
                 confidence_interval=confidence_interval,
@@ -313,6 +387,37 @@ class ABTestFramework:
         
         return results
     
+    def get_live_results(self, test_id: str) -> List[Dict[str, Any]]:
+        """Per-variant metrics straight from the running aggregates, for dashboards that poll.
+        
+        Costs O(variants) regardless of how many events the test has; no significance testing.
+        """
+        if test_id not in self.active_tests:
+            return []
+        
+        test = self.active_tests[test_id]
+        variants = []
+        if test.test_type in [VariantType.MESSAGE, VariantType.HYBRID]:
+            variants.extend([(v.id, v.name) for v in test.message_variants])
+        if test.test_type in [VariantType.SCHEDULE, VariantType.HYBRID]:
+            variants.extend([(v.id, v.name) for v in test.schedule_variants])
+        
+        live_results = []
+        for variant_id, variant_name in variants:
+            accumulator = self.store.accumulator(test_id, variant_id)
+            live_results.append({
+                'variant_id': variant_id,
+                'variant_name': variant_name,
+                'participants': accumulator.participants,
+                'metrics': {metric.value: self._calculate_metric(metric, accumulator) for metric in MetricType},
+                'event_counts': dict(accumulator.event_counts),
+                'continuous_metrics': {
+                    name: accumulator.continuous_summary(name) for name in CONTINUOUS_FIELDS
+                }
+            })
+        
+        return live_results
+    
     async def get_message_for_user(self, test_id: str, user_id: str) -> Optional[MessageVariant]:
         """Get the appropriate message variant for a user"""
         variant_id = self.assign_participant(test_id, user_id)
@@ -351,10 +456,9 @@ class ABTestFramework:
         if not all_variants:
             return ""
         
-        # Use hash of user_id + test_id for consistent assignment
+        # Use a stable hash of user_id + test_id so every process assigns the same variant
         hash_input = f"{user_id}_{test.test_id}"
-        hash_value = hash(hash_input) % len(all_variants)
-        return all_variants[hash_value]
+        return all_variants[stable_bucket(hash_input, len(all_variants))]
     
     def _user_matches_criteria(self, user_profile: Dict[str, Any], filters: Dict[str, Any]) -> bool:
         """Check if user matches target audience criteria"""
@@ -380,50 +484,31 @@ class ABTestFramework:
         
         return True
     
-    def _calculate_metric(self, metric: MetricType, user_ids: List[str], events: List[TestEvent]) -> float:
-        """Calculate a specific metric value"""
-        if not user_ids:
+    def _calculate_metric(self, metric: MetricType, accumulator: VariantAccumulator) -> float:
+        """Read a metric value from a variant's running aggregates"""
+        if not accumulator.participants:
             return 0.0
         
         if metric == MetricType.TURNOUT_RATE:
             # Percentage of users who attended events
-            attended_users = set()
-            for event in events:
-                if event.event_type == "attended" and event.user_id in user_ids:
-                    attended_users.add(event.user_id)
-            return len(attended_users) / len(user_ids)
+            return accumulator.distinct_users('attended') / accumulator.participants
         
         elif metric == MetricType.ENGAGEMENT_RATE:
             # Percentage of users who opened messages or clicked links
-            engaged_users = set()
-            for event in events:
-                if event.event_type in ["message_opened", "clicked"] and event.user_id in user_ids:
-                    engaged_users.add(event.user_id)
-            return len(engaged_users) / len(user_ids)
+            return accumulator.distinct_users('engaged') / accumulator.participants
         
         elif metric == MetricType.RETENTION_RATE:
             # Percentage of users who attended multiple events
-            user_attendance = {}
-            for event in events:
-                if event.event_type == "attended" and event.user_id in user_ids:
-                    user_attendance[event.user_id] = user_attendance.get(event.user_id, 0) + 1
-            
-            retained_users = sum(1 for count in user_attendance.values() if count > 1)
-            return retained_users / len(user_ids)
+            return accumulator.retained_users / accumulator.participants
         
         elif metric == MetricType.CONVERSION_RATE:
             # Percentage of users who registered after receiving message
-            converted_users = set()
-            for event in events:
-                if event.event_type == "registered" and event.user_id in user_ids:
-                    converted_users.add(event.user_id)
-            return len(converted_users) / len(user_ids)
+            return accumulator.distinct_users('registered') / accumulator.participants
         
         return 0.0
     
     def _calculate_significance(self, test: TestConfiguration, variant_id: str, 
-                              variant_users: List[str], variant_events: List[TestEvent],
-                              variant_value: float) -> Tuple[float, Tuple[float, float], float]:
+                              variant_users: List[str], variant_value: float) -> Tuple[float, Tuple[float, float], float]:
         """Calculate statistical significance vs control"""
         # For now, return placeholder values
         # In production, implement proper statistical tests (t-test, chi-square, etc.)
@@ -516,6 +601,29 @@ class ABTestFramework:
         except Exception as e:
             logger.error(f"Failed to save event to database: {e}")
 
+    async def _save_events_to_db(self, events: List[TestEvent]):
+        """Save a batch of events to the database in one insert"""
+        if not self.database:
+            return
+        
+        try:
+            event_rows = [
+                {
+                    'id': event.event_id,
+                    'test_id': event.test_id,
+                    'user_id': event.user_id,
+                    'variant_id': event.variant_id,
+                    'event_type': event.event_type,
+                    'timestamp': event.timestamp.isoformat(),
+                    'metadata': json.dumps(event.metadata)
+                }
+                for event in events
+            ]
+            
+            await self.database.supabase.table('ab_test_events').insert(event_rows).execute()
+        except Exception as e:
+            logger.error(f"Failed to save {len(events)} events to database: {e}")
+
 # Usage example and helper functions
 class CampaignMessageManager:
     """High-level manager for campaign message A/B testing"""
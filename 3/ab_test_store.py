@@ -0,0 +1,124 @@
+"""
+Indexed storage for A/B test assignments and events
+Dict lookup of (test, user) -> variant, per-variant running aggregates and process-independent variant hashing
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+import hashlib
+import math
+
+# Distinct-user sets kept per variant, by the event types that count towards them
+USER_GROUPS = {
+    'attended': ('attended',),
+    'engaged': ('message_opened', 'clicked'),
+    'registered': ('registered',),
+}
+
+# Numeric event metadata fields with running count, sum and sum of squares per variant
+CONTINUOUS_FIELDS = ('hours_contributed',)
+
+def stable_bucket(key: str, buckets: int) -> int:
+    """Map a key to one of `buckets` slots, identically in every process.
+
+    Uses an 8-byte BLAKE2b digest, unlike the built-in hash() whose string
+    hashing is randomized per process.
+    """
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % buckets
+
+@dataclass
+class VariantAccumulator:
+    """Streaming aggregates for one variant, updated as events are stored.
+
+    Distinct users per USER_GROUPS entry, attendance counts for retention
+    and running sums for CONTINUOUS_FIELDS, so every metric is O(1) to read.
+    """
+    participants: int = 0
+    event_counts: Dict[str, int] = field(default_factory=dict)
+    group_users: Dict[str, Set[str]] = field(default_factory=lambda: {group: set() for group in USER_GROUPS})
+    attendance: Dict[str, int] = field(default_factory=dict)
+    retained_users: int = 0
+    value_sums: Dict[str, List[float]] = field(default_factory=dict)
+
+    def add_event(self, user_id: str, event_type: str, metadata: Optional[Dict[str, Any]] = None):
+        self.event_counts[event_type] = self.event_counts.get(event_type, 0) + 1
+        for group, event_types in USER_GROUPS.items():
+            if event_type in event_types:
+                self.group_users[group].add(user_id)
+
+        if event_type == 'attended':
+            count = self.attendance.get(user_id, 0) + 1
+            self.attendance[user_id] = count
+            if count == 2:
+                self.retained_users += 1
+
+        for name in CONTINUOUS_FIELDS:
+            value = (metadata or {}).get(name)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                sums = self.value_sums.setdefault(name, [0, 0.0, 0.0])
+                sums[0] += 1
+                sums[1] += value
+                sums[2] += value * value
+
+    def distinct_users(self, group: str) -> int:
+        return len(self.group_users[group])
+
+    def continuous_summary(self, name: str) -> Dict[str, float]:
+        """Count, sum, mean and sample standard deviation of a continuous field"""
+        count, total, total_sq = self.value_sums.get(name, (0, 0.0, 0.0))
+        mean = total / count if count else 0.0
+        variance = (total_sq - count * mean * mean) / (count - 1) if count > 1 else 0.0
+        return {'count': count, 'sum': total, 'mean': mean, 'std': math.sqrt(max(variance, 0.0))}
+
+class ABTestStore:
+    """In-memory assignments and events, indexed by test, user and variant.
+
+    `participant_assignments` and `test_events` keep the append-order lists
+    the framework has always exposed. Lookups go through the indexes next
+    to them, so no operation scans every participant or event.
+    """
+
+    def __init__(self):
+        self.participant_assignments: Dict[str, List[Any]] = {}
+        self.test_events: List[Any] = []
+        self._variant_by_user: Dict[str, Dict[str, str]] = {}
+        self._users_by_variant: Dict[str, Dict[str, List[str]]] = {}
+        self._accumulators: Dict[str, Dict[str, VariantAccumulator]] = {}
+
+    def start_test(self, test_id: str):
+        """Begin tracking a test with no participants"""
+        self.participant_assignments[test_id] = []
+        self._variant_by_user[test_id] = {}
+        self._users_by_variant[test_id] = {}
+        self._accumulators[test_id] = {}
+
+    def get_variant(self, test_id: str, user_id: str) -> Optional[str]:
+        return self._variant_by_user.get(test_id, {}).get(user_id)
+
+    def variant_map(self, test_id: str) -> Dict[str, str]:
+        """user_id -> variant_id for a test (read-only)"""
+        return self._variant_by_user.get(test_id, {})
+
+    def add_assignment(self, assignment: Any):
+        test_id = assignment.test_id
+        if test_id not in self.participant_assignments:
+            self.start_test(test_id)
+        self.participant_assignments[test_id].append(assignment)
+        self._variant_by_user[test_id][assignment.user_id] = assignment.variant_id
+        self._users_by_variant[test_id].setdefault(assignment.variant_id, []).append(assignment.user_id)
+        self.accumulator(test_id, assignment.variant_id).participants += 1
+
+    def variant_users(self, test_id: str, variant_id: str) -> List[str]:
+        """Users assigned to a variant, in assignment order"""
+        return self._users_by_variant.get(test_id, {}).get(variant_id, [])
+
+    def add_event(self, event: Any):
+        self.test_events.append(event)
+        self.accumulator(event.test_id, event.variant_id).add_event(event.user_id, event.event_type, event.metadata)
+
+    def accumulator(self, test_id: str, variant_id: str) -> VariantAccumulator:
+        """Running aggregates for a variant (created empty on first use)"""
+        return self._accumulators.setdefault(test_id, {}).setdefault(variant_id, VariantAccumulator())
+
+    def participant_count(self, test_id: str) -> int:
+        return len(self._variant_by_user.get(test_id, {}))
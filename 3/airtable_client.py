@@ -10,6 +10,12 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Most records Airtable accepts per create/update request
+BATCH_LIMIT = 10
+
+class AirtableRateLimitError(Exception):
+    """Airtable answered 429; the request was not applied and can be sent again"""
+
 class AirtableClient:
     def __init__(self, api_key: str, base_id: str):
         self.api_key = api_key
@@ -31,7 +37,8 @@ class AirtableClient:
 
     async def get_table_records(self, table_name: str, view: Optional[str] = None, 
                               fields: Optional[List[str]] = None, 
-                              max_records: int = 100) -> List[Dict[str, Any]]:
+                              max_records: int = 100,
+                              filter_formula: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get records from an Airtable table"""
         if not self.session:
             raise RuntimeError("Client not initialized. Use async context manager.")
@@ -43,6 +50,8 @@ class AirtableClient:
             params['fields[]'] = fields
         if max_records:
             params['maxRecords'] = max_records
+        if filter_formula:
+            params['filterByFormula'] = filter_formula
 
         all_records = []
         offset = None
@@ -74,6 +83,14 @@ class AirtableClient:
 
         return all_records
 
+    async def get_records_modified_since(self, table_name: str, since: datetime) -> List[Dict[str, Any]]:
+        """Get every record created or changed after `since` (a UTC time)"""
+        since_text = since.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+        return await self.get_table_records(
+            table_name, max_records=None,
+            filter_formula=f"IS_AFTER(LAST_MODIFIED_TIME(), '{since_text}')"
+        )
+
     async def create_record(self, table_name: str, fields: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new record in Airtable"""
         if not self.session:
@@ -121,39 +138,48 @@ class AirtableClient:
             logger.error(f"Error updating record {record_id} in {table_name}: {e}")
             raise
 
-    async def batch_create_records(self, table_name: str, 
-                                 records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Create multiple records in batch (max 10 at a time)"""
-        if not self.session:
-            raise RuntimeError("Client not initialized. Use async context manager.")
+    async def create_records(self, table_name: str, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Create up to 10 records in one request; rate limits are raised, not retried"""
+        return await self._write_records('post', table_name, [{"fields": fields} for fields in records])
 
-        all_results = []
-        batch_size = 10
+    async def update_records(self, table_name: str, updates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Update up to 10 records ({'id', 'fields'}) in one request; rate limits are raised, not retried"""
+        return await self._write_records('patch', table_name,
+                                         [{"id": update['id'], "fields": update['fields']} for update in updates])
 
-        for i in range(0, len(records), batch_size):
-            batch = records[i:i + batch_size]
-            payload = {"records": [{"fields": record} for record in batch]}
+    async def _write_records(self, method: str, table_name: str, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not self.session:
+            raise RuntimeError("Client not initialized. Use async context manager.")
+        if len(records) > BATCH_LIMIT:
+            raise ValueError(f"Airtable accepts at most {BATCH_LIMIT} records per request")
 
-            try:
-                async with self.session.post(f"{self.base_url}/{table_name}", 
-                                           json=payload) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        all_results.extend(data.get('records', []))
-                    elif response.status == 429:
-                        await asyncio.sleep(0.2)
-                        i -= batch_size
-                        continue
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"Batch create error: {error_text}")
-                        raise Exception(f"Failed to batch create: {response.status}")
-                        
-                await asyncio.sleep(0.1)
-            except Exception as e:
-                logger.error(f"Error batch creating records in {table_name}: {e}")
-                raise
+        async with self.session.request(method.upper(), f"{self.base_url}/{table_name}",
+                                        json={"records": records}) as response:
+            if response.status == 200:
+                data = await response.json()
+                return data.get('records', [])
+            error_text = await response.text()
+            if response.status == 429:
+                raise AirtableRateLimitError("Airtable API error: 429 rate limit exceeded")
+            logger.error(f"Batch {method} error: {error_text}")
+            raise Exception(f"Airtable API error: {response.status} {error_text[:200]}")
 
+    async def batch_create_records(self, table_name: str, records: List[Dict[str, Any]],
+                                   max_retries: int = 3) -> List[Dict[str, Any]]:
+        """Create any number of records through create_records, 10 per request, waiting out rate limits"""
+        all_results = []
+        for offset in range(0, len(records), BATCH_LIMIT):
+            batch = records[offset:offset + BATCH_LIMIT]
+            for attempt in range(max_retries + 1):
+                try:
+                    all_results.extend(await self.create_records(table_name, batch))
+                    break
+                except AirtableRateLimitError:
+                    if attempt == max_retries:
+                        logger.error(f"Error batch creating records in {table_name}: rate limit persisted")
+                        raise
+                    await asyncio.sleep(0.2 * (2 ** attempt))
+            await asyncio.sleep(0.1)
         return all_results
 
     async def get_table_schema(self, table_name: str) -> Dict[str, Any]:
@@ -197,6 +197,26 @@ def setup_ab_test_endpoints(app, database=None):
             logger.error(f"Error getting test results: {e}")
             raise HTTPException(status_code=500, detail="Failed to get test results")
     
+    @app.get("/api/ab-tests/{test_id}/live")
+    async def get_live_results(test_id: str) -> JSONResponse:
+        """Get running per-variant metrics for an A/B test (cheap enough to poll)"""
+        
+        try:
+            if test_id not in ab_framework.active_tests:
+                raise HTTPException(status_code=404, detail="Test not found")
+            
+            return JSONResponse(content={
+                'success': True,
+                'test_id': test_id,
+                'variants': ab_framework.get_live_results(test_id)
+            })
+            
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error getting live results: {e}")
+            raise HTTPException(status_code=500, detail="Failed to get live results")
+    
     @app.get("/api/ab-tests")
     async def list_ab_tests(status: Optional[str] = None) -> JSONResponse:
         """List all A/B tests with optional status filter"""
@@ -451,7 +471,7 @@ def setup_ab_test_endpoints(app, database=None):
             dashboard_data = {
                 'active_tests': len([t for t in ab_framework.active_tests.values() if t.status == TestStatus.ACTIVE]),
                 'total_tests': len(ab_framework.active_tests),
-                'total_participants': sum(len(ab_framework.participant_assignments.get(test_id, [])) 
+                'total_participants': sum(ab_framework.store.participant_count(test_id)
                                         for test_id in ab_framework.active_tests.keys()),
                 'recent_events': len([e for e in ab_framework.test_events 
                                     if (datetime.now() - e.timestamp).days <= 7])
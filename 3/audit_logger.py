@@ -2,7 +2,8 @@
 Audit Logger for Volunteer PathFinder
 Provides comprehensive change tracking with diffs and export functionality
 """
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, List, Optional, Any, Union, AsyncIterator
+import asyncio
 import json
 import uuid
 from datetime import datetime, timedelta
@@ -12,12 +13,23 @@ import difflib
 import logging
 from supabase import Client
 from database import VolunteerDatabase
+from audit_sink import AuditSink
+from audit_rollups import AuditRollupStore
 import pandas as pd
 import csv
 import io
 
 logger = logging.getLogger(__name__)
 
+# Columns stored as JSON text in audit_logs
+AUDIT_JSON_COLUMNS = ('old_values', 'new_values', 'changes', 'metadata')
+
+# Flattened columns of the CSV export; changes_summary is derived from changes
+CSV_EXPORT_COLUMNS = [
+    'id', 'timestamp', 'user_id', 'session_id', 'action', 'resource',
+    'resource_id', 'ip_address', 'user_agent', 'changes_summary', 'diff_text'
+]
+
 class AuditAction(Enum):
     CREATE = "create"
     UPDATE = "update"
@@ -55,8 +67,11 @@ class AuditEntry:
     metadata: Optional[Dict[str, Any]]
 
 class AuditLogger:
-    def __init__(self, database: VolunteerDatabase):
+    def __init__(self, database: VolunteerDatabase, sink: Optional[AuditSink] = None):
         self.database = database
+        self.sink = sink or AuditSink(database)
+        self.rollups = AuditRollupStore(database)
+        self.sink.add_listener(self.rollups.record_batch)
         self._setup_audit_tables()
     
     def _setup_audit_tables(self):
@@ -82,6 +97,7 @@ class AuditLogger:
         );
         
         CREATE INDEX IF NOT EXISTS idx_audit_logs_timestamp ON audit_logs(timestamp);
+        CREATE INDEX IF NOT EXISTS idx_audit_logs_timestamp_id ON audit_logs(timestamp, id);
         CREATE INDEX IF NOT EXISTS idx_audit_logs_user_id ON audit_logs(user_id);
         CREATE INDEX IF NOT EXISTS idx_audit_logs_action ON audit_logs(action);
         CREATE INDEX IF NOT EXISTS idx_audit_logs_resource ON audit_logs(resource);
@@ -129,40 +145,49 @@ class AuditLogger:
             metadata=metadata
         )
         
-        # Save to database
+        # Queue for the background sink; the database write happens in batches
+        audit_data = {
+            'id': audit_id,
+            'timestamp': timestamp.isoformat(),
+            'user_id': user_id,
+            'session_id': session_id,
+            'action': action.value,
+            'resource': resource.value,
+            'resource_id': resource_id,
+            'old_values': json.dumps(old_values) if old_values else None,
+            'new_values': json.dumps(new_values) if new_values else None,
+            'changes': json.dumps(changes) if changes else None,
+            'diff_text': diff_text,
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            'metadata': json.dumps(metadata) if metadata else None,
+            'created_at': timestamp.isoformat()
+        }
+
         try:
-            if self.database._is_available():
-                audit_data = {
-                    'id': audit_id,
-                    'timestamp': timestamp.isoformat(),
-                    'user_id': user_id,
-                    'session_id': session_id,
-                    'action': action.value,
-                    'resource': resource.value,
-                    'resource_id': resource_id,
-                    'old_values': json.dumps(old_values) if old_values else None,
-                    'new_values': json.dumps(new_values) if new_values else None,
-                    'changes': json.dumps(changes) if changes else None,
-                    'diff_text': diff_text,
-                    'ip_address': ip_address,
-                    'user_agent': user_agent,
-                    'metadata': json.dumps(metadata) if metadata else None,
-                    'created_at': timestamp.isoformat()
-                }
-                
-                result = self.database.supabase.table('audit_logs').insert(audit_data).execute()
-                
-                if result.data:
-                    logger.info(f"✅ Audit entry logged: {action.value} on {resource.value} by user {user_id}")
-                else:
-                    logger.error(f"❌ Failed to log audit entry: {result}")
-                    
+            self.sink.enqueue(audit_data)
+            logger.debug(f"Audit entry queued: {action.value} on {resource.value} by user {user_id}")
         except Exception as e:
-            logger.error(f"❌ Error logging audit entry: {e}")
-            # Consider falling back to file logging or other persistence method
+            logger.error(f"❌ Error queueing audit entry: {e}")
         
         return audit_id
     
+    async def flush(self) -> int:
+        """Write all queued audit entries now"""
+        return await self.sink.flush()
+    
+    def start(self):
+        """Start the background sink and replay entries spooled by a previous run (call on startup)"""
+        self.sink.start()
+    
+    async def close(self):
+        """Flush pending entries and stop the background sink (call on shutdown)"""
+        await self.sink.stop()
+    
+    def get_sink_metrics(self) -> Dict[str, Any]:
+        """Queue depth, spool size and flush latency of the audit sink"""
+        return self.sink.get_metrics()
+    
     def _calculate_changes(self, old_values: Optional[Dict], new_values: Optional[Dict]) -> Optional[Dict]:
         """Calculate what fields changed between old and new values"""
         if not old_values and not new_values:
@@ -239,21 +264,11 @@ class AuditLogger:
                 logger.warning("Database not available")
                 return []
             
-            query = self.database.supabase.table('audit_logs').select('*')
+            # Make entries still sitting in the sink visible to this query
+            await self.sink.flush()
             
-            # Apply filters
-            if user_id:
-                query = query.eq('user_id', user_id)
-            if resource:
-                query = query.eq('resource', resource.value)
-            if resource_id:
-                query = query.eq('resource_id', resource_id)
-            if action:
-                query = query.eq('action', action.value)
-            if start_date:
-                query = query.gte('timestamp', start_date.isoformat())
-            if end_date:
-                query = query.lte('timestamp', end_date.isoformat())
+            query = self.database.supabase.table('audit_logs').select('*')
+            query = self._apply_filters(query, user_id, resource, resource_id, action, start_date, end_date)
             
             # Apply pagination and ordering
             result = query.order('timestamp', desc=True).range(offset, offset + limit - 1).execute()
@@ -277,6 +292,154 @@ class AuditLogger:
             logger.error(f"❌ Error retrieving audit logs: {e}")
             return []
     
+    def _apply_filters(
+        self,
+        query,
+        user_id: Optional[str] = None,
+        resource: Optional[AuditResource] = None,
+        resource_id: Optional[str] = None,
+        action: Optional[AuditAction] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ):
+        """Apply the standard audit log filters to a Supabase query"""
+        if user_id:
+            query = query.eq('user_id', user_id)
+        if resource:
+            query = query.eq('resource', resource.value)
+        if resource_id:
+            query = query.eq('resource_id', resource_id)
+        if action:
+            query = query.eq('action', action.value)
+        if start_date:
+            query = query.gte('timestamp', start_date.isoformat())
+        if end_date:
+            query = query.lte('timestamp', end_date.isoformat())
+        return query
+    
+    async def iter_audit_log_pages(
+        self,
+        columns: Optional[List[str]] = None,
+        user_id: Optional[str] = None,
+        resource: Optional[AuditResource] = None,
+        resource_id: Optional[str] = None,
+        action: Optional[AuditAction] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        page_size: int = 1000
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield pages of raw audit rows in (timestamp, id) order using keyset pagination.
+        
+        Each page starts after the last (timestamp, id) seen, so the cost per page
+        stays constant however deep the export goes. JSON columns are left undecoded.
+        """
+        if not self.database._is_available():
+            logger.warning("Database not available")
+            return
+        
+        await self.sink.flush()
+        
+        select_columns = list(columns) if columns else ['*']
+        if columns:
+            for key_column in ('timestamp', 'id'):
+                if key_column not in select_columns:
+                    select_columns.append(key_column)
+        
+        cursor = None
+        while True:
+            query = self.database.supabase.table('audit_logs').select(','.join(select_columns))
+            query = self._apply_filters(query, user_id, resource, resource_id, action, start_date, end_date)
+            if cursor:
+                last_timestamp, last_id = cursor
+                query = query.or_(
+                    f'timestamp.gt."{last_timestamp}",'
+                    f'and(timestamp.eq."{last_timestamp}",id.gt.{last_id})'
+                )
+            query = query.order('timestamp').order('id').limit(page_size)
+            
+            # The Supabase client is synchronous; keep the event loop free while it runs
+            result = await asyncio.to_thread(query.execute)
+            rows = result.data or []
+            if not rows:
+                return
+            
+            yield rows
+            
+            if len(rows) < page_size:
+                return
+            cursor = (rows[-1]['timestamp'], rows[-1]['id'])
+    
+    async def stream_audit_logs(
+        self,
+        format_type: str = "csv",
+        columns: Optional[List[str]] = None,
+        user_id: Optional[str] = None,
+        resource: Optional[AuditResource] = None,
+        resource_id: Optional[str] = None,
+        action: Optional[AuditAction] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        page_size: int = 1000
+    ) -> AsyncIterator[str]:
+        """Stream an audit export as CSV or NDJSON text chunks, one chunk per page.
+        
+        Memory stays bounded by page_size, so this suits exports of any size:
+        
+            return StreamingResponse(audit_logger.stream_audit_logs("csv"), media_type="text/csv")
+        """
+        format_type = format_type.lower()
+        if format_type not in ("csv", "ndjson"):
+            raise ValueError(f"Unsupported streaming export format: {format_type}")
+        
+        if format_type == "csv":
+            export_columns = list(columns) if columns else list(CSV_EXPORT_COLUMNS)
+            # changes_summary is derived from the changes column
+            fetch_columns = [c for c in export_columns if c != 'changes_summary']
+            if 'changes_summary' in export_columns and 'changes' not in fetch_columns:
+                fetch_columns.append('changes')
+        else:
+            export_columns = list(columns) if columns else None
+            fetch_columns = export_columns
+        
+        json_columns = [c for c in AUDIT_JSON_COLUMNS if fetch_columns is None or c in fetch_columns]
+        
+        buffer = io.StringIO()
+        writer = None
+        if format_type == "csv":
+            writer = csv.writer(buffer)
+            writer.writerow(export_columns)
+            yield buffer.getvalue()
+        
+        async for page in self.iter_audit_log_pages(
+            columns=fetch_columns,
+            user_id=user_id,
+            resource=resource,
+            resource_id=resource_id,
+            action=action,
+            start_date=start_date,
+            end_date=end_date,
+            page_size=page_size
+        ):
+            buffer.seek(0)
+            buffer.truncate()
+            
+            for log in page:
+                for column in json_columns:
+                    if log.get(column):
+                        log[column] = json.loads(log[column])
+                
+                if writer is not None:
+                    if 'changes_summary' in export_columns:
+                        log['changes_summary'] = self._summarize_changes(log.get('changes'))
+                    writer.writerow([log.get(column) for column in export_columns])
+                else:
+                    if export_columns:
+                        log = {column: log.get(column) for column in export_columns}
+                    buffer.write(json.dumps(log, default=str))
+                    buffer.write('\n')
+            
+            yield buffer.getvalue()
+    
     async def get_resource_history(self, resource: AuditResource, resource_id: str) -> List[Dict[str, Any]]:
         """Get the complete history of changes for a specific resource"""
         return await self.get_audit_logs(
@@ -302,7 +465,11 @@ class AuditLogger:
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None
     ) -> Union[str, bytes]:
-        """Export audit logs to various formats (CSV, JSON, Excel)"""
+        """Export audit logs to various formats (CSV, JSON, Excel)
+        
+        Builds the whole file in memory and caps at 10,000 rows; use
+        stream_audit_logs for large CSV or NDJSON exports.
+        """
         
         # Get all matching logs
         logs = await self.get_audit_logs(
@@ -388,61 +555,33 @@ class AuditLogger:
         return "; ".join(summary_parts) if summary_parts else "No changes"
     
     async def get_audit_statistics(self, days: int = 30) -> Dict[str, Any]:
-        """Get audit log statistics and insights"""
+        """Get audit log statistics and insights from the daily rollups"""
         try:
-            start_date = datetime.utcnow() - timedelta(days=days)
-            
-            logs = await self.get_audit_logs(start_date=start_date, limit=10000)
-            
-            if not logs:
-                return {"message": "No audit logs found for the specified period"}
-            
-            # Calculate statistics
-            total_activities = len(logs)
-            unique_users = len(set(log['user_id'] for log in logs if log.get('user_id')))
-            
-            # Activity by action
-            actions = {}
-            for log in logs:
-                action = log.get('action', 'unknown')
-                actions[action] = actions.get(action, 0) + 1
-            
-            # Activity by resource
-            resources = {}
-            for log in logs:
-                resource = log.get('resource', 'unknown')
-                resources[resource] = resources.get(resource, 0) + 1
-            
-            # Daily activity
-            daily_activity = {}
-            for log in logs:
-                if log.get('timestamp'):
-                    date_str = log['timestamp'][:10]  # Extract date part
-                    daily_activity[date_str] = daily_activity.get(date_str, 0) + 1
-            
-            # Top users by activity
-            user_activity = {}
-            for log in logs:
-                user_id = log.get('user_id')
-                if user_id:
-                    user_activity[user_id] = user_activity.get(user_id, 0) + 1
-            
-            top_users = sorted(user_activity.items(), key=lambda x: x[1], reverse=True)[:10]
-            
-            return {
-                "period_days": days,
-                "total_activities": total_activities,
-                "unique_users": unique_users,
-                "activity_by_action": actions,
-                "activity_by_resource": resources,
-                "daily_activity": daily_activity,
-                "top_users": [{"user_id": user_id, "activity_count": count} for user_id, count in top_users],
-                "generated_at": datetime.utcnow().isoformat()
-            }
+            # Entries still queued are counted once the sink writes them
+            await self.sink.flush()
+            return await self.rollups.get_statistics(days)
             
         except Exception as e:
             logger.error(f"❌ Error getting audit statistics: {e}")
             return {"error": str(e)}
+    
+    async def rebuild_rollups(self, start_date: Optional[datetime] = None) -> int:
+        """Backfill the daily rollups from raw audit_logs (one keyset-paginated pass).
+
+        The sink is paused for the whole rebuild, so no batch is written (and
+        counted again by the rollup listener) while the raw rows are read.
+        """
+        start_day = None
+        if start_date:
+            # Rollup rows are whole days; a partial first day would overwrite its counters
+            start_date = datetime.combine(start_date.date(), datetime.min.time())
+            start_day = start_date.date().isoformat()
+        async with self.sink.paused():
+            pages = self.iter_audit_log_pages(
+                columns=['timestamp', 'id', 'action', 'resource', 'user_id'],
+                start_date=start_date
+            )
+            return await self.rollups.rebuild(pages, start_day=start_day)
 
 # Decorators for automatic audit logging
 def audit_log(action: AuditAction, resource: AuditResource):
@@ -0,0 +1,221 @@
+"""
+Audit Rollups for Volunteer PathFinder
+Maintains per-day audit counters so statistics never scan raw audit_logs
+"""
+from typing import Dict, List, Optional, Any, AsyncIterator
+from collections import Counter
+from datetime import datetime, timedelta
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_TABLE = 'audit_daily_rollups'
+
+# Dimensions counted per day; 'total' uses an empty key
+ROLLUP_DIMENSIONS = ('total', 'action', 'resource', 'user')
+
+class AuditRollupStore:
+    """Per-day counters of audit entries by action, resource and user.
+
+    Counters are incremented from each batch the audit sink writes, through
+    the increment_audit_rollups database function. If the increment fails,
+    the deltas stay pending and are sent with the next batch. Statistics read
+    one row per (day, dimension, key), so their cost depends on the window
+    length and the number of active users, not on audit volume.
+    """
+
+    def __init__(self, database, page_size: int = 1000):
+        self.database = database
+        self.page_size = page_size
+        self._pending = Counter()
+        self._lock = asyncio.Lock()
+        self._setup_rollup_tables()
+
+    def _setup_rollup_tables(self):
+        """Setup rollup table and increment function in the database"""
+        # This would be executed in Supabase SQL editor
+        rollup_sql = """
+        CREATE TABLE IF NOT EXISTS audit_daily_rollups (
+            day DATE NOT NULL,
+            dimension VARCHAR(20) NOT NULL,
+            key VARCHAR(100) NOT NULL DEFAULT '',
+            count BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+            PRIMARY KEY (day, dimension, key)
+        );
+
+        CREATE OR REPLACE FUNCTION increment_audit_rollups(deltas JSONB)
+        RETURNS VOID AS $$
+        BEGIN
+            INSERT INTO audit_daily_rollups (day, dimension, key, count)
+            SELECT (d->>'day')::DATE, d->>'dimension', d->>'key', (d->>'count')::BIGINT
+            FROM jsonb_array_elements(deltas) AS d
+            ON CONFLICT (day, dimension, key)
+            DO UPDATE SET count = audit_daily_rollups.count + EXCLUDED.count,
+                          updated_at = NOW();
+        END;
+        $$ LANGUAGE plpgsql;
+
+        -- Rebuild: replace every counter in a day range in one transaction.
+        -- NULL bounds leave that side of the range open.
+        CREATE OR REPLACE FUNCTION replace_audit_rollups(start_day DATE, end_day DATE, counters JSONB)
+        RETURNS VOID AS $$
+        BEGIN
+            -- Concurrent increments wait until the new counters are committed
+            LOCK TABLE audit_daily_rollups IN SHARE ROW EXCLUSIVE MODE;
+            DELETE FROM audit_daily_rollups
+            WHERE (start_day IS NULL OR day >= start_day)
+              AND (end_day IS NULL OR day <= end_day);
+            INSERT INTO audit_daily_rollups (day, dimension, key, count)
+            SELECT (c->>'day')::DATE, c->>'dimension', c->>'key', (c->>'count')::BIGINT
+            FROM jsonb_array_elements(counters) AS c;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+
+        logger.info("Audit rollup schema prepared. Execute in Supabase SQL editor.")
+
+    @staticmethod
+    def count_rows(rows: List[Dict[str, Any]], counter: Optional[Counter] = None) -> Counter:
+        """Count audit rows per (day, dimension, key)"""
+        counter = counter if counter is not None else Counter()
+        for row in rows:
+            timestamp = row.get('timestamp')
+            if not timestamp:
+                continue
+            day = str(timestamp)[:10]
+            counter[(day, 'total', '')] += 1
+            counter[(day, 'action', row.get('action') or 'unknown')] += 1
+            counter[(day, 'resource', row.get('resource') or 'unknown')] += 1
+            if row.get('user_id'):
+                counter[(day, 'user', row['user_id'])] += 1
+        return counter
+
+    async def record_batch(self, rows: List[Dict[str, Any]]):
+        """Add a written batch to the counters (audit sink listener)"""
+        async with self._lock:
+            self.count_rows(rows, self._pending)
+            await self._push_pending()
+
+    async def _push_pending(self):
+        if not self._pending or not self.database._is_available():
+            return
+
+        deltas = [
+            {'day': day, 'dimension': dimension, 'key': key, 'count': count}
+            for (day, dimension, key), count in self._pending.items()
+        ]
+        try:
+            await asyncio.to_thread(
+                lambda: self.database.supabase.rpc('increment_audit_rollups', {'deltas': deltas}).execute()
+            )
+            self._pending.clear()
+        except Exception as e:
+            # Keep the deltas; they are merged into the next push
+            logger.error(f"❌ Error updating audit rollups ({len(deltas)} counters pending): {e}")
+
+    async def flush(self):
+        """Retry any pending counter deltas"""
+        async with self._lock:
+            await self._push_pending()
+
+    async def get_daily_counters(self, start_day: str, end_day: Optional[str] = None) -> Counter:
+        """Read rollup counters for a day range, including deltas not yet pushed"""
+        counters = Counter()
+
+        if self.database._is_available():
+            offset = 0
+            while True:
+                query = self.database.supabase.table(ROLLUP_TABLE).select('day,dimension,key,count').gte('day', start_day)
+                if end_day:
+                    query = query.lte('day', end_day)
+                query = query.order('day').order('dimension').order('key').range(offset, offset + self.page_size - 1)
+                result = await asyncio.to_thread(query.execute)
+                rows = result.data or []
+                for row in rows:
+                    counters[(str(row['day'])[:10], row['dimension'], row['key'])] += int(row['count'])
+                if len(rows) < self.page_size:
+                    break
+                offset += self.page_size
+
+        for (day, dimension, key), count in self._pending.items():
+            if day >= start_day and (end_day is None or day <= end_day):
+                counters[(day, dimension, key)] += count
+
+        return counters
+
+    async def get_statistics(self, days: int = 30) -> Dict[str, Any]:
+        """Audit statistics for the last `days` days (whole days, UTC) from the rollups"""
+        start_day = (datetime.utcnow() - timedelta(days=days)).date().isoformat()
+        counters = await self.get_daily_counters(start_day)
+
+        daily_activity = {}
+        actions = Counter()
+        resources = Counter()
+        user_activity = Counter()
+        for (day, dimension, key), count in counters.items():
+            if dimension == 'total':
+                daily_activity[day] = daily_activity.get(day, 0) + count
+            elif dimension == 'action':
+                actions[key] += count
+            elif dimension == 'resource':
+                resources[key] += count
+            elif dimension == 'user':
+                user_activity[key] += count
+
+        total_activities = sum(daily_activity.values())
+        if not total_activities:
+            return {"message": "No audit logs found for the specified period"}
+
+        top_users = sorted(user_activity.items(), key=lambda x: x[1], reverse=True)[:10]
+
+        return {
+            "period_days": days,
+            "total_activities": total_activities,
+            "unique_users": len(user_activity),
+            "activity_by_action": dict(actions),
+            "activity_by_resource": dict(resources),
+            "daily_activity": dict(sorted(daily_activity.items())),
+            "top_users": [{"user_id": user_id, "activity_count": count} for user_id, count in top_users],
+            "generated_at": datetime.utcnow().isoformat()
+        }
+
+    async def rebuild(self, pages: AsyncIterator[List[Dict[str, Any]]],
+                      start_day: Optional[str] = None, end_day: Optional[str] = None) -> int:
+        """Recompute counters from raw audit rows and replace the rollups for a day range.
+
+        Used to backfill rollups for history written before they existed.
+        `pages` is typically AuditLogger.iter_audit_log_pages(columns=[...]) and
+        must cover every raw row from start_day to end_day (None leaves that
+        side of the range open). The range is deleted and rewritten by the
+        replace_audit_rollups function in one transaction, so counters with no
+        rows left are removed too. Memory is bounded by the number of distinct
+        counters, not by row count.
+
+        No audit batch may be written while the pages are read, or its rows
+        are counted twice; AuditLogger.rebuild_rollups pauses the sink for
+        this. Pending deltas inside the range are dropped, since the recount
+        already includes their rows.
+        """
+        async with self._lock:
+            counters = Counter()
+            async for page in pages:
+                self.count_rows(page, counters)
+
+            rows = [
+                {'day': day, 'dimension': dimension, 'key': key, 'count': count}
+                for (day, dimension, key), count in counters.items()
+                if (start_day is None or day >= start_day) and (end_day is None or day <= end_day)
+            ]
+            params = {'start_day': start_day, 'end_day': end_day, 'counters': rows}
+            await asyncio.to_thread(
+                lambda: self.database.supabase.rpc('replace_audit_rollups', params).execute()
+            )
+
+            for day, dimension, key in list(self._pending):
+                if (start_day is None or day >= start_day) and (end_day is None or day <= end_day):
+                    del self._pending[(day, dimension, key)]
+
+        logger.info(f"✅ Rebuilt {len(rows)} audit rollup counters")
+        return len(rows)
@@ -0,0 +1,281 @@
+"""
+Background audit sink for Volunteer PathFinder
+Queues audit rows, writes them to Supabase in batches and spools to a local file when the database is down
+"""
+from typing import Dict, List, Optional, Any, Callable, Awaitable
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import logging
+import os
+import time
+
+from batch_writer import BatchWriter
+
+logger = logging.getLogger(__name__)
+
+class AuditSink(BatchWriter):
+    """Batched, non-blocking writer for audit_logs rows.
+
+    Rows are flushed when a batch fills up or after flush_interval seconds.
+    A batch that fails or takes longer than write_timeout is appended to an
+    append-only JSON lines spool file. The spool is replayed after the next
+    successful write, on startup and every replay_interval seconds once the
+    database health check passes, so it drains even when no new rows arrive.
+    Replays use upsert on the row id, so a batch that timed out but reached
+    the database is not written twice.
+
+    When the queue holds max_queue_size rows, new rows are held in an overflow
+    list and spooled a batch at a time in a worker thread, never on the event
+    loop.
+
+    Inside `async with sink.paused()` nothing is written or replayed; rows
+    keep queuing and are flushed after the block.
+    """
+
+    def __init__(self, database, table: str = 'audit_logs', batch_size: int = 200,
+                 flush_interval: float = 1.0, write_timeout: float = 5.0,
+                 max_queue_size: int = 50000, spool_path: Optional[str] = None,
+                 max_backoff: float = 30.0, replay_interval: float = 30.0):
+        super().__init__(batch_size, flush_interval, max_backoff)
+        self.database = database
+        self.table = table
+        self.write_timeout = write_timeout
+        self.max_queue_size = max_queue_size
+        self.replay_interval = replay_interval
+        self.spool_path = spool_path or os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), 'audit_spool.jsonl'
+        )
+        self._overflow: List[Dict[str, Any]] = []
+        self._replay_task: Optional[asyncio.Task] = None
+        self._spool_lock = asyncio.Lock()
+        self._paused = False
+        self._listeners: List[Callable[[List[Dict[str, Any]]], Awaitable[None]]] = []
+        self._stats = {
+            'enqueued': 0,
+            'written': 0,
+            'spooled': 0,
+            'replayed': 0,
+            'failed_flushes': 0,
+            'slow_flushes': 0,
+        }
+
+    def add_listener(self, callback: Callable[[List[Dict[str, Any]]], Awaitable[None]]):
+        """Register an async callback that receives each batch once it is written"""
+        self._listeners.append(callback)
+
+    def enqueue(self, row: Dict[str, Any]):
+        """Queue a row for the next batch; never blocks on the database"""
+        self._stats['enqueued'] += 1
+        if len(self._queue) >= self.max_queue_size:
+            # Degraded mode: the writer is far behind, the next flush spools these rows
+            self._overflow.append(row)
+        else:
+            self._queue.append(row)
+
+        if len(self._overflow) >= self.batch_size:
+            self._batch_ready.set()
+        self._queued()
+
+    def start(self):
+        """Start the background tasks; call from the app's startup hook to replay a leftover spool"""
+        self._ensure_flush_task()
+
+    def _has_pending(self) -> bool:
+        return bool(self._queue or self._overflow)
+
+    def _ensure_flush_task(self):
+        """Start the flush and replay tasks on the running loop if they are not running"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._replay_task is None or self._replay_task.done():
+            self._replay_task = loop.create_task(self._replay_periodically())
+        super()._ensure_flush_task()
+
+    async def flush(self) -> int:
+        """Write all queued rows; returns the number written to the database"""
+        written = 0
+        async with self._flush_lock:
+            if self._paused:
+                return 0
+            if self._overflow:
+                overflow, self._overflow = self._overflow, []
+                await self._spool_batch(overflow)
+
+            while self._queue:
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                if await self._write_batch(batch, replay=False):
+                    written += len(batch)
+                else:
+                    # Database is down or slow: spool this batch and the rest of the queue
+                    batch.extend(self._queue)
+                    self._queue.clear()
+                    await self._spool_batch(batch)
+
+            if written and self.spool_size() > 0:
+                await self._replay_spool_locked()
+        return written
+
+    async def _write_batch(self, batch: List[Dict[str, Any]], replay: bool) -> bool:
+        """Insert one batch off the event loop, recording latency and health"""
+        if not self.database._is_available():
+            return False
+
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(
+                asyncio.to_thread(self._execute_write, batch, replay),
+                timeout=self.write_timeout
+            )
+        except asyncio.TimeoutError:
+            self._stats['slow_flushes'] += 1
+            self._record_failure()
+            logger.error(f"❌ Audit batch of {len(batch)} timed out after {self.write_timeout}s, spooling")
+            return False
+        except asyncio.CancelledError:
+            # Replayed rows are still in the replay file; only live rows need requeueing
+            if not replay:
+                self._queue.extendleft(reversed(batch))
+            raise
+        except Exception as e:
+            self._record_failure()
+            logger.error(f"❌ Error writing {len(batch)} audit entries: {e}")
+            return False
+
+        self._record_success(start)
+        self._stats['written'] += len(batch)
+
+        for listener in self._listeners:
+            try:
+                await listener(batch)
+            except Exception as e:
+                logger.error(f"❌ Audit sink listener failed: {e}")
+        return True
+
+    def _execute_write(self, batch: List[Dict[str, Any]], replay: bool):
+        """Blocking Supabase call, run in a worker thread"""
+        table = self.database.supabase.table(self.table)
+        query = table.upsert(batch) if replay else table.insert(batch)
+        return query.execute()
+
+    def _record_failure(self):
+        self._stats['failed_flushes'] += 1
+        super()._record_failure()
+
+    async def _spool_batch(self, batch: List[Dict[str, Any]]):
+        """Append a failed batch to the spool file"""
+        async with self._spool_lock:
+            await asyncio.to_thread(self._append_to_spool, batch)
+        self._stats['spooled'] += len(batch)
+
+    def _append_to_spool(self, rows: List[Dict[str, Any]]):
+        with open(self.spool_path, 'a', encoding='utf-8') as spool:
+            for row in rows:
+                spool.write(json.dumps(row, default=str) + '\n')
+            spool.flush()
+            os.fsync(spool.fileno())
+
+    def spool_size(self) -> int:
+        """Size of pending spool data in bytes"""
+        total = 0
+        for path in (self.spool_path, self._replay_path):
+            if os.path.exists(path):
+                total += os.path.getsize(path)
+        return total
+
+    @property
+    def _replay_path(self) -> str:
+        return self.spool_path + '.replaying'
+
+    async def replay_spool(self) -> int:
+        """Write spooled rows back to the database; returns the number replayed"""
+        async with self._flush_lock:
+            if self._paused:
+                return 0
+            return await self._replay_spool_locked()
+
+    async def _replay_spool_locked(self) -> int:
+        async with self._spool_lock:
+            # Move the spool aside so new failures start a fresh file; a leftover
+            # replay file from an interrupted run is finished first
+            if not os.path.exists(self._replay_path):
+                if not os.path.exists(self.spool_path):
+                    return 0
+                os.replace(self.spool_path, self._replay_path)
+
+        rows = await asyncio.to_thread(self._read_spool, self._replay_path)
+        replayed = 0
+        for offset in range(0, len(rows), self.batch_size):
+            batch = rows[offset:offset + self.batch_size]
+            if not await self._write_batch(batch, replay=True):
+                async with self._spool_lock:
+                    await asyncio.to_thread(self._append_to_spool, rows[offset:])
+                break
+            replayed += len(batch)
+
+        os.remove(self._replay_path)
+        self._stats['replayed'] += replayed
+        if replayed:
+            logger.info(f"✅ Replayed {replayed} spooled audit entries")
+        return replayed
+
+    async def _replay_periodically(self):
+        """Replay leftover spool data now and then on every tick the database is healthy"""
+        while True:
+            try:
+                if self.spool_size() > 0 and self.database._is_available():
+                    await self.replay_spool()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Audit spool replay failed: {e}")
+            await asyncio.sleep(self.replay_interval)
+
+    def _read_spool(self, path: str) -> List[Dict[str, Any]]:
+        rows = []
+        with open(path, 'r', encoding='utf-8') as spool:
+            for line in spool:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-write
+                    logger.warning("Skipping unreadable audit spool line")
+        return rows
+
+    @asynccontextmanager
+    async def paused(self):
+        """Hold every write until the block exits; rows enqueued meanwhile stay queued"""
+        async with self._flush_lock:
+            # A flush already running finishes first
+            self._paused = True
+        try:
+            yield
+        finally:
+            self._paused = False
+            self._ensure_flush_task()
+
+    async def stop(self):
+        """Cancel the background tasks and write whatever is left"""
+        if self._replay_task is not None and not self._replay_task.done():
+            self._replay_task.cancel()
+            try:
+                await self._replay_task
+            except asyncio.CancelledError:
+                pass
+        self._replay_task = None
+        await super().stop()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Queue depth, throughput counters and flush latency"""
+        return {
+            **self._stats,
+            'queue_depth': len(self._queue),
+            'overflow_depth': len(self._overflow),
+            'spool_bytes': self.spool_size(),
+            **self._latency_metrics(),
+        }
@@ -0,0 +1,113 @@
+"""
+Event-driven waitlist backfill
+Drops, no-shows and capacity changes publish a backfill for just the affected course; a worker pool runs
+them de-duplicated and serialized per course, so freed seats are filled without waiting for a periodic scan
+"""
+from typing import Any, Dict, List, Set, Tuple
+from collections import deque
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class BackfillEventBus:
+    """In-process queue of per-course backfill tasks run by `engine` (a BatchBackfillEngine).
+
+    - De-duplicated: events for a course that is already queued join that
+      queued run instead of adding another one
+    - Serialized per course: a course is never backfilled by two workers at
+      once; events arriving mid-run schedule exactly one follow-up run
+    - Worker pool: up to `workers` different courses are backfilled in parallel
+
+    `publish` returns a future with the course's backfill result, which
+    callers may await or ignore.
+    """
+
+    def __init__(self, engine, workers: int = 4):
+        self.engine = engine
+        self.workers = workers
+        self._queue: asyncio.Queue = None
+        self._tasks: List[asyncio.Task] = []
+        self._loop = None
+        self._pending: Dict[str, List[Tuple[str, asyncio.Future, float]]] = {}
+        self._running: Set[str] = set()
+        self._stats = {'published': 0, 'coalesced': 0, 'runs': 0, 'failed_runs': 0}
+        self._latencies_ms = deque(maxlen=1000)
+
+    def _ensure_workers(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._queue, self._tasks, self._loop = asyncio.Queue(), [], loop
+            self._pending, self._running = {}, set()
+        self._tasks = [task for task in self._tasks if not task.done()]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    def publish(self, course_id: str, reason: str) -> asyncio.Future:
+        """Request a backfill of one course; resolves with that course's backfill result"""
+        self._ensure_workers()
+        self._stats['published'] += 1
+        future = self._loop.create_future()
+
+        waiters = self._pending.get(course_id)
+        if waiters is not None:
+            self._stats['coalesced'] += 1
+            waiters.append((reason, future, time.perf_counter()))
+            return future
+
+        self._pending[course_id] = [(reason, future, time.perf_counter())]
+        if course_id not in self._running:
+            self._queue.put_nowait(course_id)
+        # A course that is running is re-queued by its worker once the current run finishes
+        return future
+
+    async def _worker(self):
+        while True:
+            course_id = await self._queue.get()
+            waiters = self._pending.pop(course_id, [])
+            self._running.add(course_id)
+            try:
+                result = await self._backfill(course_id, waiters[0][0] if waiters else 'event')
+                finished = time.perf_counter()
+                for _, future, published_at in waiters:
+                    self._latencies_ms.append((finished - published_at) * 1000)
+                    if not future.done():
+                        future.set_result(result)
+            finally:
+                self._running.discard(course_id)
+                if course_id in self._pending:
+                    self._queue.put_nowait(course_id)
+                self._queue.task_done()
+
+    async def _backfill(self, course_id: str, reason: str) -> Dict[str, Any]:
+        self._stats['runs'] += 1
+        try:
+            run = await self.engine.run(reason, course_ids=[course_id], wait_for_notifications=False)
+            return run['results'][0]['result']
+        except Exception as e:
+            self._stats['failed_runs'] += 1
+            logger.error(f"❌ Error in event-driven backfill for course {course_id}: {e}")
+            return {'success': False, 'message': f'Auto-backfill error: {e}'}
+
+    async def join(self):
+        """Wait until every published backfill has run"""
+        if self._queue is not None and self._loop is asyncio.get_running_loop():
+            await self._queue.join()
+
+    async def close(self):
+        await self.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def get_metrics(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies_ms)
+        return {
+            **self._stats,
+            'queued_courses': len(self._pending),
+            'running_courses': len(self._running),
+            'avg_latency_ms': sum(latencies) / len(latencies) if latencies else 0,
+            'p95_latency_ms': latencies[int(len(latencies) * 0.95)] if latencies else 0,
+        }
@@ -0,0 +1,102 @@
+"""
+Background batch writer for Volunteer PathFinder
+Shared flush loop for writers that queue rows in memory and write them in batches
+"""
+from typing import Dict, Optional, Any
+from abc import ABC, abstractmethod
+from collections import deque
+import asyncio
+import time
+
+class BatchWriter(ABC):
+    """Queue, flush task and backoff shared by the batched background writers.
+
+    Subclasses append rows to `_queue` and call `_queued()`; a background task
+    then calls `flush()` as soon as batch_size rows are waiting, or
+    flush_interval seconds after the first one. After a failed write
+    (`_record_failure()`) the wait grows by a backoff that doubles up to
+    max_backoff, and a successful write (`_record_success()`) resets it.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float, max_backoff: float = 30.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self._queue = deque()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._batch_ready = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._backoff = 0.0
+        self._stopping = False
+        self._flush_latencies_ms = deque(maxlen=200)
+
+    @abstractmethod
+    async def flush(self) -> int:
+        """Write all queued rows under _flush_lock; returns the number written"""
+
+    def _has_pending(self) -> bool:
+        """Whether the flush loop has work left"""
+        return bool(self._queue)
+
+    def _queued(self):
+        """Wake the flush loop for a full batch and make sure it is running"""
+        if len(self._queue) >= self.batch_size:
+            self._batch_ready.set()
+        self._ensure_flush_task()
+
+    def _ensure_flush_task(self):
+        """Start the flush task on the running loop if rows are waiting and none is running"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop (e.g. scripts); rows stay queued until flush() is awaited
+            return
+        if self._has_pending() and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = loop.create_task(self._flush_when_ready())
+
+    async def _flush_when_ready(self):
+        """Wait for a full batch or the flush interval (plus backoff), then drain the queue"""
+        while self._has_pending() and not self._stopping:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), timeout=self.flush_interval + self._backoff)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            if self._stopping:
+                break
+            await self.flush()
+
+    def _record_success(self, started: float):
+        """Record a written batch that started at time.perf_counter() value `started`"""
+        self._flush_latencies_ms.append((time.perf_counter() - started) * 1000)
+        self._backoff = 0.0
+
+    def _record_failure(self):
+        self._backoff = min(self.max_backoff, max(self.flush_interval, self._backoff * 2))
+
+    async def stop(self):
+        """Stop the background flush and write whatever is left.
+
+        The flush task is woken and exits instead of being cancelled, so a
+        batch is never interrupted mid-insert (it may already be stored and
+        would be written again).
+        """
+        self._stopping = True
+        self._batch_ready.set()
+        try:
+            if self._flush_task is not None and not self._flush_task.done():
+                await self._flush_task
+        finally:
+            self._stopping = False
+            self._flush_task = None
+        await self.flush()
+
+    def _latency_metrics(self) -> Dict[str, Any]:
+        """Backoff and flush latency, for the writers' metrics"""
+        latencies = sorted(self._flush_latencies_ms)
+        return {
+            'backoff_seconds': self._backoff,
+            'last_flush_ms': self._flush_latencies_ms[-1] if self._flush_latencies_ms else None,
+            'avg_flush_ms': sum(latencies) / len(latencies) if latencies else None,
+            'p95_flush_ms': latencies[int(0.95 * (len(latencies) - 1))] if latencies else None,
+        }
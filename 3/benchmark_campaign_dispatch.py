@@ -0,0 +1,100 @@
+"""
+Throughput benchmark for campaign dispatch
+Compares one-at-a-time send_personalized_message with CampaignDispatcher against a local fake provider
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict
+
+from ab_test_framework import ABTestFramework
+from campaign_manager import CampaignManager
+from campaign_dispatch import CampaignDispatcher, FakeDeliveryProvider
+
+CITIES = ['Cincinnati', 'Blue Ash', 'Newport', 'Mason']
+
+
+def generate_recipients(count: int) -> Dict[str, Dict[str, Any]]:
+    """Synthetic recipients keyed by user id"""
+    return {
+        f'user_{i}': {
+            'first_name': f'Volunteer{i}',
+            'city': CITIES[i % len(CITIES)],
+            'interests': 'youth development',
+            'volunteer_history': {'previous_hours': i % 40},
+        }
+        for i in range(count)
+    }
+
+
+async def _launched_campaign(provider: FakeDeliveryProvider):
+    manager = CampaignManager(ABTestFramework(), delivery_provider=provider)
+    campaign_id = await manager.create_volunteer_campaign({
+        'name': 'Benchmark Campaign',
+        'description': 'Dispatch throughput benchmark',
+        'channel': 'email',
+        'start_date': datetime.now().isoformat(),
+        'end_date': (datetime.now() + timedelta(days=30)).isoformat(),
+        'created_by': 'benchmark'
+    })
+    await manager.launch_campaign(campaign_id)
+    return manager, campaign_id
+
+
+async def run_sequential(count: int, latency: float) -> Dict[str, float]:
+    """Send one message at a time, as send_personalized_message callers did"""
+    manager, campaign_id = await _launched_campaign(FakeDeliveryProvider(latency_seconds=latency))
+    recipients = generate_recipients(count)
+
+    start = time.perf_counter()
+    delivered = 0
+    for user_id, profile in recipients.items():
+        delivered += await manager.send_personalized_message(campaign_id, user_id, profile)
+    seconds = time.perf_counter() - start
+
+    return {'recipients': count, 'delivered': delivered, 'seconds': seconds,
+            'messages_per_second': delivered / seconds if seconds else float('inf')}
+
+
+async def run_dispatcher(count: int, latency: float, concurrency: int, rate_limit: float) -> Dict[str, float]:
+    """Send the whole audience through the dispatcher"""
+    provider = FakeDeliveryProvider(latency_seconds=latency)
+    manager, campaign_id = await _launched_campaign(provider)
+    recipients = generate_recipients(count)
+
+    with tempfile.TemporaryDirectory() as checkpoint_dir:
+        dispatcher = CampaignDispatcher(manager, concurrency=concurrency, checkpoint_dir=checkpoint_dir,
+                                        channel_rate_limits={'email': rate_limit})
+        start = time.perf_counter()
+        summary = await dispatcher.dispatch(campaign_id, recipients)
+        seconds = time.perf_counter() - start
+
+    assert max(provider.deliveries.values()) == 1, "A recipient was sent the campaign twice"
+    return {'recipients': count, 'delivered': summary['delivered'], 'seconds': seconds,
+            'messages_per_second': summary['delivered'] / seconds if seconds else float('inf'),
+            'p95_delivery_ms': dispatcher.get_metrics()['p95_delivery_ms']}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark campaign dispatch throughput")
+    parser.add_argument('--recipients', type=int, default=20000, help='Audience size for the dispatcher')
+    parser.add_argument('--sequential-recipients', type=int, default=1000,
+                        help='Audience size for the one-at-a-time baseline')
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='Fake provider latency per send')
+    parser.add_argument('--concurrency', type=int, default=100, help='Dispatcher worker count')
+    parser.add_argument('--rate-limit', type=float, default=5000.0, help='Email messages per second')
+    args = parser.parse_args()
+    latency = args.latency_ms / 1000
+
+    print(f"📨 Fake provider latency {args.latency_ms:.1f} ms per message")
+    sequential = asyncio.run(run_sequential(args.sequential_recipients, latency))
+    print(f"  sequential  {sequential['recipients']:>6,} recipients | {sequential['delivered']:>6,} delivered "
+          f"in {sequential['seconds']:.2f}s ({sequential['messages_per_second']:,.0f} msg/s)")
+
+    dispatched = asyncio.run(run_dispatcher(args.recipients, latency, args.concurrency, args.rate_limit))
+    print(f"  dispatcher  {dispatched['recipients']:>6,} recipients | {dispatched['delivered']:>6,} delivered "
+          f"in {dispatched['seconds']:.2f}s ({dispatched['messages_per_second']:,.0f} msg/s, "
+          f"p95 send {dispatched['p95_delivery_ms']:.1f} ms)")
+    print(f"  speedup     {dispatched['messages_per_second'] / sequential['messages_per_second']:.1f}x")
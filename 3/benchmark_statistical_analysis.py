@@ -0,0 +1,85 @@
+"""
+Micro-benchmarks for A/B test statistical analysis
+Times the integrated and sampled Bayesian analysis, look-by-look and vectorized sequential
+p-values, alpha-spending boundaries and batched analysis of many concurrent tests
+"""
+import argparse
+import random
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from statistical_analysis import ABTestAnalyzer, StatisticalAnalyzer
+from statistical_kernels import group_sequential_boundaries
+
+
+def time_call(func: Callable[[], Any], repeat: int) -> float:
+    """Median milliseconds per call"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def generate_tests(count: int, seed: int = 42) -> Dict[str, Dict[str, int]]:
+    rng = random.Random(seed)
+    tests = {}
+    for i in range(count):
+        control_total, variant_total = rng.randint(500, 5000), rng.randint(500, 5000)
+        tests[f'test_{i}'] = {
+            'control_conversions': rng.randint(1, control_total // 10),
+            'control_total': control_total,
+            'variant_conversions': rng.randint(1, variant_total // 10),
+            'variant_total': variant_total,
+        }
+    return tests
+
+
+def generate_looks(count: int, seed: int = 42) -> List[Dict[str, int]]:
+    rng = random.Random(seed)
+    return [{'control_conversions': rng.randint(2, 8), 'control_total': 50,
+             'variant_conversions': rng.randint(3, 9), 'variant_total': 50} for _ in range(count)]
+
+
+def run_benchmark(tests: int, looks: int, repeat: int) -> Dict[str, float]:
+    analyzer = StatisticalAnalyzer()
+    test_data = generate_tests(tests)
+    points = generate_looks(looks)
+    cumulative = np.cumsum([[p['control_conversions'], p['control_total'], p['variant_conversions'],
+                             p['variant_total']] for p in points], axis=0)
+    fractions = np.linspace(1 / looks, 1, looks)
+
+    return {
+        'bayesian_sampling_ms': time_call(lambda: analyzer.bayesian_analysis(50, 1000, 70, 1000, method='sampling'),
+                                          repeat),
+        'bayesian_integrated_ms': time_call(lambda: analyzer.bayesian_analysis(50, 1000, 70, 1000), repeat),
+        'sequential_per_look_ms': time_call(
+            lambda: [analyzer.analyze_conversion_rate(*map(int, row)) for row in cumulative], repeat),
+        'sequential_vectorized_ms': time_call(lambda: analyzer.sequential_analysis(points), repeat),
+        # Boundaries are cached per schedule, so only the first call does the work
+        'boundaries_ms': time_call(lambda: group_sequential_boundaries(fractions), 1),
+        'tests_one_by_one_ms': time_call(
+            lambda: {k: ABTestAnalyzer().comprehensive_analysis(v) for k, v in test_data.items()}, repeat),
+        'tests_batched_ms': time_call(lambda: ABTestAnalyzer().analyze_tests(test_data), repeat),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark A/B test statistical analysis")
+    parser.add_argument('--tests', type=int, default=200, help='Concurrent tests analyzed together')
+    parser.add_argument('--looks', type=int, default=100, help='Looks in the sequential analysis')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement (median reported)')
+    args = parser.parse_args()
+
+    results = run_benchmark(args.tests, args.looks, args.repeat)
+    print(f"📊 Statistical analysis micro-benchmarks (median of {args.repeat})")
+    print(f"  bayesian    sampling {results['bayesian_sampling_ms']:8.2f} ms | "
+          f"integrated {results['bayesian_integrated_ms']:8.2f} ms")
+    print(f"  sequential  {args.looks} looks one by one {results['sequential_per_look_ms']:8.2f} ms | "
+          f"vectorized {results['sequential_vectorized_ms']:8.2f} ms")
+    print(f"  boundaries  {args.looks} looks {results['boundaries_ms']:8.2f} ms (uncached)")
+    print(f"  {args.tests} tests  one by one {results['tests_one_by_one_ms']:8.2f} ms | "
+          f"batched {results['tests_batched_ms']:8.2f} ms")
@@ -0,0 +1,300 @@
+"""
+Campaign dispatch engine
+Fans a campaign out to many recipients through a rate-limited, bounded-concurrency delivery queue
+"""
+from typing import Dict, List, Optional, Any, Set
+from collections import deque
+from datetime import datetime
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import uuid
+
+from campaign_manager import CampaignExecution
+from rate_limiting import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Messages per second each channel's provider accepts
+DEFAULT_CHANNEL_RATE_LIMITS = {
+    'email': 100.0,
+    'sms': 20.0,
+    'push': 200.0,
+    'in_app': 500.0,
+}
+
+# Namespace for deterministic execution ids, one per (campaign, user)
+EXECUTION_NAMESPACE = uuid.UUID('6f1c2d0e-8a53-4f57-9a1e-2b7c4d9e0f31')
+
+class DispatchCheckpoint:
+    """Append-only JSON lines record of the users a campaign was delivered to.
+
+    Lines are written and fsynced once a batch's execution rows are saved,
+    so a resumed dispatch skips those users.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def load(self) -> Set[str]:
+        delivered = set()
+        if not os.path.exists(self.path):
+            return delivered
+        with open(self.path, 'r', encoding='utf-8') as checkpoint:
+            for line in checkpoint:
+                try:
+                    delivered.add(json.loads(line)['user_id'])
+                except (ValueError, KeyError):
+                    # A torn final line from an interrupted write
+                    logger.warning("Skipping unreadable campaign checkpoint line")
+        return delivered
+
+    def record(self, executions: List[CampaignExecution]):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+        for execution in executions:
+            self._file.write(json.dumps({'user_id': execution.user_id, 'execution_id': execution.id}) + '\n')
+        self._file.flush()
+        self.sync()
+
+    def sync(self):
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+class FakeDeliveryProvider:
+    """Local stand-in for an email/SMS provider, for tests and benchmarks.
+
+    Each send takes `latency_seconds`; `failure_rate` of sends return False.
+    `deliveries` counts successful sends per execution id, so double sends
+    are easy to spot.
+    """
+
+    def __init__(self, latency_seconds: float = 0.005, failure_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency_seconds = latency_seconds
+        self.failure_rate = failure_rate
+        self.deliveries: Dict[str, int] = {}
+        self._random = random.Random(seed)
+
+    async def send(self, execution: CampaignExecution, channel: str) -> bool:
+        await asyncio.sleep(self.latency_seconds)
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            return False
+        self.deliveries[execution.id] = self.deliveries.get(execution.id, 0) + 1
+        return True
+
+class CampaignDispatcher:
+    """Sends a campaign to many recipients concurrently.
+
+    Variants are assigned for the whole audience up front and messages are
+    personalized in batches of `batch_size`. `concurrency` workers deliver
+    them through the manager's provider, each send waiting on its channel's
+    token bucket. Execution rows, "message_sent" events and the checkpoint
+    are written once per batch; a batch whose rows cannot be saved is left
+    out of the checkpoint and sent again by the next dispatch.
+
+    Execution ids are derived from (campaign, user), so a provider that
+    honours idempotency keys can drop the rare resend of a message that was
+    in flight when a dispatch was interrupted.
+    """
+
+    def __init__(self, campaign_manager, concurrency: int = 50, batch_size: int = 500,
+                 channel_rate_limits: Optional[Dict[str, float]] = None,
+                 checkpoint_dir: Optional[str] = None, max_attempts: int = 3,
+                 retry_backoff_seconds: float = 0.5):
+        self.campaign_manager = campaign_manager
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.channel_rate_limits = {**DEFAULT_CHANNEL_RATE_LIMITS, **(channel_rate_limits or {})}
+        self.checkpoint_dir = checkpoint_dir or os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), 'campaign_checkpoints'
+        )
+        self.max_attempts = max_attempts
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._delivery_latencies_ms = deque(maxlen=1000)
+        self._stats = {
+            'dispatches': 0,
+            'delivered': 0,
+            'failed': 0,
+            'retries': 0,
+            'skipped_already_sent': 0,
+            'batches_committed': 0,
+            'uncommitted': 0,
+        }
+
+    def checkpoint_path(self, campaign_id: str) -> str:
+        return os.path.join(self.checkpoint_dir, f"campaign_{campaign_id}.jsonl")
+
+    async def dispatch(self, campaign_id: str, recipients: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """Deliver the campaign to every recipient (user_id -> user_profile) not already sent to"""
+        manager = self.campaign_manager
+        campaign = manager.campaigns.get(campaign_id)
+        if not campaign or not campaign.test_id:
+            logger.error(f"Campaign {campaign_id} not found or has no A/B test")
+            return {'campaign_id': campaign_id, 'error': 'campaign not found'}
+
+        start = time.perf_counter()
+        checkpoint = DispatchCheckpoint(self.checkpoint_path(campaign_id))
+        already_sent = await asyncio.to_thread(checkpoint.load)
+        pending = [(user_id, profile) for user_id, profile in recipients.items() if user_id not in already_sent]
+
+        summary = {
+            'campaign_id': campaign_id,
+            'recipients': len(recipients),
+            'skipped_already_sent': len(recipients) - len(pending),
+            'no_message_variant': 0,
+            'delivered': 0,
+            'failed': 0,
+            'retries': 0,
+            'uncommitted': 0,
+        }
+
+        assignments = manager.ab_framework.assign_participants(campaign.test_id, pending)
+        test = manager.ab_framework.active_tests[campaign.test_id]
+        message_variants = {variant.id: variant for variant in test.message_variants}
+        schedule_variants = {variant.id: variant for variant in test.schedule_variants}
+
+        bucket = self._bucket(campaign.channel.value)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        completed: List[CampaignExecution] = []
+        commit_lock = asyncio.Lock()
+
+        async def commit():
+            async with commit_lock:
+                batch = completed[:]
+                del completed[:len(batch)]
+                if batch:
+                    await self._commit_batch(campaign, batch, checkpoint, summary)
+
+        async def worker():
+            while True:
+                execution = await queue.get()
+                try:
+                    await self._deliver(bucket, execution, summary)
+                    completed.append(execution)
+                    if len(completed) >= self.batch_size:
+                        await commit()
+                except Exception as e:
+                    logger.error(f"Dispatch worker error for user {execution.user_id}: {e}")
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        try:
+            for offset in range(0, len(pending), self.batch_size):
+                # Personalize a batch, then feed it to the workers
+                batch = []
+                for user_id, profile in pending[offset:offset + self.batch_size]:
+                    message_variant = message_variants.get(assignments.get(user_id))
+                    if not message_variant:
+                        summary['no_message_variant'] += 1
+                        continue
+                    batch.append(manager._build_execution(
+                        campaign, user_id, profile, message_variant,
+                        schedule_variants.get(assignments.get(user_id)),
+                        execution_id=str(uuid.uuid5(EXECUTION_NAMESPACE, f"{campaign_id}:{user_id}"))
+                    ))
+                for execution in batch:
+                    await queue.put(execution)
+            await queue.join()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            # Commit whatever was delivered, including when the dispatch is cancelled
+            await commit()
+            await asyncio.to_thread(checkpoint.close)
+
+        elapsed = time.perf_counter() - start
+        summary['elapsed_seconds'] = round(elapsed, 3)
+        summary['messages_per_second'] = round(summary['delivered'] / elapsed, 1) if elapsed else None
+        self._stats['dispatches'] += 1
+        self._stats['skipped_already_sent'] += summary['skipped_already_sent']
+        logger.info(f"Dispatched campaign {campaign_id}: {summary['delivered']} delivered, "
+                    f"{summary['failed']} failed, {summary['skipped_already_sent']} already sent")
+        return summary
+
+    def _bucket(self, channel: str) -> TokenBucket:
+        if channel not in self._buckets:
+            self._buckets[channel] = TokenBucket(self.channel_rate_limits.get(channel, 10.0))
+        return self._buckets[channel]
+
+    async def _deliver(self, bucket: TokenBucket, execution: CampaignExecution, summary: Dict[str, Any]):
+        """Send one message, retrying provider errors with exponential backoff"""
+        success = False
+        for attempt in range(self.max_attempts):
+            await bucket.acquire()
+            started = time.perf_counter()
+            try:
+                success = await self.campaign_manager._deliver_message(execution)
+                break
+            except Exception as e:
+                if attempt + 1 == self.max_attempts:
+                    logger.error(f"Giving up on message to user {execution.user_id}: {e}")
+                    break
+                summary['retries'] += 1
+                self._stats['retries'] += 1
+                await asyncio.sleep(self.retry_backoff_seconds * (2 ** attempt))
+            finally:
+                self._delivery_latencies_ms.append((time.perf_counter() - started) * 1000)
+
+        execution.sent_at = datetime.now()
+        if success:
+            execution.delivery_status = "delivered"
+            summary['delivered'] += 1
+            self._stats['delivered'] += 1
+        else:
+            # Not checkpointed, so a later dispatch tries this user again
+            execution.delivery_status = "failed"
+            summary['failed'] += 1
+            self._stats['failed'] += 1
+
+    async def _commit_batch(self, campaign, batch: List[CampaignExecution], checkpoint: DispatchCheckpoint,
+                            summary: Dict[str, Any]) -> bool:
+        """Save a batch of executions, retrying with backoff, then advance the checkpoint"""
+        manager = self.campaign_manager
+        for attempt in range(self.max_attempts):
+            if await manager._save_executions_to_db(batch):
+                break
+            if attempt + 1 < self.max_attempts:
+                await asyncio.sleep(self.retry_backoff_seconds * (2 ** attempt))
+        else:
+            # Not checkpointed: the next dispatch sends again under the same execution ids
+            logger.error(f"Could not save {len(batch)} executions for campaign {campaign.id}; "
+                         f"leaving them out of the checkpoint")
+            summary['uncommitted'] += len(batch)
+            self._stats['uncommitted'] += len(batch)
+            return False
+
+        manager.executions.extend(batch)
+        await manager.ab_framework.track_events(campaign.test_id, [
+            (execution.user_id, "message_sent", manager._message_sent_metadata(campaign, execution))
+            for execution in batch
+        ])
+        # Failed sends stay out of the checkpoint so the next dispatch retries them
+        delivered = [execution for execution in batch if execution.delivery_status == "delivered"]
+        await asyncio.to_thread(checkpoint.record, delivered)
+        self._stats['batches_committed'] += 1
+        return True
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Cumulative delivery counters and provider latency"""
+        latencies = sorted(self._delivery_latencies_ms)
+        return {
+            **self._stats,
+            'concurrency': self.concurrency,
+            'channel_rate_limits': dict(self.channel_rate_limits),
+            'avg_delivery_ms': sum(latencies) / len(latencies) if latencies else None,
+            'p95_delivery_ms': latencies[int(0.95 * (len(latencies) - 1))] if latencies else None,
+        }
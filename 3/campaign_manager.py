@@ -59,12 +59,16 @@ class CampaignExecution:
 class CampaignManager:
     """High-level campaign management for volunteer messaging"""
     
-    def __init__(self, ab_framework: ABTestFramework, database=None):
+    def __init__(self, ab_framework: ABTestFramework, database=None, delivery_provider=None):
         self.ab_framework = ab_framework
         self.database = database
+        # Object with `async send(execution, channel) -> bool`; None simulates delivery
+        self.delivery_provider = delivery_provider
         self.campaigns: Dict[str, Campaign] = {}
         self.executions: List[CampaignExecution] = []
         self.message_manager = CampaignMessageManager(ab_framework)
+        self._dispatcher = None
+        self._dispatcher_options: Dict[str, Any] = {}
     
     async def create_volunteer_campaign(self, campaign_data: Dict[str, Any]) -> str:
         """Create a new volunteer recruitment campaign with A/B testing"""
@@ -144,37 +148,14 @@ class CampaignManager:
         # Get schedule variant
         schedule_variant = await self.ab_framework.get_schedule_for_user(campaign.test_id, user_id)
         
-        # Personalize the message content
-        personalized_content = self._personalize_message(message_variant, user_profile)
-        
-        # Create execution record
-        execution = CampaignExecution(
-            id=str(uuid.uuid4()),
-            campaign_id=campaign_id,
-            test_id=campaign.test_id,
-            user_id=user_id,
-            variant_id=message_variant.id,
-            message_content=personalized_content,
-            scheduled_for=datetime.now(),
-            sent_at=datetime.now(),
-            delivery_status="sent",
-            metadata={
-                'user_profile': user_profile,
-                'schedule_variant_id': schedule_variant.id if schedule_variant else None
-            }
-        )
+        # Personalize the message content and create the execution record
+        execution = self._build_execution(campaign, user_id, user_profile, message_variant, schedule_variant)
         
         self.executions.append(execution)
         
         # Track the message send event
         await self.ab_framework.track_event(
-            campaign.test_id, user_id, "message_sent",
-            {
-                'campaign_id': campaign_id,
-                'message_variant_id': message_variant.id,
-                'channel': campaign.channel.value,
-                'personalized_content': personalized_content
-            }
+            campaign.test_id, user_id, "message_sent", self._message_sent_metadata(campaign, execution)
         )
         
         # In production, integrate with actual messaging service (email, SMS, etc.)
@@ -192,6 +173,27 @@ class CampaignManager:
         
         return success
     
+    async def dispatch_campaign(self, campaign_id: str, recipients: Dict[str, Dict[str, Any]],
+                                **dispatcher_options) -> Dict[str, Any]:
+        """Send the campaign to many recipients (user_id -> user_profile) at once.
+
+        Uses a CampaignDispatcher (see campaign_dispatch.py), created on first
+        use with `dispatcher_options`, so per-channel rate limits are shared by
+        every campaign this manager sends. Later calls may omit the options;
+        passing different ones raises ValueError.
+        """
+        if self._dispatcher is None:
+            from campaign_dispatch import CampaignDispatcher
+            self._dispatcher = CampaignDispatcher(self, **dispatcher_options)
+            self._dispatcher_options = dispatcher_options
+        elif dispatcher_options and dispatcher_options != self._dispatcher_options:
+            raise ValueError(
+                f"dispatch_campaign options {dispatcher_options} differ from the shared dispatcher's "
+                f"{self._dispatcher_options}; create a CampaignDispatcher directly for different options"
+            )
+        
+        return await self._dispatcher.dispatch(campaign_id, recipients)
+    
     async def track_user_engagement(self, campaign_id: str, user_id: str, 
                                   engagement_type: str, metadata: Dict[str, Any] = None):
         """Track user engagement with campaign messages"""
@@ -285,6 +287,36 @@ class CampaignManager:
         
         return campaigns_data
     
+    def _build_execution(self, campaign: Campaign, user_id: str, user_profile: Dict[str, Any],
+                         message_variant: MessageVariant, schedule_variant: Optional[ScheduleVariant],
+                         execution_id: Optional[str] = None) -> CampaignExecution:
+        """Personalize the variant for a user and wrap it in an execution record"""
+        now = datetime.now()
+        return CampaignExecution(
+            id=execution_id or str(uuid.uuid4()),
+            campaign_id=campaign.id,
+            test_id=campaign.test_id,
+            user_id=user_id,
+            variant_id=message_variant.id,
+            message_content=self._personalize_message(message_variant, user_profile),
+            scheduled_for=now,
+            sent_at=now,
+            delivery_status="sent",
+            metadata={
+                'user_profile': user_profile,
+                'schedule_variant_id': schedule_variant.id if schedule_variant else None
+            }
+        )
+    
+    def _message_sent_metadata(self, campaign: Campaign, execution: CampaignExecution) -> Dict[str, Any]:
+        """Metadata recorded with the A/B test "message_sent" event"""
+        return {
+            'campaign_id': campaign.id,
+            'message_variant_id': execution.variant_id,
+            'channel': campaign.channel.value,
+            'personalized_content': execution.message_content
+        }
+    
     def _personalize_message(self, message_variant: MessageVariant, 
                            user_profile: Dict[str, Any]) -> Dict[str, Any]:
         """Personalize message content based on user profile and variant settings"""
@@ -416,6 +448,12 @@ class CampaignManager:
     async def _deliver_message(self, execution: CampaignExecution) -> bool:
         """Deliver message via appropriate channel (email, SMS, etc.)"""
         
+        campaign = self.campaigns.get(execution.campaign_id)
+        channel = campaign.channel if campaign else MessageChannel.EMAIL
+        
+        if self.delivery_provider:
+            return await self.delivery_provider.send(execution, channel.value)
+        
         # In production, integrate with actual messaging services
         # For now, simulate delivery
         
@@ -426,7 +464,7 @@ class CampaignManager:
             MessageChannel.IN_APP: "in_app_service"
         }
         
-        logger.info(f"Delivering message via {channel_map.get(MessageChannel.EMAIL, 'unknown')} "
+        logger.info(f"Delivering message via {channel_map.get(channel, 'unknown')} "
                    f"to user {execution.user_id}")
         
         # Simulate successful delivery
@@ -474,16 +512,39 @@ class CampaignManager:
             return
         
         try:
-            execution_data = asdict(execution)
-            execution_data['scheduled_for'] = execution.scheduled_for.isoformat()
-            if execution.sent_at:
-                execution_data['sent_at'] = execution.sent_at.isoformat()
+            execution_data = self._execution_row(execution)
             
             await self.database.supabase.table('campaign_executions').insert(execution_data).execute()
             logger.debug(f"Saved execution {execution.id} to database")
         except Exception as e:
             logger.error(f"Failed to save execution to database: {e}")
     
+    async def _save_executions_to_db(self, executions: List[CampaignExecution]) -> bool:
+        """Upsert a batch of campaign executions in one request.
+
+        Upserting on id lets a resumed dispatch overwrite the rows of messages
+        that failed and were sent again.
+        """
+        if not self.database or not executions:
+            return True
+        
+        try:
+            execution_rows = [self._execution_row(execution) for execution in executions]
+            
+            await self.database.supabase.table('campaign_executions').upsert(execution_rows).execute()
+            logger.debug(f"Saved {len(executions)} executions to database")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to save {len(executions)} executions to database: {e}")
+            return False
+    
+    def _execution_row(self, execution: CampaignExecution) -> Dict[str, Any]:
+        execution_data = asdict(execution)
+        execution_data['scheduled_for'] = execution.scheduled_for.isoformat()
+        if execution.sent_at:
+            execution_data['sent_at'] = execution.sent_at.isoformat()
+        return execution_data
+    
     async def _save_volunteer_registration(self, campaign_id: str, user_id: str, 
                                          event_details: Dict[str, Any]):
         """Save volunteer registration to turnout tracking table"""
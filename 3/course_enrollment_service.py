@@ -8,13 +8,20 @@ import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any, Tuple
 from database import VolunteerDatabase
+from waitlist_backfill import BatchBackfillEngine, check_enrollment_eligibility
+from backfill_events import BackfillEventBus
 import uuid
 
 logger = logging.getLogger(__name__)
 
 class CourseEnrollmentService:
-    def __init__(self, db: VolunteerDatabase):
+    def __init__(self, db: VolunteerDatabase, max_concurrent_courses: int = 8, backfill_workers: int = 4):
         self.db = db
+        self.backfill_engine = BatchBackfillEngine(
+            db, self._send_auto_enrollment_notification, max_concurrent_courses=max_concurrent_courses
+        )
+        # Drops, no-shows and capacity changes backfill just their course through this bus
+        self.backfill_events = BackfillEventBus(self.backfill_engine, workers=backfill_workers)
     
     async def enroll_user(self, user_id: str, course_id: str, 
                          waitlist_priority: int = 5) -> Dict[str, Any]:
@@ -112,100 +119,47 @@ class CourseEnrollmentService:
             logger.error(f"❌ Error marking no-show: {e}")
             return {'success': False, 'message': f'No-show error: {e}'}
     
-    async def auto_backfill_course(self, course_id: str, trigger_reason: str) -> Dict[str, Any]:
-        """
-        Intelligent auto-backfill from waitlist with priority ranking
-        """
+    async def update_course_capacity(self, course_id: str, max_capacity: int) -> Dict[str, Any]:
+        """Change a course's capacity and backfill any seats it opens"""
         try:
-            # Get current course state
-            course = await self.db.get_course(course_id)
-            if not course:
-                return {'success': False, 'message': 'Course not found'}
-            
-            available_spots = course['max_capacity'] - course['current_enrolled']
-            if available_spots <= 0:
-                return {'success': False, 'message': 'No available spots'}
-            
-            # Get ranked waitlist candidates
-            candidates = await self._get_ranked_waitlist_candidates(course_id)
-            if not candidates:
-                return {'success': False, 'message': 'No waitlist candidates'}
+            result = self.db.supabase.table('courses')\
+                .update({'max_capacity': max_capacity, 'updated_at': datetime.now().isoformat()})\
+                .eq('id', course_id)\
+                .execute()
             
-            # Auto-enroll candidates based on ranking
-            enrolled_users = []
-            enrolled_count = 0
+            if not result.data:
+                return {'success': False, 'message': 'Course not found'}
             
-            for candidate in candidates:
-                if enrolled_count >= available_spots:
-                    break
-                
-                # Check if candidate is still eligible
-                user = await self.db.get_user(user_id=candidate['user_id'])
-                if not user:
-                    continue
-                
-                eligibility_check = await self._check_enrollment_eligibility(user, course)
-                if not eligibility_check['eligible']:
-                    # Log skip reason
-                    await self.db.log_waitlist_action(
-                        course_id, candidate['user_id'], 'skipped_ineligible',
-                        'waitlisted', 'waitlisted', eligibility_check['reason']
-                    )
-                    continue
-                
-                # Move to enrolled
-                update_success = await self._promote_from_waitlist(candidate, course_id, trigger_reason)
-                if update_success:
-                    enrolled_count += 1
-                    enrolled_users.append({
-                        'user_id': candidate['user_id'],
-                        'user_name': f"{user['first_name']} {user['last_name']}",
-                        'email': user['email'],
-                        'priority': candidate['waitlist_priority'],
-                        'waitlist_position': candidate['waitlist_position']
-                    })
-                    
-                    # Send enrollment notification
-                    await self._send_auto_enrollment_notification(user, course, candidate)
-            
-            # Reorder remaining waitlist
-            if enrolled_count > 0:
-                await self.db.reorder_waitlist_positions(course_id)
-            
-            logger.info(f"✅ Auto-enrolled {enrolled_count} users from waitlist for course {course_id}")
+            backfill_result = await self.auto_backfill_course(course_id, 'capacity_changed')
             
             return {
                 'success': True,
-                'enrolled_count': enrolled_count,
-                'enrolled_users': enrolled_users,
-                'available_spots': available_spots,
-                'message': f'Successfully auto-enrolled {enrolled_count} candidate(s) from waitlist'
+                'message': 'Course capacity updated',
+                'course': result.data[0],
+                'backfill_result': backfill_result
             }
             
+        except Exception as e:
+            logger.error(f"❌ Error updating course capacity: {e}")
+            return {'success': False, 'message': f'Capacity update error: {e}'}
+    
+    async def auto_backfill_course(self, course_id: str, trigger_reason: str) -> Dict[str, Any]:
+        """
+        Intelligent auto-backfill from waitlist with priority ranking
+        Queued on the event bus: concurrent triggers for the same course share one run
+        """
+        try:
+            return await self.backfill_events.publish(course_id, trigger_reason)
+            
         except Exception as e:
             logger.error(f"❌ Error in auto-backfill: {e}")
             return {'success': False, 'message': f'Auto-backfill error: {e}'}
     
     async def process_scheduled_auto_backfill(self) -> Dict[str, Any]:
-        """Process scheduled auto-backfill for all courses (run periodically)"""
+        """Reconcile every course (run periodically); catches seats freed outside this service"""
         try:
-            # Get courses that need auto-backfill checking
-            courses_needing_check = await self._get_courses_needing_backfill_check()
-            
-            results = []
-            for course in courses_needing_check:
-                result = await self.auto_backfill_course(course['id'], 'scheduled_check')
-                results.append({
-                    'course_id': course['id'],
-                    'course_name': course['course_name'],
-                    'result': result
-                })
-            
-            return {
-                'success': True,
-                'courses_processed': len(courses_needing_check),
-                'results': results
-            }
+            # Open courses with free seats and a waitlist, backfilled concurrently
+            return await self.backfill_engine.run('scheduled_check')
             
         except Exception as e:
             logger.error(f"❌ Error in scheduled auto-backfill: {e}")
@@ -216,23 +170,8 @@ class CourseEnrollmentService:
     async def _check_enrollment_eligibility(self, user: Dict, course: Dict) -> Dict[str, Any]:
         """Check if user is eligible to enroll in course"""
         try:
-            # Check course status
-            if course['status'] != 'open':
-                return {'eligible': False, 'reason': 'Course is not open for enrollment'}
-            
-            # Check if course has started
-            if course['start_date']:
-                start_date = datetime.fromisoformat(course['start_date'].replace('Z', '+00:00'))
-                if start_date <= datetime.now().astimezone():
-                    return {'eligible': False, 'reason': 'Course has already started'}
-            
-            # Check age requirements if any
-            if course.get('requirements'):
-                # Parse age requirements from course requirements
-                # This could be extended based on specific business rules
-                pass
-            
-            return {'eligible': True, 'reason': 'User is eligible'}
+            # Course status and start date; shared with the batch backfill
+            return check_enrollment_eligibility(course)
             
         except Exception as e:
             logger.error(f"❌ Error checking eligibility: {e}")
@@ -284,36 +223,6 @@ class CourseEnrollmentService:
             logger.error(f"❌ Error getting ranked candidates: {e}")
             return []
     
-    async def _promote_from_waitlist(self, candidate: Dict, course_id: str, 
-                                   trigger_reason: str) -> bool:
-        """Promote a candidate from waitlist to enrolled"""
-        try:
-            result = self.db.supabase.table('course_enrollments')\
-                .update({
-                    'enrollment_status': 'enrolled',
-                    'waitlist_position': None,
-                    'notification_sent': False,
-                    'updated_at': datetime.now().isoformat()
-                })\
-                .eq('id', candidate['id'])\
-                .execute()
-            
-            if result.data:
-                # Log the promotion
-                await self.db.log_waitlist_action(
-                    course_id, candidate['user_id'], 'auto_enrolled',
-                    'waitlisted', 'enrolled',
-                    f'Auto-promoted from waitlist due to {trigger_reason}',
-                    'system'
-                )
-                return True
-            
-            return False
-            
-        except Exception as e:
-            logger.error(f"❌ Error promoting from waitlist: {e}")
-            return False
-    
     async def _get_user_enrollment(self, user_id: str, course_id: str) -> Optional[Dict]:
         """Get user's enrollment record for a course"""
         try:
@@ -329,39 +238,6 @@ class CourseEnrollmentService:
             logger.error(f"❌ Error getting user enrollment: {e}")
             return None
     
-    async def _get_courses_needing_backfill_check(self) -> List[Dict[str, Any]]:
-        """Get courses that might need auto-backfill checking"""
-        try:
-            # Get open courses that have waitlists and available capacity
-            result = self.db.supabase.rpc('get_courses_with_waitlist_and_capacity').execute()
-            
-            # Fallback to manual query if RPC not available
-            if not hasattr(result, 'data') or not result.data:
-                courses_result = self.db.supabase.table('courses')\
-                    .select('*')\
-                    .eq('status', 'open')\
-                    .lt('current_enrolled', 'max_capacity')\
-                    .execute()
-                
-                courses_with_waitlist = []
-                for course in courses_result.data or []:
-                    waitlist_count = self.db.supabase.table('course_enrollments')\
-                        .select('*', count='exact')\
-                        .eq('course_id', course['id'])\
-                        .eq('enrollment_status', 'waitlisted')\
-                        .execute()
-                    
-                    if waitlist_count.count and waitlist_count.count > 0:
-                        courses_with_waitlist.append(course)
-                
-                return courses_with_waitlist
-            
-            return result.data
-            
-        except Exception as e:
-            logger.error(f"❌ Error getting courses needing backfill: {e}")
-            return []
-    
     # Notification methods (placeholders - implement based on your notification system)
     
     async def _send_enrollment_confirmation(self, user: Dict, course: Dict, enrollment: Dict):
@@ -400,7 +276,8 @@ class WaitlistBackgroundService:
     def __init__(self, enrollment_service: CourseEnrollmentService):
         self.enrollment_service = enrollment_service
         self.running = False
-        self.check_interval = 300  # 5 minutes
+        # Seats freed through the service are backfilled by events; this scan only reconciles
+        self.check_interval = 3600  # 1 hour
     
     async def start(self):
         """Start the background service"""
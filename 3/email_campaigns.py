@@ -95,177 +95,69 @@ class Campaign:
         }
 
 class AudienceSegmentationEngine:
-    """Engine for creating dynamic audience segments from volunteer data"""
+    """Engine for creating dynamic audience segments from volunteer data
+    
+    Segments are resolved through a SegmentIndex (segment_index.py): one
+    cached bitmap per criterion over the volunteers table, combined with
+    AND within a segment and OR across segments.
+    """
     
     def __init__(self, volunteer_data: Dict[str, Any]):
         self.volunteer_data = volunteer_data
         self.volunteers_df = pd.DataFrame(volunteer_data.get('volunteers', []))
         self.interactions_df = pd.DataFrame(volunteer_data.get('interactions', []))
+        self._index = None
+    
+    @property
+    def index(self):
+        """Segment index over the current volunteer data, built on first use"""
+        if self._index is None:
+            from segment_index import SegmentIndex
+            self._index = SegmentIndex(self.volunteers_df, self.interactions_df)
+        return self._index
+    
+    def refresh(self, volunteer_data: Dict[str, Any]):
+        """Replace the volunteer data; the index is rebuilt on next use"""
+        self.volunteer_data = volunteer_data
+        self.volunteers_df = pd.DataFrame(volunteer_data.get('volunteers', []))
+        self.interactions_df = pd.DataFrame(volunteer_data.get('interactions', []))
+        self._index = None
         
     def create_segment(self, criteria: List[SegmentCriteria]) -> pd.DataFrame:
         """Create audience segment based on criteria"""
         try:
-            # Start with all volunteers
-            segment_df = self.volunteers_df.copy()
-            
-            for criterion in criteria:
-                segment_df = self._apply_criterion(segment_df, criterion)
-                
-            return segment_df
+            return self.index.rows(self.index.mask(criteria))
             
         except Exception as e:
             logger.error(f"Error creating segment: {e}")
             return pd.DataFrame()
     
-    def _apply_criterion(self, df: pd.DataFrame, criterion: SegmentCriteria) -> pd.DataFrame:
-        """Apply a single criterion to the dataframe"""
+    def create_combined_segment(self, segments: List[List[SegmentCriteria]]) -> pd.DataFrame:
+        """Volunteers matching any of the segments (criteria within a segment must all match)"""
         try:
-            if criterion.type == SegmentationType.ENGAGEMENT_LEVEL:
-                return self._filter_by_engagement(df, criterion)
-            elif criterion.type == SegmentationType.VOLUNTEER_EXPERIENCE:
-                return self._filter_by_experience(df, criterion)
-            elif criterion.type == SegmentationType.BRANCH_AFFINITY:
-                return self._filter_by_branch(df, criterion)
-            elif criterion.type == SegmentationType.CATEGORY_INTEREST:
-                return self._filter_by_category(df, criterion)
-            elif criterion.type == SegmentationType.TIME_SINCE_LAST_ACTIVITY:
-                return self._filter_by_last_activity(df, criterion)
-            elif criterion.type == SegmentationType.DEMOGRAPHIC:
-                return self._filter_by_demographic(df, criterion)
-            elif criterion.type == SegmentationType.CUSTOM:
-                return self._filter_by_custom(df, criterion)
-            else:
-                return df
-                
-        except Exception as e:
-            logger.error(f"Error applying criterion {criterion.type}: {e}")
-            return df
-    
-    def _filter_by_engagement(self, df: pd.DataFrame, criterion: SegmentCriteria) -> pd.DataFrame:
-        """Filter by engagement level (hours, sessions, etc.)"""
-        if 'contact_id' not in df.columns:
-            return df
-            
-        # Calculate engagement metrics from interactions
-        engagement_stats = self.interactions_df.groupby('contact_id').agg({
-            'hours': 'sum',
-            'date': 'count',  # sessions
-            'project_id': 'nunique'  # unique projects
-        }).reset_index()
-        engagement_stats.columns = ['contact_id', 'total_hours', 'total_sessions', 'unique_projects']
-        
-        # Merge with volunteers
-        df_with_engagement = df.merge(engagement_stats, on='contact_id', how='left').fillna(0)
-        
-        # Apply filter based on criterion
-        field_map = {
-            'hours': 'total_hours',
-            'sessions': 'total_sessions', 
-            'projects': 'unique_projects'
-        }
-        
-        field = field_map.get(criterion.field, criterion.field)
-        return self._apply_numeric_filter(df_with_engagement, field, criterion.operator, criterion.value)
-    
-    def _filter_by_experience(self, df: pd.DataFrame, criterion: SegmentCriteria) -> pd.DataFrame:
-        """Filter by volunteer experience level"""
-        if criterion.field == 'experience_level' and 'experience_level' in df.columns:
-            return self._apply_filter(df, 'experience_level', criterion.operator, criterion.value)
-        return df
-    
-    def _filter_by_branch(self, df: pd.DataFrame, criterion: SegmentCriteria) -> pd.DataFrame:
-        """Filter by branch affinity"""
-        if 'contact_id' not in df.columns:
-            return df
+            return self.index.rows(self.index.mask_any(segments))
             
-        # Get branch preferences from interactions
-        branch_stats = self.interactions_df.groupby('contact_id')['branch_short'].apply(
-            lambda x: x.value_counts().index[0] if len(x) > 0 else None
-        ).reset_index()
-        branch_stats.columns = ['contact_id', 'preferred_branch']
-        
-        df_with_branch = df.merge(branch_stats, on='contact_id', how='left')
-        return self._apply_filter(df_with_branch, 'preferred_branch', criterion.operator, criterion.value)
+        except Exception as e:
+            logger.error(f"Error creating combined segment: {e}")
+            return pd.DataFrame()
     
-    def _filter_by_category(self, df: pd.DataFrame, criterion: SegmentCriteria) -> pd.DataFrame:
-        """Filter by category interest"""
-        if 'contact_id' not in df.columns:
-            return df
-            
-        # Get category preferences from interactions
-        category_stats = self.interactions_df.groupby('contact_id')['project_category'].apply(
-            lambda x: x.value_counts().index[0] if len(x) > 0 else None
-        ).reset_index()
-        category_stats.columns = ['contact_id', 'preferred_category']
-        
-        df_with_category = df.merge(category_stats, on='contact_id', how='left')
-        return self._apply_filter(df_with_category, 'preferred_category', criterion.operator, criterion.value)
+    def get_audience_size(self, criteria: List[SegmentCriteria]) -> int:
+        """Number of volunteers in a segment, without materializing the rows"""
+        try:
+            return int(self.index.mask(criteria).sum())
+        except Exception as e:
+            logger.error(f"Error sizing segment: {e}")
+            return 0
     
-    def _filter_by_last_activity(self, df: pd.DataFrame, criterion: SegmentCriteria) -> pd.DataFrame:
-        """Filter by time since last activity"""
-        if 'contact_id' not in df.columns:
-            return df
-            
-        # Get last activity date
-        last_activity = self.interactions_df.groupby('contact_id')['date'].max().reset_index()
-        last_activity.columns = ['contact_id', 'last_activity_date']
-        
-        df_with_activity = df.merge(last_activity, on='contact_id', how='left')
-        
-        # Calculate days since last activity
-        df_with_activity['days_since_last_activity'] = (
-            datetime.now() - pd.to_datetime(df_with_activity['last_activity_date'])
-        ).dt.days
-        
-        return self._apply_numeric_filter(df_with_activity, 'days_since_last_activity', 
-                                        criterion.operator, criterion.value)
-    
-    def _filter_by_demographic(self, df: pd.DataFrame, criterion: SegmentCriteria) -> pd.DataFrame:
-        """Filter by demographic data"""
-        if criterion.field in df.columns:
-            return self._apply_filter(df, criterion.field, criterion.operator, criterion.value)
-        return df
-    
-    def _filter_by_custom(self, df: pd.DataFrame, criterion: SegmentCriteria) -> pd.DataFrame:
-        """Apply custom filter logic"""
-        if criterion.field in df.columns:
-            return self._apply_filter(df, criterion.field, criterion.operator, criterion.value)
-        return df
-    
-    def _apply_filter(self, df: pd.DataFrame, field: str, operator: str, value: Any) -> pd.DataFrame:
-        """Apply generic filter to dataframe"""
-        if field not in df.columns:
-            return df
-            
-        if operator == 'eq':
-            return df[df[field] == value]
-        elif operator == 'in':
-            return df[df[field].isin(value)]
-        elif operator == 'contains':
-            return df[df[field].str.contains(str(value), na=False)]
-        else:
-            return self._apply_numeric_filter(df, field, operator, value)
-    
-    def _apply_numeric_filter(self, df: pd.DataFrame, field: str, operator: str, value: Any) -> pd.DataFrame:
-        """Apply numeric filter operations"""
-        if field not in df.columns:
-            return df
-            
+    def get_audience_breakdown(self, field: str, criteria: Optional[List[SegmentCriteria]] = None) -> Dict[Any, int]:
+        """Audience size per value of an indexed field (preferred_branch, preferred_category,
+        member_branch, engagement_tier, activity_bucket), optionally within a segment"""
         try:
-            if operator == 'gt':
-                return df[df[field] > value]
-            elif operator == 'lt':
-                return df[df[field] < value]
-            elif operator == 'gte':
-                return df[df[field] >= value]
-            elif operator == 'lte':
-                return df[df[field] <= value]
-            elif operator == 'between' and isinstance(value, list) and len(value) == 2:
-                return df[(df[field] >= value[0]) & (df[field] <= value[1])]
-            else:
-                return df
-        except Exception:
-            return df
+            mask = self.index.mask(criteria) if criteria else None
+            return self.index.value_counts(field, mask)
+        except Exception as e:
+            logger.error(f"Error computing audience breakdown: {e}")
+            return {}
 
 class EmailProvider(ABC):
     """Abstract base class for email providers"""
@@ -475,7 +367,7 @@ class EmailCampaignManager:
         
         # Convert to recipient format
         recipients = []
-        for _, volunteer in segment_df.iterrows():
+        for volunteer in segment_df.to_dict('records'):
             recipient = {
                 "email": volunteer.get('email', ''),
                 "first_name": volunteer.get('first_name', ''),
@@ -497,6 +389,16 @@ class EmailCampaignManager:
         
         return recipients
     
+    def preview_audience(self, segments: List[SegmentCriteria]) -> Dict[str, Any]:
+        """Audience size and composition for the campaign builder, answered from the segment index"""
+        engine = self.segmentation_engine
+        return {
+            'audience_size': engine.get_audience_size(segments),
+            'by_branch': engine.get_audience_breakdown('preferred_branch', segments),
+            'by_engagement_tier': engine.get_audience_breakdown('engagement_tier', segments),
+            'by_activity': engine.get_audience_breakdown('activity_bucket', segments)
+        }
+    
     async def send_campaign(self, campaign_id: str, provider_name: str = "mailchimp") -> Dict[str, Any]:
         """Send a campaign using specified provider"""
         if campaign_id not in self.campaigns:
@@ -669,6 +571,32 @@ class SegmentTemplates:
             )
         ]
     
+    @staticmethod
+    def engagement_tier(*tiers: str) -> List[SegmentCriteria]:
+        """Volunteers in engagement tiers by total hours: none, light (<20), engaged (20-49), champion (50+)"""
+        return [
+            SegmentCriteria(
+                type=SegmentationType.ENGAGEMENT_LEVEL,
+                field="engagement_tier",
+                operator="in",
+                value=list(tiers),
+                description=f"Volunteers in engagement tiers: {', '.join(tiers)}"
+            )
+        ]
+    
+    @staticmethod
+    def activity_window(*buckets: str) -> List[SegmentCriteria]:
+        """Volunteers by last-activity bucket: active_30d, recent_90d, lapsed_1y, dormant, never"""
+        return [
+            SegmentCriteria(
+                type=SegmentationType.TIME_SINCE_LAST_ACTIVITY,
+                field="activity_bucket",
+                operator="in",
+                value=list(buckets),
+                description=f"Volunteers last active: {', '.join(buckets)}"
+            )
+        ]
+    
     @staticmethod
     def youth_demographic(max_age: int = 35) -> List[SegmentCriteria]:
         """Young volunteers"""
@@ -5,7 +5,7 @@ Ensures demographic balance and equitable opportunity distribution across branch
 import pandas as pd
 import numpy as np
 from typing import Dict, List, Tuple, Any, Optional
-from collections import defaultdict, Counter
+from collections import defaultdict
 from sklearn.metrics import pairwise_distances
 import warnings
 warnings.filterwarnings('ignore')
@@ -46,6 +46,11 @@ class FairnessConstraintsEngine:
         # Branch categories
         self.branches = ['Blue Ash', 'M.E. Lyons', 'Campbell County', 'Clippard', 'YDE', 'Other']
         
+        # Lookup arrays are rebuilt lazily whenever the data version changes
+        self.data_version = 0
+        self._baseline_tables = None
+        self._adjustment_cache = {}
+        
         # Initialize demographic statistics
         self._calculate_demographic_baselines()
         self._analyze_current_disparities()
@@ -157,11 +162,29 @@ class FairnessConstraintsEngine:
         
         print(f"📈 Disparity analysis complete: {len(self.current_disparities)} categories analyzed")
     
+    def update_data(self, volunteer_data: Dict[str, Any]):
+        """Swap in a new data snapshot and invalidate all cached baselines"""
+        self.volunteer_data = volunteer_data
+        self.volunteers_df = volunteer_data.get('volunteers')
+        self.projects_df = volunteer_data.get('projects')
+        self.interactions_df = volunteer_data.get('interactions')
+        
+        self.data_version += 1
+        self._baseline_tables = None
+        self._adjustment_cache = {}
+        
+        self._calculate_demographic_baselines()
+        self._analyze_current_disparities()
+    
     def apply_fairness_constraints(self, matches: List[Dict[str, Any]], 
                                  user_demographics: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
         Apply fairness constraints to volunteer matches to promote demographic balance.
         
+        All four adjustments (demographic parity, branch equity, underrepresentation
+        boost and recommendation diversity) run as array operations over the match
+        scores, using lookup tables that are built once per data version.
+        
         Args:
             matches: List of volunteer opportunity matches
             user_demographics: Demographic information about the user
@@ -169,247 +192,238 @@ class FairnessConstraintsEngine:
         Returns:
             Adjusted matches with fairness constraints applied
         """
-        print("⚖️  Applying fairness constraints to matches...")
-        
         if not matches:
             return matches
         
-        # Create a copy to avoid modifying original matches
-        adjusted_matches = [match.copy() for match in matches]
+        tables = self._get_baseline_tables()
+        adjustments = self._get_user_adjustments(user_demographics)
+        n = len(matches)
         
-        # Apply demographic parity adjustments
-        adjusted_matches = self._apply_demographic_parity(adjusted_matches, user_demographics)
+        scores = np.fromiter((match.get('score', 0) for match in matches), dtype=float, count=n)
         
-        # Apply branch equity adjustments
-        adjusted_matches = self._apply_branch_equity(adjusted_matches, user_demographics)
-        
-        # Apply underrepresentation boost
-        adjusted_matches = self._apply_underrepresentation_boost(adjusted_matches, user_demographics)
-        
-        # Ensure diversity in recommendations
-        adjusted_matches = self._ensure_recommendation_diversity(adjusted_matches)
-        
-        # Re-sort by adjusted scores
-        adjusted_matches.sort(key=lambda x: x.get('fairness_adjusted_score', x.get('score', 0)), reverse=True)
+        # Demographic parity (only for projects with known demographics)
+        project_idx = np.fromiter(
+            (tables['project_index'].get(match.get('project_id'), -1) for match in matches),
+            dtype=np.int64, count=n
+        )
+        has_project = project_idx >= 0
+        if self.projects_df is None:
+            has_project[:] = False
+        parity_adjustment = np.zeros(n)
+        if has_project.any():
+            parity_adjustment[has_project] = adjustments['project_parity'][project_idx[has_project]]
+        adjusted = np.where(has_project, np.clip(scores + parity_adjustment, 0, 1), scores)
+        
+        # Branch equity
+        branch_idx = np.fromiter(
+            (tables['branch_index'].get(match.get('branch', 'Other'), -1) for match in matches),
+            dtype=np.int64, count=n
+        )
+        has_branch = branch_idx >= 0
+        branch_adjustment = np.zeros(n)
+        if has_branch.any():
+            branch_adjustment[has_branch] = adjustments['branch_equity'][branch_idx[has_branch]]
+        adjusted = np.clip(adjusted + branch_adjustment, 0, 1)
+        
+        # Underrepresentation boost (same for every match of this user)
+        boost_amount = adjustments['underrepresentation_boost']
+        if boost_amount > 0:
+            adjusted = np.clip(adjusted + boost_amount, 0, 1)
+        
+        # Diversity penalty for repeated branches/categories, in incoming order
+        diversity_penalty = np.zeros(n)
+        if n > 5:
+            branch_rank = self._occurrence_rank([match.get('branch', 'Other') for match in matches])
+            category_rank = self._occurrence_rank([match.get('category', 'General') for match in matches])
+            diversity_penalty = np.where(branch_rank >= 2, 0.05, 0.0) + np.where(category_rank >= 3, 0.03, 0.0)
+            adjusted = np.where(diversity_penalty > 0, np.maximum(0, adjusted - diversity_penalty), adjusted)
+        
+        # Re-rank by adjusted score (stable, matching list.sort semantics)
+        order = np.argsort(-adjusted, kind='stable')
+        
+        adjusted_matches = []
+        for i in order:
+            match = matches[i].copy()
+            if has_project[i]:
+                match['demographic_parity_adjustment'] = float(parity_adjustment[i])
+            match['branch_equity_adjustment'] = float(branch_adjustment[i])
+            if boost_amount > 0:
+                match['underrepresentation_boost'] = boost_amount
+            if diversity_penalty[i] > 0:
+                match['diversity_penalty'] = float(diversity_penalty[i])
+            match['fairness_adjusted_score'] = float(adjusted[i])
+            adjusted_matches.append(match)
         
-        print(f"✅ Fairness constraints applied to {len(adjusted_matches)} matches")
         return adjusted_matches
     
-    def _apply_demographic_parity(self, matches: List[Dict[str, Any]], 
-                                user_demographics: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Apply demographic parity constraints to match scoring"""
-        if not matches or not self.projects_df is not None:
-            return matches
-        
-        # Get project demographic distributions
-        project_demographics = self._get_project_demographics()
-        
-        for match in matches:
-            project_id = match.get('project_id')
-            if project_id not in project_demographics:
-                continue
-            
-            project_demo = project_demographics[project_id]
-            parity_adjustment = 0
-            
-            # Check gender parity
-            user_gender = user_demographics.get('gender', 'Unknown')
-            project_gender_dist = project_demo.get('gender', {})
-            
-            if user_gender in project_gender_dist:
-                current_representation = project_gender_dist[user_gender]
-                expected_representation = self.demographic_baselines.get('gender', {}).get(user_gender, 0.25)
-                
-                # If user's demographic is underrepresented in this project, boost the score
-                if current_representation < expected_representation - self.fairness_thresholds['demographic_parity_tolerance']:
-                    parity_adjustment += 0.15
-                elif current_representation > expected_representation + self.fairness_thresholds['demographic_parity_tolerance']:
-                    parity_adjustment -= 0.1
-            
-            # Check age group parity
-            user_age = user_demographics.get('age', 35)
-            user_age_group = self._get_age_group(user_age)
-            project_age_dist = project_demo.get('age_group', {})
-            
-            if user_age_group in project_age_dist:
-                current_representation = project_age_dist[user_age_group]
-                expected_representation = self.demographic_baselines.get('age_group', {}).get(user_age_group, 0.2)
-                
-                if current_representation < expected_representation - self.fairness_thresholds['demographic_parity_tolerance']:
-                    parity_adjustment += 0.1
-            
-            # Apply adjustment to score
-            original_score = match.get('score', 0)
-            match['demographic_parity_adjustment'] = parity_adjustment
-            match['fairness_adjusted_score'] = max(0, min(1, original_score + parity_adjustment))
-        
-        return matches
-    
-    def _apply_branch_equity(self, matches: List[Dict[str, Any]], 
-                           user_demographics: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Apply branch equity constraints to ensure fair geographic distribution"""
-        if not matches:
-            return matches
-        
-        # Get branch volunteer distributions
-        branch_distributions = self._get_branch_distributions()
-        
-        for match in matches:
-            branch = match.get('branch', 'Other')
-            branch_adjustment = 0
-            
-            # Check if this branch needs more volunteers from user's demographic
-            if branch in branch_distributions:
-                branch_demo = branch_distributions[branch]
-                user_gender = user_demographics.get('gender', 'Unknown')
-                
-                if user_gender in branch_demo.get('gender', {}):
-                    current_representation = branch_demo['gender'][user_gender]
-                    expected_representation = self.demographic_baselines.get('gender', {}).get(user_gender, 0.25)
-                    
-                    # Boost branches that need more diversity
-                    if current_representation < expected_representation - self.fairness_thresholds['branch_equity_tolerance']:
-                        branch_adjustment += 0.12
-            
-            # Apply branch equity adjustment
-            current_score = match.get('fairness_adjusted_score', match.get('score', 0))
-            match['branch_equity_adjustment'] = branch_adjustment
-            match['fairness_adjusted_score'] = max(0, min(1, current_score + branch_adjustment))
+    def _get_user_adjustments(self, user_demographics: Dict[str, Any]) -> Dict[str, Any]:
+        """Get per-project/per-branch adjustment arrays for a demographic profile (cached per data version)"""
+        user_gender = user_demographics.get('gender', 'Unknown')
+        user_age_group = self._get_age_group(user_demographics.get('age', 35))
+        cache_key = (self.data_version, user_gender, user_age_group)
+        
+        cached = self._adjustment_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        tables = self._get_baseline_tables()
+        parity_tolerance = self.fairness_thresholds['demographic_parity_tolerance']
+        branch_tolerance = self.fairness_thresholds['branch_equity_tolerance']
+        expected_gender = self.demographic_baselines.get('gender', {}).get(user_gender, 0.25)
+        expected_age = self.demographic_baselines.get('age_group', {}).get(user_age_group, 0.2)
+        gender_idx = tables['gender_index'].get(user_gender)
+        age_idx = tables['age_index'].get(user_age_group)
+        
+        # Missing groups are NaN in the tables, and NaN comparisons are False
+        project_parity = np.zeros(len(tables['project_index']))
+        if gender_idx is not None:
+            representation = tables['project_gender'][:, gender_idx]
+            project_parity += np.where(
+                representation < expected_gender - parity_tolerance, 0.15,
+                np.where(representation > expected_gender + parity_tolerance, -0.1, 0.0)
+            )
+        if age_idx is not None:
+            representation = tables['project_age'][:, age_idx]
+            project_parity += np.where(representation < expected_age - parity_tolerance, 0.1, 0.0)
         
-        return matches
-    
-    def _apply_underrepresentation_boost(self, matches: List[Dict[str, Any]], 
-                                       user_demographics: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Apply boost for underrepresented demographic groups"""
-        if not matches or not self.current_disparities:
-            return matches
+        branch_equity = np.zeros(len(tables['branch_index']))
+        if gender_idx is not None:
+            representation = tables['branch_gender'][:, gender_idx]
+            branch_equity += np.where(representation < expected_gender - branch_tolerance, 0.12, 0.0)
         
         boost_amount = 0
-        
-        # Check if user belongs to underrepresented groups
-        user_gender = user_demographics.get('gender', 'Unknown')
-        if user_gender in self.current_disparities.get('gender', {}):
-            disparity = self.current_disparities['gender'][user_gender]
-            if disparity < -0.05:  # Underrepresented by more than 5%
+        if self.current_disparities:
+            if self.current_disparities.get('gender', {}).get(user_gender, 0) < -0.05:
                 boost_amount += self.fairness_thresholds['protected_groups_boost']
-        
-        user_age = user_demographics.get('age', 35)
-        user_age_group = self._get_age_group(user_age)
-        if user_age_group in self.current_disparities.get('age_group', {}):
-            disparity = self.current_disparities['age_group'][user_age_group]
-            if disparity < -0.05:  # Underrepresented by more than 5%
+            if self.current_disparities.get('age_group', {}).get(user_age_group, 0) < -0.05:
                 boost_amount += self.fairness_thresholds['protected_groups_boost'] * 0.5
         
-        # Apply boost to all matches if user is from underrepresented group
-        if boost_amount > 0:
-            for match in matches:
-                current_score = match.get('fairness_adjusted_score', match.get('score', 0))
-                match['underrepresentation_boost'] = boost_amount
-                match['fairness_adjusted_score'] = max(0, min(1, current_score + boost_amount))
+        adjustments = {
+            'project_parity': project_parity,
+            'branch_equity': branch_equity,
+            'underrepresentation_boost': boost_amount
+        }
         
-        return matches
+        if len(self._adjustment_cache) >= 256:
+            self._adjustment_cache.clear()
+        self._adjustment_cache[cache_key] = adjustments
+        return adjustments
     
-    def _ensure_recommendation_diversity(self, matches: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Ensure diversity in the final set of recommendations"""
-        if len(matches) <= 5:
-            return matches
-        
-        # Group matches by branch and category for diversity
-        branch_counts = Counter()
-        category_counts = Counter()
+    @staticmethod
+    def _occurrence_rank(keys: List[Any]) -> np.ndarray:
+        """For each position, count how many earlier entries share the same key"""
+        codes_by_key = {}
+        codes = np.fromiter(
+            (codes_by_key.setdefault(key, len(codes_by_key)) for key in keys),
+            dtype=np.int64, count=len(keys)
+        )
+        order = np.argsort(codes, kind='stable')
+        sorted_codes = codes[order]
+        group_start = np.r_[0, np.flatnonzero(np.diff(sorted_codes)) + 1]
+        group_sizes = np.diff(np.r_[group_start, len(keys)])
+        ranks = np.empty(len(keys), dtype=np.int64)
+        ranks[order] = np.arange(len(keys)) - np.repeat(group_start, group_sizes)
+        return ranks
+    
+    def _get_baseline_tables(self) -> Dict[str, Any]:
+        """Get project/branch demographic lookup arrays, building them once per data version"""
+        if self._baseline_tables is None or self._baseline_tables['data_version'] != self.data_version:
+            self._baseline_tables = self._build_baseline_tables()
+        return self._baseline_tables
+    
+    def _build_baseline_tables(self) -> Dict[str, Any]:
+        """
+        Aggregate interactions into dense share matrices.
         
-        for i, match in enumerate(matches):
-            branch = match.get('branch', 'Other')
-            category = match.get('category', 'General')
-            
-            # Apply diversity penalty if too many matches from same branch/category
-            diversity_penalty = 0
-            
-            if branch_counts[branch] >= 2:
-                diversity_penalty += 0.05
-            if category_counts[category] >= 3:
-                diversity_penalty += 0.03
-            
-            # Apply penalty
-            if diversity_penalty > 0:
-                current_score = match.get('fairness_adjusted_score', match.get('score', 0))
-                match['diversity_penalty'] = diversity_penalty
-                match['fairness_adjusted_score'] = max(0, current_score - diversity_penalty)
-            
-            branch_counts[branch] += 1
-            category_counts[category] += 1
+        Rows are projects (or branches), columns are gender / age groups. Gender
+        shares are NaN where a group never appears, mirroring value_counts output.
+        """
+        age_labels = ['Under 25', '25-34', '35-49', '50-64', '65+']
+        tables = {
+            'data_version': self.data_version,
+            'project_index': {},
+            'branch_index': {},
+            'gender_index': {},
+            'age_index': {label: i for i, label in enumerate(age_labels)},
+            'project_gender': np.empty((0, 0)),
+            'project_age': np.empty((0, len(age_labels))),
+            'branch_gender': np.empty((0, 0))
+        }
         
-        return matches
-    
-    def _get_project_demographics(self) -> Dict[str, Dict[str, Any]]:
-        """Get demographic distributions for each project"""
         if self.interactions_df is None or self.volunteers_df is None:
-            return {}
+            return tables
         
-        # Merge interactions with volunteer demographics
         enriched = self.interactions_df.merge(
             self.volunteers_df[['contact_id', 'gender', 'age', 'race_ethnicity']], 
             on='contact_id', 
             how='left'
         )
+        enriched = enriched[enriched['project_id'].notna()]
+        gender = enriched['gender'].fillna('Unknown')
+        age_group = pd.cut(enriched['age'].fillna(35), 
+                           bins=[0, 25, 35, 50, 65, 100], 
+                           labels=age_labels)
         
-        project_demographics = {}
+        branch_project_map = {}
+        if self.projects_df is not None:
+            if 'branch' in self.projects_df.columns:
+                branch_project_map = dict(zip(self.projects_df['project_id'], self.projects_df['branch']))
+            else:
+                branch_project_map = dict.fromkeys(self.projects_df['project_id'], 'Other')
+        branch = enriched['project_id'].map(branch_project_map).fillna('Other')
+        
+        gender_counts = pd.crosstab(enriched['project_id'], gender)
+        age_counts = pd.crosstab(enriched['project_id'], age_group, dropna=False).reindex(
+            index=gender_counts.index, columns=age_labels, fill_value=0
+        )
+        branch_gender_counts = pd.crosstab(branch, gender).reindex(columns=gender_counts.columns, fill_value=0)
         
-        for project_id in enriched['project_id'].unique():
-            project_data = enriched[enriched['project_id'] == project_id]
-            
-            demographics = {}
-            
-            # Gender distribution
-            if 'gender' in project_data.columns:
-                gender_dist = project_data['gender'].fillna('Unknown').value_counts(normalize=True)
-                demographics['gender'] = gender_dist.to_dict()
-            
-            # Age group distribution
-            if 'age' in project_data.columns:
-                age_groups = pd.cut(project_data['age'].fillna(35), 
-                                  bins=[0, 25, 35, 50, 65, 100], 
-                                  labels=['Under 25', '25-34', '35-49', '50-64', '65+'])
-                age_dist = age_groups.value_counts(normalize=True)
-                demographics['age_group'] = age_dist.to_dict()
-            
-            project_demographics[project_id] = demographics
+        tables['project_index'] = {project_id: i for i, project_id in enumerate(gender_counts.index)}
+        tables['branch_index'] = {name: i for i, name in enumerate(branch_gender_counts.index)}
+        tables['gender_index'] = {name: i for i, name in enumerate(gender_counts.columns)}
+        tables['project_gender'] = self._share_matrix(gender_counts.to_numpy(dtype=float), mask_absent=True)
+        tables['project_age'] = self._share_matrix(age_counts.to_numpy(dtype=float), mask_absent=False)
+        tables['branch_gender'] = self._share_matrix(branch_gender_counts.to_numpy(dtype=float), mask_absent=True)
+        
+        return tables
+    
+    @staticmethod
+    def _share_matrix(counts: np.ndarray, mask_absent: bool) -> np.ndarray:
+        """Normalize count rows to shares, optionally marking zero-count cells as NaN"""
+        totals = counts.sum(axis=1, keepdims=True)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            shares = counts / totals
+        if mask_absent:
+            shares[counts == 0] = np.nan
+        return shares
+    
+    def _get_project_demographics(self) -> Dict[str, Dict[str, Any]]:
+        """Get demographic distributions for each project"""
+        tables = self._get_baseline_tables()
+        genders = list(tables['gender_index'])
+        age_labels = list(tables['age_index'])
+        
+        project_demographics = {}
+        for project_id, i in tables['project_index'].items():
+            gender_row = tables['project_gender'][i]
+            project_demographics[project_id] = {
+                'gender': {g: float(gender_row[j]) for j, g in enumerate(genders) if not np.isnan(gender_row[j])},
+                'age_group': {a: float(tables['project_age'][i, j]) for j, a in enumerate(age_labels)}
+            }
         
         return project_demographics
     
     def _get_branch_distributions(self) -> Dict[str, Dict[str, Any]]:
         """Get demographic distributions for each branch"""
-        if self.interactions_df is None or self.volunteers_df is None:
-            return {}
-        
-        # Get branch information from projects
-        branch_project_map = {}
-        if self.projects_df is not None:
-            for _, project in self.projects_df.iterrows():
-                branch_project_map[project['project_id']] = project.get('branch', 'Other')
-        
-        # Merge interactions with volunteer demographics and branch info
-        enriched = self.interactions_df.merge(
-            self.volunteers_df[['contact_id', 'gender', 'age', 'race_ethnicity']], 
-            on='contact_id', 
-            how='left'
-        )
-        
-        enriched['branch'] = enriched['project_id'].map(branch_project_map).fillna('Other')
+        tables = self._get_baseline_tables()
+        genders = list(tables['gender_index'])
         
         branch_demographics = {}
-        
-        for branch in enriched['branch'].unique():
-            branch_data = enriched[enriched['branch'] == branch]
-            
-            demographics = {}
-            
-            # Gender distribution
-            if 'gender' in branch_data.columns:
-                gender_dist = branch_data['gender'].fillna('Unknown').value_counts(normalize=True)
-                demographics['gender'] = gender_dist.to_dict()
-            
-            branch_demographics[branch] = demographics
+        for branch, i in tables['branch_index'].items():
+            gender_row = tables['branch_gender'][i]
+            branch_demographics[branch] = {
+                'gender': {g: float(gender_row[j]) for j, g in enumerate(genders) if not np.isnan(gender_row[j])}
+            }
         
         return branch_demographics
     
@@ -0,0 +1,305 @@
+"""
+In-memory stand-in for the Supabase client, shared by the unit tests
+Covers the PostgREST query builder calls the services make. Like PostgreSQL, order() sorts only by
+the requested columns: rows that tie come back in an arbitrary order that changes from query to
+query, so offset paging without a unique tiebreaker shows up as skipped or repeated rows.
+"""
+import random
+import threading
+import time
+from itertools import count
+
+
+class FakeResult:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+def _comparable(value):
+    """Sort/compare key that tolerates None and mixed str/datetime values"""
+    if value is None:
+        return (0, '')
+    if isinstance(value, bool):
+        return (1, int(value))
+    if isinstance(value, (int, float)):
+        return (1, value)
+    return (2, str(value))
+
+
+def _split_top_level(text):
+    parts, depth, current = [], 0, ''
+    for char in text:
+        if char == ',' and depth == 0:
+            parts.append(current)
+            current = ''
+            continue
+        depth += char == '('
+        depth -= char == ')'
+        current += char
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _unquote(value):
+    return value[1:-1] if len(value) >= 2 and value[0] == value[-1] == '"' else value
+
+
+OPERATORS = {
+    'eq': lambda a, b: _comparable(a) == _comparable(b),
+    'neq': lambda a, b: _comparable(a) != _comparable(b),
+    'gt': lambda a, b: a is not None and _comparable(a) > _comparable(b),
+    'gte': lambda a, b: a is not None and _comparable(a) >= _comparable(b),
+    'lt': lambda a, b: a is not None and _comparable(a) < _comparable(b),
+    'lte': lambda a, b: a is not None and _comparable(a) <= _comparable(b),
+}
+
+
+def parse_or_filter(expression):
+    """Predicate for a PostgREST or=(...) expression, e.g. 'a.gt.1,and(a.eq.1,id.gt.5)'"""
+    def parse(part):
+        part = part.strip()
+        for group, combine in (('and(', all), ('or(', any)):
+            if part.startswith(group) and part.endswith(')'):
+                checks = [parse(inner) for inner in _split_top_level(part[len(group):-1])]
+                return lambda row, checks=checks, combine=combine: combine(check(row) for check in checks)
+        column, operator, value = part.split('.', 2)
+        if operator == 'in':
+            values = {_comparable(_unquote(v)) for v in _split_top_level(value.strip('()'))}
+            return lambda row: _comparable(row.get(column)) in values
+        value = _unquote(value)
+        return lambda row: OPERATORS[operator](row.get(column), value)
+
+    checks = [parse(part) for part in _split_top_level(expression)]
+    return lambda row: any(check(row) for check in checks)
+
+
+class FakeQuery:
+    def __init__(self, supabase, table):
+        self.supabase = supabase
+        self.table = table
+        self.columns = '*'
+        self.count_mode = None
+        self.filters = []
+        self.sort_keys = []
+        self.offset = 0
+        self.limit_rows = None
+        self.operation = 'select'
+        self.payload = None
+        self.on_conflict = None
+        self.ignore_duplicates = False
+
+    # Reads
+
+    def select(self, columns='*', count=None, **kwargs):
+        self.columns = columns
+        self.count_mode = count
+        return self
+
+    def _filter(self, column, operator, value):
+        self.filters.append(lambda row: OPERATORS[operator](row.get(column), value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, 'eq', value)
+
+    def neq(self, column, value):
+        return self._filter(column, 'neq', value)
+
+    def gt(self, column, value):
+        return self._filter(column, 'gt', value)
+
+    def gte(self, column, value):
+        return self._filter(column, 'gte', value)
+
+    def lt(self, column, value):
+        return self._filter(column, 'lt', value)
+
+    def lte(self, column, value):
+        return self._filter(column, 'lte', value)
+
+    def in_(self, column, values):
+        wanted = {_comparable(value) for value in values}
+        self.filters.append(lambda row: _comparable(row.get(column)) in wanted)
+        return self
+
+    def or_(self, expression):
+        self.filters.append(parse_or_filter(expression))
+        return self
+
+    def order(self, column, desc=False):
+        self.sort_keys.append((column, desc))
+        return self
+
+    def range(self, start, end):
+        self.offset, self.limit_rows = start, end - start + 1
+        return self
+
+    def limit(self, rows):
+        self.limit_rows = rows
+        return self
+
+    # Writes
+
+    def insert(self, rows):
+        self.operation, self.payload = 'insert', rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, on_conflict=None, ignore_duplicates=False):
+        self.operation, self.payload = 'upsert', rows if isinstance(rows, list) else [rows]
+        self.on_conflict, self.ignore_duplicates = on_conflict, ignore_duplicates
+        return self
+
+    def update(self, changes):
+        self.operation, self.payload = 'update', changes
+        return self
+
+    def delete(self):
+        self.operation = 'delete'
+        return self
+
+    # Execution
+
+    def execute(self):
+        if self.supabase.async_client:
+            async def run():
+                return self._run()
+            return run()
+        return self._run()
+
+    def _run(self):
+        supabase = self.supabase
+        if supabase.delay:
+            time.sleep(supabase.delay)
+        with supabase.lock:
+            supabase.calls.append(self.table)
+            if supabase.down or (supabase.fail_writes and self.operation != 'select'):
+                raise ConnectionError("database unavailable")
+            rows = supabase.tables.setdefault(self.table, [])
+            if self.operation in ('insert', 'upsert'):
+                return self._write(rows)
+            if self.operation == 'select':
+                supabase.reads.append(self.table)
+
+            matched = [row for row in rows if all(check(row) for check in self.filters)]
+            if self.operation == 'update':
+                for row in matched:
+                    row.update(self.payload)
+                supabase.writes.append((self.table, len(matched)))
+                return FakeResult([dict(row) for row in matched])
+            if self.operation == 'delete':
+                supabase.tables[self.table] = [row for row in rows if row not in matched]
+                supabase.writes.append((self.table, len(matched)))
+                return FakeResult([dict(row) for row in matched])
+
+            total = len(matched)
+            # Ties between the requested sort columns come back in no particular order
+            random.Random(next(supabase.query_seeds)).shuffle(matched)
+            for column, desc in reversed(self.sort_keys):
+                matched.sort(key=lambda row: _comparable(row.get(column)), reverse=desc)
+            if self.limit_rows is not None:
+                matched = matched[self.offset:self.offset + self.limit_rows]
+            return FakeResult([self._project(row) for row in matched],
+                              count=total if self.count_mode else None)
+
+    def _project(self, row):
+        result = dict(row)
+        for relation, (foreign_key, table) in self.supabase.relations.get(self.table, {}).items():
+            if f'{relation}(' in self.columns:
+                related = {other['id']: other for other in self.supabase.tables.get(table, [])}
+                result[relation] = related.get(row.get(foreign_key))
+        return result
+
+    def _write(self, rows):
+        keys = [column.strip() for column in
+                (self.on_conflict or self.supabase.primary_keys.get(self.table, 'id')).split(',')]
+        index = {tuple(row.get(key) for key in keys): row for row in rows}
+        written = []
+        for new_row in self.payload:
+            new_row = dict(new_row)
+            if 'id' not in new_row and 'id' in keys:
+                new_row['id'] = f'{self.table}-{next(self.supabase.ids)}'
+            key = tuple(new_row.get(column) for column in keys)
+            existing = index.get(key) if all(part is not None for part in key) else None
+            if existing is not None:
+                if self.operation == 'insert':
+                    raise ValueError(f"duplicate key value violates unique constraint on {self.table} {key}")
+                if self.ignore_duplicates:
+                    continue
+                existing.update(new_row)
+            else:
+                if 'id' not in new_row:
+                    new_row['id'] = f'{self.table}-{next(self.supabase.ids)}'
+                rows.append(new_row)
+                index[key] = new_row
+            written.append(dict(new_row))
+        self.supabase.writes.append((self.table, len(self.payload)))
+        return FakeResult(written)
+
+
+class FakeRpc:
+    def __init__(self, supabase, name, params):
+        self.supabase = supabase
+        self.name = name
+        self.params = params
+
+    def execute(self):
+        if self.supabase.async_client:
+            async def run():
+                return self._run()
+            return run()
+        return self._run()
+
+    def _run(self):
+        handler = self.supabase.rpc_handlers.get(self.name)
+        if handler is None:
+            raise RuntimeError(f"Could not find the function public.{self.name} (PGRST202)")
+        self.supabase.rpc_calls.append((self.name, self.params))
+        return FakeResult(handler(self.params))
+
+
+class FakeSupabase:
+    """Tables are lists of row dicts in `tables`.
+
+    `calls` lists the table of every executed query, `reads` of every
+    select and `writes` the (table, rows) of every write. Inserts and
+    upserts without on_conflict match on the table's entry in
+    `primary_keys`, 'id' by default. Set `down` to fail every query,
+    `fail_writes` to fail only writes and `delay` to slow each query. RPCs
+    run the handler registered in `rpc_handlers`; `relations` maps
+    embedded selects like users(...) to (foreign key, table).
+    `async_client=True` makes execute() awaitable, for services written
+    against the async client.
+    """
+
+    def __init__(self, async_client=False):
+        self.async_client = async_client
+        self.tables = {}
+        self.calls = []
+        self.reads = []
+        self.writes = []
+        self.rpc_calls = []
+        self.rpc_handlers = {}
+        self.relations = {}
+        self.primary_keys = {}
+        self.down = False
+        self.fail_writes = False
+        self.delay = 0.0
+        self.lock = threading.RLock()
+        self.ids = count(1)
+        self.query_seeds = count(1)
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params):
+        return FakeRpc(self, name, params)
+
+
+class FakeDatabase:
+    def __init__(self, async_client=False):
+        self.supabase = FakeSupabase(async_client)
+
+    def _is_available(self):
+        return True
@@ -0,0 +1,225 @@
+"""
+In-memory stand-ins for the Airtable and Notion clients, shared by the sync tests
+Every record and page is stamped with the time it last changed, so full reads and change-cursor
+reads both work. Write requests, request times and requests in flight are recorded for the
+batching and rate limit tests.
+"""
+import asyncio
+import time
+from datetime import datetime, timezone
+
+from airtable_client import AirtableClient, AirtableRateLimitError
+from notion_client import NotionClient
+from sync_service import CollaborationSyncService, SyncConfig
+from sync_executor import SyncExecutor, ProviderLimits, RetryConfig
+
+OLD = '2025-01-01T00:00:00'
+NEW = '2025-06-01T00:00:00'
+
+
+def now():
+    return datetime.now(timezone.utc)
+
+
+class FakeAirtable(AirtableClient):
+    """In-memory Airtable base; records every write request.
+
+    `tables` maps a table name to its initial records. rate_limited_writes
+    and rate_limited_updates make that many write (or update) requests fail
+    with a 429 before anything is stored.
+    """
+
+    def __init__(self, tables=None, fetch_delay=0.0, rate_limited_writes=0, rate_limited_updates=0):
+        super().__init__('key', 'base')
+        self.tables = {}  # table -> {id: (fields, modified)}
+        for table_name, records in (tables or {}).items():
+            self.tables[table_name] = {}
+            for record in records:
+                self.put(record['id'], record['fields'], table_name)
+        self.fetch_delay = fetch_delay
+        self.rate_limited_writes = rate_limited_writes
+        self.rate_limited_updates = rate_limited_updates
+        self.write_requests = []  # (method, table, records)
+        self.full_reads = 0
+        self.records_read = 0
+        self.fetching = 0
+        self.max_fetching = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    @property
+    def records(self):
+        """The Volunteers table: id -> (fields, modified)"""
+        return self.tables.setdefault('Volunteers', {})
+
+    @property
+    def writes(self):
+        return len(self.write_requests)
+
+    def put(self, record_id, fields, table_name='Volunteers'):
+        self.tables.setdefault(table_name, {})[record_id] = (dict(fields), now())
+
+    def _read(self, table_name, since=None):
+        rows = [{'id': record_id, 'fields': dict(fields)}
+                for record_id, (fields, modified) in self.tables.get(table_name, {}).items()
+                if since is None or modified > since]
+        self.records_read += len(rows)
+        return rows
+
+    async def get_table_records(self, table_name, view=None, fields=None, max_records=100, filter_formula=None):
+        self.full_reads += 1
+        self.fetching += 1
+        self.max_fetching = max(self.max_fetching, self.fetching)
+        await asyncio.sleep(self.fetch_delay)
+        self.fetching -= 1
+        return self._read(table_name)
+
+    async def get_records_modified_since(self, table_name, since):
+        return self._read(table_name, since)
+
+    async def _write_records(self, method, table_name, records):
+        if len(records) > 10:
+            raise ValueError("Airtable accepts at most 10 records per request")
+        if self.rate_limited_writes:
+            self.rate_limited_writes -= 1
+            raise AirtableRateLimitError("Airtable API error: 429 rate limit exceeded")
+        if method == 'patch' and self.rate_limited_updates:
+            self.rate_limited_updates -= 1
+            raise AirtableRateLimitError("Airtable API error: 429 rate limit exceeded")
+        self.write_requests.append((method, table_name, len(records)))
+
+        table = self.tables.setdefault(table_name, {})
+        written = []
+        for record in records:
+            record_id = record.get('id')
+            if record_id is None:
+                record_id = f'rec{len(table)}'
+                while record_id in table:
+                    record_id += '+'
+            fields = dict(table[record_id][0]) if record_id in table else {}
+            fields.update(record['fields'])
+            self.put(record_id, fields, table_name)
+            written.append({'id': record_id, 'fields': fields})
+        return written
+
+
+def readable(properties):
+    """Notion properties as written, in the shape Notion returns them"""
+    pages = {}
+    for name, prop in properties.items():
+        kind, value = next(iter(prop.items()))
+        if kind in ('title', 'rich_text'):
+            value = [{'plain_text': part['text']['content']} for part in value]
+        pages[name] = {'type': kind, kind: value}
+    return pages
+
+
+class FakeNotion(NotionClient):
+    """In-memory Notion databases; counts page writes and requests in flight.
+
+    `databases` maps a database id to its initial pages. Updates to a page in
+    failing_pages raise a validation error.
+    """
+
+    def __init__(self, databases=None, write_delay=0.0):
+        super().__init__('key')
+        self.pages = {}  # id -> (properties, edited)
+        self.page_databases = {}  # id -> database id
+        for database_id, pages in (databases or {}).items():
+            for page in pages:
+                self.put(page['id'], page['properties'], database_id)
+        self.write_delay = write_delay
+        self.created, self.updated = [], []
+        self.failing_pages = set()
+        self.full_reads = 0
+        self.records_read = 0
+        self.request_times = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    @property
+    def writes(self):
+        return len(self.created) + len(self.updated)
+
+    def put(self, page_id, properties, database_id=None):
+        self.pages[page_id] = (properties, now())
+        self.page_databases[page_id] = database_id or self.page_databases.get(page_id, 'vol-db')
+
+    def _read(self, database_id, since=None):
+        rows = [{'id': page_id, 'properties': properties}
+                for page_id, (properties, edited) in self.pages.items()
+                if self.page_databases[page_id] == database_id and (since is None or edited >= since)]
+        self.records_read += len(rows)
+        return rows
+
+    async def _request(self):
+        self.request_times.append(time.perf_counter())
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.write_delay)
+        self.in_flight -= 1
+
+    async def get_database_pages(self, database_id, filter_conditions=None, sorts=None, page_size=100):
+        self.request_times.append(time.perf_counter())
+        self.full_reads += 1
+        return self._read(database_id)
+
+    async def get_pages_edited_since(self, database_id, since):
+        return self._read(database_id, since)
+
+    async def create_page(self, database_id, properties, children=None):
+        await self._request()
+        page_id = f'page{len(self.pages)}'
+        while page_id in self.pages:
+            page_id += '+'
+        self.put(page_id, readable(properties), database_id)
+        self.created.append(properties)
+        return {'id': page_id}
+
+    async def update_page(self, page_id, properties):
+        await self._request()
+        if page_id in self.failing_pages:
+            raise Exception("Notion API error: 400 validation failed")
+        merged = dict(self.pages[page_id][0]) if page_id in self.pages else {}
+        merged.update(readable(properties))
+        self.put(page_id, merged)
+        self.updated.append(page_id)
+        return {'id': page_id}
+
+
+def airtable_volunteer(n, updated=OLD):
+    return {'id': f'rec{n}', 'fields': {'Name': f'Volunteer {n}', 'Email': f'v{n}@example.org',
+                                        'Last Updated': updated}}
+
+
+def notion_volunteer(n, updated=NEW):
+    return {'id': f'page{n}', 'properties': {
+        'Name': {'type': 'title', 'title': [{'plain_text': f'Volunteer {n}'}]},
+        'Email': {'type': 'email', 'email': f'v{n}@example.org'},
+        'Last Updated': {'type': 'date', 'date': {'start': updated}},
+    }}
+
+
+def make_service(airtable, notion, table_parallelism=2, airtable_rate=1000.0, notion_rate=1000.0, **config):
+    """Sync service wired to the fakes; extra keyword arguments go to SyncConfig"""
+    config = SyncConfig(airtable_api_key='key', airtable_base_id='base', notion_api_key='key',
+                        volunteer_table_name='Volunteers', project_table_name='Projects',
+                        notion_volunteer_db_id='vol-db', notion_project_db_id='proj-db', **config)
+    executor = SyncExecutor(
+        retry_config=RetryConfig(initial_delay=0.01),
+        provider_limits={'airtable': ProviderLimits(airtable_rate, batch_size=10, concurrency=4),
+                         'notion': ProviderLimits(notion_rate, batch_size=1, concurrency=3)},
+        table_parallelism=table_parallelism)
+    return CollaborationSyncService(config, executor=executor,
+                                    airtable_client_factory=lambda *args: airtable,
+                                    notion_client_factory=lambda *args: notion)
@@ -0,0 +1,224 @@
+"""
+Batched funnel event ingestion
+Buffers funnel events, drops repeated stage hits, tracks each user's current stage in memory
+and writes events and stage updates to the backend in batches
+"""
+from typing import Dict, List, Optional, Any
+from collections import OrderedDict
+import asyncio
+import logging
+import time
+
+from batch_writer import BatchWriter
+
+logger = logging.getLogger(__name__)
+
+class SupabaseFunnelBackend:
+    """Writes funnel batches to Supabase (funnel_events and funnel_cohorts)"""
+
+    def __init__(self, database, max_known_users: int = 100000):
+        self.database = database
+        self.max_known_users = max_known_users
+        # Users known to have a funnel_cohorts row, so the existence check is skipped
+        self._known_cohort_users: OrderedDict = OrderedDict()
+
+    async def insert_events(self, rows: List[Dict[str, Any]]):
+        await asyncio.to_thread(
+            lambda: self.database.supabase.table('funnel_events').insert(rows).execute()
+        )
+
+    async def upsert_current_stages(self, stage_by_user: Dict[str, str]):
+        """Set current_stage for every user; users without a cohort row join the default cohort"""
+        await asyncio.to_thread(self._upsert_current_stages_sync, stage_by_user)
+
+    def _upsert_current_stages_sync(self, stage_by_user: Dict[str, str]):
+        table = lambda: self.database.supabase.table('funnel_cohorts')
+
+        unknown = [user_id for user_id in stage_by_user if user_id not in self._known_cohort_users]
+        if unknown:
+            existing = table().select('user_id').in_('user_id', unknown).execute()
+            for row in existing.data or []:
+                self._remember(row['user_id'])
+
+        new_rows = []
+        users_by_stage: Dict[str, List[str]] = {}
+        for user_id, stage in stage_by_user.items():
+            if user_id in self._known_cohort_users:
+                users_by_stage.setdefault(stage, []).append(user_id)
+            else:
+                new_rows.append({'user_id': user_id, 'cohort_name': 'default', 'current_stage': stage})
+
+        # One update per distinct stage rather than per user
+        for stage, user_ids in users_by_stage.items():
+            table().update({'current_stage': stage}).in_('user_id', user_ids).execute()
+
+        if new_rows:
+            table().insert(new_rows).execute()
+            for row in new_rows:
+                self._remember(row['user_id'])
+
+    def _remember(self, user_id: str):
+        self._known_cohort_users[user_id] = True
+        self._known_cohort_users.move_to_end(user_id)
+        if len(self._known_cohort_users) > self.max_known_users:
+            self._known_cohort_users.popitem(last=False)
+
+class InMemoryFunnelBackend:
+    """Local stand-in backend for tests and load tests.
+
+    latency_seconds simulates the round trip of each backend call; set
+    fail to make calls raise.
+    """
+
+    def __init__(self, latency_seconds: float = 0.0):
+        self.latency_seconds = latency_seconds
+        self.fail = False
+        self.events: List[Dict[str, Any]] = []
+        self.current_stages: Dict[str, str] = {}
+        self.calls = 0
+
+    async def _round_trip(self):
+        self.calls += 1
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        if self.fail:
+            raise ConnectionError("funnel backend unavailable")
+
+    async def insert_events(self, rows: List[Dict[str, Any]]):
+        await self._round_trip()
+        self.events.extend(rows)
+
+    async def upsert_current_stages(self, stage_by_user: Dict[str, str]):
+        await self._round_trip()
+        self.current_stages.update(stage_by_user)
+
+class FunnelEventBuffer(BatchWriter):
+    """Asynchronous, batched writer for funnel events.
+
+    A repeated hit of the same (user, stage) within dedup_window_seconds is
+    dropped, unless it carries an intervention. Each user's latest stage is kept
+    in memory and written once per batch. When max_pending events are waiting,
+    submit() waits for a flush (back-pressure) instead of growing without bound.
+    """
+
+    def __init__(self, backend, batch_size: int = 500, flush_interval: float = 1.0,
+                 max_pending: int = 20000, dedup_window_seconds: float = 3600,
+                 max_tracked_users: int = 100000, max_backoff: float = 30.0):
+        super().__init__(batch_size, flush_interval, max_backoff)
+        self.backend = backend
+        self.max_pending = max_pending
+        self.dedup_window_seconds = dedup_window_seconds
+        self.max_tracked_users = max_tracked_users
+
+        self._recent_hits: OrderedDict = OrderedDict()  # (user_id, stage) -> monotonic time
+        self._current_stages: OrderedDict = OrderedDict()  # user_id -> (stage, timestamp)
+        self._stats = {
+            'submitted': 0,
+            'deduplicated': 0,
+            'flushed_events': 0,
+            'flushes': 0,
+            'failed_flushes': 0,
+            'backpressure_waits': 0,
+            'dropped': 0,
+        }
+
+    async def submit(self, row: Dict[str, Any]) -> bool:
+        """Queue a funnel_events row; returns False if it was dropped as a repeat"""
+        self._stats['submitted'] += 1
+        user_id, stage = row['user_id'], row['stage']
+
+        if not row.get('intervention_applied') and self._is_repeat(user_id, stage):
+            self._stats['deduplicated'] += 1
+            return False
+
+        if len(self._queue) >= self.max_pending:
+            self._stats['backpressure_waits'] += 1
+            await self.flush()
+            if len(self._queue) >= self.max_pending:
+                # Backend is down and the buffer is full: shed the oldest event,
+                # and forget its hit so a resubmission is not dropped as a repeat
+                shed = self._queue.popleft()
+                self._recent_hits.pop((shed['user_id'], shed['stage']), None)
+                self._stats['dropped'] += 1
+
+        self._queue.append(row)
+        self._set_current_stage(user_id, stage, row.get('timestamp'))
+        self._queued()
+        return True
+
+    def _is_repeat(self, user_id: str, stage: str) -> bool:
+        key = (user_id, stage)
+        now = time.monotonic()
+        seen_at = self._recent_hits.get(key)
+        if seen_at is not None and now - seen_at < self.dedup_window_seconds:
+            return True
+
+        self._recent_hits[key] = now
+        self._recent_hits.move_to_end(key)
+        while len(self._recent_hits) > self.max_tracked_users:
+            self._recent_hits.popitem(last=False)
+        return False
+
+    def _set_current_stage(self, user_id: str, stage: str, timestamp: Optional[str]):
+        previous = self._current_stages.get(user_id)
+        # Late-arriving older events do not move the user backwards
+        if previous and timestamp and previous[1] and timestamp < previous[1]:
+            return
+        self._current_stages[user_id] = (stage, timestamp)
+        self._current_stages.move_to_end(user_id)
+        while len(self._current_stages) > self.max_tracked_users:
+            self._current_stages.popitem(last=False)
+
+    def get_current_stage(self, user_id: str) -> Optional[str]:
+        """Latest stage seen for a user by this process, if any"""
+        current = self._current_stages.get(user_id)
+        return current[0] if current else None
+
+    async def flush(self) -> int:
+        """Write all pending events; returns how many were written"""
+        written = 0
+        async with self._flush_lock:
+            while self._queue:
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+
+                # Latest known stage for each user in the batch
+                stage_by_user = {}
+                for row in batch:
+                    current = self._current_stages.get(row['user_id'])
+                    stage_by_user[row['user_id']] = current[0] if current else row['stage']
+
+                start = time.perf_counter()
+                try:
+                    await self.backend.insert_events(batch)
+                except asyncio.CancelledError:
+                    self._queue.extendleft(reversed(batch))
+                    raise
+                except Exception as e:
+                    self._queue.extendleft(reversed(batch))
+                    self._stats['failed_flushes'] += 1
+                    self._record_failure()
+                    logger.error(f"Error flushing {len(batch)} funnel events: {e}")
+                    break
+
+                try:
+                    await self.backend.upsert_current_stages(stage_by_user)
+                except Exception as e:
+                    # Events are stored; current_stage catches up with the user's next event
+                    logger.error(f"Error updating current stage for {len(stage_by_user)} users: {e}")
+
+                self._record_success(start)
+                self._stats['flushes'] += 1
+                self._stats['flushed_events'] += len(batch)
+                written += len(batch)
+        return written
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Back-pressure and flush metrics"""
+        return {
+            **self._stats,
+            'pending': len(self._queue),
+            'max_pending': self.max_pending,
+            'pending_ratio': round(len(self._queue) / self.max_pending, 3) if self.max_pending else 0,
+            'tracked_users': len(self._current_stages),
+            **self._latency_metrics(),
+        }
@@ -0,0 +1,180 @@
+"""
+Funnel analytics snapshots
+Fetches the funnel fact data for a (window, as-of date) once and shares it between report sections
+"""
+from typing import Dict, List, Optional, Any, Tuple
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import date, datetime, time as dt_time, timedelta
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class FunnelSnapshot:
+    """Funnel facts for one window, plus the report sections derived from them.
+
+    user_stage_times is user -> stage -> (first, last), aggregated by the
+    database; raw events are not kept. Sections are memoized in `sections`
+    and shared by every caller of the snapshot, so treat them as read-only.
+    """
+    days: int
+    as_of: date
+    start_date: str
+    end_date: Optional[str]
+    event_count: Optional[int]
+    user_stage_times: Dict[str, Dict[str, Tuple[datetime, datetime]]]
+    interventions: List[Dict[str, Any]]
+    cohorts: List[Dict[str, Any]]
+    stage_distribution: Any
+    generated_at: str
+    built_at: float = field(default_factory=time.monotonic)
+    sections: Dict[str, Any] = field(default_factory=dict)
+
+    def age_seconds(self) -> float:
+        return time.monotonic() - self.built_at
+
+class FunnelSnapshotStore:
+    """Cache of FunnelSnapshot objects keyed by (days, as-of date).
+
+    A cached snapshot is reused while it is younger than ttl_seconds and the
+    number of funnel_events in its window is unchanged. Checking the count is
+    a single count query, and a build reads one aggregated row per
+    (user, stage), so neither loads the raw events.
+    Snapshots for a past as_of date cover whole days up to the end of that date.
+    """
+
+    def __init__(self, funnel_tracker, database, ttl_seconds: float = 300,
+                 max_snapshots: int = 16):
+        self.funnel_tracker = funnel_tracker
+        self.database = database
+        self.ttl_seconds = ttl_seconds
+        self.max_snapshots = max_snapshots
+        self._snapshots: OrderedDict = OrderedDict()
+        self._build_locks: Dict[Tuple[int, date], asyncio.Lock] = {}
+        self._build_latencies_ms = deque(maxlen=100)
+        self._stats = {
+            'hits': 0,
+            'builds': 0,
+            'expired': 0,
+            'invalidated': 0,
+        }
+
+    async def get(self, days: int = 30, as_of: Optional[date] = None) -> FunnelSnapshot:
+        """Cached snapshot for the window, rebuilt if expired or if new events arrived"""
+        as_of = as_of or date.today()
+        key = (days, as_of)
+
+        # Events buffered by this process count as arrived
+        await self.funnel_tracker.flush_events()
+
+        lock = self._build_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None:
+                if snapshot.age_seconds() >= self.ttl_seconds:
+                    self._stats['expired'] += 1
+                elif (snapshot.event_count is None
+                      or await self._count_events(snapshot.start_date, snapshot.end_date) != snapshot.event_count):
+                    self._stats['invalidated'] += 1
+                else:
+                    self._stats['hits'] += 1
+                    self._snapshots.move_to_end(key)
+                    return snapshot
+
+            snapshot = await self._build(days, as_of)
+            self._snapshots[key] = snapshot
+            self._snapshots.move_to_end(key)
+            while len(self._snapshots) > self.max_snapshots:
+                evicted, _ = self._snapshots.popitem(last=False)
+                self._build_locks.pop(evicted, None)
+            return snapshot
+
+    def invalidate(self, days: Optional[int] = None):
+        """Drop cached snapshots (all, or those for one window length)"""
+        for key in list(self._snapshots):
+            if days is None or key[0] == days:
+                del self._snapshots[key]
+
+    def _window(self, days: int, as_of: date) -> Tuple[str, Optional[str]]:
+        if as_of >= date.today():
+            return (datetime.now() - timedelta(days=days)).isoformat(), None
+        end = datetime.combine(as_of + timedelta(days=1), dt_time.min)
+        return (end - timedelta(days=days)).isoformat(), end.isoformat()
+
+    async def _build(self, days: int, as_of: date) -> FunnelSnapshot:
+        start = time.perf_counter()
+        start_date, end_date = self._window(days, as_of)
+
+        # Counted first, so an event arriving mid-build invalidates the snapshot
+        event_count = await self._count_events(start_date, end_date)
+        user_stage_times, interventions, cohorts, stage_distribution = await asyncio.gather(
+            self.funnel_tracker._get_user_stage_times(days, start_date=start_date, end_date=end_date),
+            asyncio.to_thread(self._fetch_rows, 'funnel_interventions', 'applied_at', start_date, end_date),
+            asyncio.to_thread(self._fetch_rows, 'funnel_cohorts', 'entry_date', start_date, end_date),
+            self._fetch_stage_distribution(start_date)
+        )
+
+        snapshot = FunnelSnapshot(
+            days=days,
+            as_of=as_of,
+            start_date=start_date,
+            end_date=end_date,
+            event_count=event_count,
+            user_stage_times=user_stage_times,
+            interventions=interventions,
+            cohorts=cohorts,
+            stage_distribution=stage_distribution,
+            generated_at=datetime.now().isoformat()
+        )
+
+        self._build_latencies_ms.append((time.perf_counter() - start) * 1000)
+        self._stats['builds'] += 1
+        logger.info(f"Built funnel snapshot for {days} days as of {as_of}: {event_count} events")
+        return snapshot
+
+    def _fetch_rows(self, table: str, time_column: str, start_date: str, end_date: Optional[str]) -> List[Dict[str, Any]]:
+        query = self.database.supabase.table(table).select('*').gte(time_column, start_date)
+        if end_date:
+            query = query.lt(time_column, end_date)
+        return query.execute().data or []
+
+    async def _fetch_stage_distribution(self, start_date: str) -> Any:
+        try:
+            result = await asyncio.to_thread(
+                lambda: self.database.supabase.rpc('get_stage_distribution', {'start_date': start_date}).execute()
+            )
+            return result.data if result.data else {}
+        except Exception as e:
+            logger.warning(f"get_stage_distribution unavailable: {e}")
+            return {}
+
+    async def _count_events(self, start_date: str, end_date: Optional[str]) -> Optional[int]:
+        """Number of funnel_events in the window; None if the count query fails"""
+        def count():
+            query = self.database.supabase.table('funnel_events')\
+                .select('id', count='exact')\
+                .gte('timestamp', start_date)
+            if end_date:
+                query = query.lt('timestamp', end_date)
+            return query.limit(1).execute().count
+
+        try:
+            return await asyncio.to_thread(count)
+        except Exception as e:
+            logger.warning(f"Could not count funnel events, rebuilding snapshot: {e}")
+            return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Cache hit/build counters and build latency"""
+        latencies = sorted(self._build_latencies_ms)
+        lookups = self._stats['hits'] + self._stats['builds']
+        return {
+            **self._stats,
+            'hit_rate': round(self._stats['hits'] / lookups, 3) if lookups else 0,
+            'cached_snapshots': len(self._snapshots),
+            'avg_build_ms': sum(latencies) / len(latencies) if latencies else None,
+            'p95_build_ms': latencies[int(0.95 * (len(latencies) - 1))] if latencies else None,
+        }
@@ -3,13 +3,15 @@ Interest→Active Funnel Tracking System
 Tracks volunteer journey from initial interest through activation
 and measures intervention impact on conversion rates
 """
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, List, Optional, Any, Union, Tuple
 from datetime import datetime, timedelta
 from enum import Enum
+import asyncio
 import json
 import pandas as pd
 from dataclasses import dataclass
 from database import VolunteerDatabase
+from funnel_ingestion import FunnelEventBuffer, SupabaseFunnelBackend
 import logging
 
 logger = logging.getLogger(__name__)
@@ -65,9 +67,10 @@ class InterventionOutcome:
 class VolunteerFunnelTracker:
     """Main class for tracking volunteer funnel progression and interventions"""
     
-    def __init__(self, database: VolunteerDatabase):
+    def __init__(self, database: VolunteerDatabase, ingestion_buffer: Optional[FunnelEventBuffer] = None):
         self.database = database
         self.stage_order = list(FunnelStage)
+        self.ingestion_buffer = ingestion_buffer or FunnelEventBuffer(SupabaseFunnelBackend(database))
     
     async def initialize_tracking_tables(self):
         """Initialize database tables for funnel tracking"""
@@ -115,11 +118,33 @@ class VolunteerFunnelTracker:
         );
         """
         
+        # One row per (user, stage) in a window; all funnel metrics are derived from it
+        user_stage_times_sql = """
+        CREATE INDEX IF NOT EXISTS idx_funnel_events_timestamp_user_stage
+            ON funnel_events(timestamp, user_id, stage);
+        
+        CREATE OR REPLACE FUNCTION get_funnel_user_stage_times(start_date TIMESTAMP WITH TIME ZONE,
+                                                               end_date TIMESTAMP WITH TIME ZONE DEFAULT NULL)
+        RETURNS TABLE (user_id UUID, stage VARCHAR, first_at TIMESTAMP WITH TIME ZONE, last_at TIMESTAMP WITH TIME ZONE)
+        AS $$
+            SELECT user_id, stage, MIN(timestamp), MAX(timestamp)
+            FROM funnel_events
+            WHERE timestamp >= start_date
+              AND (end_date IS NULL OR timestamp < end_date)
+            GROUP BY user_id, stage
+        $$ LANGUAGE sql STABLE;
+        """
+        
         logger.info("Funnel tracking tables SQL prepared")
-        return [funnel_events_sql, interventions_sql, funnel_cohorts_sql]
+        return [funnel_events_sql, interventions_sql, funnel_cohorts_sql, user_stage_times_sql]
     
-    async def track_stage_progression(self, event: FunnelEvent) -> bool:
-        """Track a user's progression through funnel stages"""
+    async def track_stage_progression(self, event: FunnelEvent, buffered: bool = True) -> bool:
+        """Track a user's progression through funnel stages
+        
+        By default the event is queued on the ingestion buffer and written in a
+        batch; returns False if it was dropped as a repeat of a recent stage hit.
+        Pass buffered=False to write the event and current stage immediately.
+        """
         try:
             event_data = {
                 'user_id': event.user_id,
@@ -131,6 +156,12 @@ class VolunteerFunnelTracker:
                 'source_system': event.source_system
             }
             
+            if buffered:
+                accepted = await self.ingestion_buffer.submit(event_data)
+                if accepted and event.intervention_applied:
+                    await self._mark_intervention_successful(event.user_id, event.intervention_applied, event.timestamp)
+                return accepted
+            
             # Insert funnel event
             result = self.database.supabase.table('funnel_events').insert(event_data).execute()
             
@@ -148,6 +179,18 @@ class VolunteerFunnelTracker:
             logger.error(f"Error tracking stage progression: {e}")
             return False
     
+    async def flush_events(self) -> int:
+        """Write all buffered funnel events now"""
+        return await self.ingestion_buffer.flush()
+    
+    async def close(self):
+        """Write buffered events and stop the ingestion buffer (call on shutdown)"""
+        await self.ingestion_buffer.stop()
+    
+    def get_ingestion_metrics(self) -> Dict[str, Any]:
+        """Back-pressure and flush metrics of the ingestion buffer"""
+        return self.ingestion_buffer.get_metrics()
+    
     async def apply_intervention(self, user_id: str, intervention_type: InterventionType, 
                                target_stage: FunnelStage, metadata: Dict[str, Any] = None) -> str:
         """Apply an intervention to help user progress to target stage"""
@@ -185,36 +228,35 @@ class VolunteerFunnelTracker:
         """Get comprehensive funnel analytics"""
         try:
             start_date = (datetime.now() - timedelta(days=days)).isoformat()
-            
-            # Stage distribution
-            stage_dist_result = self.database.supabase.rpc(
-                'get_stage_distribution',
-                {'start_date': start_date}
-            ).execute()
-            
-            # Conversion rates between stages
-            conversions = await self._calculate_stage_conversions(days)
-            
-            # Drop-off analysis
-            dropoffs = await self._analyze_stage_dropoffs(days)
-            
-            # Intervention effectiveness
-            intervention_stats = await self._get_intervention_effectiveness(days)
-            
-            # Time to progression analysis
-            progression_times = await self._analyze_progression_times(days)
-            
-            # Cohort analysis
-            cohort_performance = await self._analyze_cohort_performance(days)
+            await self.ingestion_buffer.flush()
+            
+            # Independent fetches run concurrently; the funnel event metrics all
+            # come from one (user, stage) aggregate. A failed fetch only empties its own sections
+            sections = ['stage_distribution', 'user_stage_times', 'intervention_effectiveness', 'cohort_performance']
+            results = await asyncio.gather(
+                asyncio.to_thread(
+                    lambda: self.database.supabase.rpc('get_stage_distribution', {'start_date': start_date}).execute()
+                ),
+                self._get_user_stage_times(days),
+                self._get_intervention_effectiveness(days),
+                self._analyze_cohort_performance(days),
+                return_exceptions=True
+            )
+            for section, result in zip(sections, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Error getting {section} for funnel analytics: {result}")
+            stage_dist_result, user_stage_times, intervention_stats, cohort_performance = [
+                None if isinstance(result, Exception) else result for result in results
+            ]
             
             return {
                 'period_days': days,
-                'stage_distribution': stage_dist_result.data if stage_dist_result.data else {},
-                'conversion_rates': conversions,
-                'dropoff_analysis': dropoffs,
-                'intervention_effectiveness': intervention_stats,
-                'progression_times': progression_times,
-                'cohort_performance': cohort_performance,
+                'stage_distribution': stage_dist_result.data if stage_dist_result and stage_dist_result.data else {},
+                'conversion_rates': self._conversions_from_stage_times(user_stage_times) if user_stage_times is not None else {},
+                'dropoff_analysis': self._dropoffs_from_stage_times(user_stage_times) if user_stage_times is not None else {},
+                'intervention_effectiveness': intervention_stats or {},
+                'progression_times': self._progression_times_from_stage_times(user_stage_times) if user_stage_times is not None else {},
+                'cohort_performance': cohort_performance or {},
                 'generated_at': datetime.now().isoformat()
             }
             
@@ -385,38 +427,138 @@ class VolunteerFunnelTracker:
         except Exception as e:
             logger.error(f"Error marking intervention successful: {e}")
     
+    async def _get_user_stage_times(self, days: int, start_date: Optional[str] = None,
+                                    end_date: Optional[str] = None) -> Dict[str, Dict[str, Tuple[datetime, datetime]]]:
+        """First and last timestamp of every (user, stage) in the window: user -> stage -> (first, last).
+        
+        The window is the last `days` days unless start_date is given; end_date
+        (exclusive) closes it. Uses the get_funnel_user_stage_times RPC (one
+        aggregated round trip). If the function is not installed, falls back to
+        paging the raw events.
+        """
+        start_date = start_date or (datetime.now() - timedelta(days=days)).isoformat()
+        params = {'start_date': start_date}
+        if end_date:
+            params['end_date'] = end_date
+        
+        try:
+            result = await asyncio.to_thread(
+                lambda: self.database.supabase.rpc('get_funnel_user_stage_times', params).execute()
+            )
+            rows = result.data or []
+        except Exception as e:
+            logger.warning(f"get_funnel_user_stage_times unavailable, aggregating raw events: {e}")
+            rows = await asyncio.to_thread(self._aggregate_events_since, start_date, end_date=end_date)
+        
+        user_stage_times = {}
+        for row in rows:
+            first_at = self._parse_timestamp(row['first_at'])
+            last_at = self._parse_timestamp(row['last_at'])
+            stages = user_stage_times.setdefault(row['user_id'], {})
+            if row['stage'] in stages:
+                # Merge duplicates (possible when aggregating page by page)
+                previous_first, previous_last = stages[row['stage']]
+                first_at, last_at = min(first_at, previous_first), max(last_at, previous_last)
+            stages[row['stage']] = (first_at, last_at)
+        return user_stage_times
+    
+    def _aggregate_events_since(self, start_date: str, page_size: int = 1000,
+                                end_date: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Page through funnel_events fetching only (user_id, stage, timestamp) and aggregate in memory"""
+        aggregated = {}
+        offset = 0
+        while True:
+            query = self.database.supabase.table('funnel_events')\
+                .select('user_id, stage, timestamp')\
+                .gte('timestamp', start_date)
+            if end_date:
+                query = query.lt('timestamp', end_date)
+            page = query.order('timestamp')\
+                .order('id')\
+                .range(offset, offset + page_size - 1)\
+                .execute()
+            events = page.data or []
+            for event in events:
+                key = (event['user_id'], event['stage'])
+                timestamp = self._parse_timestamp(event['timestamp'])
+                if key in aggregated:
+                    first_at, last_at = aggregated[key]
+                    aggregated[key] = (min(first_at, timestamp), max(last_at, timestamp))
+                else:
+                    aggregated[key] = (timestamp, timestamp)
+            if len(events) < page_size:
+                break
+            offset += page_size
+        
+        return [
+            {'user_id': user_id, 'stage': stage, 'first_at': first_at, 'last_at': last_at}
+            for (user_id, stage), (first_at, last_at) in aggregated.items()
+        ]
+    
+    @staticmethod
+    def _parse_timestamp(value: Union[str, datetime]) -> datetime:
+        if isinstance(value, datetime):
+            return value
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+    def _conversions_from_stage_times(self, user_stage_times: Dict[str, Dict[str, Tuple[datetime, datetime]]]) -> Dict[str, float]:
+        """Conversion rates between adjacent stages from distinct users per stage"""
+        stage_counts = {}
+        for stages in user_stage_times.values():
+            for stage in stages:
+                stage_counts[stage] = stage_counts.get(stage, 0) + 1
+        
+        conversions = {}
+        for current_stage, next_stage in zip(self.stage_order, self.stage_order[1:]):
+            current_count = stage_counts.get(current_stage.value, 0)
+            next_count = stage_counts.get(next_stage.value, 0)
+            
+            conversion_rate = (next_count / current_count * 100) if current_count > 0 else 0
+            conversions[f"{current_stage.value}_to_{next_stage.value}"] = round(conversion_rate, 2)
+        
+        return conversions
+    
+    def _dropoffs_from_stage_times(self, user_stage_times: Dict[str, Dict[str, Tuple[datetime, datetime]]]) -> Dict[str, Any]:
+        """Where users drop off: the stage of each user's most recent event"""
+        last_stages = {}
+        for stages in user_stage_times.values():
+            if not stages:
+                continue
+            last_stage = max(stages.items(), key=lambda item: item[1][1])[0]
+            last_stages[last_stage] = last_stages.get(last_stage, 0) + 1
+        
+        total_users = len(user_stage_times)
+        dropoff_percentages = {
+            stage: round(count / total_users * 100, 2)
+            for stage, count in last_stages.items()
+        }
+        
+        return {
+            'total_users_in_period': total_users,
+            'dropoff_by_stage': last_stages,
+            'dropoff_percentages': dropoff_percentages
+        }
+    
+    def _progression_times_from_stage_times(self, user_stage_times: Dict[str, Dict[str, Tuple[datetime, datetime]]]) -> Dict[str, float]:
+        """Average hours between consecutive stages, ordering each user's stages by first arrival"""
+        progression_times = {}
+        for stages in user_stage_times.values():
+            ordered = sorted(stages.items(), key=lambda item: item[1][0])
+            for (current_stage, (current_time, _)), (next_stage, (next_time, _)) in zip(ordered, ordered[1:]):
+                transition = f"{current_stage}_to_{next_stage}"
+                totals = progression_times.setdefault(transition, [0.0, 0])
+                totals[0] += (next_time - current_time).total_seconds() / 3600  # hours
+                totals[1] += 1
+        
+        return {
+            transition: round(total / count, 2)
+            for transition, (total, count) in progression_times.items()
+        }
+    
     async def _calculate_stage_conversions(self, days: int) -> Dict[str, float]:
         """Calculate conversion rates between stages"""
         try:
-            start_date = (datetime.now() - timedelta(days=days)).isoformat()
-            
-            conversions = {}
-            for i in range(len(self.stage_order) - 1):
-                current_stage = self.stage_order[i]
-                next_stage = self.stage_order[i + 1]
-                
-                # Users who reached current stage
-                current_users = self.database.supabase.table('funnel_events')\
-                    .select('user_id')\
-                    .eq('stage', current_stage.value)\
-                    .gte('timestamp', start_date)\
-                    .execute()
-                
-                # Users who reached next stage
-                next_users = self.database.supabase.table('funnel_events')\
-                    .select('user_id')\
-                    .eq('stage', next_stage.value)\
-                    .gte('timestamp', start_date)\
-                    .execute()
-                
-                current_count = len(set(u['user_id'] for u in current_users.data))
-                next_count = len(set(u['user_id'] for u in next_users.data))
-                
-                conversion_rate = (next_count / current_count * 100) if current_count > 0 else 0
-                conversions[f"{current_stage.value}_to_{next_stage.value}"] = round(conversion_rate, 2)
-            
-            return conversions
-            
+            return self._conversions_from_stage_times(await self._get_user_stage_times(days))
         except Exception as e:
             logger.error(f"Error calculating conversions: {e}")
             return {}
@@ -424,38 +566,7 @@ class VolunteerFunnelTracker:
     async def _analyze_stage_dropoffs(self, days: int) -> Dict[str, Any]:
         """Analyze where users drop off in the funnel"""
         try:
-            start_date = (datetime.now() - timedelta(days=days)).isoformat()
-            
-            # Get last stage for each user
-            user_stages = self.database.supabase.table('funnel_events')\
-                .select('user_id, stage')\
-                .gte('timestamp', start_date)\
-                .order('timestamp', desc=True)\
-                .execute()
-            
-            # Count dropoffs by stage
-            last_stages = {}
-            processed_users = set()
-            
-            for event in user_stages.data:
-                user_id = event['user_id']
-                if user_id not in processed_users:
-                    stage = event['stage']
-                    last_stages[stage] = last_stages.get(stage, 0) + 1
-                    processed_users.add(user_id)
-            
-            total_users = len(processed_users)
-            dropoff_percentages = {
-                stage: round(count / total_users * 100, 2) 
-                for stage, count in last_stages.items()
-            }
-            
-            return {
-                'total_users_in_period': total_users,
-                'dropoff_by_stage': last_stages,
-                'dropoff_percentages': dropoff_percentages
-            }
-            
+            return self._dropoffs_from_stage_times(await self._get_user_stage_times(days))
         except Exception as e:
             logger.error(f"Error analyzing dropoffs: {e}")
             return {}
@@ -465,88 +576,52 @@ class VolunteerFunnelTracker:
         try:
             start_date = (datetime.now() - timedelta(days=days)).isoformat()
             
-            interventions = self.database.supabase.table('funnel_interventions')\
-                .select('*')\
-                .gte('applied_at', start_date)\
-                .execute()
+            interventions = await asyncio.to_thread(
+                self.database.supabase.table('funnel_interventions')
+                .select('*')
+                .gte('applied_at', start_date)
+                .execute
+            )
             
-            effectiveness = {}
-            for intervention in interventions.data:
-                int_type = intervention['intervention_type']
-                if int_type not in effectiveness:
-                    effectiveness[int_type] = {
-                        'total_applied': 0,
-                        'successful': 0,
-                        'success_rate': 0,
-                        'avg_time_to_progression': 0
-                    }
-                
-                effectiveness[int_type]['total_applied'] += 1
-                if intervention['successful']:
-                    effectiveness[int_type]['successful'] += 1
-                    if intervention['time_to_progression_hours']:
-                        current_avg = effectiveness[int_type]['avg_time_to_progression']
-                        new_avg = (current_avg + intervention['time_to_progression_hours']) / 2
-                        effectiveness[int_type]['avg_time_to_progression'] = round(new_avg, 1)
-            
-            # Calculate success rates
-            for int_type in effectiveness:
-                stats = effectiveness[int_type]
-                if stats['total_applied'] > 0:
-                    stats['success_rate'] = round(stats['successful'] / stats['total_applied'] * 100, 2)
-            
-            return effectiveness
+            return self._intervention_stats_from_rows(interventions.data or [])
             
         except Exception as e:
             logger.error(f"Error analyzing intervention effectiveness: {e}")
             return {}
     
+    def _intervention_stats_from_rows(self, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Per-type intervention counts and success rates from funnel_interventions rows"""
+        effectiveness = {}
+        for intervention in rows:
+            int_type = intervention['intervention_type']
+            if int_type not in effectiveness:
+                effectiveness[int_type] = {
+                    'total_applied': 0,
+                    'successful': 0,
+                    'success_rate': 0,
+                    'avg_time_to_progression': 0
+                }
+            
+            effectiveness[int_type]['total_applied'] += 1
+            if intervention['successful']:
+                effectiveness[int_type]['successful'] += 1
+                if intervention['time_to_progression_hours']:
+                    current_avg = effectiveness[int_type]['avg_time_to_progression']
+                    new_avg = (current_avg + intervention['time_to_progression_hours']) / 2
+                    effectiveness[int_type]['avg_time_to_progression'] = round(new_avg, 1)
+        
+        # Calculate success rates
+        for int_type in effectiveness:
+            stats = effectiveness[int_type]
+            if stats['total_applied'] > 0:
+                stats['success_rate'] = round(stats['successful'] / stats['total_applied'] * 100, 2)
+        
+        return effectiveness
+    
     async def _analyze_progression_times(self, days: int) -> Dict[str, float]:
         """Analyze time taken to progress between stages"""
         try:
-            start_date = (datetime.now() - timedelta(days=days)).isoformat()
-            
-            # Get all events ordered by user and time
-            events = self.database.supabase.table('funnel_events')\
-                .select('*')\
-                .gte('timestamp', start_date)\
-                .order('user_id, timestamp')\
-                .execute()
-            
-            progression_times = {}
-            user_events = {}
-            
-            # Group events by user
-            for event in events.data:
-                user_id = event['user_id']
-                if user_id not in user_events:
-                    user_events[user_id] = []
-                user_events[user_id].append(event)
-            
-            # Calculate progression times
-            for user_id, user_event_list in user_events.items():
-                for i in range(len(user_event_list) - 1):
-                    current_event = user_event_list[i]
-                    next_event = user_event_list[i + 1]
-                    
-                    current_time = datetime.fromisoformat(current_event['timestamp'].replace('Z', '+00:00'))
-                    next_time = datetime.fromisoformat(next_event['timestamp'].replace('Z', '+00:00'))
-                    
-                    time_diff = (next_time - current_time).total_seconds() / 3600  # hours
-                    
-                    transition = f"{current_event['stage']}_to_{next_event['stage']}"
-                    if transition not in progression_times:
-                        progression_times[transition] = []
-                    progression_times[transition].append(time_diff)
-            
-            # Calculate averages
-            avg_times = {}
-            for transition, times in progression_times.items():
-                if times:
-                    avg_times[transition] = round(sum(times) / len(times), 2)
-            
-            return avg_times
-            
+            return self._progression_times_from_stage_times(await self._get_user_stage_times(days))
         except Exception as e:
             logger.error(f"Error analyzing progression times: {e}")
             return {}
@@ -557,57 +632,81 @@ class VolunteerFunnelTracker:
             start_date = (datetime.now() - timedelta(days=days)).isoformat()
             
             # Get cohort data
-            cohorts = self.database.supabase.table('funnel_cohorts')\
-                .select('*')\
-                .gte('entry_date', start_date)\
-                .execute()
-            
-            cohort_performance = {}
-            
-            for cohort in cohorts.data:
-                cohort_name = cohort['cohort_name']
-                user_id = cohort['user_id']
-                
-                if cohort_name not in cohort_performance:
-                    cohort_performance[cohort_name] = {
-                        'total_users': 0,
-                        'active_users': 0,
-                        'is_control': cohort['is_control_group'],
-                        'stage_distribution': {}
-                    }
-                
-                cohort_performance[cohort_name]['total_users'] += 1
-                
-                # Check current stage
-                current_stage = cohort['current_stage']
-                stage_dist = cohort_performance[cohort_name]['stage_distribution']
-                stage_dist[current_stage] = stage_dist.get(current_stage, 0) + 1
-                
-                # Check if user is active (reached active_volunteer stage)
-                if current_stage == 'active_volunteer':
-                    cohort_performance[cohort_name]['active_users'] += 1
-            
-            # Calculate activation rates
-            for cohort_name in cohort_performance:
-                stats = cohort_performance[cohort_name]
-                if stats['total_users'] > 0:
-                    stats['activation_rate'] = round(stats['active_users'] / stats['total_users'] * 100, 2)
-                else:
-                    stats['activation_rate'] = 0
+            cohorts = await asyncio.to_thread(
+                self.database.supabase.table('funnel_cohorts')
+                .select('*')
+                .gte('entry_date', start_date)
+                .execute
+            )
             
-            return cohort_performance
+            return self._cohort_performance_from_rows(cohorts.data or [])
             
         except Exception as e:
             logger.error(f"Error analyzing cohort performance: {e}")
             return {}
 
+    def _cohort_performance_from_rows(self, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Per-cohort totals, stage distribution and activation rate from funnel_cohorts rows"""
+        cohort_performance = {}
+        
+        for cohort in rows:
+            cohort_name = cohort['cohort_name']
+            user_id = cohort['user_id']
+            
+            if cohort_name not in cohort_performance:
+                cohort_performance[cohort_name] = {
+                    'total_users': 0,
+                    'active_users': 0,
+                    'is_control': cohort['is_control_group'],
+                    'stage_distribution': {}
+                }
+            
+            cohort_performance[cohort_name]['total_users'] += 1
+            
+            # Check current stage
+            current_stage = cohort['current_stage']
+            stage_dist = cohort_performance[cohort_name]['stage_distribution']
+            stage_dist[current_stage] = stage_dist.get(current_stage, 0) + 1
+            
+            # Check if user is active (reached active_volunteer stage)
+            if current_stage == 'active_volunteer':
+                cohort_performance[cohort_name]['active_users'] += 1
+        
+        # Calculate activation rates
+        for cohort_name in cohort_performance:
+            stats = cohort_performance[cohort_name]
+            if stats['total_users'] > 0:
+                stats['activation_rate'] = round(stats['active_users'] / stats['total_users'] * 100, 2)
+            else:
+                stats['activation_rate'] = 0
+        
+        return cohort_performance
+
 # Convenience functions for easy integration
+_default_tracker: Optional[VolunteerFunnelTracker] = None
+
+def get_default_tracker() -> VolunteerFunnelTracker:
+    """Process-wide tracker, so convenience functions share one ingestion buffer"""
+    global _default_tracker
+    if _default_tracker is None:
+        _default_tracker = VolunteerFunnelTracker(VolunteerDatabase())
+    return _default_tracker
+
+async def close_default_tracker():
+    """Write the events buffered by the convenience functions; run on app shutdown"""
+    global _default_tracker
+    if _default_tracker is not None:
+        await _default_tracker.close()
+        _default_tracker = None
+
+def add_funnel_shutdown_handler(main_app):
+    """Flush buffered funnel events when the main FastAPI app shuts down"""
+    main_app.router.add_event_handler("shutdown", close_default_tracker)
+    return main_app
+
 async def track_user_interest(user_id: str, source: str = "web", metadata: Dict[str, Any] = None):
     """Track when a user expresses interest in volunteering"""
-    from database import VolunteerDatabase
-    
-    db = VolunteerDatabase()
-    tracker = VolunteerFunnelTracker(db)
+    tracker = get_default_tracker()
     
     event = FunnelEvent(
         user_id=user_id,
@@ -620,10 +719,7 @@ async def track_user_interest(user_id: str, source: str = "web", metadata: Dict[
 
 async def track_profile_creation(user_id: str, session_id: str = None):
     """Track when a user creates their profile"""
-    from database import VolunteerDatabase
-    
-    db = VolunteerDatabase()
-    tracker = VolunteerFunnelTracker(db)
+    tracker = get_default_tracker()
     
     event = FunnelEvent(
         user_id=user_id,
@@ -636,10 +732,7 @@ async def track_profile_creation(user_id: str, session_id: str = None):
 
 async def track_volunteer_activation(user_id: str, first_activity: Dict[str, Any] = None):
     """Track when a volunteer becomes active"""
-    from database import VolunteerDatabase
-    
-    db = VolunteerDatabase()
-    tracker = VolunteerFunnelTracker(db)
+    tracker = get_default_tracker()
     
     event = FunnelEvent(
         user_id=user_id,
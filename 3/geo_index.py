@@ -0,0 +1,177 @@
+"""
+Offline geocoding and spatial indexing for proximity matching
+Gazetteer resolves addresses from a local ZIP/neighborhood file; SpatialIndex answers radius and nearest-neighbor queries
+"""
+import csv
+import math
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Tuple, Any, Optional, Iterable
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS_KM = 6371
+
+DEFAULT_GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cincinnati_gazetteer.csv')
+
+# More specific places win when an address mentions several
+KIND_PRECEDENCE = {'zip': 3, 'neighborhood': 2, 'city': 1}
+
+ZIP_PATTERN = re.compile(r'\b(\d{5})(?:-\d{4})?\b')
+
+@dataclass
+class Place:
+    """A named point in the gazetteer"""
+    name: str
+    kind: str
+    lat: float
+    lng: float
+
+class _TrieNode:
+    __slots__ = ('children', 'place')
+
+    def __init__(self):
+        self.children: Dict[str, '_TrieNode'] = {}
+        self.place: Optional[Place] = None
+
+class Gazetteer:
+    """Offline place lookup backed by a character trie of normalized place names"""
+
+    def __init__(self, places: Iterable[Place]):
+        self.places: List[Place] = []
+        self.zip_codes: Dict[str, Place] = {}
+        self._root = _TrieNode()
+        for place in places:
+            self.add_place(place)
+
+    @classmethod
+    def from_csv(cls, path: str = DEFAULT_GAZETTEER_PATH) -> 'Gazetteer':
+        """Load places from a CSV with name, kind, lat, lng columns"""
+        with open(path, newline='', encoding='utf-8') as f:
+            places = [
+                Place(name=row['name'], kind=row['kind'], lat=float(row['lat']), lng=float(row['lng']))
+                for row in csv.DictReader(f)
+            ]
+        return cls(places)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Lowercase and collapse whitespace and punctuation other than . and -"""
+        return ' '.join(re.sub(r"[^a-z0-9.\-]+", ' ', text.lower()).split())
+
+    def add_place(self, place: Place):
+        self.places.append(place)
+        if place.kind == 'zip':
+            self.zip_codes[place.name] = place
+            return
+
+        node = self._root
+        for char in self.normalize(place.name):
+            node = node.children.setdefault(char, _TrieNode())
+        node.place = place
+
+    def resolve(self, address: str) -> Optional[Place]:
+        """Most specific place mentioned in an address, or None"""
+        if not address:
+            return None
+
+        best = None
+        for zip_code in ZIP_PATTERN.findall(address):
+            if zip_code in self.zip_codes:
+                return self.zip_codes[zip_code]
+
+        text = self.normalize(address)
+        # Walk the trie from every word start; keep matches that end on a word boundary
+        for start in range(len(text)):
+            if start and text[start - 1] != ' ':
+                continue
+            node = self._root
+            for end in range(start, len(text)):
+                node = node.children.get(text[end])
+                if node is None:
+                    break
+                if node.place and (end + 1 == len(text) or text[end + 1] == ' '):
+                    candidate = (KIND_PRECEDENCE.get(node.place.kind, 0), end + 1 - start)
+                    if best is None or candidate > best[0]:
+                        best = (candidate, node.place)
+
+        return best[1] if best else None
+
+    def complete(self, prefix: str, limit: int = 10) -> List[Place]:
+        """Places whose name starts with prefix (for address autocomplete)"""
+        node = self._root
+        for char in self.normalize(prefix):
+            node = node.children.get(char)
+            if node is None:
+                return []
+
+        results = []
+        stack = [node]
+        while stack and len(results) < limit:
+            current = stack.pop()
+            if current.place:
+                results.append(current.place)
+            stack.extend(current.children[c] for c in sorted(current.children, reverse=True))
+        return results
+
+class SpatialIndex:
+    """k-d tree over points on the unit sphere.
+
+    Points are stored as 3D unit vectors, so straight-line (chord) distance
+    is monotonic in great-circle distance and radius / k-nearest queries
+    stay logarithmic without projection errors.
+    """
+
+    def __init__(self, ids: List[Any], lats, lngs):
+        self.ids = list(ids)
+        self.lats = np.asarray(lats, dtype=float)
+        self.lngs = np.asarray(lngs, dtype=float)
+        self._tree = cKDTree(self._to_xyz(self.lats, self.lngs)) if self.ids else None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @staticmethod
+    def _to_xyz(lats, lngs) -> np.ndarray:
+        lat_rad = np.radians(np.atleast_1d(lats))
+        lng_rad = np.radians(np.atleast_1d(lngs))
+        cos_lat = np.cos(lat_rad)
+        return np.column_stack((cos_lat * np.cos(lng_rad), cos_lat * np.sin(lng_rad), np.sin(lat_rad)))
+
+    @staticmethod
+    def _chord_to_km(chord):
+        return EARTH_RADIUS_KM * 2 * np.arcsin(np.clip(np.asarray(chord) / 2, 0, 1))
+
+    @staticmethod
+    def _km_to_chord(distance_km: float) -> float:
+        return 2 * math.sin(min(distance_km / EARTH_RADIUS_KM, math.pi) / 2)
+
+    def within_radius(self, lat: float, lng: float, radius_km: float) -> List[Tuple[Any, float]]:
+        """(id, distance_km) for every point within radius_km, nearest first"""
+        if self._tree is None:
+            return []
+        point = self._to_xyz(lat, lng)[0]
+        indices = self._tree.query_ball_point(point, self._km_to_chord(radius_km))
+        if not indices:
+            return []
+        chords = np.linalg.norm(self._tree.data[indices] - point, axis=1)
+        distances = self._chord_to_km(chords)
+        order = np.argsort(distances, kind='stable')
+        return [(self.ids[indices[i]], float(distances[i])) for i in order]
+
+    def nearest(self, lat: float, lng: float, k: int = 5) -> List[Tuple[Any, float]]:
+        """(id, distance_km) for the k nearest points"""
+        if self._tree is None or k <= 0:
+            return []
+        k = min(k, len(self.ids))
+        chords, indices = self._tree.query(self._to_xyz(lat, lng)[0], k=k)
+        chords, indices = np.atleast_1d(chords), np.atleast_1d(indices)
+        distances = self._chord_to_km(chords)
+        return [(self.ids[i], float(d)) for i, d in zip(indices, distances)]
+
+    def count_within(self, lat: float, lng: float, radius_km: float) -> int:
+        if self._tree is None:
+            return 0
+        return len(self._tree.query_ball_point(self._to_xyz(lat, lng)[0], self._km_to_chord(radius_km)))
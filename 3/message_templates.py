@@ -4,13 +4,21 @@ Provides template-based message generation with smart personalization
 """
 import json
 import re
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Iterable, Tuple
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from dataclasses import dataclass
 
 from email_sms_drafting import MessageType, MessageTone, OutreachPurpose, PersonalizationContext
 from contextual_tone_analyzer import CommunicationStyle, EngagementPattern
 
+# A {variable} slot in a template string
+PLACEHOLDER_PATTERN = re.compile(r'\{([^{}]+)\}')
+# Three or more line breaks (with only whitespace between) collapse to one blank line
+BLANK_LINES_PATTERN = re.compile(r'\n\s*\n\s*\n')
+# Rendered lines dropped by post-processing (after stripping whitespace)
+EMPTY_LINE_MARKERS = frozenset(('', '•', '-', '*'))
+
 
 @dataclass
 class TemplateVariable:
@@ -38,12 +46,47 @@ class MessageTemplate:
     created_date: Optional[datetime] = None
 
 
+@dataclass
+class CompiledTemplate:
+    """A template string split once into literal text and variable slots.
+    
+    literals has one more entry than slots: literals[0], slots[0], literals[1], ...
+    Slots without a value render as empty text.
+    """
+    source: str
+    literals: List[str]
+    slots: List[str]
+    
+    @classmethod
+    def compile(cls, template_str: str) -> 'CompiledTemplate':
+        parts = PLACEHOLDER_PATTERN.split(template_str)
+        return cls(source=template_str, literals=parts[0::2], slots=parts[1::2])
+    
+    def render(self, variables: Dict[str, Any]) -> str:
+        parts = [self.literals[0]]
+        for name, literal in zip(self.slots, self.literals[1:]):
+            if name in variables:
+                parts.append(str(variables[name]))
+            parts.append(literal)
+        
+        result = ''.join(parts)
+        if '\n' in result:
+            result = BLANK_LINES_PATTERN.sub('\n\n', result)
+        return result.strip()
+
+
 class MessageTemplateEngine:
     """Engine for managing and processing message templates"""
     
-    def __init__(self):
+    def __init__(self, max_cached_profiles: int = 10000):
         self.templates = self._initialize_templates()
         self.personalization_functions = self._initialize_personalization_functions()
+        # template id -> (compiled subject, compiled content)
+        self._compiled_templates: Dict[str, Tuple[Optional[CompiledTemplate], CompiledTemplate]] = {}
+        # Personalization values per volunteer, keyed by the profile fields they depend on
+        self.max_cached_profiles = max_cached_profiles
+        self._profile_cache: OrderedDict = OrderedDict()
+        self._profile_stats = {'hits': 0, 'misses': 0}
     
     def _initialize_templates(self) -> Dict[str, MessageTemplate]:
         """Initialize the template library"""
@@ -454,18 +497,85 @@ Here to help,
         if not template:
             raise ValueError(f"Template {template_id} not found")
         
+        context_data = context_data or {}
+        return self._render_compiled(
+            template,
+            self.get_compiled_template(template_id),
+            person_context,
+            custom_variables or {},
+            context_data,
+            self._context_variables(context_data)
+        )
+    
+    def render_many(
+        self,
+        template_id: str,
+        person_contexts: Iterable[PersonalizationContext],
+        custom_variables: Optional[Dict[str, str]] = None,
+        context_data: Optional[Dict[str, Any]] = None,
+        per_recipient_variables: Optional[List[Dict[str, str]]] = None
+    ) -> List[Dict[str, str]]:
+        """Render one template for many recipients.
+        
+        The template lookup, compilation and context_data variables are resolved
+        once for the whole batch. per_recipient_variables, if given, is aligned
+        with person_contexts and overrides custom_variables for each recipient.
+        """
+        
+        template = self.get_template(template_id)
+        if not template:
+            raise ValueError(f"Template {template_id} not found")
+        
+        compiled = self.get_compiled_template(template_id)
+        context_data = context_data or {}
+        context_variables = self._context_variables(context_data)
+        custom_variables = custom_variables or {}
+        
+        rendered = []
+        for index, person_context in enumerate(person_contexts):
+            variables = custom_variables
+            if per_recipient_variables is not None:
+                variables = {**custom_variables, **per_recipient_variables[index]}
+            rendered.append(self._render_compiled(
+                template, compiled, person_context, variables, context_data, context_variables
+            ))
+        return rendered
+    
+    def get_compiled_template(self, template_id: str) -> Tuple[Optional[CompiledTemplate], CompiledTemplate]:
+        """(subject, content) compiled templates, cached per template id"""
+        template = self.templates[template_id]
+        cached = self._compiled_templates.get(template_id)
+        # Recompile if the template text was edited since it was cached
+        if (cached is None or cached[1].source != template.content_template or
+                (cached[0].source if cached[0] else None) != template.subject_template):
+            cached = (
+                CompiledTemplate.compile(template.subject_template) if template.subject_template else None,
+                CompiledTemplate.compile(template.content_template)
+            )
+            self._compiled_templates[template_id] = cached
+        return cached
+    
+    def _render_compiled(
+        self,
+        template: MessageTemplate,
+        compiled: Tuple[Optional[CompiledTemplate], CompiledTemplate],
+        person_context: PersonalizationContext,
+        custom_variables: Dict[str, str],
+        context_data: Dict[str, Any],
+        context_variables: Dict[str, str]
+    ) -> Dict[str, str]:
+        subject_template, content_template = compiled
+        
         # Prepare variables
         variables = self._prepare_template_variables(
-            template, person_context, custom_variables or {}, context_data or {}
+            template, person_context, custom_variables, context_data, context_variables
         )
         
         # Render subject (for emails)
-        subject = None
-        if template.subject_template:
-            subject = self._render_template_string(template.subject_template, variables)
+        subject = subject_template.render(variables) if subject_template else None
         
         # Render content
-        content = self._render_template_string(template.content_template, variables)
+        content = content_template.render(variables)
         
         # Apply post-processing
         content = self._apply_post_processing(content, template, person_context)
@@ -474,7 +584,7 @@ Here to help,
             'subject': subject,
             'content': content,
             'variables_used': list(variables.keys()),
-            'template_id': template_id
+            'template_id': template.id
         }
     
     def _prepare_template_variables(
@@ -482,17 +592,38 @@ Here to help,
         template: MessageTemplate,
         person_context: PersonalizationContext,
         custom_variables: Dict[str, str],
-        context_data: Dict[str, Any]
+        context_data: Dict[str, Any],
+        context_variables: Optional[Dict[str, str]] = None
     ) -> Dict[str, str]:
         """Prepare all variables for template rendering"""
         
-        variables = {}
-        
         # Start with defaults from template
-        for var in template.variables:
-            variables[var.name] = var.default_value
+        variables = {var.name: var.default_value for var in template.variables}
+        
+        # Add personalization from the volunteer's profile (name, history, branch, preferences)
+        profile = self._get_personalization_profile(person_context)
+        variables.update(profile['variables'])
+        
+        # Add context-specific variables
+        if context_variables is None:
+            context_variables = self._context_variables(context_data)
+        variables.update(context_variables)
+        
+        # Apply personalization functions
+        variables = self._apply_personalization_functions(
+            variables, template, person_context, context_data, profile
+        )
+        
+        # Override with custom variables
+        variables.update(custom_variables)
+        
+        return variables
+    
+    def _profile_variables(self, person_context: PersonalizationContext) -> Dict[str, str]:
+        """Variables derived from the volunteer's own profile"""
+        
+        variables = {}
         
-        # Add personalization from context
         if person_context.name:
             name_parts = person_context.name.split()
             variables['first_name'] = name_parts[0] if name_parts else 'there'
@@ -525,7 +656,13 @@ Here to help,
             if prefs.get('location_preference'):
                 variables['preferred_location'] = prefs['location_preference']
         
-        # Add context-specific variables
+        return variables
+    
+    def _context_variables(self, context_data: Dict[str, Any]) -> Dict[str, str]:
+        """Variables from the opportunity or event the message is about"""
+        
+        variables = {}
+        
         if context_data.get('opportunity'):
             opp = context_data['opportunity']
             variables['opportunity_name'] = opp.get('project_name', 'Volunteer Opportunity')
@@ -538,37 +675,90 @@ Here to help,
             variables['event_date'] = event.get('date', 'TBD')
             variables['event_location'] = event.get('location', 'YMCA Branch')
         
-        # Apply personalization functions
-        variables = self._apply_personalization_functions(
-            variables, template, person_context, context_data
-        )
-        
-        # Override with custom variables
-        variables.update(custom_variables)
-        
         return variables
     
+    @staticmethod
+    def _personalization_key(person_context: PersonalizationContext) -> Optional[tuple]:
+        """The profile fields personalization values depend on; None if they are not hashable"""
+        history = person_context.volunteer_history or {}
+        prefs = person_context.preferences or {}
+        categories = history.get('top_categories')
+        key = (
+            person_context.name, person_context.age, person_context.is_ymca_member,
+            person_context.member_branch, person_context.engagement_level,
+            bool(person_context.volunteer_history), history.get('total_hours', 0), history.get('sessions', 0),
+            tuple(categories) if categories else None,
+            bool(person_context.preferences), prefs.get('interests'), prefs.get('location_preference')
+        )
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+    
+    def _get_personalization_profile(self, person_context: PersonalizationContext) -> Dict[str, Any]:
+        """Memoized per-volunteer personalization values.
+        
+        Holds the profile variables plus lazily computed phrases (welcome
+        context, impact statistics, enthusiasm per tone). Volunteers with the
+        same profile fields share an entry, so edits to a profile are picked up
+        automatically.
+        """
+        key = self._personalization_key(person_context)
+        profile = self._profile_cache.get(key) if key is not None else None
+        if profile is not None:
+            self._profile_stats['hits'] += 1
+            self._profile_cache.move_to_end(key)
+            return profile
+        
+        self._profile_stats['misses'] += 1
+        profile = {'variables': self._profile_variables(person_context), 'phrases': {}}
+        if key is not None:
+            self._profile_cache[key] = profile
+            while len(self._profile_cache) > self.max_cached_profiles:
+                self._profile_cache.popitem(last=False)
+        return profile
+    
+    def get_personalization_cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counts for memoized personalization values"""
+        lookups = self._profile_stats['hits'] + self._profile_stats['misses']
+        return {
+            **self._profile_stats,
+            'hit_rate': round(self._profile_stats['hits'] / lookups, 3) if lookups else 0,
+            'cached_profiles': len(self._profile_cache),
+            'compiled_templates': len(self._compiled_templates)
+        }
+    
     def _apply_personalization_functions(
         self,
         variables: Dict[str, str],
         template: MessageTemplate,
         person_context: PersonalizationContext,
-        context_data: Dict[str, Any]
+        context_data: Dict[str, Any],
+        profile: Optional[Dict[str, Any]] = None
     ) -> Dict[str, str]:
         """Apply personalization functions based on template rules"""
         
         rules = template.personalization_rules
+        phrases = profile['phrases'] if profile is not None else {}
+        
+        def phrase(name, build):
+            if name not in phrases:
+                phrases[name] = build()
+            return phrases[name]
         
         # Generate enthusiasm phrase
         if 'enthusiasm_phrase' in variables:
-            variables['enthusiasm_phrase'] = self._generate_enthusiasm_phrase(
-                person_context, template.tone
+            variables['enthusiasm_phrase'] = phrase(
+                ('enthusiasm_phrase', template.tone),
+                lambda: self._generate_enthusiasm_phrase(person_context, template.tone)
             )
         
         # Create personalized welcome context
         if 'personalized_welcome_context' in variables:
-            variables['personalized_welcome_context'] = self._create_personalized_welcome(
-                person_context
+            variables['personalized_welcome_context'] = phrase(
+                'personalized_welcome_context',
+                lambda: self._create_personalized_welcome(person_context)
             )
         
         # Generate match reasons for volunteer opportunities
@@ -579,8 +769,9 @@ Here to help,
         
         # Generate impact statistics for appreciation messages
         if 'impact_statistics' in variables and person_context.volunteer_history:
-            variables['impact_statistics'] = self._generate_impact_statistics(
-                person_context.volunteer_history
+            variables['impact_statistics'] = phrase(
+                'impact_statistics',
+                lambda: self._generate_impact_statistics(person_context.volunteer_history)
             )
         
         # Member-specific notes
@@ -594,22 +785,7 @@ Here to help,
     
     def _render_template_string(self, template_str: str, variables: Dict[str, str]) -> str:
         """Render a template string with variable substitution"""
-        
-        result = template_str
-        
-        # Simple variable substitution
-        for var_name, var_value in variables.items():
-            placeholder = f'{{{var_name}}}'
-            result = result.replace(placeholder, str(var_value))
-        
-        # Clean up any remaining placeholders
-        result = re.sub(r'\{[^}]+\}', '', result)
-        
-        # Clean up extra whitespace
-        result = re.sub(r'\n\s*\n\s*\n', '\n\n', result)
-        result = result.strip()
-        
-        return result
+        return CompiledTemplate.compile(template_str).render(variables)
     
     def _apply_post_processing(
         self,
@@ -619,17 +795,10 @@ Here to help,
     ) -> str:
         """Apply post-processing rules to rendered content"""
         
-        # Remove empty sections
-        lines = content.split('\n')
-        cleaned_lines = []
-        
-        for line in lines:
-            # Skip lines that are just bullet points or empty
-            if line.strip() in ['•', '-', '*'] or not line.strip():
-                continue
-            cleaned_lines.append(line)
-        
-        content = '\n'.join(cleaned_lines)
+        # Remove empty sections: skip lines that are just bullet points or empty
+        content = '\n'.join(
+            line for line in content.split('\n') if line.strip() not in EMPTY_LINE_MARKERS
+        )
         
         # Apply message type specific formatting
         if template.message_type == MessageType.SMS:
@@ -637,12 +806,6 @@ Here to help,
             if len(content) > 160:
                 content = content[:155] + "..."
         
-        # Apply tone-specific adjustments
-        if template.tone == MessageTone.ENTHUSIASTIC:
-            # Ensure at least one exclamation mark
-            if '!' not in content:
-                content = content.rstrip('.') + '!'
-        
         return content
     
     # Personalization helper functions
@@ -783,6 +946,34 @@ Here to help,
         
         return '\n'.join(stats) if stats else "• Your dedication and time have made a real difference!"
     
+    def _create_whats_new_section(self, person_context: PersonalizationContext) -> str:
+        """Describe what's new for returning volunteers"""
+        
+        updates = ["• New flexible, one-time volunteer opportunities"]
+        
+        if person_context.member_branch:
+            updates.append(f"• Fresh programs starting at {person_context.member_branch}")
+        
+        if person_context.preferences and person_context.preferences.get('interests'):
+            updates.append(
+                f"• New roles in {person_context.preferences['interests']}"
+            )
+        
+        return '\n'.join(updates)
+    
+    def _format_support_options(self, person_context: PersonalizationContext) -> str:
+        """List support options for volunteers who haven't gotten started"""
+        
+        options = [
+            "• A quick call with a volunteer coordinator",
+            "• Help finding an opportunity that fits your schedule"
+        ]
+        
+        if person_context.member_branch:
+            options.append(f"• Meeting the volunteer team at {person_context.member_branch}")
+        
+        return '\n'.join(options)
+    
     def _format_volunteer_experience(self, history: Dict[str, Any]) -> str:
         """Format volunteer experience description"""
         
@@ -0,0 +1,321 @@
+"""
+Durable notification outbox
+Notifications are written to an outbox table in bulk, claimed in batches, coalesced per recipient and
+delivered by rate-limited per-channel workers; delivery status is written back in bulk
+"""
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import time
+import uuid
+
+from rate_limiting import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_TABLE = 'notification_outbox'
+
+# Separates the notifications merged into one coalesced message
+DIGEST_SEPARATOR = "\n\n" + "-" * 40 + "\n\n"
+
+@dataclass
+class ChannelPolicy:
+    """How a channel is delivered: provider rate limit, worker count and in-run retries"""
+    rate_per_second: float
+    workers: int
+    max_attempts: int = 3
+    retry_backoff_seconds: float = 0.5
+
+DEFAULT_CHANNEL_POLICIES = {
+    'email': ChannelPolicy(rate_per_second=500.0, workers=20),
+    'sms': ChannelPolicy(rate_per_second=30.0, workers=5),
+    'in_app': ChannelPolicy(rate_per_second=1000.0, workers=10),
+}
+
+@dataclass
+class OutboxMessage:
+    """One delivery to one recipient on one channel, covering one or more outbox rows"""
+    channel: str
+    recipient: str
+    user_id: str
+    notification_type: str
+    subject: str
+    body: str
+    rows: List[Dict[str, Any]] = field(default_factory=list)
+
+def coalesce(rows: Iterable[Dict[str, Any]]) -> List[OutboxMessage]:
+    """Merge rows for the same (channel, recipient) into one message, oldest first"""
+    grouped: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+    for row in rows:
+        grouped.setdefault((row['channel'], row['recipient']), []).append(row)
+
+    messages = []
+    for (channel, recipient), group in grouped.items():
+        if len(group) == 1:
+            row = group[0]
+            subject, body, notification_type = row['subject'], row['body'], row['notification_type']
+        else:
+            subject = f"You have {len(group)} updates from the YMCA"
+            body = DIGEST_SEPARATOR.join(f"{row['subject']}\n{row['body'].strip()}" for row in group)
+            notification_type = 'digest'
+        messages.append(OutboxMessage(channel, recipient, group[0]['user_id'], notification_type,
+                                      subject, body, group))
+    return messages
+
+class NotificationOutbox:
+    """Bulk-written notification queue with concurrent, rate-limited delivery.
+
+    `senders` maps a channel to `async send(message: OutboxMessage) -> bool`.
+    A dispatch claims due rows (pending -> sending), coalesces them per
+    recipient, delivers each channel through `workers` workers sharing a
+    token bucket, then writes sent/failed status back with one update per
+    outcome. A delivery that still fails after the channel's in-run retries
+    is re-queued with backoff, up to `max_dispatches` times. Claims older
+    than `stale_claim_seconds` (a crashed dispatcher) are released.
+
+    `on_delivered(rows)` is awaited once per dispatch with every delivered row.
+    """
+
+    def __init__(self, db, senders: Dict[str, Callable[[OutboxMessage], Awaitable[bool]]],
+                 policies: Optional[Dict[str, ChannelPolicy]] = None,
+                 on_delivered: Optional[Callable[[List[Dict[str, Any]]], Awaitable[Any]]] = None,
+                 page_size: int = 1000, write_batch_size: int = 500, max_dispatches: int = 5,
+                 requeue_delay_seconds: float = 300, stale_claim_seconds: float = 600):
+        self.db = db
+        self.senders = senders
+        self.policies = {**DEFAULT_CHANNEL_POLICIES, **(policies or {})}
+        self.on_delivered = on_delivered
+        self.page_size = page_size
+        self.write_batch_size = write_batch_size
+        self.max_dispatches = max_dispatches
+        self.requeue_delay_seconds = requeue_delay_seconds
+        self.stale_claim_seconds = stale_claim_seconds
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._delivery_latencies_ms = deque(maxlen=1000)
+        self._stats = {
+            'enqueued': 0,
+            'dispatches': 0,
+            'delivered': 0,
+            'coalesced': 0,
+            'retries': 0,
+            'requeued': 0,
+            'failed': 0,
+        }
+
+    async def enqueue(self, notifications: List[Dict[str, Any]]) -> List[str]:
+        """Write notifications to the outbox in bulk; returns the ids of the rows queued.
+
+        Each notification needs channel, recipient, user_id, notification_type,
+        subject and body; id, course_id, enrollment_id and dedupe_key are optional.
+        A notification whose dedupe_key is already pending, sending or sent is
+        skipped and its id is not returned. If the earlier row failed for good,
+        it is replaced by the new one.
+        """
+        now = datetime.now().isoformat()
+        rows = [{
+            'id': str(uuid.uuid4()),
+            'status': 'pending',
+            'attempts': 0,
+            'next_attempt_at': now,
+            'created_at': now,
+            'course_id': None,
+            'enrollment_id': None,
+            'dedupe_key': None,
+            **notification,
+        } for notification in notifications]
+
+        queued_ids: List[str] = []
+        for offset in range(0, len(rows), self.write_batch_size):
+            batch = rows[offset:offset + self.write_batch_size]
+            queued_ids.extend(await asyncio.to_thread(self._write_batch, batch))
+        self._stats['enqueued'] += len(queued_ids)
+        return queued_ids
+
+    def _write_batch(self, batch: List[Dict[str, Any]]) -> List[str]:
+        """Insert one batch, skipping known dedupe keys; returns the ids of the rows written"""
+        table = self.db.supabase.table
+        result = table(OUTBOX_TABLE).upsert(batch, on_conflict='dedupe_key', ignore_duplicates=True).execute()
+        written = {row['id'] for row in result.data or []}
+
+        skipped = {row['dedupe_key']: row for row in batch if row['dedupe_key'] and row['id'] not in written}
+        if skipped:
+            # A dedupe key that failed for good is replaced by the new row instead of blocking it
+            cleared = table(OUTBOX_TABLE).delete()\
+                .in_('dedupe_key', list(skipped))\
+                .eq('status', 'failed')\
+                .execute()
+            retries = [skipped[row['dedupe_key']] for row in cleared.data or []]
+            if retries:
+                result = table(OUTBOX_TABLE)\
+                    .upsert(retries, on_conflict='dedupe_key', ignore_duplicates=True)\
+                    .execute()
+                written.update(row['id'] for row in result.data or [])
+        return [row['id'] for row in batch if row['id'] in written]
+
+    async def dispatch_pending(self, ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Deliver every due notification, or just the given outbox rows"""
+        start = time.perf_counter()
+        await asyncio.to_thread(self._release_stale_claims)
+        rows = await asyncio.to_thread(self._claim_due, ids)
+        messages = coalesce(rows)
+
+        outcomes: List[Tuple[OutboxMessage, bool, Optional[str]]] = []
+        by_channel: Dict[str, List[OutboxMessage]] = {}
+        for message in messages:
+            by_channel.setdefault(message.channel, []).append(message)
+        await asyncio.gather(*(self._deliver_channel(channel, channel_messages, outcomes)
+                               for channel, channel_messages in by_channel.items()))
+
+        delivered = [row for message, success, _ in outcomes if success for row in message.rows]
+        failed = [(row, error) for message, success, error in outcomes if not success for row in message.rows]
+        await asyncio.to_thread(self._write_status, delivered, failed)
+        if delivered and self.on_delivered:
+            try:
+                await self.on_delivered(delivered)
+            except Exception as e:
+                logger.error(f"❌ Error recording delivered notifications: {e}")
+
+        requeued = sum(1 for row, _ in failed if row['attempts'] + 1 < self.max_dispatches)
+        self._stats['dispatches'] += 1
+        self._stats['delivered'] += len(delivered)
+        self._stats['coalesced'] += len(rows) - len(messages)
+        self._stats['requeued'] += requeued
+        self._stats['failed'] += len(failed) - requeued
+
+        elapsed = time.perf_counter() - start
+        if rows:
+            logger.info(f"📬 Dispatched {len(rows)} notifications as {len(messages)} messages: "
+                        f"{len(delivered)} delivered, {len(failed)} failed in {elapsed:.2f}s")
+        return {
+            'success': True,
+            'claimed': len(rows),
+            'messages': len(messages),
+            'delivered': len(delivered),
+            'requeued': requeued,
+            'failed': len(failed) - requeued,
+            'sent_ids': [row['id'] for row in delivered],
+            'elapsed_seconds': round(elapsed, 3),
+        }
+
+    async def _deliver_channel(self, channel: str, messages: List[OutboxMessage],
+                               outcomes: List[Tuple[OutboxMessage, bool, Optional[str]]]):
+        send = self.senders.get(channel)
+        if send is None:
+            outcomes.extend((message, False, f'No sender for channel {channel}') for message in messages)
+            return
+
+        policy = self.policies.get(channel) or ChannelPolicy(rate_per_second=10.0, workers=1)
+        bucket = self._bucket(channel, policy)
+        queue: asyncio.Queue = asyncio.Queue()
+        for message in messages:
+            queue.put_nowait(message)
+
+        async def worker():
+            while not queue.empty():
+                message = queue.get_nowait()
+                success, error = await self._deliver(send, bucket, policy, message)
+                outcomes.append((message, success, error))
+
+        await asyncio.gather(*(worker() for _ in range(min(policy.workers, len(messages)))))
+
+    async def _deliver(self, send, bucket: TokenBucket, policy: ChannelPolicy,
+                       message: OutboxMessage) -> Tuple[bool, Optional[str]]:
+        """Send one message, retrying failures with exponential backoff"""
+        error = None
+        for attempt in range(policy.max_attempts):
+            if attempt:
+                self._stats['retries'] += 1
+                await asyncio.sleep(policy.retry_backoff_seconds * (2 ** (attempt - 1)))
+            await bucket.acquire()
+            started = time.perf_counter()
+            try:
+                if await send(message):
+                    return True, None
+                error = 'Provider rejected the message'
+            except Exception as e:
+                error = str(e)
+            finally:
+                self._delivery_latencies_ms.append((time.perf_counter() - started) * 1000)
+        logger.warning(f"⚠️ {message.channel} notification to {message.recipient} failed: {error}")
+        return False, error
+
+    def _bucket(self, channel: str, policy: ChannelPolicy) -> TokenBucket:
+        if channel not in self._buckets:
+            self._buckets[channel] = TokenBucket(policy.rate_per_second)
+        return self._buckets[channel]
+
+    def _release_stale_claims(self):
+        cutoff = (datetime.now() - timedelta(seconds=self.stale_claim_seconds)).isoformat()
+        self.db.supabase.table(OUTBOX_TABLE)\
+            .update({'status': 'pending'})\
+            .eq('status', 'sending')\
+            .lt('claimed_at', cutoff)\
+            .execute()
+
+    def _claim_due(self, ids: Optional[List[str]]) -> List[Dict[str, Any]]:
+        """Load due pending rows, then mark them sending; only rows this call claimed are returned"""
+        due: Dict[str, Dict[str, Any]] = {}
+        offset = 0
+        while True:
+            query = self.db.supabase.table(OUTBOX_TABLE)\
+                .select('*')\
+                .eq('status', 'pending')\
+                .lte('next_attempt_at', datetime.now().isoformat())
+            if ids is not None:
+                query = query.in_('id', ids)
+            # Rows enqueued in one batch share created_at; id keeps the page order stable
+            rows = query.order('created_at').order('id')\
+                .range(offset, offset + self.page_size - 1).execute().data or []
+            # Rows enqueued while paging shift later pages, so a row can be read twice
+            for row in rows:
+                due.setdefault(row['id'], row)
+            if len(rows) < self.page_size:
+                break
+            offset += self.page_size
+
+        due_ids = list(due)
+        claimed_ids = set()
+        claimed_at = datetime.now().isoformat()
+        for offset in range(0, len(due_ids), self.write_batch_size):
+            batch = due_ids[offset:offset + self.write_batch_size]
+            result = self.db.supabase.table(OUTBOX_TABLE)\
+                .update({'status': 'sending', 'claimed_at': claimed_at})\
+                .in_('id', batch)\
+                .eq('status', 'pending')\
+                .execute()
+            claimed_ids.update(row['id'] for row in result.data or [])
+        return [row for row in due.values() if row['id'] in claimed_ids]
+
+    def _write_status(self, delivered: List[Dict[str, Any]], failed: List[Tuple[Dict[str, Any], Optional[str]]]):
+        """One update per batch of delivered rows and per (attempts, error) group of failed rows"""
+        now = datetime.now()
+        table = self.db.supabase.table
+        for offset in range(0, len(delivered), self.write_batch_size):
+            batch = [row['id'] for row in delivered[offset:offset + self.write_batch_size]]
+            table(OUTBOX_TABLE).update({'status': 'sent', 'sent_at': now.isoformat()}).in_('id', batch).execute()
+
+        groups: Dict[Tuple[int, Optional[str]], List[str]] = {}
+        for row, error in failed:
+            groups.setdefault((row['attempts'] + 1, error), []).append(row['id'])
+        for (attempts, error), row_ids in groups.items():
+            if attempts < self.max_dispatches:
+                retry_at = now + timedelta(seconds=self.requeue_delay_seconds * (2 ** (attempts - 1)))
+                changes = {'status': 'pending', 'next_attempt_at': retry_at.isoformat()}
+            else:
+                changes = {'status': 'failed'}
+            changes.update({'attempts': attempts, 'last_error': (error or '')[:500]})
+            for offset in range(0, len(row_ids), self.write_batch_size):
+                table(OUTBOX_TABLE).update(changes).in_('id', row_ids[offset:offset + self.write_batch_size]).execute()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Cumulative delivery counters and provider latency"""
+        latencies = sorted(self._delivery_latencies_ms)
+        return {
+            **self._stats,
+            'channel_rate_limits': {channel: policy.rate_per_second for channel, policy in self.policies.items()},
+            'avg_delivery_ms': sum(latencies) / len(latencies) if latencies else None,
+            'p95_delivery_ms': latencies[int(0.95 * (len(latencies) - 1))] if latencies else None,
+        }
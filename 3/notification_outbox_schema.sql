@@ -0,0 +1,34 @@
+-- Durable notification outbox
+-- Written in bulk by NotificationService and drained by NotificationOutbox (notification_outbox.py)
+
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id UUID PRIMARY KEY,
+    user_id UUID NOT NULL,
+    course_id UUID,
+    enrollment_id UUID,
+    channel VARCHAR(20) NOT NULL,           -- email, sms, in_app
+    recipient TEXT NOT NULL,                -- email address, phone number or user id
+    notification_type VARCHAR(50) NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    dedupe_key TEXT UNIQUE,                 -- NULL for notifications that may repeat
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',  -- pending, sending, sent, failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    next_attempt_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    claimed_at TIMESTAMP WITH TIME ZONE,
+    sent_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+-- Dispatch reads due pending rows oldest first
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_due
+    ON notification_outbox (next_attempt_at, created_at)
+    WHERE status = 'pending';
+
+-- Stale claims from an interrupted dispatcher
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_claimed
+    ON notification_outbox (claimed_at)
+    WHERE status = 'sending';
+
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_user ON notification_outbox (user_id, created_at);
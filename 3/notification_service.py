@@ -5,6 +5,7 @@ Handles email notifications, SMS alerts, and in-app notifications
 
 import asyncio
 import logging
+import uuid
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 from database import VolunteerDatabase
@@ -13,9 +14,16 @@ from email.mime.text import MimeText
 from email.mime.multipart import MimeMultipart
 import smtplib
 from dataclasses import dataclass
+from notification_outbox import NotificationOutbox, OutboxMessage
 
 logger = logging.getLogger(__name__)
 
+# Delivered emails of these types mark the enrollment's notification as sent
+ENROLLMENT_NOTIFICATION_TYPES = {'enrollment_confirmed', 'auto_enrolled'}
+
+# Delivered notifications of these types are not tracked as analytics events
+UNTRACKED_NOTIFICATION_TYPES = {'course_reminder'}
+
 @dataclass
 class NotificationTemplate:
     subject: str
@@ -33,6 +41,14 @@ class NotificationService:
         self.smtp_username = None  # Set from environment variables
         self.smtp_password = None  # Set from environment variables
         self.from_email = "noreply@ymca.org"  # Configure your from email
+        self.sms_enabled = False  # Also queue an SMS copy for users with a phone number
+        
+        # Every notification goes through the outbox; deliveries are recorded in bulk
+        self.outbox = NotificationOutbox(db, {
+            'email': self._deliver_email,
+            'sms': self._deliver_sms,
+            'in_app': self._deliver_in_app,
+        }, on_delivered=self._record_deliveries)
     
     def _load_notification_templates(self) -> Dict[str, NotificationTemplate]:
         """Load notification templates"""
@@ -203,17 +219,12 @@ This is an automated message. Please do not reply to this email.
             # Prepare template variables
             variables = self._prepare_course_variables(user, course, enrollment)
             
-            # Send notification
-            success = await self._send_notification(
-                user, template, variables, 'enrollment_confirmed'
+            # Send notification; delivery marks the enrollment notified
+            return await self._send_notification(
+                user, template, variables, 'enrollment_confirmed', course['id'], enrollment['id'],
+                dedupe=True
             )
             
-            if success:
-                await self.db.mark_notification_sent(enrollment['id'])
-                await self._log_notification('enrollment_confirmed', user['id'], course['id'])
-            
-            return success
-            
         except Exception as e:
             logger.error(f"❌ Error sending enrollment confirmation: {e}")
             return False
@@ -232,15 +243,10 @@ This is an automated message. Please do not reply to this email.
             })
             
             # Send notification
-            success = await self._send_notification(
-                user, template, variables, 'waitlisted'
+            return await self._send_notification(
+                user, template, variables, 'waitlisted', course['id'], enrollment.get('id')
             )
             
-            if success:
-                await self._log_notification('waitlisted', user['id'], course['id'])
-            
-            return success
-            
         except Exception as e:
             logger.error(f"❌ Error sending waitlist notification: {e}")
             return False
@@ -254,17 +260,11 @@ This is an automated message. Please do not reply to this email.
             # Prepare template variables
             variables = self._prepare_course_variables(user, course, enrollment)
             
-            # Send notification
-            success = await self._send_notification(
-                user, template, variables, 'auto_enrolled'
+            # Send notification; delivery marks the enrollment notified
+            return await self._send_notification(
+                user, template, variables, 'auto_enrolled', course['id'], enrollment['id']
             )
             
-            if success:
-                await self.db.mark_notification_sent(enrollment['id'])
-                await self._log_notification('auto_enrolled', user['id'], course['id'])
-            
-            return success
-            
         except Exception as e:
             logger.error(f"❌ Error sending auto-enrollment notification: {e}")
             return False
@@ -287,15 +287,10 @@ This is an automated message. Please do not reply to this email.
             })
             
             # Send notification
-            success = await self._send_notification(
-                user, template, variables, 'waitlist_position_updated'
+            return await self._send_notification(
+                user, template, variables, 'waitlist_position_updated', course['id']
             )
             
-            if success:
-                await self._log_notification('waitlist_position_updated', user['id'], course['id'])
-            
-            return success
-            
         except Exception as e:
             logger.error(f"❌ Error sending position update notification: {e}")
             return False
@@ -313,25 +308,39 @@ This is an automated message. Please do not reply to this email.
                 .eq('status', 'open')\
                 .execute()
             
-            reminder_count = 0
-            for course in courses_starting.data or []:
-                # Get enrolled students
-                enrollments = self.db.supabase.table('course_enrollments')\
-                    .select('*, users(*)')\
-                    .eq('course_id', course['id'])\
-                    .eq('enrollment_status', 'enrolled')\
-                    .execute()
-                
-                for enrollment in enrollments.data or []:
-                    user = enrollment['users']
-                    success = await self._send_course_reminder(user, course, enrollment)
-                    if success:
-                        reminder_count += 1
+            courses = {course['id']: course for course in courses_starting.data or []}
+            
+            # Enrolled students of every course in one paged query
+            enrollments = await asyncio.to_thread(self._load_enrollments, list(courses), 'enrolled')
+            
+            template = self.templates['course_reminder']
+            notifications = []
+            for enrollment in enrollments:
+                course = courses[enrollment['course_id']]
+                if not enrollment.get('users'):
+                    continue
+                variables = self._prepare_course_variables(enrollment['users'], course, enrollment)
+                notifications.extend(self._build_notifications(
+                    enrollment['users'], template, variables, 'course_reminder', course['id'], enrollment['id'],
+                    dedupe_key=f"course_reminder:{enrollment['id']}:{course.get('start_date')}"
+                ))
+            
+            # Queued in bulk; delivered with anything else due, coalesced per user
+            await self.outbox.enqueue(notifications)
+            dispatch = await self.outbox.dispatch_pending()
+            
+            # Reminders already queued by an earlier run were skipped and keep their own ids
+            sent_ids = set(dispatch['sent_ids'])
+            reminder_count = sum(
+                1 for notification in notifications
+                if notification['channel'] == 'email' and notification['id'] in sent_ids
+            )
             
             return {
                 'success': True,
-                'courses_processed': len(courses_starting.data or []),
-                'reminders_sent': reminder_count
+                'courses_processed': len(courses),
+                'reminders_sent': reminder_count,
+                'dispatch': {key: value for key, value in dispatch.items() if key != 'sent_ids'}
             }
             
         except Exception as e:
@@ -344,14 +353,25 @@ This is an automated message. Please do not reply to this email.
             # Get users who need enrollment notifications
             pending_enrollments = await self.db.get_users_needing_notification(None)
             
-            notification_count = 0
+            template = self.templates['enrollment_confirmation']
+            notifications = []
             for enrollment in pending_enrollments:
                 user = enrollment['users']
                 course = enrollment['courses']
-                
-                success = await self.send_enrollment_confirmation(user, course, enrollment)
-                if success:
-                    notification_count += 1
+                variables = self._prepare_course_variables(user, course, enrollment)
+                notifications.extend(self._build_notifications(
+                    user, template, variables, 'enrollment_confirmed', course['id'], enrollment['id'], dedupe=True
+                ))
+            
+            # Queue the confirmations in bulk, then drain the whole outbox (retries included)
+            await self.outbox.enqueue(notifications)
+            dispatch = await self.outbox.dispatch_pending()
+            
+            sent_ids = set(dispatch['sent_ids'])
+            notification_count = sum(
+                1 for notification in notifications
+                if notification['channel'] == 'email' and notification['id'] in sent_ids
+            )
             
             return {
                 'success': True,
@@ -408,31 +428,117 @@ This is an automated message. Please do not reply to this email.
         }
         return priority_map.get(priority, "Standard Priority")
     
+    def _build_notifications(self, user: Dict, template: NotificationTemplate, variables: Dict[str, str],
+                             notification_type: str, course_id: Optional[str] = None,
+                             enrollment_id: Optional[str] = None, dedupe: bool = False,
+                             dedupe_key: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Outbox rows for one notification: email, in-app and (if enabled) SMS.
+
+        `dedupe=True` keys the rows by type and enrollment, so re-queuing the
+        same notification is a no-op unless its earlier delivery failed for good.
+        Each row carries its own id, which the outbox returns if it queues the row.
+        """
+        subject = template.subject.format(**variables)
+        body = template.template.format(**variables)
+        if dedupe and enrollment_id:
+            dedupe_key = f"{notification_type}:{enrollment_id}"
+        
+        channels = [('email', user['email'], body), ('in_app', user['id'], body)]
+        if self.sms_enabled and user.get('phone'):
+            channels.append(('sms', user['phone'], subject))
+        
+        return [{
+            'id': str(uuid.uuid4()),
+            'channel': channel,
+            'recipient': recipient,
+            'user_id': user['id'],
+            'course_id': course_id,
+            'enrollment_id': enrollment_id,
+            'notification_type': notification_type,
+            'subject': subject,
+            'body': channel_body,
+            'dedupe_key': f"{dedupe_key}:{channel}" if dedupe_key else None,
+        } for channel, recipient, channel_body in channels]
+    
     async def _send_notification(self, user: Dict, template: NotificationTemplate, 
-                               variables: Dict[str, str], notification_type: str) -> bool:
-        """Send notification using multiple channels"""
+                               variables: Dict[str, str], notification_type: str,
+                               course_id: Optional[str] = None, enrollment_id: Optional[str] = None,
+                               dedupe: bool = False) -> bool:
+        """Queue a notification on every channel and deliver it right away"""
         try:
-            # Format template
-            subject = template.subject.format(**variables)
-            body = template.template.format(**variables)
-            
-            # Send email notification
-            email_success = await self._send_email(user['email'], subject, body)
-            
-            # Send SMS notification if phone number available (placeholder)
-            sms_success = True  # await self._send_sms(user.get('phone'), subject)
-            
-            # Create in-app notification (placeholder)
-            inapp_success = await self._create_in_app_notification(
-                user['id'], notification_type, subject, body
+            notifications = self._build_notifications(
+                user, template, variables, notification_type, course_id, enrollment_id, dedupe
             )
+            queued_ids = await self.outbox.enqueue(notifications)
+            email_id = notifications[0]['id']
+            if email_id not in queued_ids:
+                # Deduplicated: the same notification is already queued or sent
+                logger.info(f"📭 {notification_type} for enrollment {enrollment_id} already in the outbox")
+                return True
+            dispatch = await self.outbox.dispatch_pending(ids=queued_ids)
             
-            return email_success  # At minimum, email should succeed
+            # At minimum, email should succeed; failures stay queued for retry
+            return email_id in dispatch['sent_ids']
             
         except Exception as e:
             logger.error(f"❌ Error sending notification: {e}")
             return False
     
+    # Outbox channel senders
+    
+    async def _deliver_email(self, message: OutboxMessage) -> bool:
+        return await self._send_email(message.recipient, message.subject, message.body)
+    
+    async def _deliver_sms(self, message: OutboxMessage) -> bool:
+        return await self._send_sms(message.recipient, message.body)
+    
+    async def _deliver_in_app(self, message: OutboxMessage) -> bool:
+        return await self._create_in_app_notification(
+            message.user_id, message.notification_type, message.subject, message.body
+        )
+    
+    async def _record_deliveries(self, rows: List[Dict[str, Any]]):
+        """Mark enrollments notified and track analytics for delivered emails, in bulk"""
+        emails = [row for row in rows if row['channel'] == 'email']
+        
+        enrollment_ids = list({
+            row['enrollment_id'] for row in emails
+            if row['notification_type'] in ENROLLMENT_NOTIFICATION_TYPES and row.get('enrollment_id')
+        })
+        if enrollment_ids:
+            await asyncio.to_thread(
+                lambda: self.db.supabase.table('course_enrollments')
+                .update({'notification_sent': True})
+                .in_('id', enrollment_ids)
+                .execute()
+            )
+        
+        await asyncio.gather(*(
+            self._log_notification(row['notification_type'], row['user_id'], row.get('course_id'))
+            for row in emails if row['notification_type'] not in UNTRACKED_NOTIFICATION_TYPES
+        ))
+    
+    def _load_enrollments(self, course_ids: List[str], status: str, page_size: int = 1000) -> List[Dict[str, Any]]:
+        """Enrollments with a status across many courses, with user rows embedded"""
+        enrollments: List[Dict[str, Any]] = []
+        if not course_ids:
+            return enrollments
+        
+        offset = 0
+        while True:
+            rows = self.db.supabase.table('course_enrollments')\
+                .select('*, users(*)')\
+                .in_('course_id', course_ids)\
+                .eq('enrollment_status', status)\
+                .order('id')\
+                .range(offset, offset + page_size - 1)\
+                .execute().data or []
+            enrollments.extend(rows)
+            if len(rows) < page_size:
+                break
+            offset += page_size
+        return enrollments
+    
     async def _send_email(self, to_email: str, subject: str, body: str) -> bool:
         """Send email notification"""
         try:
@@ -538,23 +644,31 @@ class NotificationBackgroundService:
         self.notification_service = notification_service
         self.running = False
         self.check_interval = 600  # 10 minutes
+        self.dispatch_interval = 30  # Outbox retries and anything queued without an immediate send
     
     async def start(self):
         """Start the background notification service"""
         self.running = True
         logger.info("📧 Starting notification background service")
+        last_check = None
+        last_reminder_date = None
         
         while self.running:
             try:
-                # Process pending notifications
-                await self.notification_service.process_pending_notifications()
+                # Queue confirmations for pending enrollments (drains the outbox too)
+                if last_check is None or (datetime.now() - last_check).total_seconds() >= self.check_interval:
+                    await self.notification_service.process_pending_notifications()
+                    last_check = datetime.now()
+                else:
+                    await self.notification_service.outbox.dispatch_pending()
                 
                 # Check for course reminders (daily at 9 AM)
                 current_time = datetime.now()
-                if current_time.hour == 9 and current_time.minute < 10:
+                if current_time.hour == 9 and current_time.minute < 10 and last_reminder_date != current_time.date():
                     await self.notification_service.send_course_reminders(1)  # 1 day before
+                    last_reminder_date = current_time.date()
                 
-                await asyncio.sleep(self.check_interval)
+                await asyncio.sleep(self.dispatch_interval)
                 
             except Exception as e:
                 logger.error(f"❌ Error in notification background service: {e}")
@@ -72,6 +72,13 @@ class NotionClient:
 
         return all_pages
 
+    async def get_pages_edited_since(self, database_id: str, since: datetime) -> List[Dict[str, Any]]:
+        """Get every page created or edited on or after `since` (a UTC time)"""
+        return await self.get_database_pages(database_id, filter_conditions={
+            "timestamp": "last_edited_time",
+            "last_edited_time": {"on_or_after": since.strftime('%Y-%m-%dT%H:%M:%S.000Z')}
+        })
+
     async def create_page(self, database_id: str, properties: Dict[str, Any],
                          children: Optional[List[Dict]] = None) -> Dict[str, Any]:
         """Create a new page in a Notion database"""
@@ -4,9 +4,10 @@ Implements masking of sensitive fields for unauthorized views
 """
 import re
 import json
-from typing import Dict, Any, List, Optional, Set
+import time
+from typing import Dict, Any, List, Optional, Set, Union
 from enum import Enum
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 import hashlib
 
@@ -61,12 +62,51 @@ class UserContext:
             self.branch_access = set()
 
 
+# Field actions stored in a mask plan's key lookup (masked fields map to their PIIField)
+FIELD_VISIBLE = "visible"
+FIELD_SCAN_TEXT = "scan_text"
+
+# Most distinct keys a mask plan remembers; dicts keyed by data (e.g. ids) would grow it without bound
+MAX_KEY_LOOKUP_SIZE = 4096
+
+# Order in which detection patterns are tried by the combined text scanner
+TEXT_SCAN_PRECEDENCE = [
+    PIIFieldType.EMAIL,
+    PIIFieldType.SSN,
+    PIIFieldType.CREDIT_CARD,
+    PIIFieldType.PHONE,
+    PIIFieldType.ZIP_CODE,
+]
+
+
+@dataclass
+class PIIMaskPlan:
+    """Masking decisions precomputed once for a viewer permission level"""
+    permission_level: ViewPermissionLevel
+    masked_fields: Dict[str, PIIField]
+    visible_fields: Set[str]
+    text_scanner: Optional[re.Pattern] = None
+    text_mask_fields: Dict[str, PIIField] = field(default_factory=dict)
+    key_lookup: Dict[str, Union[str, PIIField]] = field(default_factory=dict)
+
+
+@dataclass
+class RedactionPlan:
+    """Redaction steps for one dict shape (its key tuple) at one permission level"""
+    permission_level: ViewPermissionLevel
+    keys: tuple
+    mask_fields: tuple = ()   # (key, PIIField) pairs to mask
+    scan_fields: tuple = ()   # keys whose string values need free-text scanning
+
+
 class PIIRedactionEngine:
     """Main engine for PII detection and masking"""
     
     def __init__(self):
         self.pii_fields = self._initialize_pii_fields()
         self.field_patterns = self._compile_detection_patterns()
+        self._mask_plans: Dict[ViewPermissionLevel, PIIMaskPlan] = {}
+        self.mask_plan_version = 0
     
     def _initialize_pii_fields(self) -> Dict[str, PIIField]:
         """Initialize PII field configurations"""
@@ -115,6 +155,69 @@ class PIIRedactionEngine:
     def register_pii_field(self, field: PIIField) -> None:
         """Register a new PII field configuration"""
         self.pii_fields[field.field_name] = field
+        self.invalidate_mask_plans()
+    
+    def invalidate_mask_plans(self) -> None:
+        """Drop cached mask plans (call after changing fields or detection patterns)"""
+        self._mask_plans = {}
+        self.mask_plan_version += 1
+    
+    def get_mask_plan(self, user_context: UserContext) -> PIIMaskPlan:
+        """Get the precomputed mask plan for the user's permission level"""
+        plan = self._mask_plans.get(user_context.permission_level)
+        if plan is None:
+            plan = self._build_mask_plan(user_context)
+            self._mask_plans[user_context.permission_level] = plan
+        return plan
+    
+    def _build_mask_plan(self, user_context: UserContext) -> PIIMaskPlan:
+        """Resolve every permission check for a viewer up front"""
+        masked_fields = {
+            name: pii_field for name, pii_field in self.pii_fields.items()
+            if not self._has_permission(user_context, pii_field.required_permission)
+        }
+        visible_fields = {name for name in self.pii_fields if name not in masked_fields}
+        
+        # Only scan free text for PII types this viewer is not allowed to see
+        hidden_types = [
+            pii_type for pii_type in self.field_patterns
+            if not self._has_permission(user_context, self._get_required_permission_for_type(pii_type))
+        ]
+        hidden_types.sort(key=lambda t: TEXT_SCAN_PRECEDENCE.index(t) if t in TEXT_SCAN_PRECEDENCE else len(TEXT_SCAN_PRECEDENCE))
+        
+        text_scanner = None
+        text_mask_fields = {}
+        if hidden_types:
+            text_scanner = re.compile('|'.join(
+                f'(?P<{pii_type.value}>{self.field_patterns[pii_type].pattern})' for pii_type in hidden_types
+            ))
+            text_mask_fields = {
+                pii_type.value: PIIField("temp", pii_type, self._get_required_permission_for_type(pii_type))
+                for pii_type in hidden_types
+            }
+        
+        return PIIMaskPlan(
+            permission_level=user_context.permission_level,
+            masked_fields=masked_fields,
+            visible_fields=visible_fields,
+            text_scanner=text_scanner,
+            text_mask_fields=text_mask_fields
+        )
+    
+    def _resolve_field_action(self, plan: PIIMaskPlan, key: str) -> Union[str, PIIField]:
+        """Look up what to do with a key, lower-casing each distinct key only once"""
+        action = plan.key_lookup.get(key)
+        if action is None:
+            name = key.lower()
+            if name in plan.masked_fields:
+                action = plan.masked_fields[name]
+            elif name in plan.visible_fields:
+                action = FIELD_VISIBLE
+            else:
+                action = FIELD_SCAN_TEXT
+            if len(plan.key_lookup) < MAX_KEY_LOOKUP_SIZE:
+                plan.key_lookup[key] = action
+        return action
     
     def _mask_value(self, value: Any, pii_field: PIIField) -> str:
         """Apply masking to a specific value"""
@@ -161,27 +264,17 @@ class PIIRedactionEngine:
     
     def _mask_text_content(self, text: str, user_context: UserContext) -> str:
         """Mask PII content found in text fields"""
-        if not text or not isinstance(text, str):
-            return text
-            
-        detected_pii = self._detect_pii_in_text(text)
-        if not detected_pii:
+        return self._scan_text(text, self.get_mask_plan(user_context))
+    
+    def _scan_text(self, text: str, plan: PIIMaskPlan) -> str:
+        """Mask hidden PII types in text with a single pass of the combined scanner"""
+        if not text or not isinstance(text, str) or plan.text_scanner is None:
             return text
         
-        # Sort by position (reverse order to maintain positions during replacement)
-        detected_pii.sort(key=lambda x: x[0], reverse=True)
-        
-        masked_text = text
-        for start, end, pii_type, original_value in detected_pii:
-            # Check if user has permission to see this PII type
-            required_level = self._get_required_permission_for_type(pii_type)
-            if not self._has_permission(user_context, required_level):
-                # Create a temporary PIIField for masking
-                temp_field = PIIField("temp", pii_type, required_level)
-                masked_value = self._mask_value(original_value, temp_field)
-                masked_text = masked_text[:start] + masked_value + masked_text[end:]
-        
-        return masked_text
+        return plan.text_scanner.sub(
+            lambda match: self._mask_value(match.group(), plan.text_mask_fields[match.lastgroup]),
+            text
+        )
     
     def _get_required_permission_for_type(self, pii_type: PIIFieldType) -> ViewPermissionLevel:
         """Get required permission level for a PII type"""
@@ -226,44 +319,160 @@ class PIIRedactionEngine:
         if not data:
             return data
         
-        masked_data = {}
+        return self._mask_dict(data, self.get_mask_plan(user_context))
+    
+    def mask_records(self, records: List[Any], user_context: UserContext) -> List[Any]:
+        """
+        Bulk-mask a list of records column by column
         
-        for key, value in data.items():
-            # Handle nested dictionaries
-            if isinstance(value, dict):
-                masked_data[key] = self.mask_data(value, user_context)
-                continue
+        Each distinct key is resolved once, and repeated string values within a
+        column are masked once, so large listings are masked in near-linear time.
+        
+        Args:
+            records: List of record dictionaries (non-dict items pass through)
+            user_context: User's permission context
             
-            # Handle lists
-            if isinstance(value, list):
-                masked_list = []
-                for item in value:
-                    if isinstance(item, dict):
-                        masked_list.append(self.mask_data(item, user_context))
-                    elif isinstance(item, str):
-                        masked_list.append(self._mask_text_content(item, user_context))
-                    else:
-                        masked_list.append(item)
-                masked_data[key] = masked_list
-                continue
+        Returns:
+            List of masked records in the original order
+        """
+        if not records:
+            return records
+        
+        plan = self.get_mask_plan(user_context)
+        
+        # Records sharing a key layout are transposed into columns together
+        layouts: Dict[tuple, List[int]] = {}
+        for index, record in enumerate(records):
+            if isinstance(record, dict) and record:
+                layouts.setdefault(tuple(record), []).append(index)
+        
+        column_maskers = {}
+        masked_records = list(records)
+        for keys, indices in layouts.items():
+            masked_columns = []
+            for key, column in zip(keys, zip(*(records[index].values() for index in indices))):
+                mask_column = column_maskers.get(key)
+                if mask_column is None:
+                    mask_column = self._make_column_masker(self._resolve_field_action(plan, key), plan)
+                    column_maskers[key] = mask_column
+                masked_columns.append(mask_column(column))
             
-            # Check if this field is configured as PII
-            pii_field = self.pii_fields.get(key.lower())
-            if pii_field:
-                if self._has_permission(user_context, pii_field.required_permission):
-                    # User has permission - show original value
-                    masked_data[key] = value
-                else:
-                    # User lacks permission - mask the value
-                    masked_data[key] = self._mask_value(value, pii_field)
+            for index, row in zip(indices, zip(*masked_columns)):
+                masked_records[index] = dict(zip(keys, row))
+        
+        return masked_records
+    
+    def mask_dataframe(self, df, user_context: UserContext):
+        """
+        Mask a pandas DataFrame column-wise
+        
+        Args:
+            df: DataFrame whose columns are field names
+            user_context: User's permission context
+            
+        Returns:
+            A masked copy of the DataFrame
+        """
+        plan = self.get_mask_plan(user_context)
+        masked_df = df.copy()
+        
+        for column in df.columns:
+            action = self._resolve_field_action(plan, str(column))
+            if action is FIELD_VISIBLE:
+                continue
+            if action is FIELD_SCAN_TEXT and plan.text_scanner is None:
+                continue
+            masked_df[column] = df[column].map(
+                self._make_value_masker(action, plan), na_action='ignore'
+            )
+        
+        return masked_df
+    
+    def _mask_dict(self, data: Dict[str, Any], plan: PIIMaskPlan) -> Dict[str, Any]:
+        """Mask a dictionary using a precomputed plan"""
+        if not data:
+            return data
+        
+        return {
+            key: self._apply_field_action(value, self._resolve_field_action(plan, key), plan)
+            for key, value in data.items()
+        }
+    
+    def _mask_list(self, items: List[Any], plan: PIIMaskPlan) -> List[Any]:
+        """Mask the dict and string items of a list"""
+        masked_list = []
+        for item in items:
+            if isinstance(item, dict):
+                masked_list.append(self._mask_dict(item, plan))
+            elif isinstance(item, str):
+                masked_list.append(self._scan_text(item, plan))
             else:
-                # Not a configured PII field, but check for PII in text content
-                if isinstance(value, str):
-                    masked_data[key] = self._mask_text_content(value, user_context)
-                else:
-                    masked_data[key] = value
+                masked_list.append(item)
+        return masked_list
+    
+    def _apply_field_action(self, value: Any, action: Union[str, PIIField], plan: PIIMaskPlan) -> Any:
+        """Mask a single field value according to its resolved action"""
+        # Nested structures are always walked, regardless of the key
+        if isinstance(value, dict):
+            return self._mask_dict(value, plan)
+        if isinstance(value, list):
+            return self._mask_list(value, plan)
+        
+        if action is FIELD_VISIBLE:
+            return value
+        if action is FIELD_SCAN_TEXT:
+            return self._scan_text(value, plan) if isinstance(value, str) else value
+        return self._mask_value(value, action)
+    
+    def _make_value_masker(self, action: Union[str, PIIField], plan: PIIMaskPlan):
+        """Build a per-column masking function that memoizes repeated values"""
+        field_memo: Dict[Any, Any] = {}
+        text_memo: Dict[str, str] = {}
+        
+        def scan_text(text: str) -> str:
+            masked = text_memo.get(text)
+            if masked is None:
+                masked = self._scan_text(text, plan)
+                text_memo[text] = masked
+            return masked
+        
+        def mask(value: Any) -> Any:
+            value_type = type(value)
+            if value_type is list:
+                return [
+                    scan_text(item) if type(item) is str
+                    else self._mask_dict(item, plan) if isinstance(item, dict)
+                    else item
+                    for item in value
+                ]
+            if action is FIELD_SCAN_TEXT:
+                if value_type is str:
+                    return scan_text(value)
+                return self._apply_field_action(value, action, plan)
+            if value_type in (str, int, float, bool):
+                memo_key = (value_type, value)
+                masked = field_memo.get(memo_key)
+                if masked is None:
+                    masked = self._mask_value(value, action)
+                    field_memo[memo_key] = masked
+                return masked
+            return self._apply_field_action(value, action, plan)
+        
+        return mask
+    
+    def _make_column_masker(self, action: Union[str, PIIField], plan: PIIMaskPlan):
+        """Build a function that masks a whole column of values"""
+        if action is FIELD_VISIBLE or (action is FIELD_SCAN_TEXT and plan.text_scanner is None):
+            # Only nested structures can still contain something to mask
+            def mask_column(values):
+                return [
+                    self._apply_field_action(value, action, plan) if isinstance(value, (dict, list)) else value
+                    for value in values
+                ]
+            return mask_column
         
-        return masked_data
+        mask = self._make_value_masker(action, plan)
+        return lambda values: [mask(value) for value in values]
     
     def mask_volunteer_profile(self, profile: Dict[str, Any], user_context: UserContext, 
                               target_user_id: Optional[str] = None) -> Dict[str, Any]:
@@ -324,21 +533,165 @@ class PIIRedactionEngine:
 class PIIRedactionMiddleware:
     """Middleware for automatic PII redaction in API responses"""
     
-    def __init__(self, redaction_engine: PIIRedactionEngine):
+    def __init__(self, redaction_engine: PIIRedactionEngine, max_cached_plans: int = 1024):
         self.redaction_engine = redaction_engine
+        self.max_cached_plans = max_cached_plans
+        self._plan_cache: Dict[tuple, RedactionPlan] = {}
+        self._plan_cache_version = redaction_engine.mask_plan_version
+        self._plan_stats = self._empty_plan_stats()
     
     def process_response(self, response_data: Any, user_context: UserContext, 
                         endpoint: str = None) -> Any:
         """Process API response to mask PII fields"""
+        if not isinstance(response_data, (dict, list)):
+            return response_data
+        
+        start_time = time.perf_counter()
+        if self._plan_cache_version != self.redaction_engine.mask_plan_version:
+            self.clear_plan_cache()
+        mask_plan = self.redaction_engine.get_mask_plan(user_context)
+        
+        memo: Dict[tuple, Any] = {}
         if isinstance(response_data, dict):
-            return self.redaction_engine.mask_data(response_data, user_context)
-        elif isinstance(response_data, list):
-            return [
-                self.redaction_engine.mask_data(item, user_context) 
-                if isinstance(item, dict) else item 
+            redacted = self._redact_dict(response_data, mask_plan, memo)
+        else:
+            redacted = [
+                self._redact_dict(item, mask_plan, memo) if isinstance(item, dict) else item
                 for item in response_data
             ]
-        return response_data
+        
+        elapsed = time.perf_counter() - start_time
+        self._plan_stats['responses_processed'] += 1
+        self._plan_stats['total_seconds'] += elapsed
+        self._plan_stats['max_seconds'] = max(self._plan_stats['max_seconds'], elapsed)
+        return redacted
+    
+    def get_plan_stats(self) -> Dict[str, Any]:
+        """Redaction plan cache hit rate and timing, for monitoring"""
+        stats = self._plan_stats
+        lookups = stats['plan_hits'] + stats['plan_misses']
+        responses = stats['responses_processed']
+        return {
+            'plan_hits': stats['plan_hits'],
+            'plan_misses': stats['plan_misses'],
+            'hit_rate': stats['plan_hits'] / lookups if lookups else 0.0,
+            'cached_plans': len(self._plan_cache),
+            'max_cached_plans': self.max_cached_plans,
+            'responses_processed': responses,
+            'avg_redaction_ms': (stats['total_seconds'] / responses * 1000) if responses else 0.0,
+            'max_redaction_ms': stats['max_seconds'] * 1000
+        }
+    
+    def clear_plan_cache(self) -> None:
+        """Drop all cached redaction plans"""
+        self._plan_cache = {}
+        self._plan_cache_version = self.redaction_engine.mask_plan_version
+    
+    def reset_plan_stats(self) -> None:
+        """Reset hit/miss counters and timing"""
+        self._plan_stats = self._empty_plan_stats()
+    
+    @staticmethod
+    def _empty_plan_stats() -> Dict[str, Any]:
+        return {
+            'plan_hits': 0,
+            'plan_misses': 0,
+            'responses_processed': 0,
+            'total_seconds': 0.0,
+            'max_seconds': 0.0
+        }
+    
+    def _get_redaction_plan(self, data: Dict[str, Any], mask_plan: PIIMaskPlan) -> RedactionPlan:
+        """Look up (or build and cache) the plan for a dict's shape"""
+        keys = tuple(data)
+        cache_key = (mask_plan.permission_level, keys)
+        plan = self._plan_cache.get(cache_key)
+        if plan is not None:
+            self._plan_stats['plan_hits'] += 1
+            return plan
+        
+        self._plan_stats['plan_misses'] += 1
+        mask_fields = []
+        scan_fields = []
+        for key in keys:
+            action = self.redaction_engine._resolve_field_action(mask_plan, key)
+            if action is FIELD_SCAN_TEXT:
+                if mask_plan.text_scanner is not None:
+                    scan_fields.append(key)
+            elif action is not FIELD_VISIBLE:
+                mask_fields.append((key, action))
+        
+        plan = RedactionPlan(
+            permission_level=mask_plan.permission_level,
+            keys=keys,
+            mask_fields=tuple(mask_fields),
+            scan_fields=tuple(scan_fields)
+        )
+        # Dicts keyed by data (e.g. ids) would grow the cache without bound
+        if len(self._plan_cache) < self.max_cached_plans:
+            self._plan_cache[cache_key] = plan
+        return plan
+    
+    def _redact_dict(self, data: Dict[str, Any], mask_plan: PIIMaskPlan,
+                     memo: Dict[tuple, Any]) -> Dict[str, Any]:
+        """Redact a dict by following the cached plan for its shape"""
+        if not data:
+            return data
+        
+        plan = self._get_redaction_plan(data, mask_plan)
+        engine = self.redaction_engine
+        redacted = dict(data)
+        
+        # Nested structures are walked regardless of the key, as in mask_data
+        for key, value in data.items():
+            if isinstance(value, dict):
+                redacted[key] = self._redact_dict(value, mask_plan, memo)
+            elif isinstance(value, list):
+                redacted[key] = self._redact_list(value, mask_plan, memo)
+        
+        # Repeated string values within one response are masked once
+        for key, pii_field in plan.mask_fields:
+            value = data[key]
+            if type(value) is str:
+                memo_key = (key, value)
+                masked = memo.get(memo_key)
+                if masked is None:
+                    masked = engine._mask_value(value, pii_field)
+                    memo[memo_key] = masked
+                redacted[key] = masked
+            elif not isinstance(value, (dict, list)):
+                redacted[key] = engine._mask_value(value, pii_field)
+        
+        for key in plan.scan_fields:
+            value = data[key]
+            if isinstance(value, str):
+                redacted[key] = self._scan_text(value, mask_plan, memo)
+        
+        return redacted
+    
+    def _redact_list(self, items: List[Any], mask_plan: PIIMaskPlan,
+                     memo: Dict[tuple, Any]) -> List[Any]:
+        """Redact the dict and string items of a nested list"""
+        redacted = []
+        for item in items:
+            if isinstance(item, dict):
+                redacted.append(self._redact_dict(item, mask_plan, memo))
+            elif isinstance(item, str):
+                redacted.append(self._scan_text(item, mask_plan, memo))
+            else:
+                redacted.append(item)
+        return redacted
+    
+    def _scan_text(self, text: str, mask_plan: PIIMaskPlan, memo: Dict[tuple, Any]) -> str:
+        """Free-text scan with per-response memoization"""
+        if mask_plan.text_scanner is None:
+            return text
+        memo_key = (None, text)
+        masked = memo.get(memo_key)
+        if masked is None:
+            masked = self.redaction_engine._scan_text(text, mask_plan)
+            memo[memo_key] = masked
+        return masked
 
 
 # Utility functions for FastAPI integration
@@ -11,6 +11,8 @@ import aiohttp
 import json
 from dataclasses import dataclass
 from enum import Enum
+from collections import OrderedDict
+from geo_index import Gazetteer, SpatialIndex
 
 class TransportMode(Enum):
     DRIVING = "driving"
@@ -18,6 +20,16 @@ class TransportMode(Enum):
     TRANSIT = "transit"
     CYCLING = "bicycling"
 
+# Effective door-to-door speeds used for travel time estimates
+TRAVEL_SPEEDS_KMH = {
+    TransportMode.DRIVING: 35,  # City traffic
+    TransportMode.WALKING: 5,
+    TransportMode.CYCLING: 15,
+    TransportMode.TRANSIT: 20,  # Includes walking to stops, waiting, transfers
+}
+
+EARTH_RADIUS_KM = 6371
+
 @dataclass
 class Location:
     """Represents a geographic location"""
@@ -36,13 +48,24 @@ class TravelInfo:
     cost_estimate: float = 0.0  # Estimated cost (gas, transit fare, etc.)
 
 class ProximityMatcher:
-    def __init__(self, api_key: Optional[str] = None):
+    # Used when an address cannot be resolved
+    DEFAULT_COORDS = (39.1031, -84.5120)  # Cincinnati center
+    
+    def __init__(self, api_key: Optional[str] = None, max_cache_size: int = 1024,
+                 gazetteer: Optional[Gazetteer] = None):
         """
         Initialize proximity matcher with optional Google Maps API key for real travel times
         If no API key provided, will use haversine distance calculations
         """
         self.api_key = api_key
         self.use_real_apis = api_key is not None
+        self.max_cache_size = max_cache_size
+        self.gazetteer = gazetteer or Gazetteer.from_csv()
+        self.volunteer_index: Optional[SpatialIndex] = None
+        
+        # LRU caches: address -> coordinates, coordinates -> per-branch travel options
+        self._geocode_cache: OrderedDict = OrderedDict()
+        self._travel_cache: OrderedDict = OrderedDict()
         
         # YMCA branch locations (Cincinnati area)
         self.branch_locations = {
@@ -82,9 +105,35 @@ class ProximityMatcher:
             'East Community YMCA': 0.5   # Suburban, moderate transit
         }
         
+        self.refresh_branch_arrays()
+    
+    def refresh_branch_arrays(self):
+        """Rebuild the branch coordinate arrays; call after editing branch_locations"""
+        self._branch_names = list(self.branch_locations.keys())
+        self._branch_index = {name: i for i, name in enumerate(self._branch_names)}
+        coords = np.array([[loc.lat, loc.lng] for loc in self.branch_locations.values()], dtype=float)
+        self._branch_lat_rad = np.radians(coords[:, 0]) if len(coords) else np.empty(0)
+        self._branch_lng_rad = np.radians(coords[:, 1]) if len(coords) else np.empty(0)
+        self._branch_cos_lat = np.cos(self._branch_lat_rad)
+        self._branch_transit = np.array(
+            [self.transit_accessibility.get(name, 0.5) for name in self._branch_names], dtype=float
+        )
+        self.branch_index = SpatialIndex(self._branch_names, coords[:, 0] if len(coords) else [],
+                                         coords[:, 1] if len(coords) else [])
+        self._travel_cache.clear()
+    
+    def branch_distances(self, lat: float, lng: float) -> np.ndarray:
+        """Haversine distance in km from a point to every branch, in branch order"""
+        lat_rad, lng_rad = math.radians(lat), math.radians(lng)
+        dlat = self._branch_lat_rad - lat_rad
+        dlng = self._branch_lng_rad - lng_rad
+        
+        a = np.sin(dlat / 2) ** 2 + math.cos(lat_rad) * self._branch_cos_lat * np.sin(dlng / 2) ** 2
+        return EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(a))
+    
     def haversine_distance(self, lat1: float, lng1: float, lat2: float, lng2: float) -> float:
         """Calculate haversine distance between two points in kilometers"""
-        R = 6371  # Earth's radius in kilometers
+        R = EARTH_RADIUS_KM
         
         lat1, lng1, lat2, lng2 = map(math.radians, [lat1, lng1, lat2, lng2])
         dlat = lat2 - lat1
@@ -97,48 +146,104 @@ class ProximityMatcher:
     
     def geocode_address(self, address: str) -> Optional[Tuple[float, float]]:
         """
-        Simple geocoding for common Cincinnati area locations
+        Offline geocoding from the local gazetteer (ZIP centroids, neighborhoods, cities)
         In production, would use Google Geocoding API
         """
-        # Common Cincinnati area geocoding
-        location_map = {
-            'cincinnati': (39.1031, -84.5120),
-            'blue ash': (39.2320, -84.3783),
-            'oakley': (39.1312, -84.4569),
-            'newport': (39.0917, -84.4686),
-            'covington': (39.0837, -84.5085),
-            'norwood': (39.1556, -84.4594),
-            'mount adams': (39.1103, -84.4936),
-            'over-the-rhine': (39.1167, -84.5167),
-            'downtown': (39.0997, -84.5122),
-            'westwood': (39.1570, -84.6370),
-            'clifton': (39.1353, -84.5183),
-            'walnut hills': (39.1150, -84.4850)
-        }
-        
-        address_lower = address.lower()
-        for location, coords in location_map.items():
-            if location in address_lower:
-                return coords
+        place = self.gazetteer.resolve(address)
+        if place:
+            return (place.lat, place.lng)
         
         # Default to Cincinnati center if no match
-        return (39.1031, -84.5120)
+        return self.DEFAULT_COORDS
+    
+    def geocode_batch(self, addresses: List[str]) -> List[Optional[Tuple[float, float]]]:
+        """Resolve many addresses, each distinct one once; unresolvable ones map to None"""
+        resolved = {}
+        results = []
+        for address in addresses:
+            key = Gazetteer.normalize(address or '')
+            if key not in resolved:
+                place = self.gazetteer.resolve(key)
+                resolved[key] = (place.lat, place.lng) if place else None
+            results.append(resolved[key])
+        return results
+    
+    def index_volunteers(self, volunteers: List[Dict[str, Any]], id_field: str = 'contact_id',
+                         location_field: str = 'location') -> Dict[str, int]:
+        """Geocode volunteers and build the spatial index used by radius/nearest queries.
+        
+        Records with 'lat'/'lng' keys are indexed as-is; others are resolved
+        from location_field. Volunteers whose location cannot be resolved are skipped.
+        """
+        ids, lats, lngs = [], [], []
+        pending = []
+        for volunteer in volunteers:
+            if volunteer.get('lat') is not None and volunteer.get('lng') is not None:
+                ids.append(volunteer.get(id_field))
+                lats.append(float(volunteer['lat']))
+                lngs.append(float(volunteer['lng']))
+            else:
+                pending.append(volunteer)
+        
+        coords = self.geocode_batch([str(v.get(location_field) or '') for v in pending])
+        skipped = 0
+        for volunteer, point in zip(pending, coords):
+            if point is None:
+                skipped += 1
+                continue
+            ids.append(volunteer.get(id_field))
+            lats.append(point[0])
+            lngs.append(point[1])
+        
+        self.volunteer_index = SpatialIndex(ids, lats, lngs)
+        return {'indexed': len(ids), 'skipped': skipped}
+    
+    def volunteers_within(self, branch_name: str, radius_km: float) -> List[Dict[str, Any]]:
+        """Indexed volunteers within radius_km of a branch, nearest first"""
+        branch = self.branch_locations.get(branch_name)
+        if branch is None or self.volunteer_index is None:
+            return []
+        return [
+            {'volunteer_id': volunteer_id, 'distance_km': round(distance, 2)}
+            for volunteer_id, distance in self.volunteer_index.within_radius(branch.lat, branch.lng, radius_km)
+        ]
+    
+    def nearest_volunteers(self, branch_name: str, k: int = 10) -> List[Dict[str, Any]]:
+        """The k indexed volunteers closest to a branch"""
+        branch = self.branch_locations.get(branch_name)
+        if branch is None or self.volunteer_index is None:
+            return []
+        return [
+            {'volunteer_id': volunteer_id, 'distance_km': round(distance, 2)}
+            for volunteer_id, distance in self.volunteer_index.nearest(branch.lat, branch.lng, k)
+        ]
+    
+    def nearest_branches(self, user_location: str, k: int = 3) -> List[Dict[str, Any]]:
+        """The k branches closest to an address"""
+        lat, lng = self.geocode_cached(user_location)
+        return [
+            {'branch': branch_name, 'distance_km': round(distance, 2)}
+            for branch_name, distance in self.branch_index.nearest(lat, lng, k)
+        ]
+    
+    def geocode_cached(self, address: str) -> Optional[Tuple[float, float]]:
+        """geocode_address with an LRU cache keyed by the normalized address"""
+        key = address.lower().strip()
+        coords = self._geocode_cache.get(key)
+        if coords is not None:
+            self._geocode_cache.move_to_end(key)
+            return coords
+        
+        coords = self.geocode_address(address)
+        if coords is not None:
+            self._geocode_cache[key] = coords
+            if len(self._geocode_cache) > self.max_cache_size:
+                self._geocode_cache.popitem(last=False)
+        return coords
     
     def estimate_travel_time(self, distance_km: float, mode: TransportMode) -> int:
         """Estimate travel time based on distance and transportation mode"""
-        if mode == TransportMode.DRIVING:
-            # Account for city traffic, average 35 km/h in urban areas
-            speed_kmh = 35
-        elif mode == TransportMode.WALKING:
-            speed_kmh = 5
-        elif mode == TransportMode.CYCLING:
-            speed_kmh = 15
-        elif mode == TransportMode.TRANSIT:
-            # Transit includes walking to stops, waiting, transfers
-            speed_kmh = 20  # Effective speed including waits
-        else:
-            speed_kmh = 35  # Default to driving
-        
+        speed_kmh = TRAVEL_SPEEDS_KMH.get(mode, TRAVEL_SPEEDS_KMH[TransportMode.DRIVING])
         return int((distance_km / speed_kmh) * 60)  # Convert to minutes
     
     def calculate_transit_score(self, origin: Location, destination: Location, 
@@ -150,16 +255,16 @@ class ProximityMatcher:
         distance = self.haversine_distance(origin.lat, origin.lng, 
                                          destination.lat, destination.lng)
         
-        if distance > 25:  # > 25km
-            distance_penalty = 0.3
-        elif distance > 15:  # > 15km
-            distance_penalty = 0.1
-        elif distance > 10:  # > 10km
-            distance_penalty = 0.05
-        else:
-            distance_penalty = 0
-        
-        return max(0, base_score - distance_penalty)
+        return max(0, base_score - float(self._transit_distance_penalty(distance)))
+    
+    @staticmethod
+    def _transit_distance_penalty(distance_km):
+        """Transit penalty for a distance or an array of distances"""
+        return np.select(
+            [np.asarray(distance_km) > 25, np.asarray(distance_km) > 15, np.asarray(distance_km) > 10],
+            [0.3, 0.1, 0.05],
+            default=0.0
+        )
     
     def calculate_cost_estimate(self, distance_km: float, mode: TransportMode) -> float:
         """Estimate travel cost in USD"""
@@ -202,41 +307,98 @@ class ProximityMatcher:
             cost_estimate=cost
         )
     
-    def calculate_proximity_score(self, user_location: str, branch_name: str,
-                                user_preferences: Dict[str, Any]) -> Dict[str, Any]:
-        """Calculate comprehensive proximity score for a branch"""
-        
-        # Geocode user location
-        user_coords = self.geocode_address(user_location)
-        if not user_coords:
-            return {"score": 0.5, "travel_options": [], "reasons": ["Location not found"]}
+    def _get_branch_travel_table(self, coords: Tuple[float, float]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Rounded travel options for every branch and mode from one origin (LRU cached).
         
-        user_loc = Location(address=user_location, lat=user_coords[0], lng=user_coords[1])
-        
-        # Get branch location
-        if branch_name not in self.branch_locations:
-            return {"score": 0.5, "travel_options": [], "reasons": ["Branch location unknown"]}
-        
-        branch_loc = self.branch_locations[branch_name]
+        Distances, times, transit scores and costs are computed for all branches
+        at once with numpy; the result maps branch -> mode -> option dict.
+        """
+        table = self._travel_cache.get(coords)
+        if table is not None:
+            self._travel_cache.move_to_end(coords)
+            return table
+        
+        distances = self.branch_distances(*coords)
+        transit_scores = np.maximum(0, self._branch_transit - self._transit_distance_penalty(distances))
+        
+        columns = {}
+        for mode in TransportMode:
+            speed_kmh = TRAVEL_SPEEDS_KMH[mode]
+            durations = (distances / speed_kmh * 60).astype(int)
+            costs = np.broadcast_to(self.calculate_cost_estimate(distances, mode), distances.shape)
+            columns[mode.value] = (durations.tolist(), np.round(costs, 2).tolist())
+        
+        rounded_distances = np.round(distances, 1).tolist()
+        rounded_transit = np.round(transit_scores, 2).tolist()
+        
+        table = {}
+        for i, branch_name in enumerate(self._branch_names):
+            table[branch_name] = {
+                mode: {
+                    'mode': mode,
+                    'distance_km': rounded_distances[i],
+                    'duration_minutes': durations[i],
+                    'transit_score': rounded_transit[i],
+                    'cost_estimate': costs[i]
+                }
+                for mode, (durations, costs) in columns.items()
+            }
         
-        # Calculate travel options
-        travel_options = []
+        self._travel_cache[coords] = table
+        if len(self._travel_cache) > self.max_cache_size:
+            self._travel_cache.popitem(last=False)
+        return table
+    
+    def _get_transport_modes(self, user_preferences: Dict[str, Any]) -> List[TransportMode]:
+        """Transport modes to offer a user"""
         transport_modes = [TransportMode.DRIVING, TransportMode.TRANSIT, TransportMode.WALKING]
         
         # Add cycling if user expresses fitness interest
         interests = user_preferences.get('interests', '').lower()
         if 'fitness' in interests or 'cycling' in interests or 'bike' in interests:
             transport_modes.append(TransportMode.CYCLING)
+        return transport_modes
+    
+    def calculate_proximity_score(self, user_location: str, branch_name: str,
+                                user_preferences: Dict[str, Any]) -> Dict[str, Any]:
+        """Calculate comprehensive proximity score for a branch"""
+        return self.score_branches(user_location, [branch_name], user_preferences)[branch_name]
+    
+    def score_branches(self, user_location: str, branch_names: List[str],
+                       user_preferences: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Proximity scores for several branches in one call (one geocode, one vectorized pass)"""
         
-        for mode in transport_modes:
-            travel_info = self.get_travel_info(user_loc, branch_loc, mode, branch_name)
-            travel_options.append({
-                'mode': mode.value,
-                'distance_km': round(travel_info.distance_km, 1),
-                'duration_minutes': travel_info.duration_minutes,
-                'transit_score': round(travel_info.transit_score, 2),
-                'cost_estimate': round(travel_info.cost_estimate, 2)
-            })
+        # Geocode user location
+        user_coords = self.geocode_cached(user_location)
+        if not user_coords:
+            return {
+                branch_name: {"score": 0.5, "travel_options": [], "reasons": ["Location not found"]}
+                for branch_name in branch_names
+            }
+        
+        travel_table = self._get_branch_travel_table(tuple(user_coords))
+        transport_modes = self._get_transport_modes(user_preferences)
+        
+        results = {}
+        for branch_name in branch_names:
+            if branch_name in results:
+                continue
+            
+            # Get branch location
+            branch_options = travel_table.get(branch_name)
+            if branch_options is None:
+                results[branch_name] = {"score": 0.5, "travel_options": [], "reasons": ["Branch location unknown"]}
+                continue
+            
+            # Calculate travel options
+            travel_options = [dict(branch_options[mode.value]) for mode in transport_modes]
+            results[branch_name] = self._score_travel_options(travel_options, user_preferences)
+        
+        return results
+    
+    def _score_travel_options(self, travel_options: List[Dict[str, Any]],
+                              user_preferences: Dict[str, Any]) -> Dict[str, Any]:
+        """Turn a branch's travel options into a proximity score with reasons"""
         
         # Calculate overall proximity score
         driving_info = next(t for t in travel_options if t['mode'] == 'driving')
@@ -317,14 +479,18 @@ class ProximityMatcher:
         
         enhanced_matches = []
         
+        # Score each distinct branch once for this user
+        proximity_by_branch = {}
+        if user_location:
+            branch_names = list(dict.fromkeys(match.get('branch', '') for match in matches if match.get('branch')))
+            proximity_by_branch = self.score_branches(user_location, branch_names, user_preferences)
+        
         for match in matches:
             enhanced_match = match.copy()
             branch_name = match.get('branch', '')
             
             if branch_name and user_location:
-                proximity_info = self.calculate_proximity_score(
-                    user_location, branch_name, user_preferences
-                )
+                proximity_info = proximity_by_branch[branch_name]
                 
                 # Integrate proximity score with existing match score
                 original_score = match.get('score', 0.5)
@@ -365,6 +531,11 @@ class ProximityMatcher:
             }
         }
         
+        neighborhoods = [p for p in self.gazetteer.places if p.kind == 'neighborhood']
+        neighborhood_index = SpatialIndex(
+            [p.name for p in neighborhoods], [p.lat for p in neighborhoods], [p.lng for p in neighborhoods]
+        )
+        
         for branch_name, location in self.branch_locations.items():
             transit_score = self.transit_accessibility[branch_name]
             
@@ -374,6 +545,21 @@ class ProximityMatcher:
                 "coordinates": {"lat": location.lat, "lng": location.lng}
             }
             
+            # Spatial context from the branch and gazetteer indexes
+            nearest = [
+                (name, distance) for name, distance in self.branch_index.nearest(location.lat, location.lng, 2)
+                if name != branch_name
+            ]
+            if nearest:
+                branch_info["nearest_branch"] = {"name": nearest[0][0], "distance_km": round(nearest[0][1], 1)}
+            branch_info["neighborhoods_within_5km"] = [
+                name.title() for name, _ in neighborhood_index.within_radius(location.lat, location.lng, 5)
+            ]
+            if self.volunteer_index is not None:
+                branch_info["volunteers_within_10km"] = self.volunteer_index.count_within(
+                    location.lat, location.lng, 10
+                )
+            
             # Categorize transit access
             if transit_score >= 0.7:
                 report["transit_summary"]["high_transit_access"].append(branch_name)
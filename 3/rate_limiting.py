@@ -0,0 +1,31 @@
+"""
+Rate limiting shared by the delivery queues
+"""
+from typing import Optional
+import asyncio
+import time
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursts of up to `capacity`.
+
+    Waiters are served in arrival order because the lock is held while a
+    waiter sleeps for its token.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
@@ -10,7 +10,7 @@ from pydantic import BaseModel, Field
 import logging
 
 from rbac_models import (
-    RBACService, SystemRole, Role, Permission, UserBranchRole, 
+    SystemRole, Role, Permission, UserBranchRole, 
     PermissionOverride, AccessLogEntry, RBACContext
 )
 from rbac_middleware import RBACMiddleware, RBACDependency, create_rbac_middleware
@@ -74,7 +74,11 @@ def create_rbac_router(database: VolunteerDatabase) -> APIRouter:
     
     # Create RBAC middleware and dependencies
     rbac_middleware, rbac_dependency = create_rbac_middleware(database)
-    rbac_service = RBACService(database)
+    # Share the middleware's service so role changes invalidate its permission cache
+    rbac_service = rbac_middleware.rbac_service
+    
+    # Write access log entries still queued when the app shuts down
+    router.add_event_handler("shutdown", rbac_service.access_log_writer.stop)
     
     # Helper functions
     async def get_current_user_admin():
@@ -254,6 +258,7 @@ def create_rbac_router(database: VolunteerDatabase) -> APIRouter:
                 
                 # Add new permissions
                 await rbac_service.add_permissions_to_role(role_id, request.permissions)
+                rbac_service.invalidate_all_permissions()
             
             # Get updated role
             updated_role = await rbac_service.get_role_by_id(role_id)
@@ -482,6 +487,7 @@ def create_rbac_router(database: VolunteerDatabase) -> APIRouter:
                 .update({'is_active': False})\
                 .eq('id', role_assignment_id)\
                 .execute()
+            rbac_service.invalidate_user_permissions(user_id)
             
             return JSONResponse(content={"success": True, "message": "Role revoked"})
             
@@ -542,6 +548,7 @@ def create_rbac_router(database: VolunteerDatabase) -> APIRouter:
                 .execute()
             
             if result.data:
+                rbac_service.invalidate_user_permissions(request.user_id)
                 return JSONResponse(content={"success": True, "message": "Permission override created"})
             else:
                 raise HTTPException(status_code=400, detail="Failed to create override")
@@ -67,8 +67,8 @@ class RBACMiddleware:
             target_branch = branch or user.get('current_branch')
             has_permission = rbac_context.has_permission(permission, target_branch)
             
-            # Log access attempt
-            await self.rbac_service.log_access(
+            # Queue the access log; the batched writer inserts it off the request path
+            self.rbac_service.queue_access_log(
                 resource=permission.split('.')[0] if '.' in permission else 'unknown',
                 action=permission.split('.')[1] if '.' in permission else 'unknown',
                 user_id=user['id'],
@@ -339,7 +339,7 @@ class AuditLogger:
                                   branch: Optional[str], granted: bool, 
                                   context: str = None):
         """Log permission check"""
-        await self.rbac_service.log_access(
+        self.rbac_service.queue_access_log(
             resource=permission.split('.')[0] if '.' in permission else 'unknown',
             action=permission.split('.')[1] if '.' in permission else 'check',
             user_id=user_id,
@@ -3,12 +3,16 @@ Branch-Scoped RBAC Models for Volunteer PathFinder
 Implements role-based access control with least-privilege defaults
 """
 from enum import Enum
-from typing import Dict, List, Optional, Set, Any, Union
-from pydantic import BaseModel, Field, validator
+from typing import Dict, List, Optional, Set, Any, Union, FrozenSet, Tuple
+from pydantic import BaseModel, Field, PrivateAttr, validator
 from datetime import datetime, timedelta
+import asyncio
+import time
 import uuid
 import logging
 
+from batch_writer import BatchWriter
+
 logger = logging.getLogger(__name__)
 
 class ResourceType(str, Enum):
@@ -144,10 +148,29 @@ class RBACContext(BaseModel):
     permission_overrides: List[PermissionOverride] = Field(default_factory=list)
     current_branch: Optional[str] = None
     
+    # branch -> (compiled permission set, epoch seconds after which it must be rebuilt)
+    _compiled_permissions: Dict[Optional[str], Tuple[FrozenSet[str], Optional[float]]] = PrivateAttr(default_factory=dict)
+    
     def get_user_permissions(self, branch: Optional[str] = None) -> Set[str]:
         """Get all permissions for user in specified branch"""
-        permissions = set()
+        return set(self.get_compiled_permissions(branch))
+    
+    def get_compiled_permissions(self, branch: Optional[str] = None) -> FrozenSet[str]:
+        """Get the memoized permission set for a branch, rebuilding it once a role or override expires"""
         target_branch = branch or self.current_branch
+        compiled = self._compiled_permissions.get(target_branch)
+        if compiled is not None:
+            permissions, valid_until = compiled
+            if valid_until is None or time.time() < valid_until:
+                return permissions
+        
+        permissions = self._build_permissions(target_branch)
+        self._compiled_permissions[target_branch] = (permissions, self.get_valid_until())
+        return permissions
+    
+    def _build_permissions(self, target_branch: Optional[str]) -> FrozenSet[str]:
+        """Resolve roles and overrides into a permission set"""
+        permissions = set()
         
         # Get permissions from roles
         for user_role in self.user_roles:
@@ -172,12 +195,24 @@ class RBACContext(BaseModel):
                     else:
                         permissions.discard(override.permission.name)
         
-        return permissions
+        return frozenset(permissions)
+    
+    def get_valid_until(self) -> Optional[float]:
+        """Earliest expiry (epoch seconds) among currently valid roles and overrides"""
+        expiries = [
+            item.expires_at.timestamp()
+            for item in [*self.user_roles, *self.permission_overrides]
+            if item.expires_at is not None and item.is_valid()
+        ]
+        return min(expiries) if expiries else None
+    
+    def invalidate_permission_cache(self) -> None:
+        """Drop compiled permission sets (call after mutating roles or overrides in place)"""
+        self._compiled_permissions.clear()
     
     def has_permission(self, permission: str, branch: Optional[str] = None) -> bool:
         """Check if user has specific permission in branch"""
-        user_permissions = self.get_user_permissions(branch)
-        return permission in user_permissions
+        return permission in self.get_compiled_permissions(branch)
     
     def get_accessible_branches(self) -> Set[str]:
         """Get all branches user has any access to"""
@@ -187,6 +222,122 @@ class RBACContext(BaseModel):
                 branches.add(user_role.branch)
         return branches
 
+class PermissionCache:
+    """
+    Per-user cache of loaded RBAC contexts
+    
+    Each entry expires at the earliest role/override expiry, capped by max_ttl so
+    role changes made by other processes are picked up eventually. Local role
+    changes must call invalidate_user or invalidate_all.
+    """
+    
+    def __init__(self, max_ttl: float = 300.0):
+        self.max_ttl = max_ttl
+        self._contexts: Dict[str, Tuple[RBACContext, float]] = {}
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, user_id: str) -> Optional[RBACContext]:
+        """Get a cached context if it has not expired"""
+        entry = self._contexts.get(user_id)
+        if entry is not None:
+            context, valid_until = entry
+            if time.time() < valid_until:
+                self.hits += 1
+                return context
+            del self._contexts[user_id]
+        self.misses += 1
+        return None
+    
+    def put(self, context: RBACContext) -> None:
+        """Cache a freshly loaded context"""
+        valid_until = time.time() + self.max_ttl
+        context_valid_until = context.get_valid_until()
+        if context_valid_until is not None:
+            valid_until = min(valid_until, context_valid_until)
+        self._contexts[context.user_id] = (context, valid_until)
+    
+    def invalidate_user(self, user_id: str) -> None:
+        """Forget one user's cached permissions"""
+        self._contexts.pop(user_id, None)
+    
+    def invalidate_all(self) -> None:
+        """Forget all cached permissions (e.g. after a role's permissions change)"""
+        self._contexts.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Cache size and hit rate"""
+        lookups = self.hits + self.misses
+        return {
+            'cached_users': len(self._contexts),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+class AccessLogWriter(BatchWriter):
+    """
+    Batched asynchronous writer for the access_logs table
+    
+    Entries are queued without awaiting the database. A background task inserts
+    them in batches as soon as batch_size entries are waiting, or flush_interval
+    seconds after the first queued entry, whichever comes first. After a failed
+    write the wait backs off, doubling up to max_backoff seconds.
+    """
+    
+    def __init__(self, database, batch_size: int = 100, flush_interval: float = 2.0,
+                 max_queue_size: int = 10000, max_backoff: float = 30.0):
+        super().__init__(batch_size, flush_interval, max_backoff)
+        self.database = database
+        self.max_queue_size = max_queue_size
+        self.stats = {
+            'queued': 0,
+            'written': 0,
+            'failed_batches': 0,
+            'dropped': 0,
+            'batches': 0
+        }
+    
+    def enqueue(self, log_data: Dict[str, Any]) -> None:
+        """Queue an access log entry; never blocks on the database"""
+        if len(self._queue) >= self.max_queue_size:
+            self._queue.popleft()
+            self.stats['dropped'] += 1
+        self._queue.append(log_data)
+        self.stats['queued'] += 1
+        self._queued()
+    
+    async def flush(self) -> int:
+        """Write all queued entries in batches; returns the number written"""
+        written = 0
+        async with self._flush_lock:
+            while self._queue:
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                start_time = time.perf_counter()
+                try:
+                    await self.database.supabase.table('access_logs').insert(batch).execute()
+                except asyncio.CancelledError:
+                    self._queue.extendleft(reversed(batch))
+                    raise
+                except Exception as e:
+                    logger.error(f"Error writing {len(batch)} access logs: {e}")
+                    self.stats['failed_batches'] += 1
+                    self._record_failure()
+                    # Put the batch back in front and retry on the next flush
+                    room = max(0, self.max_queue_size - len(self._queue))
+                    self.stats['dropped'] += max(0, len(batch) - room)
+                    self._queue.extendleft(reversed(batch[:room]))
+                    break
+                self._record_success(start_time)
+                self.stats['batches'] += 1
+                written += len(batch)
+        self.stats['written'] += written
+        return written
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth, write counters and flush latency"""
+        return {**self.stats, 'queue_depth': len(self._queue), **self._latency_metrics()}
+
 class RBACService:
     """Service class for RBAC operations"""
     
@@ -194,6 +345,8 @@ class RBACService:
         self.database = database
         self._permission_cache: Dict[str, Permission] = {}
         self._role_cache: Dict[str, Role] = {}
+        self.context_cache = PermissionCache()
+        self.access_log_writer = AccessLogWriter(database)
         
     def get_least_privilege_defaults(self) -> Dict[SystemRole, List[str]]:
         """Get least-privilege default permissions for each role"""
@@ -357,6 +510,7 @@ class RBACService:
             success = len(result.data) > 0
             
             if success:
+                self.invalidate_user_permissions(user_id)
                 logger.info(f"Assigned role {role_id} to user {user_id} for branch {branch}")
                 # Log the assignment
                 await self.log_access("rbac", "create", user_id, branch, 
@@ -369,8 +523,13 @@ class RBACService:
             logger.error(f"Error assigning role to user: {e}")
             return False
     
-    async def get_user_context(self, user_id: str) -> RBACContext:
+    async def get_user_context(self, user_id: str, use_cache: bool = True) -> RBACContext:
         """Get full RBAC context for user"""
+        if use_cache:
+            cached_context = self.context_cache.get(user_id)
+            if cached_context is not None:
+                return cached_context
+        
         try:
             # Get user roles with role details
             roles_result = await self.database.supabase.table('user_branch_roles')\
@@ -411,11 +570,13 @@ class RBACService:
                 if override.is_valid():
                     overrides.append(override)
             
-            return RBACContext(
+            context = RBACContext(
                 user_id=user_id,
                 user_roles=user_roles,
                 permission_overrides=overrides
             )
+            self.context_cache.put(context)
+            return context
             
         except Exception as e:
             logger.error(f"Error getting user context for {user_id}: {e}")
@@ -429,7 +590,7 @@ class RBACService:
             has_perm = context.has_permission(permission, branch)
             
             # Log access attempt
-            await self.log_access(
+            self.queue_access_log(
                 resource=permission.split('.')[0] if '.' in permission else 'unknown',
                 action=permission.split('.')[1] if '.' in permission else 'unknown',
                 user_id=user_id,
@@ -444,6 +605,28 @@ class RBACService:
             logger.error(f"Error checking permission {permission} for user {user_id}: {e}")
             return False
     
+    def invalidate_user_permissions(self, user_id: str) -> None:
+        """Drop a user's cached permissions after their roles or overrides change"""
+        self.context_cache.invalidate_user(user_id)
+    
+    def invalidate_all_permissions(self) -> None:
+        """Drop every cached permission set after a role definition changes"""
+        self.context_cache.invalidate_all()
+    
+    def queue_access_log(self, resource: str, action: str, user_id: str = None,
+                         branch: str = None, resource_id: str = None,
+                         granted: bool = False, reason: str = None) -> None:
+        """Queue an access log entry for the batched writer (does not await the database)"""
+        self.access_log_writer.enqueue({
+            'user_id': user_id,
+            'resource': resource,
+            'action': action,
+            'branch': branch,
+            'resource_id': resource_id,
+            'granted': granted,
+            'reason': reason
+        })
+    
     async def log_access(self, resource: str, action: str, user_id: str = None,
                         branch: str = None, resource_id: str = None,
                         granted: bool = False, reason: str = None) -> bool:
@@ -518,6 +701,7 @@ class RBACService:
                 await self.database.supabase.table('role_permissions')\
                     .insert(perm_mappings)\
                     .execute()
+                self.invalidate_all_permissions()
             
             return True
             
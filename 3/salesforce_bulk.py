@@ -0,0 +1,265 @@
+"""
+Bulk Salesforce sync for contacts and campaigns
+Resolves Salesforce IDs from a local cache plus one SOQL IN query per chunk, then upserts each chunk
+through the sObject Collections endpoints (composite/sobjects, 200 records per request)
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from dataclasses import dataclass
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+from sync_executor import SyncExecutor, ProviderLimits, RetryConfig
+
+logger = logging.getLogger(__name__)
+
+# Most records the sObject Collections endpoints accept per request
+COLLECTION_LIMIT = 200
+
+# Per-record errors meaning a cached ID no longer points at a live record
+STALE_ID_ERRORS = {'ENTITY_IS_DELETED', 'INVALID_CROSS_REFERENCE_KEY', 'INVALID_ID_FIELD', 'NOT_FOUND'}
+
+def normalize_key(value: Any) -> Optional[str]:
+    """Cache key for an email or name; SOQL compares strings case-insensitively"""
+    if value is None:
+        return None
+    key = str(value).strip().lower()
+    return key or None
+
+def soql_literal(value: str) -> str:
+    """Quote a value for a SOQL string comparison"""
+    escaped = value.replace('\\', '\\\\').replace("'", "\\'")
+    return f"'{escaped}'"
+
+@dataclass
+class BulkObjectSpec:
+    """How records of one sObject type are matched and written"""
+    object_type: str  # e.g. 'Contact'
+    key_field: str  # Salesforce field matched on, e.g. 'Email'
+    source_key: str  # Key in our records holding that value, e.g. 'email'
+    create_fields: Callable[[Dict], Dict]
+    update_fields: Callable[[Dict], Dict]
+
+class SalesforceIdCache:
+    """Local map of natural keys (contact email, campaign name) to Salesforce IDs, per sObject type.
+
+    Held in memory; when `path` is set it is loaded from and saved to a JSON
+    file, written through a temporary file and an atomic rename.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._ids: Optional[Dict[str, Dict[str, str]]] = None
+
+    def _load(self) -> Dict[str, Dict[str, str]]:
+        if self._ids is None:
+            self._ids = {}
+            if self.path and os.path.exists(self.path):
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as cache_file:
+                        self._ids = json.load(cache_file)
+                except ValueError:
+                    logger.warning(f"Unreadable Salesforce ID cache at {self.path}; starting empty")
+        return self._ids
+
+    def get(self, object_type: str, key: Any) -> Optional[str]:
+        key = normalize_key(key)
+        with self._lock:
+            return self._load().get(object_type, {}).get(key) if key else None
+
+    def put(self, object_type: str, key: Any, salesforce_id: str):
+        key = normalize_key(key)
+        if key and salesforce_id:
+            with self._lock:
+                self._load().setdefault(object_type, {})[key] = salesforce_id
+
+    def evict(self, object_type: str, key: Any):
+        key = normalize_key(key)
+        with self._lock:
+            self._load().get(object_type, {}).pop(key, None)
+
+    def size(self) -> Dict[str, int]:
+        with self._lock:
+            return {object_type: len(ids) for object_type, ids in self._load().items()}
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            ids = self._load()
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as cache_file:
+                json.dump(ids, cache_file)
+            os.replace(temp_path, self.path)
+
+class SalesforceBulkSync:
+    """Chunked upsert pipeline over a SalesforceNonprofitCloudSync client.
+
+    Records are de-duplicated by key and split into chunks of up to 200.
+    Per chunk: IDs missing from the cache are resolved with one SOQL `IN`
+    query, then existing records are updated and new ones created with one
+    collections request each. Chunks run concurrently; every request goes
+    through a SyncExecutor that holds the Salesforce rate limit and
+    in-flight cap. Queries and updates are retried on connection and
+    rate-limit errors; creates are not, since a lost response may hide a
+    saved record.
+    """
+
+    def __init__(self, client, id_cache: SalesforceIdCache, chunk_size: int = COLLECTION_LIMIT,
+                 concurrency: int = 4, requests_per_second: float = 10.0,
+                 executor: Optional[SyncExecutor] = None):
+        self.client = client
+        self.id_cache = id_cache
+        self.chunk_size = max(1, min(chunk_size, COLLECTION_LIMIT))
+        self.executor = executor or SyncExecutor(
+            retry_config=RetryConfig(max_retries=3),
+            provider_limits={'salesforce': ProviderLimits(requests_per_second, batch_size=self.chunk_size,
+                                                          concurrency=concurrency)}
+        )
+
+    async def run(self, spec: BulkObjectSpec, items: List[Dict],
+                  progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Upsert `items` as `spec.object_type` records; returns counts, errors and timing"""
+        start = time.perf_counter()
+        results = {
+            "successful": 0,
+            "failed": 0,
+            "errors": [],
+            "created": 0,
+            "updated": 0,
+            "cache_hits": 0,
+            "resolved_by_query": 0,
+            "requests": 0,
+            "chunks": 0
+        }
+
+        # One record per key, the last one wins; records without a key are always created
+        keyed: Dict[str, Dict] = {}
+        unkeyed: List[Tuple[Optional[str], Dict]] = []
+        for item in items:
+            key = normalize_key(item.get(spec.source_key))
+            if key:
+                keyed[key] = item
+            else:
+                unkeyed.append((None, item))
+        records = list(keyed.items()) + unkeyed
+        chunks = [records[offset:offset + self.chunk_size] for offset in range(0, len(records), self.chunk_size)]
+        results["chunks"] = len(chunks)
+        progress = {"object_type": spec.object_type, "chunks_total": len(chunks), "chunks_done": 0,
+                    "records_total": len(records), "records_done": 0}
+
+        async def run_chunk(chunk):
+            settled: List[Dict] = []
+            try:
+                await self._sync_chunk(spec, chunk, results, settled)
+            except Exception as e:
+                # Records already saved or reported before the error keep their outcome
+                unsettled = len(chunk) - len(settled)
+                results["failed"] += unsettled
+                results["errors"].append(f"{spec.object_type} chunk failed with {unsettled} of {len(chunk)} "
+                                         f"records unsynced: {e}")
+                logger.error(f"Salesforce {spec.object_type} chunk failed: {e}")
+            progress["chunks_done"] += 1
+            progress["records_done"] += len(chunk)
+            progress["elapsed_seconds"] = round(time.perf_counter() - start, 3)
+            logger.info(f"Salesforce {spec.object_type} sync: chunk {progress['chunks_done']}/{len(chunks)}, "
+                        f"{progress['records_done']}/{len(records)} records")
+            if progress_callback:
+                progress_callback(dict(progress))
+
+        await asyncio.gather(*(run_chunk(chunk) for chunk in chunks))
+        await asyncio.to_thread(self.id_cache.save)
+
+        duration = time.perf_counter() - start
+        results["duration_seconds"] = round(duration, 3)
+        results["records_per_second"] = round(len(records) / duration, 1) if duration > 0 else None
+        logger.info(f"Salesforce {spec.object_type} bulk sync: {results['created']} created, "
+                    f"{results['updated']} updated, {results['failed']} failed in {duration:.1f}s "
+                    f"({results['requests']} requests)")
+        return results
+
+    async def _request(self, results: Dict[str, Any], operation, *args, retry: bool = True):
+        results["requests"] += 1
+        return await self.executor.call('salesforce', operation, *args, max_retries=None if retry else 0)
+
+    async def _resolve_ids(self, spec: BulkObjectSpec, keys: List[str], results: Dict[str, Any]) -> Dict[str, str]:
+        """Look up Salesforce IDs for a chunk's uncached keys with a single SOQL query"""
+        soql = (f"SELECT Id, {spec.key_field} FROM {spec.object_type} "
+                f"WHERE {spec.key_field} IN ({', '.join(soql_literal(key) for key in keys)})")
+        found: Dict[str, str] = {}
+        for record in await self._request(results, self.client.query_all, soql):
+            key = normalize_key(record.get(spec.key_field))
+            if key and key not in found:
+                found[key] = record["Id"]
+                self.id_cache.put(spec.object_type, key, record["Id"])
+        return found
+
+    async def _sync_chunk(self, spec: BulkObjectSpec, chunk: List[Tuple[Optional[str], Dict]],
+                          results: Dict[str, Any], settled: List[Dict], resolve_stale: bool = True):
+        """Upsert one chunk; every record whose outcome is counted is appended to `settled`"""
+        ids: Dict[str, str] = {}
+        unknown = []
+        for key, _ in chunk:
+            cached = self.id_cache.get(spec.object_type, key) if key else None
+            if cached:
+                ids[key] = cached
+                results["cache_hits"] += 1
+            elif key:
+                unknown.append(key)
+        if unknown:
+            found = await self._resolve_ids(spec, unknown, results)
+            results["resolved_by_query"] += len(found)
+            ids.update(found)
+
+        updates = [(key, item) for key, item in chunk if key in ids]
+        creates = [(key, item) for key, item in chunk if key not in ids]
+        stale = []
+
+        if updates:
+            payload = [dict(spec.update_fields(item), id=ids[key]) for key, item in updates]
+            outcomes = await self._request(results, self.client.save_collection, 'PATCH', spec.object_type, payload)
+            for (key, item), outcome in zip(updates, outcomes):
+                if outcome.get("success"):
+                    results["successful"] += 1
+                    results["updated"] += 1
+                elif resolve_stale and self._error_codes(outcome) & STALE_ID_ERRORS:
+                    # Deleted or merged since it was cached: look it up again
+                    self.id_cache.evict(spec.object_type, key)
+                    stale.append((key, item))
+                    continue
+                else:
+                    self._record_failure(spec, item, outcome, results)
+                settled.append(item)
+
+        if creates:
+            payload = [spec.create_fields(item) for _, item in creates]
+            # A create that timed out may still have been saved; retrying it could duplicate records
+            outcomes = await self._request(results, self.client.save_collection, 'POST', spec.object_type, payload,
+                                           retry=False)
+            for (key, item), outcome in zip(creates, outcomes):
+                if outcome.get("success"):
+                    results["successful"] += 1
+                    results["created"] += 1
+                    self.id_cache.put(spec.object_type, key, outcome.get("id"))
+                else:
+                    self._record_failure(spec, item, outcome, results)
+                settled.append(item)
+
+        if stale:
+            await self._sync_chunk(spec, stale, results, settled, resolve_stale=False)
+
+    @staticmethod
+    def _error_codes(outcome: Dict[str, Any]) -> set:
+        return {error.get("statusCode") for error in outcome.get("errors", [])}
+
+    @staticmethod
+    def _record_failure(spec: BulkObjectSpec, item: Dict, outcome: Dict[str, Any], results: Dict[str, Any]):
+        results["failed"] += 1
+        messages = "; ".join(f"{error.get('statusCode')}: {error.get('message')}"
+                             for error in outcome.get("errors", [])) or "unknown error"
+        results["errors"].append(f"Failed to sync {item.get(spec.source_key) or 'Unknown'}: {messages}")
@@ -2,16 +2,18 @@
 Salesforce Nonprofit Cloud Integration
 Syncs contacts, campaigns, and activities between YMCA volunteer system and Salesforce
 """
-import asyncio
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 import httpx
 import base64
 import json
+from urllib.parse import quote
 from dataclasses import dataclass, asdict
 from pydantic import BaseModel
 
+from salesforce_bulk import SalesforceBulkSync, SalesforceIdCache, BulkObjectSpec, COLLECTION_LIMIT
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -78,6 +80,11 @@ class SalesforceConfig(BaseModel):
     password: str
     security_token: str
     api_version: str = "v58.0"
+    # Bulk sync: records per collections request, requests in flight and request rate
+    bulk_chunk_size: int = COLLECTION_LIMIT
+    bulk_concurrency: int = 4
+    requests_per_second: float = 10.0
+    id_cache_path: Optional[str] = None  # Email/name -> Salesforce ID map; in memory only when unset
     
 class SalesforceNonprofitCloudSync:
     """
@@ -90,6 +97,10 @@ class SalesforceNonprofitCloudSync:
         self.access_token: Optional[str] = None
         self.token_expires_at: Optional[datetime] = None
         self.session = httpx.AsyncClient(timeout=30.0)
+        self.id_cache = SalesforceIdCache(config.id_cache_path)
+        self.bulk = SalesforceBulkSync(self, self.id_cache, chunk_size=config.bulk_chunk_size,
+                                       concurrency=config.bulk_concurrency,
+                                       requests_per_second=config.requests_per_second)
         
     async def __aenter__(self):
         await self.authenticate()
@@ -174,6 +185,30 @@ class SalesforceNonprofitCloudSync:
         except Exception as e:
             logger.error(f"Request failed: {e}")
             raise
+
+    async def query_all(self, soql: str) -> List[Dict]:
+        """Run a SOQL query and return every record, following nextRecordsUrl"""
+        result = await self._salesforce_request("GET", f"query?q={quote(soql)}")
+        records = list(result.get("records", []))
+        prefix = f"/services/data/{self.config.api_version}/"
+        while not result.get("done", True) and result.get("nextRecordsUrl"):
+            result = await self._salesforce_request("GET", result["nextRecordsUrl"].replace(prefix, "", 1))
+            records.extend(result.get("records", []))
+        return records
+
+    async def save_collection(self, method: str, object_type: str, records: List[Dict]) -> List[Dict]:
+        """Create (POST) or update (PATCH, records carry "id") up to 200 records in one request.
+
+        Uses allOrNone=false, so each record succeeds or fails on its own; the
+        result has one {"id", "success", "errors"} entry per record, in order.
+        """
+        if len(records) > COLLECTION_LIMIT:
+            raise ValueError(f"Salesforce accepts at most {COLLECTION_LIMIT} records per collections request")
+        payload = {
+            "allOrNone": False,
+            "records": [{"attributes": {"type": object_type}, **record} for record in records]
+        }
+        return await self._salesforce_request(method, "composite/sobjects", payload)
     
     # Contact Sync Methods
     
@@ -191,24 +226,7 @@ class SalesforceNonprofitCloudSync:
                     return contact_id
             
             # Create new contact
-            contact = SalesforceContact(
-                FirstName=volunteer_data.get("first_name"),
-                LastName=volunteer_data.get("last_name"),
-                Email=volunteer_data.get("email"),
-                Phone=volunteer_data.get("phone"),
-                MailingCity=volunteer_data.get("city"),
-                MailingState=volunteer_data.get("state"),
-                MailingPostalCode=volunteer_data.get("zip_code"),
-                npe01__PreferredPhone__c="Work" if volunteer_data.get("phone") else None,
-                npe01__Preferred_Email__c="Personal" if volunteer_data.get("email") else None,
-                Volunteer_Status__c="Active",
-                Volunteer_Skills__c=volunteer_data.get("skills", ""),
-                Volunteer_Interests__c=volunteer_data.get("interests", ""),
-                Last_Volunteer_Activity__c=datetime.now().isoformat()
-            )
-            
-            # Remove None values
-            contact_data = {k: v for k, v in asdict(contact).items() if v is not None}
+            contact_data = self._contact_create_fields(volunteer_data)
             
             result = await self._salesforce_request("POST", "sobjects/Contact", contact_data)
             contact_id = result.get("id")
@@ -233,21 +251,46 @@ class SalesforceNonprofitCloudSync:
             logger.error(f"Failed to find contact by email: {e}")
             return None
     
+    def _contact_create_fields(self, volunteer_data: Dict) -> Dict:
+        """Contact fields for a new volunteer"""
+        contact = SalesforceContact(
+            FirstName=volunteer_data.get("first_name"),
+            LastName=volunteer_data.get("last_name"),
+            Email=volunteer_data.get("email"),
+            Phone=volunteer_data.get("phone"),
+            MailingCity=volunteer_data.get("city"),
+            MailingState=volunteer_data.get("state"),
+            MailingPostalCode=volunteer_data.get("zip_code"),
+            npe01__PreferredPhone__c="Work" if volunteer_data.get("phone") else None,
+            npe01__Preferred_Email__c="Personal" if volunteer_data.get("email") else None,
+            Volunteer_Status__c="Active",
+            Volunteer_Skills__c=volunteer_data.get("skills", ""),
+            Volunteer_Interests__c=volunteer_data.get("interests", ""),
+            Last_Volunteer_Activity__c=datetime.now().isoformat()
+        )
+        
+        # Remove None values
+        return {k: v for k, v in asdict(contact).items() if v is not None}
+
+    def _contact_update_fields(self, volunteer_data: Dict) -> Dict:
+        """Contact fields refreshed on an existing volunteer"""
+        update_data = {
+            "Volunteer_Skills__c": volunteer_data.get("skills", ""),
+            "Volunteer_Interests__c": volunteer_data.get("interests", ""),
+            "Last_Volunteer_Activity__c": datetime.now().isoformat(),
+            "Phone": volunteer_data.get("phone"),
+            "MailingCity": volunteer_data.get("city"),
+            "MailingState": volunteer_data.get("state"),
+            "MailingPostalCode": volunteer_data.get("zip_code")
+        }
+        
+        # Remove None values
+        return {k: v for k, v in update_data.items() if v is not None}
+
     async def update_contact(self, contact_id: str, volunteer_data: Dict) -> bool:
         """Update existing Salesforce contact"""
         try:
-            update_data = {
-                "Volunteer_Skills__c": volunteer_data.get("skills", ""),
-                "Volunteer_Interests__c": volunteer_data.get("interests", ""),
-                "Last_Volunteer_Activity__c": datetime.now().isoformat(),
-                "Phone": volunteer_data.get("phone"),
-                "MailingCity": volunteer_data.get("city"),
-                "MailingState": volunteer_data.get("state"),
-                "MailingPostalCode": volunteer_data.get("zip_code")
-            }
-            
-            # Remove None values
-            update_data = {k: v for k, v in update_data.items() if v is not None}
+            update_data = self._contact_update_fields(volunteer_data)
             
             await self._salesforce_request("PATCH", f"sobjects/Contact/{contact_id}", update_data)
             
@@ -271,21 +314,7 @@ class SalesforceNonprofitCloudSync:
                 return campaign_id
             
             # Create new campaign
-            campaign = SalesforceCampaign(
-                Name=project_data.get("name", "Volunteer Opportunity"),
-                Type="Volunteer",
-                Status="Active",
-                StartDate=project_data.get("start_date"),
-                EndDate=project_data.get("end_date"),
-                Description=project_data.get("description", ""),
-                Volunteer_Opportunity__c=True,
-                Required_Skills__c=project_data.get("required_skills", ""),
-                Location__c=project_data.get("branch", ""),
-                Time_Commitment_Hours__c=project_data.get("estimated_hours")
-            )
-            
-            # Remove None values
-            campaign_data = {k: v for k, v in asdict(campaign).items() if v is not None}
+            campaign_data = self._campaign_create_fields(project_data)
             
             result = await self._salesforce_request("POST", "sobjects/Campaign", campaign_data)
             campaign_id = result.get("id")
@@ -312,19 +341,41 @@ class SalesforceNonprofitCloudSync:
             logger.error(f"Failed to find campaign by name: {e}")
             return None
     
+    def _campaign_create_fields(self, project_data: Dict) -> Dict:
+        """Campaign fields for a new volunteer project"""
+        campaign = SalesforceCampaign(
+            Name=project_data.get("name", "Volunteer Opportunity"),
+            Type="Volunteer",
+            Status="Active",
+            StartDate=project_data.get("start_date"),
+            EndDate=project_data.get("end_date"),
+            Description=project_data.get("description", ""),
+            Volunteer_Opportunity__c=True,
+            Required_Skills__c=project_data.get("required_skills", ""),
+            Location__c=project_data.get("branch", ""),
+            Time_Commitment_Hours__c=project_data.get("estimated_hours")
+        )
+        
+        # Remove None values
+        return {k: v for k, v in asdict(campaign).items() if v is not None}
+
+    def _campaign_update_fields(self, project_data: Dict) -> Dict:
+        """Campaign fields refreshed on an existing project"""
+        update_data = {
+            "Description": project_data.get("description", ""),
+            "Required_Skills__c": project_data.get("required_skills", ""),
+            "Location__c": project_data.get("branch", ""),
+            "Time_Commitment_Hours__c": project_data.get("estimated_hours"),
+            "EndDate": project_data.get("end_date")
+        }
+        
+        # Remove None values
+        return {k: v for k, v in update_data.items() if v is not None}
+
     async def update_campaign(self, campaign_id: str, project_data: Dict) -> bool:
         """Update existing Salesforce campaign"""
         try:
-            update_data = {
-                "Description": project_data.get("description", ""),
-                "Required_Skills__c": project_data.get("required_skills", ""),
-                "Location__c": project_data.get("branch", ""),
-                "Time_Commitment_Hours__c": project_data.get("estimated_hours"),
-                "EndDate": project_data.get("end_date")
-            }
-            
-            # Remove None values
-            update_data = {k: v for k, v in update_data.items() if v is not None}
+            update_data = self._campaign_update_fields(project_data)
             
             await self._salesforce_request("PATCH", f"sobjects/Campaign/{campaign_id}", update_data)
             
@@ -368,57 +419,19 @@ class SalesforceNonprofitCloudSync:
     
     # Bulk Operations
     
-    async def bulk_sync_contacts(self, volunteer_list: List[Dict]) -> Dict[str, Any]:
-        """Bulk sync multiple contacts to Salesforce"""
-        results = {
-            "successful": 0,
-            "failed": 0,
-            "errors": []
-        }
-        
-        for volunteer in volunteer_list:
-            try:
-                contact_id = await self.sync_contact_to_salesforce(volunteer)
-                if contact_id:
-                    results["successful"] += 1
-                else:
-                    results["failed"] += 1
-                    results["errors"].append(f"Failed to sync {volunteer.get('email', 'Unknown')}")
-                    
-                # Add small delay to avoid rate limiting
-                await asyncio.sleep(0.1)
-                
-            except Exception as e:
-                results["failed"] += 1
-                results["errors"].append(f"Error syncing {volunteer.get('email', 'Unknown')}: {str(e)}")
-        
-        return results
+    async def bulk_sync_contacts(self, volunteer_list: List[Dict],
+                                 progress_callback=None) -> Dict[str, Any]:
+        """Bulk sync contacts to Salesforce, matched by email, 200 per collections request"""
+        spec = BulkObjectSpec("Contact", "Email", "email",
+                              self._contact_create_fields, self._contact_update_fields)
+        return await self.bulk.run(spec, volunteer_list, progress_callback)
     
-    async def bulk_sync_campaigns(self, project_list: List[Dict]) -> Dict[str, Any]:
-        """Bulk sync multiple campaigns to Salesforce"""
-        results = {
-            "successful": 0,
-            "failed": 0,
-            "errors": []
-        }
-        
-        for project in project_list:
-            try:
-                campaign_id = await self.sync_campaign_to_salesforce(project)
-                if campaign_id:
-                    results["successful"] += 1
-                else:
-                    results["failed"] += 1
-                    results["errors"].append(f"Failed to sync {project.get('name', 'Unknown')}")
-                    
-                # Add small delay to avoid rate limiting
-                await asyncio.sleep(0.1)
-                
-            except Exception as e:
-                results["failed"] += 1
-                results["errors"].append(f"Error syncing {project.get('name', 'Unknown')}: {str(e)}")
-        
-        return results
+    async def bulk_sync_campaigns(self, project_list: List[Dict],
+                                  progress_callback=None) -> Dict[str, Any]:
+        """Bulk sync campaigns to Salesforce, matched by name, 200 per collections request"""
+        spec = BulkObjectSpec("Campaign", "Name", "name",
+                              self._campaign_create_fields, self._campaign_update_fields)
+        return await self.bulk.run(spec, project_list, progress_callback)
     
     # Query Methods
     
@@ -0,0 +1,237 @@
+"""
+Mock Salesforce REST API for tests and local runs of the Salesforce sync
+Implements OAuth password login, SOQL queries with = / IN filters, single sObject writes and the
+sObject Collections endpoints, with per-record errors like the real API
+
+Run standalone with: python salesforce_mock_server.py [port]
+"""
+from typing import Any, Dict, List, Optional
+import asyncio
+import itertools
+import re
+import sys
+
+from aiohttp import web
+
+ID_PREFIXES = {'Contact': '003', 'Campaign': '701', 'Task': '00T'}
+REQUIRED_FIELDS = {'Contact': ['LastName'], 'Campaign': ['Name']}
+COLLECTION_LIMIT = 200
+
+QUERY_PATTERN = re.compile(
+    r"SELECT\s+(?P<fields>.+?)\s+FROM\s+(?P<object>\w+)"
+    r"(?:\s+WHERE\s+(?P<field>\w+)\s*(?P<op>=|IN)\s*(?P<values>\(.*\)|'(?:[^'\\]|\\.)*'))?"
+    r"(?:\s+LIMIT\s+(?P<limit>\d+))?\s*$",
+    re.IGNORECASE | re.DOTALL
+)
+LITERAL_PATTERN = re.compile(r"'((?:[^'\\]|\\.)*)'")
+
+
+def _unescape(literal: str) -> str:
+    return re.sub(r"\\(.)", r"\1", literal)
+
+
+class MockSalesforceServer:
+    """In-memory Salesforce org served over HTTP.
+
+    `records` holds each sObject type's records by ID. `requests` logs
+    (method, path, record count) per API call; `max_in_flight` is the most
+    calls handled at once. Statuses queued in `fail_next` are returned,
+    one per call, before the next calls are served normally; a
+    (method, status) entry waits for the next call with that method.
+    """
+
+    def __init__(self, latency: float = 0.0, api_version: str = 'v58.0', query_page_size: int = 2000):
+        self.latency = latency
+        self.api_version = api_version
+        self.query_page_size = query_page_size
+        self.records: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.deleted: set = set()
+        self.requests: List[tuple] = []
+        self.fail_next: List[Any] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.access_token = 'mock-access-token'
+        self._ids = itertools.count(1)
+        self._cursors: Dict[str, List[Dict]] = {}
+        self.runner = None
+        self.base_url = None
+
+    # Data helpers
+
+    def insert(self, object_type: str, fields: Dict[str, Any]) -> str:
+        record_id = f"{ID_PREFIXES.get(object_type, '001')}{next(self._ids):015d}"
+        self.records.setdefault(object_type, {})[record_id] = dict(fields, Id=record_id)
+        return record_id
+
+    def delete(self, object_type: str, record_id: str):
+        self.records.get(object_type, {}).pop(record_id, None)
+        self.deleted.add(record_id)
+
+    def find(self, object_type: str, field: str, value: str) -> List[Dict[str, Any]]:
+        wanted = value.lower()
+        return [record for record in self.records.get(object_type, {}).values()
+                if str(record.get(field, '')).lower() == wanted]
+
+    def count(self, method: Optional[str] = None, kind: Optional[str] = None) -> int:
+        """Number of API calls, optionally filtered by method and 'query' / 'composite' / 'sobjects'"""
+        return sum(1 for request_method, path, _ in self.requests
+                   if (method is None or request_method == method) and (kind is None or f'/{kind}' in path))
+
+    # Request handling
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        if request.path == '/services/oauth2/token':
+            return await handler(request)
+        if request.headers.get('Authorization') != f'Bearer {self.access_token}':
+            return web.json_response([{'message': 'Session expired or invalid', 'errorCode': 'INVALID_SESSION_ID'}],
+                                     status=401)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            status = self._next_failure(request.method)
+            if status:
+                self.requests.append((request.method, request.path, 0))
+                return web.json_response([{'message': 'Request limit exceeded', 'errorCode': 'REQUEST_LIMIT_EXCEEDED'}],
+                                         status=status)
+            return await handler(request)
+        finally:
+            self.in_flight -= 1
+
+    def _next_failure(self, method: str) -> Optional[int]:
+        for index, failure in enumerate(self.fail_next):
+            if isinstance(failure, int) or failure[0] == method:
+                self.fail_next.pop(index)
+                return failure if isinstance(failure, int) else failure[1]
+        return None
+
+    async def _token(self, request):
+        form = await request.post()
+        if form.get('grant_type') != 'password':
+            return web.json_response({'error': 'unsupported_grant_type'}, status=400)
+        return web.json_response({'access_token': self.access_token, 'instance_url': self.base_url,
+                                  'token_type': 'Bearer'})
+
+    async def _query(self, request):
+        self.requests.append(('GET', request.path, 0))
+        match = QUERY_PATTERN.match(' '.join(request.query.get('q', '').split()))
+        if not match:
+            return web.json_response([{'message': 'unexpected token', 'errorCode': 'MALFORMED_QUERY'}], status=400)
+
+        fields = [field.strip() for field in match.group('fields').split(',')]
+        candidates = list(self.records.get(match.group('object'), {}).values())
+        if match.group('field'):
+            values = {_unescape(value).lower() for value in LITERAL_PATTERN.findall(match.group('values'))}
+            candidates = [record for record in candidates
+                          if str(record.get(match.group('field'), '')).lower() in values]
+        if match.group('limit'):
+            candidates = candidates[:int(match.group('limit'))]
+
+        rows = [dict({'attributes': {'type': match.group('object')}},
+                     **{field: record.get(field) for field in fields}) for record in candidates]
+        return web.json_response(self._page(rows, len(rows)))
+
+    async def _query_more(self, request):
+        self.requests.append(('GET', request.path, 0))
+        rows = self._cursors.pop(request.match_info['locator'], None)
+        if rows is None:
+            return web.json_response([{'message': 'invalid query locator', 'errorCode': 'INVALID_QUERY_LOCATOR'}],
+                                     status=400)
+        return web.json_response(self._page(rows, None))
+
+    def _page(self, rows: List[Dict], total: Optional[int]) -> Dict[str, Any]:
+        page, rest = rows[:self.query_page_size], rows[self.query_page_size:]
+        body = {'totalSize': total if total is not None else len(rows), 'done': not rest, 'records': page}
+        if rest:
+            locator = f"01gMOCK{next(self._ids)}-{len(page)}"
+            self._cursors[locator] = rest
+            body['nextRecordsUrl'] = f"/services/data/{self.api_version}/query/{locator}"
+        return body
+
+    def _error(self, code: str, message: str, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        return {'id': None, 'success': False,
+                'errors': [{'statusCode': code, 'message': message, 'fields': fields or []}]}
+
+    def _create(self, object_type: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        missing = [field for field in REQUIRED_FIELDS.get(object_type, []) if not fields.get(field)]
+        if missing:
+            return self._error('REQUIRED_FIELD_MISSING', f"Required fields are missing: {missing}", missing)
+        return {'id': self.insert(object_type, fields), 'success': True, 'errors': []}
+
+    def _update(self, object_type: str, record_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        if record_id in self.deleted:
+            return self._error('ENTITY_IS_DELETED', 'entity is deleted')
+        record = self.records.get(object_type, {}).get(record_id)
+        if record is None:
+            return self._error('INVALID_CROSS_REFERENCE_KEY', 'invalid cross reference id')
+        record.update(fields)
+        return {'id': record_id, 'success': True, 'errors': []}
+
+    async def _collection(self, request):
+        body = await request.json()
+        records = body.get('records', [])
+        self.requests.append((request.method, request.path, len(records)))
+        if len(records) > COLLECTION_LIMIT:
+            return web.json_response([{'message': f'Maximum of {COLLECTION_LIMIT} records', 'errorCode': 'EXCEEDED_ID_LIMIT'}],
+                                     status=400)
+
+        results = []
+        for record in records:
+            fields = {key: value for key, value in record.items() if key not in ('attributes', 'id')}
+            object_type = record.get('attributes', {}).get('type')
+            if request.method == 'POST':
+                results.append(self._create(object_type, fields))
+            else:
+                results.append(self._update(object_type, record.get('id'), fields))
+        return web.json_response(results)
+
+    async def _sobject_create(self, request):
+        self.requests.append(('POST', request.path, 1))
+        result = self._create(request.match_info['object'], await request.json())
+        if not result['success']:
+            return web.json_response(result['errors'], status=400)
+        return web.json_response(result, status=201)
+
+    async def _sobject_update(self, request):
+        self.requests.append(('PATCH', request.path, 1))
+        result = self._update(request.match_info['object'], request.match_info['id'], await request.json())
+        if not result['success']:
+            return web.json_response(result['errors'], status=404)
+        return web.Response(status=204)
+
+    # Lifecycle
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self._middleware])
+        prefix = f'/services/data/{self.api_version}'
+        app.router.add_post('/services/oauth2/token', self._token)
+        app.router.add_get(f'{prefix}/query', self._query)
+        app.router.add_get(f'{prefix}/query/{{locator}}', self._query_more)
+        app.router.add_post(f'{prefix}/composite/sobjects', self._collection)
+        app.router.add_patch(f'{prefix}/composite/sobjects', self._collection)
+        app.router.add_post(f'{prefix}/sobjects/{{object}}', self._sobject_create)
+        app.router.add_patch(f'{prefix}/sobjects/{{object}}/{{id}}', self._sobject_update)
+        return app
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0):
+        self.runner = web.AppRunner(self.app())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        self.base_url = f'http://{host}:{site._server.sockets[0].getsockname()[1]}'
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+
+async def _serve(port: int):
+    server = MockSalesforceServer()
+    await server.start(port=port)
+    print(f"🧪 Mock Salesforce listening on {server.base_url} (set SALESFORCE_INSTANCE_URL to it)")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(_serve(int(sys.argv[1]) if len(sys.argv) > 1 else 8089))
@@ -4,6 +4,7 @@ Manages Salesforce synchronization operations and provides high-level interface
 """
 import asyncio
 import logging
+import os
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 import pandas as pd
@@ -40,7 +41,11 @@ class SalesforceService:
                 username=settings.SALESFORCE_USERNAME,
                 password=settings.SALESFORCE_PASSWORD,
                 security_token=settings.SALESFORCE_SECURITY_TOKEN,
-                api_version=settings.SALESFORCE_API_VERSION
+                api_version=settings.SALESFORCE_API_VERSION,
+                bulk_concurrency=getattr(settings, 'SALESFORCE_BULK_CONCURRENCY', 4),
+                requests_per_second=getattr(settings, 'SALESFORCE_REQUESTS_PER_SECOND', 10.0),
+                id_cache_path=getattr(settings, 'SALESFORCE_ID_CACHE_PATH', os.path.join(
+                    os.path.dirname(os.path.abspath(__file__)), 'salesforce_id_cache.json'))
             )
             logger.info("Salesforce configuration initialized")
         except Exception as e:
@@ -116,17 +121,8 @@ class SalesforceService:
                         if volunteer_dict.get("email"):  # Only sync if email exists
                             volunteer_list.append(volunteer_dict)
                     
-                    # Process in batches
-                    batch_size = settings.SALESFORCE_BATCH_SIZE
-                    for i in range(0, len(volunteer_list), batch_size):
-                        batch = volunteer_list[i:i+batch_size]
-                        batch_result = await client.bulk_sync_contacts(batch)
-                        
-                        results["contacts"]["successful"] += batch_result["successful"]
-                        results["contacts"]["failed"] += batch_result["failed"]
-                        results["contacts"]["errors"].extend(batch_result["errors"])
-                        
-                        logger.info(f"Processed contact batch {i//batch_size + 1}: {batch_result['successful']} successful, {batch_result['failed']} failed")
+                    # Chunked and run concurrently by the bulk pipeline
+                    results["contacts"] = await client.bulk_sync_contacts(volunteer_list)
                 
                 # 2. Sync Campaigns (Projects)
                 if "projects" in volunteer_data:
@@ -140,16 +136,8 @@ class SalesforceService:
                         if project_dict.get("name"):  # Only sync if name exists
                             project_list.append(project_dict)
                     
-                    # Process in batches
-                    for i in range(0, len(project_list), batch_size):
-                        batch = project_list[i:i+batch_size]
-                        batch_result = await client.bulk_sync_campaigns(batch)
-                        
-                        results["campaigns"]["successful"] += batch_result["successful"]
-                        results["campaigns"]["failed"] += batch_result["failed"]
-                        results["campaigns"]["errors"].extend(batch_result["errors"])
-                        
-                        logger.info(f"Processed campaign batch {i//batch_size + 1}: {batch_result['successful']} successful, {batch_result['failed']} failed")
+                    # Chunked and run concurrently by the bulk pipeline
+                    results["campaigns"] = await client.bulk_sync_campaigns(project_list)
                 
                 # 3. Sync Activities (Interactions)
                 if "interactions" in volunteer_data:
@@ -173,15 +161,19 @@ class SalesforceService:
                             if not contact_email or not project_name:
                                 continue
                             
-                            # Look up Salesforce IDs
-                            contact = await client.find_contact_by_email(contact_email)
-                            campaign = await client.find_campaign_by_name(project_name)
+                            # Look up Salesforce IDs, from the local ID cache when the bulk sync saw them
+                            contact_id = client.id_cache.get("Contact", contact_email)
+                            if not contact_id:
+                                contact_id = (await client.find_contact_by_email(contact_email) or {}).get("Id")
+                            campaign_id = client.id_cache.get("Campaign", project_name)
+                            if not campaign_id:
+                                campaign_id = (await client.find_campaign_by_name(project_name) or {}).get("Id")
                             
-                            if contact and campaign:
+                            if contact_id and campaign_id:
                                 activity_dict = transform_activity_to_salesforce(
                                     row.to_dict(),
-                                    contact["Id"],
-                                    campaign["Id"]
+                                    contact_id,
+                                    campaign_id
                                 )
                                 
                                 activity_id = await client.sync_activity_to_salesforce(activity_dict)
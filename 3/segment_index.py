@@ -0,0 +1,291 @@
+"""
+Segment index for audience segmentation
+Precomputes per-volunteer engagement, affinity and recency columns once and answers segment criteria with cached boolean bitmaps
+"""
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Engagement tiers by total hours: (name, lower bound inclusive, upper bound exclusive)
+ENGAGEMENT_TIERS = [
+    ('none', 0, 1e-9),
+    ('light', 1e-9, 20),
+    ('engaged', 20, 50),
+    ('champion', 50, float('inf')),
+]
+
+# Activity recency buckets by days since last activity; volunteers with no activity are 'never'
+RECENCY_BUCKETS = [
+    ('active_30d', -float('inf'), 31),
+    ('recent_90d', 31, 91),
+    ('lapsed_1y', 91, 366),
+    ('dormant', 366, float('inf')),
+]
+
+# Columns with a bitmap per distinct value
+BITMAP_FIELDS = ('preferred_branch', 'preferred_category', 'member_branch', 'engagement_tier', 'activity_bucket')
+
+ENGAGEMENT_FIELD_MAP = {
+    'hours': 'total_hours',
+    'sessions': 'total_sessions',
+    'projects': 'unique_projects',
+}
+
+class SegmentIndex:
+    """Boolean bitmaps over a fixed ordering of the volunteers table.
+
+    Row i of every bitmap is row i of `volunteers_df`. The derived columns
+    (hours, sessions, projects, preferred branch and category, days since
+    last activity) are computed once from the interactions. Each criterion's
+    bitmap is cached, so a segment is the AND of its criteria's bitmaps and
+    a union of segments is an OR. Recency depends on today's date, so the
+    index rebuilds itself the first time it is used on a new day.
+    """
+
+    def __init__(self, volunteers_df: pd.DataFrame, interactions_df: pd.DataFrame, max_cached_masks: int = 512):
+        self.volunteers_df = volunteers_df.reset_index(drop=True)
+        self.interactions_df = interactions_df
+        self.max_cached_masks = max_cached_masks
+        self._masks: OrderedDict = OrderedDict()
+        self._stats = {'hits': 0, 'misses': 0, 'builds': 0}
+        self._build()
+
+    def __len__(self) -> int:
+        return len(self.volunteers_df)
+
+    def _build(self):
+        start = time.perf_counter()
+        self.as_of = date.today()
+        volunteers = self.volunteers_df
+        # Derived columns that could not be computed are left out; criteria on them match everyone
+        derived: Dict[str, pd.Series] = {}
+
+        if 'contact_id' in volunteers.columns:
+            contact_ids = volunteers['contact_id']
+            for name, builder in (('engagement', self._engagement_columns),
+                                  ('branch', self._preferred_column('branch_short', 'preferred_branch')),
+                                  ('category', self._preferred_column('project_category', 'preferred_category')),
+                                  ('activity', self._activity_columns)):
+                try:
+                    for column, values in builder().items():
+                        derived[column] = contact_ids.map(values)
+                except Exception as e:
+                    logger.debug(f"Segment index has no {name} columns: {e}")
+
+        if 'last_activity_date' in derived:
+            derived['days_since_last_activity'] = (
+                datetime.now() - pd.to_datetime(derived['last_activity_date'])
+            ).dt.days
+        if 'total_hours' in derived:
+            derived['engagement_tier'] = self._bucket(derived['total_hours'].fillna(0), ENGAGEMENT_TIERS)
+        if 'days_since_last_activity' in derived:
+            derived['activity_bucket'] = self._bucket(
+                derived['days_since_last_activity'], RECENCY_BUCKETS, missing='never'
+            )
+
+        self.frame = volunteers.assign(**derived) if derived else volunteers
+        self.bitmaps: Dict[str, Dict[Any, np.ndarray]] = {}
+        for field in BITMAP_FIELDS:
+            if field in self.frame.columns:
+                codes, values = pd.factorize(self.frame[field])
+                self.bitmaps[field] = {value: codes == position for position, value in enumerate(values)}
+
+        self._masks.clear()
+        self._stats['builds'] += 1
+        self.build_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"Built segment index over {len(self)} volunteers in {self.build_ms:.1f} ms")
+
+    def _engagement_columns(self) -> Dict[str, pd.Series]:
+        stats = self.interactions_df.groupby('contact_id').agg({
+            'hours': 'sum',
+            'date': 'count',  # sessions
+            'project_id': 'nunique'  # unique projects
+        })
+        return {
+            'total_hours': stats['hours'],
+            'total_sessions': stats['date'],
+            'unique_projects': stats['project_id'],
+        }
+
+    def _preferred_column(self, source: str, column: str):
+        def build() -> Dict[str, pd.Series]:
+            # Most frequent value per volunteer; ties go to the value seen first, as with value_counts()
+            interactions = self.interactions_df[['contact_id', source]].dropna(subset=[source])
+            counts = interactions.assign(_order=np.arange(len(interactions)))\
+                .groupby(['contact_id', source], sort=False)['_order']\
+                .agg(['size', 'min'])\
+                .reset_index()\
+                .sort_values(['size', 'min'], ascending=[False, True], kind='stable')
+            return {column: counts.drop_duplicates('contact_id').set_index('contact_id')[source]}
+        return build
+
+    def _activity_columns(self) -> Dict[str, pd.Series]:
+        return {'last_activity_date': self.interactions_df.groupby('contact_id')['date'].max()}
+
+    @staticmethod
+    def _bucket(values: pd.Series, buckets: List[Tuple[str, float, float]], missing: Optional[str] = None) -> pd.Series:
+        labels = np.full(len(values), missing, dtype=object)
+        numeric = values.to_numpy(dtype=float, na_value=np.nan)
+        for name, lower, upper in buckets:
+            labels[(numeric >= lower) & (numeric < upper)] = name
+        return pd.Series(labels, index=values.index)
+
+    def _ensure_current(self):
+        if date.today() != self.as_of:
+            self._build()
+
+    def mask(self, criteria: Iterable[Any]) -> np.ndarray:
+        """Bitmap of volunteers matching every criterion"""
+        self._ensure_current()
+        result = np.ones(len(self), dtype=bool)
+        for criterion in criteria:
+            result &= self.criterion_mask(criterion)
+        return result
+
+    def mask_any(self, segments: Iterable[Iterable[Any]]) -> np.ndarray:
+        """Bitmap of volunteers matching at least one segment (each a list of ANDed criteria)"""
+        self._ensure_current()
+        result = np.zeros(len(self), dtype=bool)
+        for criteria in segments:
+            result |= self.mask(criteria)
+        return result
+
+    def criterion_mask(self, criterion: Any) -> np.ndarray:
+        """Cached bitmap for one SegmentCriteria"""
+        key = self._criterion_key(criterion)
+        if key is not None and key in self._masks:
+            self._stats['hits'] += 1
+            self._masks.move_to_end(key)
+            return self._masks[key]
+
+        self._stats['misses'] += 1
+        try:
+            mask = self._compute_mask(criterion)
+        except Exception as e:
+            logger.error(f"Error applying criterion {criterion.type}: {e}")
+            mask = None
+        if mask is None:
+            mask = np.ones(len(self), dtype=bool)
+        mask.flags.writeable = False
+
+        if key is not None:
+            self._masks[key] = mask
+            while len(self._masks) > self.max_cached_masks:
+                self._masks.popitem(last=False)
+        return mask
+
+    @staticmethod
+    def _criterion_key(criterion: Any) -> Optional[Tuple]:
+        value = criterion.value
+        if isinstance(value, (list, set, tuple)):
+            value = tuple(value)
+        key = (criterion.type.value, criterion.field, criterion.operator, value)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def _compute_mask(self, criterion: Any) -> Optional[np.ndarray]:
+        """Bitmap for a criterion, or None when it does not apply (it then matches everyone)"""
+        columns = self.frame.columns
+        kind = criterion.type.value
+        has_contacts = 'contact_id' in columns
+
+        if kind == 'engagement_level':
+            if not has_contacts:
+                return None
+            if criterion.field == 'engagement_tier':
+                return self._filter_mask('engagement_tier', criterion.operator, criterion.value)
+            field = ENGAGEMENT_FIELD_MAP.get(criterion.field, criterion.field)
+            if field not in columns:
+                return None
+            return self._numeric_mask(self.frame[field].fillna(0), criterion.operator, criterion.value)
+        if kind == 'volunteer_experience':
+            if criterion.field == 'experience_level':
+                return self._filter_mask('experience_level', criterion.operator, criterion.value)
+            return None
+        if kind == 'branch_affinity':
+            return self._filter_mask('preferred_branch', criterion.operator, criterion.value) if has_contacts else None
+        if kind == 'category_interest':
+            return self._filter_mask('preferred_category', criterion.operator, criterion.value) if has_contacts else None
+        if kind == 'time_since_last_activity':
+            if not has_contacts:
+                return None
+            if criterion.field == 'activity_bucket':
+                return self._filter_mask('activity_bucket', criterion.operator, criterion.value)
+            if 'days_since_last_activity' not in columns:
+                return None
+            return self._numeric_mask(self.frame['days_since_last_activity'], criterion.operator, criterion.value)
+        if kind in ('demographic', 'custom'):
+            return self._filter_mask(criterion.field, criterion.operator, criterion.value)
+        return None
+
+    def _filter_mask(self, field: str, operator: str, value: Any) -> Optional[np.ndarray]:
+        if field not in self.frame.columns:
+            return None
+
+        bitmaps = self.bitmaps.get(field)
+        if bitmaps is not None and (operator == 'eq' or (operator == 'in' and isinstance(value, (list, tuple, set)))):
+            values = [value] if operator == 'eq' else value
+            mask = np.zeros(len(self), dtype=bool)
+            for item in values:
+                if item in bitmaps and not pd.isna(item):
+                    mask |= bitmaps[item]
+            return mask
+
+        column = self.frame[field]
+        if operator == 'eq':
+            return (column == value).to_numpy()
+        elif operator == 'in':
+            return column.isin(value).to_numpy()
+        elif operator == 'contains':
+            return column.str.contains(str(value), na=False).to_numpy(dtype=bool)
+        return self._numeric_mask(column, operator, value)
+
+    def _numeric_mask(self, column: pd.Series, operator: str, value: Any) -> Optional[np.ndarray]:
+        try:
+            if operator == 'gt':
+                return (column > value).to_numpy()
+            elif operator == 'lt':
+                return (column < value).to_numpy()
+            elif operator == 'gte':
+                return (column >= value).to_numpy()
+            elif operator == 'lte':
+                return (column <= value).to_numpy()
+            elif operator == 'between' and isinstance(value, list) and len(value) == 2:
+                return ((column >= value[0]) & (column <= value[1])).to_numpy()
+        except Exception:
+            return None
+        return None
+
+    def rows(self, mask: np.ndarray) -> pd.DataFrame:
+        """Volunteer rows (with the derived columns) selected by a bitmap"""
+        return self.frame[mask]
+
+    def value_counts(self, field: str, mask: Optional[np.ndarray] = None) -> Dict[Any, int]:
+        """Audience size per value of a bitmap field, optionally within another segment"""
+        self._ensure_current()
+        return {
+            value: int(np.count_nonzero(bitmap & mask if mask is not None else bitmap))
+            for value, bitmap in self.bitmaps.get(field, {}).items()
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self._stats['hits'] + self._stats['misses']
+        return {
+            **self._stats,
+            'volunteers': len(self),
+            'as_of': self.as_of.isoformat(),
+            'build_ms': round(self.build_ms, 2),
+            'bitmap_fields': {field: len(values) for field, values in self.bitmaps.items()},
+            'cached_masks': len(self._masks),
+            'hit_rate': round(self._stats['hits'] / lookups, 3) if lookups else 0,
+        }
@@ -3,17 +3,23 @@ Statistical Analysis Module for A/B Test Framework
 Provides robust statistical calculations for measuring campaign message impact
 """
 import numpy as np
-import pandas as pd
 from scipy import stats
-from scipy.stats import chi2_contingency, ttest_ind, mannwhitneyu
+from scipy.stats import ttest_ind, mannwhitneyu
 import math
 from typing import Dict, List, Tuple, Optional, Any
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 import logging
 
+from statistical_kernels import (
+    beta_comparison, sample_beta_comparison, two_proportion_p_values, two_proportion_z_scores,
+    group_sequential_boundaries
+)
+
 logger = logging.getLogger(__name__)
 
+CONVERSION_KEYS = ('control_conversions', 'control_total', 'variant_conversions', 'variant_total')
+
 @dataclass
 class StatisticalResult:
     metric_name: str
@@ -52,63 +58,76 @@ class StatisticalAnalyzer:
     def analyze_conversion_rate(self, control_conversions: int, control_total: int,
                               variant_conversions: int, variant_total: int) -> StatisticalResult:
         """Analyze conversion rate difference between control and variant"""
+        return self.analyze_conversion_rates(
+            [control_conversions], [control_total], [variant_conversions], [variant_total]
+        )[0]
+    
+    def analyze_conversion_rates(self, control_conversions: List[int], control_totals: List[int],
+                                 variant_conversions: List[int], variant_totals: List[int]) -> List[StatisticalResult]:
+        """Analyze conversion rate differences for many control/variant pairs in one array pass"""
+        c1, n1, c2, n2 = (np.asarray(v, dtype=float) for v in
+                          (control_conversions, control_totals, variant_conversions, variant_totals))
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            control_rate = c1 / n1
+            variant_rate = c2 / n2
+            
+            # Chi-square test for proportion differences (Yates-corrected, as chi2_contingency)
+            p_values = two_proportion_p_values(c1, n1, c2, n2)
+            
+            # Effect size (Cohen's h for proportions)
+            effect_sizes = 2 * (np.arcsin(np.sqrt(control_rate)) - np.arcsin(np.sqrt(variant_rate)))
+            
+            # Confidence interval for difference in proportions
+            diff = variant_rate - control_rate
+            se_diff = np.sqrt(control_rate * (1 - control_rate) / n1 + variant_rate * (1 - variant_rate) / n2)
+            ci_lower = diff - self.z_score * se_diff
+            ci_upper = diff + self.z_score * se_diff
+            
+            lifts = np.where(control_rate > 0, diff / control_rate * 100, 0.0)
+            
+            # Statistical power (see _calculate_power_proportions)
+            differs = (control_rate != variant_rate) & (n1 > 0) & (n2 > 0)
+            p_pooled = (c1 + c2) / (n1 + n2)
+            se_pooled = np.sqrt(p_pooled * (1 - p_pooled) * (1 / n1 + 1 / n2))
+            se_separate = np.sqrt(control_rate * (1 - control_rate) / n1 + variant_rate * (1 - variant_rate) / n2)
+            powers = np.where(differs, np.clip(
+                stats.norm.cdf((np.abs(diff) - self.z_score * se_pooled) / se_separate), 0.0, 1.0
+            ), 0.0)
+            
+            # Required sample size for 80% power (see _required_sample_size_proportions)
+            p_avg = (control_rate + variant_rate) / 2
+            required = ((self.z_score * np.sqrt(2 * p_avg * (1 - p_avg)) +
+                         stats.norm.ppf(0.8) * np.sqrt(control_rate * (1 - control_rate) +
+                                                       variant_rate * (1 - variant_rate))) / diff) ** 2
+            required = np.where(differs, np.ceil(required), 0)
+        
+        results = []
+        for i in range(len(c1)):
+            if n1[i] == 0 or n2[i] == 0:
+                results.append(self._create_empty_result("Conversion Rate", "Insufficient data"))
+                continue
+            
+            p_value, lift_percentage, power = float(p_values[i]), float(lifts[i]), float(powers[i])
+            results.append(StatisticalResult(
+                metric_name="Conversion Rate",
+                control_value=float(control_rate[i]),
+                variant_value=float(variant_rate[i]),
+                sample_size_control=control_totals[i],
+                sample_size_variant=variant_totals[i],
+                effect_size=float(effect_sizes[i]),
+                lift_percentage=lift_percentage,
+                p_value=p_value,
+                confidence_level=self.confidence_level,
+                confidence_interval=(float(ci_lower[i]), float(ci_upper[i])),
+                is_statistically_significant=p_value < self.alpha,
+                power=power,
+                required_sample_size=int(required[i]),
+                test_type="Chi-square test",
+                interpretation=self._interpret_result(p_value, lift_percentage, power)
+            ))
         
-        if control_total == 0 or variant_total == 0:
-            return self._create_empty_result("Conversion Rate", "Insufficient data")
-        
-        control_rate = control_conversions / control_total
-        variant_rate = variant_conversions / variant_total
-        
-        # Chi-square test for proportion differences
-        contingency_table = np.array([
-            [control_conversions, control_total - control_conversions],
-            [variant_conversions, variant_total - variant_conversions]
-        ])
-        
-        chi2, p_value, dof, expected = chi2_contingency(contingency_table)
-        
-        # Calculate effect size (Cohen's h for proportions)
-        effect_size = self._cohens_h(control_rate, variant_rate)
-        
-        # Calculate confidence interval for difference in proportions
-        diff = variant_rate - control_rate
-        se_diff = math.sqrt(
-            (control_rate * (1 - control_rate) / control_total) +
-            (variant_rate * (1 - variant_rate) / variant_total)
-        )
-        
-        ci_lower = diff - self.z_score * se_diff
-        ci_upper = diff + self.z_score * se_diff
-        
-        lift_percentage = ((variant_rate - control_rate) / control_rate * 100) if control_rate > 0 else 0
-        
-        # Statistical power calculation
-        power = self._calculate_power_proportions(
-            control_rate, variant_rate, control_total, variant_total
-        )
-        
-        # Required sample size for desired power
-        required_n = self._required_sample_size_proportions(
-            control_rate, variant_rate, power=0.8
-        )
-        
-        return StatisticalResult(
-            metric_name="Conversion Rate",
-            control_value=control_rate,
-            variant_value=variant_rate,
-            sample_size_control=control_total,
-            sample_size_variant=variant_total,
-            effect_size=effect_size,
-            lift_percentage=lift_percentage,
-            p_value=p_value,
-            confidence_level=self.confidence_level,
-            confidence_interval=(ci_lower, ci_upper),
-            is_statistically_significant=p_value < self.alpha,
-            power=power,
-            required_sample_size=required_n,
-            test_type="Chi-square test",
-            interpretation=self._interpret_result(p_value, lift_percentage, power)
-        )
+        return results
     
     def analyze_continuous_metric(self, control_values: List[float], 
                                 variant_values: List[float],
@@ -188,149 +207,200 @@ class StatisticalAnalyzer:
     
     def bayesian_analysis(self, control_conversions: int, control_total: int,
                          variant_conversions: int, variant_total: int,
-                         prior_alpha: float = 1, prior_beta: float = 1) -> BayesianResult:
+                         prior_alpha: float = 1, prior_beta: float = 1,
+                         method: str = 'auto') -> BayesianResult:
         """Bayesian analysis for conversion rates using Beta-Binomial model"""
+        return self.bayesian_analysis_batch(
+            [control_conversions], [control_total], [variant_conversions], [variant_total],
+            prior_alpha, prior_beta, method
+        )[0]
+    
+    def bayesian_analysis_batch(self, control_conversions: List[int], control_totals: List[int],
+                                variant_conversions: List[int], variant_totals: List[int],
+                                prior_alpha: float = 1, prior_beta: float = 1,
+                                method: str = 'auto', n_simulations: int = 100000) -> List[BayesianResult]:
+        """Bayesian analysis for many tests at once.
+        
+        method='auto' integrates the Beta posteriors numerically for all tests in one array
+        operation and falls back to Monte Carlo sampling for tests it cannot integrate (e.g. a
+        control with no conversions under a flat prior). method='sampling' always samples.
+        """
+        control_conversions = np.asarray(control_conversions, dtype=float)
+        control_totals = np.asarray(control_totals, dtype=float)
+        variant_conversions = np.asarray(variant_conversions, dtype=float)
+        variant_totals = np.asarray(variant_totals, dtype=float)
         
         # Posterior distributions
         control_alpha = prior_alpha + control_conversions
-        control_beta = prior_beta + control_total - control_conversions
-        
+        control_beta = prior_beta + control_totals - control_conversions
         variant_alpha = prior_alpha + variant_conversions
-        variant_beta = prior_beta + variant_total - variant_conversions
-        
-        # Monte Carlo simulation
-        n_simulations = 100000
-        control_samples = np.random.beta(control_alpha, control_beta, n_simulations)
-        variant_samples = np.random.beta(variant_alpha, variant_beta, n_simulations)
-        
-        # Probability that variant is better
-        prob_variant_better = np.mean(variant_samples > control_samples)
-        
-        # Expected lift
-        lift_samples = (variant_samples - control_samples) / control_samples
-        expected_lift = np.mean(lift_samples) * 100
-        
-        # Credible interval for lift
-        ci_lower, ci_upper = np.percentile(lift_samples * 100, [2.5, 97.5])
+        variant_beta = prior_beta + variant_totals - variant_conversions
         
-        # Risk calculations
-        negative_lifts = lift_samples[lift_samples < 0]
-        risk_of_loss = len(negative_lifts) / len(lift_samples)
-        
-        positive_lifts = lift_samples[lift_samples > 0]
-        potential_gain = np.mean(positive_lifts) * 100 if len(positive_lifts) > 0 else 0
+        if method == 'sampling':
+            summary = {key: np.full(len(control_alpha), np.nan) for key in
+                       ('prob_variant_better', 'expected_lift', 'ci_lower', 'ci_upper', 'potential_gain')}
+        else:
+            summary = beta_comparison(control_alpha, control_beta, variant_alpha, variant_beta)
+        
+        results = []
+        for i in range(len(control_alpha)):
+            row = {key: float(values[i]) for key, values in summary.items()}
+            if not all(math.isfinite(value) for value in row.values()):
+                row = sample_beta_comparison(control_alpha[i], control_beta[i], variant_alpha[i], variant_beta[i],
+                                             n_simulations=n_simulations)
+            
+            results.append(BayesianResult(
+                metric_name="Conversion Rate",
+                probability_variant_better=row['prob_variant_better'],
+                credible_interval=(row['ci_lower'] * 100, row['ci_upper'] * 100),
+                expected_lift=row['expected_lift'] * 100,
+                risk_of_loss=1 - row['prob_variant_better'],
+                potential_gain=row['potential_gain'] * 100
+            ))
         
-        return BayesianResult(
-            metric_name="Conversion Rate",
-            probability_variant_better=prob_variant_better,
-            credible_interval=(ci_lower, ci_upper),
-            expected_lift=expected_lift,
-            risk_of_loss=risk_of_loss,
-            potential_gain=potential_gain
-        )
+        return results
     
-    def sequential_analysis(self, data_points: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Sequential analysis to monitor test progress and recommend early stopping"""
+    def sequential_analysis(self, data_points: List[Dict[str, Any]],
+                          planned_sample_size: Optional[int] = None,
+                          spending: str = 'obrien_fleming') -> Dict[str, Any]:
+        """Sequential analysis to monitor test progress and recommend early stopping
+        
+        Every data point is a look at the cumulative counts, and all looks are tested in one
+        vectorized pass. With a planned_sample_size (users across both groups) each look is
+        held to an alpha-spending boundary, which keeps the overall false positive rate at
+        alpha however often the test is checked. Without one, the fixed p-value rules apply.
+        """
         
         if not data_points:
             return {"recommendation": "continue", "reason": "Insufficient data"}
         
-        df = pd.DataFrame(data_points)
-        df['cumulative_control_conv'] = df['control_conversions'].cumsum()
-        df['cumulative_control_total'] = df['control_total'].cumsum()
-        df['cumulative_variant_conv'] = df['variant_conversions'].cumsum()
-        df['cumulative_variant_total'] = df['variant_total'].cumsum()
+        counts = np.array([
+            [point['control_conversions'], point['control_total'],
+             point['variant_conversions'], point['variant_total']]
+            for point in data_points
+        ], dtype=float).cumsum(axis=0)
+        control_conv, control_total, variant_conv, variant_total = counts.T
         
         # Calculate p-values over time
-        p_values = []
-        for i, row in df.iterrows():
-            if row['cumulative_control_total'] > 0 and row['cumulative_variant_total'] > 0:
-                result = self.analyze_conversion_rate(
-                    int(row['cumulative_control_conv']),
-                    int(row['cumulative_control_total']),
-                    int(row['cumulative_variant_conv']),
-                    int(row['cumulative_variant_total'])
-                )
-                p_values.append(result.p_value)
-            else:
-                p_values.append(1.0)
-        
-        df['p_value'] = p_values
+        p_values = two_proportion_p_values(control_conv, control_total, variant_conv, variant_total)
+        latest_p = float(p_values[-1])
         
-        # Check for early stopping conditions
-        latest_p = p_values[-1] if p_values else 1.0
+        if planned_sample_size:
+            return self._group_sequential_decision(counts, p_values, planned_sample_size, spending)
         
+        # Check for early stopping conditions
         if latest_p < 0.01:  # Very strong evidence
             return {
                 "recommendation": "stop_early",
                 "reason": "Strong statistical significance achieved",
-                "confidence": "high"
+                "confidence": "high",
+                "p_values": p_values.tolist()
             }
         elif latest_p < self.alpha and len(data_points) >= 100:  # Minimum sample size
             return {
                 "recommendation": "stop_early", 
                 "reason": "Statistical significance achieved with adequate sample",
-                "confidence": "medium"
+                "confidence": "medium",
+                "p_values": p_values.tolist()
             }
         elif len(data_points) >= 1000 and latest_p > 0.5:  # Large sample, no effect
             return {
                 "recommendation": "stop_early",
                 "reason": "Large sample with no detectable effect",
-                "confidence": "medium"
+                "confidence": "medium",
+                "p_values": p_values.tolist()
             }
         else:
             return {
                 "recommendation": "continue",
                 "reason": "Insufficient evidence for early stopping",
                 "sample_size": len(data_points),
-                "current_p_value": latest_p
+                "current_p_value": latest_p,
+                "p_values": p_values.tolist()
             }
     
+    def _group_sequential_decision(self, counts: np.ndarray, p_values: np.ndarray,
+                                   planned_sample_size: int, spending: str) -> Dict[str, Any]:
+        """Compare each look's z statistic with its alpha-spending boundary"""
+        control_conv, control_total, variant_conv, variant_total = counts.T
+        information = np.minimum((control_total + variant_total) / planned_sample_size, 1.0)
+        z_scores = two_proportion_z_scores(control_conv, control_total, variant_conv, variant_total)
+        boundaries = group_sequential_boundaries(information, self.alpha, spending)
+        
+        crossed = np.flatnonzero(np.abs(z_scores) >= boundaries)
+        result = {
+            "sample_size": int(control_total[-1] + variant_total[-1]),
+            "information_fraction": float(information[-1]),
+            "current_p_value": float(p_values[-1]),
+            "spending_function": spending,
+            "p_values": p_values.tolist(),
+            "z_scores": z_scores.tolist(),
+            "boundaries": [float(b) if math.isfinite(b) else None for b in boundaries]
+        }
+        
+        if len(crossed):
+            look = int(crossed[0])
+            direction = "positive" if z_scores[look] > 0 else "negative"
+            result.update({
+                "recommendation": "stop_early",
+                "reason": f"Crossed the {spending} alpha-spending boundary with a {direction} effect",
+                "confidence": "high",
+                "stopping_look": look
+            })
+        elif information[-1] >= 1.0:
+            result.update({
+                "recommendation": "stop",
+                "reason": "Planned sample size reached without crossing the boundary"
+            })
+        else:
+            result.update({
+                "recommendation": "continue",
+                "reason": "Boundary not crossed yet"
+            })
+        return result
+    
     def multi_variant_analysis(self, variants_data: Dict[str, Dict[str, int]]) -> Dict[str, Any]:
         """Analyze multiple variants using ANOVA and post-hoc tests"""
         
         if len(variants_data) < 3:
             return {"error": "Multi-variant analysis requires at least 3 variants"}
         
-        # Prepare data for ANOVA
-        conversion_rates = []
-        variant_labels = []
-        
-        for variant_name, data in variants_data.items():
-            rate = data['conversions'] / data['total'] if data['total'] > 0 else 0
-            conversion_rates.append(rate)
-            variant_labels.append(variant_name)
-        
-        # One-way ANOVA (simplified - in practice, use proper proportion tests)
-        f_stat, p_value = stats.f_oneway(*[
-            [data['conversions'] / data['total']] * data['total'] 
-            for data in variants_data.values() if data['total'] > 0
-        ])
-        
-        # Pairwise comparisons (Bonferroni correction)
-        pairwise_results = {}
         variant_names = list(variants_data.keys())
+        conversions = np.array([variants_data[name]['conversions'] for name in variant_names], dtype=float)
+        totals = np.array([variants_data[name]['total'] for name in variant_names], dtype=float)
+        
+        # One-way ANOVA on the per-user 0/1 outcomes, from the counts alone
+        has_users = totals > 0
+        groups, n = int(has_users.sum()), totals[has_users].sum()
+        rates = conversions[has_users] / totals[has_users]
+        grand_rate = conversions[has_users].sum() / n if n else 0.0
+        between = float((totals[has_users] * (rates - grand_rate) ** 2).sum())
+        within = float((totals[has_users] * rates * (1 - rates)).sum())
+        if groups > 1 and n > groups and within > 0:
+            f_stat = (between / (groups - 1)) / (within / (n - groups))
+            p_value = float(stats.f.sf(f_stat, groups - 1, n - groups))
+        else:
+            f_stat, p_value = float('nan'), float('nan')
+        
+        # Pairwise comparisons (Bonferroni correction), every pair in one array operation
+        first, second = np.triu_indices(len(variant_names), k=1)
+        pair_p_values = two_proportion_p_values(conversions[first], totals[first],
+                                                conversions[second], totals[second])
+        n_comparisons = len(first)
+        adjusted_p_values = np.minimum(1.0, pair_p_values * n_comparisons)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            first_rates = conversions[first] / totals[first]
+            lifts = (conversions[second] / totals[second] - first_rates) / first_rates * 100
+        lifts = np.where((totals[first] > 0) & (totals[second] > 0) & (conversions[first] > 0), lifts, 0.0)
         
-        for i in range(len(variant_names)):
-            for j in range(i + 1, len(variant_names)):
-                var1, var2 = variant_names[i], variant_names[j]
-                data1, data2 = variants_data[var1], variants_data[var2]
-                
-                result = self.analyze_conversion_rate(
-                    data1['conversions'], data1['total'],
-                    data2['conversions'], data2['total']
-                )
-                
-                # Apply Bonferroni correction
-                n_comparisons = len(variant_names) * (len(variant_names) - 1) / 2
-                adjusted_p = min(1.0, result.p_value * n_comparisons)
-                
-                pairwise_results[f"{var1}_vs_{var2}"] = {
-                    "p_value": result.p_value,
-                    "adjusted_p_value": adjusted_p,
-                    "is_significant": adjusted_p < self.alpha,
-                    "lift_percentage": result.lift_percentage
-                }
+        pairwise_results = {}
+        for k, (i, j) in enumerate(zip(first, second)):
+            pairwise_results[f"{variant_names[i]}_vs_{variant_names[j]}"] = {
+                "p_value": float(pair_p_values[k]),
+                "adjusted_p_value": float(adjusted_p_values[k]),
+                "is_significant": bool(adjusted_p_values[k] < self.alpha),
+                "lift_percentage": float(lifts[k])
+            }
         
         return {
             "overall_test": {
@@ -407,6 +477,8 @@ class StatisticalAnalyzer:
     def _required_sample_size_proportions(self, p1: float, p2: float, 
                                         power: float = 0.8) -> int:
         """Calculate required sample size for proportion test"""
+        if p1 == p2:
+            return 0  # No difference to detect
         z_alpha = stats.norm.ppf(1 - self.alpha / 2)
         z_beta = stats.norm.ppf(power)
         
@@ -474,29 +546,47 @@ class ABTestAnalyzer:
     
     def comprehensive_analysis(self, test_data: Dict[str, Any]) -> Dict[str, Any]:
         """Run comprehensive analysis on A/B test data"""
-        
+        return self._analyze(test_data)
+    
+    def analyze_tests(self, tests: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Comprehensive analysis of many concurrent tests, keyed by test id.
+        
+        The conversion and Bayesian analyses of all tests each run as one vectorized batch.
+        """
+        conversion_tests = [test_id for test_id, data in tests.items()
+                            if all(key in data for key in CONVERSION_KEYS)]
+        columns = [[tests[test_id][key] for test_id in conversion_tests] for key in CONVERSION_KEYS]
+        precomputed = {}
+        if conversion_tests:
+            precomputed = dict(zip(conversion_tests, zip(
+                self.analyzer.analyze_conversion_rates(*columns),
+                self.analyzer.bayesian_analysis_batch(*columns)
+            )))
+        
+        return {test_id: self._analyze(data, *precomputed.get(test_id, (None, None)))
+                for test_id, data in tests.items()}
+    
+    def _analyze(self, test_data: Dict[str, Any], conversion_result: Optional[StatisticalResult] = None,
+                 bayesian_result: Optional[BayesianResult] = None) -> Dict[str, Any]:
         results = {}
         
         # Conversion rate analysis
-        if all(key in test_data for key in ['control_conversions', 'control_total', 
-                                           'variant_conversions', 'variant_total']):
+        if all(key in test_data for key in CONVERSION_KEYS):
             
-            conv_result = self.analyzer.analyze_conversion_rate(
+            results['conversion_analysis'] = conversion_result or self.analyzer.analyze_conversion_rate(
                 test_data['control_conversions'],
                 test_data['control_total'],
                 test_data['variant_conversions'],
                 test_data['variant_total']
             )
-            results['conversion_analysis'] = conv_result
             
             # Bayesian analysis
-            bayesian_result = self.analyzer.bayesian_analysis(
+            results['bayesian_analysis'] = bayesian_result or self.analyzer.bayesian_analysis(
                 test_data['control_conversions'],
                 test_data['control_total'],
                 test_data['variant_conversions'],
                 test_data['variant_total']
             )
-            results['bayesian_analysis'] = bayesian_result
         
         # Continuous metrics analysis
         if 'control_values' in test_data and 'variant_values' in test_data:
@@ -517,7 +607,8 @@ class ABTestAnalyzer:
         # Sequential analysis
         if 'time_series_data' in test_data:
             sequential_result = self.analyzer.sequential_analysis(
-                test_data['time_series_data']
+                test_data['time_series_data'],
+                planned_sample_size=test_data.get('planned_sample_size')
             )
             results['sequential_analysis'] = sequential_result
         
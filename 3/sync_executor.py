@@ -0,0 +1,187 @@
+"""
+Sync executor for the Airtable/Notion collaboration sync
+Runs provider calls through per-provider rate-limit buckets and concurrency caps, retries transient
+failures with the configured RetryStrategy, and splits writes into the providers' batch sizes
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from dataclasses import dataclass
+from enum import Enum
+import asyncio
+import logging
+
+from rate_limiting import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+class RetryStrategy(Enum):
+    LINEAR = "linear"
+    EXPONENTIAL = "exponential"
+    FIXED = "fixed"
+
+@dataclass
+class RetryConfig:
+    max_retries: int = 3
+    initial_delay: float = 1.0
+    max_delay: float = 60.0
+    strategy: RetryStrategy = RetryStrategy.EXPONENTIAL
+    backoff_factor: float = 2.0
+
+# Error types worth retrying a single provider request for
+RETRYABLE_ERRORS = {"connection_error", "rate_limit_error"}
+
+def classify_error(error: Exception) -> str:
+    """Classify error type for appropriate handling"""
+    error_message = str(error).lower()
+
+    if isinstance(error, (ConnectionError, asyncio.TimeoutError)) or \
+            "connection" in error_message or "timeout" in error_message:
+        return "connection_error"
+    elif "rate limit" in error_message or "429" in error_message:
+        return "rate_limit_error"
+    elif "unauthorized" in error_message or "401" in error_message:
+        return "auth_error"
+    elif "validation" in error_message or "400" in error_message:
+        return "validation_error"
+    else:
+        return "unknown_error"
+
+def retry_delay(config: RetryConfig, retry_count: int, error_type: str) -> float:
+    """Calculate retry delay based on strategy and error type"""
+    base_delay = config.initial_delay
+
+    # Longer delays for rate limit errors
+    if error_type == "rate_limit_error":
+        base_delay *= 5
+
+    if config.strategy == RetryStrategy.LINEAR:
+        delay = base_delay * retry_count
+    elif config.strategy == RetryStrategy.EXPONENTIAL:
+        delay = base_delay * (config.backoff_factor ** (retry_count - 1))
+    else:  # FIXED
+        delay = base_delay
+
+    return min(delay, config.max_delay)
+
+@dataclass
+class ProviderLimits:
+    """Request budget for one provider: rate, records per write request and requests in flight"""
+    requests_per_second: float
+    batch_size: int = 1
+    concurrency: int = 4
+
+# Airtable allows 5 requests/s per base and 10 records per create/update; Notion averages 3 requests/s
+DEFAULT_PROVIDER_LIMITS = {
+    'airtable': ProviderLimits(requests_per_second=5.0, batch_size=10, concurrency=4),
+    'notion': ProviderLimits(requests_per_second=3.0, batch_size=1, concurrency=3),
+}
+
+class SyncExecutor:
+    """Shared request pipeline for every table being synced.
+
+    Each provider has a token bucket at its `requests_per_second` and a cap
+    of `concurrency` requests in flight, shared by all tables, so tables can
+    sync in parallel (`table_parallelism`) without exceeding the provider's
+    limits. Connection and rate-limit errors are retried per request using
+    `retry_config`; other errors fail the request straight away.
+    """
+
+    def __init__(self, retry_config: Optional[RetryConfig] = None,
+                 provider_limits: Optional[Dict[str, ProviderLimits]] = None, table_parallelism: int = 2):
+        self.retry_config = retry_config or RetryConfig()
+        self.provider_limits = {**DEFAULT_PROVIDER_LIMITS, **(provider_limits or {})}
+        self.table_parallelism = table_parallelism
+        self._loop = None
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def limits(self, provider: str) -> ProviderLimits:
+        return self.provider_limits.get(provider) or ProviderLimits(requests_per_second=1.0)
+
+    def _gates(self, provider: str) -> Tuple[TokenBucket, asyncio.Semaphore]:
+        """Bucket and semaphore for the running loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._buckets, self._semaphores = loop, {}, {}
+        if provider not in self._buckets:
+            limits = self.limits(provider)
+            self._buckets[provider] = TokenBucket(limits.requests_per_second)
+            self._semaphores[provider] = asyncio.Semaphore(limits.concurrency)
+        return self._buckets[provider], self._semaphores[provider]
+
+    async def call(self, provider: str, operation: Callable[..., Awaitable[Any]], *args,
+                   max_retries: Optional[int] = None, **kwargs) -> Any:
+        """Run one provider request under its rate limit, retrying transient errors.
+
+        `max_retries` overrides the retry config for this call; pass 0 for
+        requests that are not safe to repeat.
+        """
+        if max_retries is None:
+            max_retries = self.retry_config.max_retries
+        bucket, semaphore = self._gates(provider)
+        stats = self._stats.setdefault(provider, {'requests': 0, 'retries': 0, 'failures': 0})
+        attempt = 0
+        while True:
+            async with semaphore:
+                await bucket.acquire()
+                stats['requests'] += 1
+                try:
+                    return await operation(*args, **kwargs)
+                except Exception as e:
+                    error = e
+            error_type = classify_error(error)
+            attempt += 1
+            if error_type not in RETRYABLE_ERRORS or attempt > max_retries:
+                stats['failures'] += 1
+                raise error
+            stats['retries'] += 1
+            delay = retry_delay(self.retry_config, attempt, error_type)
+            logger.warning(f"{provider} {error_type}, retry {attempt} in {delay:.1f}s: {error}")
+            await asyncio.sleep(delay)
+
+    async def write_batches(self, provider: str, items: List[Any],
+                            send: Callable[[List[Any]], Awaitable[Any]],
+                            max_retries: Optional[int] = None) -> Tuple[int, List[str]]:
+        """Send items in the provider's batch size, concurrently; returns (items written, errors).
+
+        `max_retries` is passed to call(); use 0 for creates, which would
+        duplicate records if a request that timed out had reached the server.
+        """
+        batch_size = max(1, self.limits(provider).batch_size)
+        batches = [items[offset:offset + batch_size] for offset in range(0, len(items), batch_size)]
+
+        async def send_batch(batch):
+            try:
+                await self.call(provider, send, batch, max_retries=max_retries)
+                return len(batch), None
+            except Exception as e:
+                logger.error(f"Error writing {len(batch)} record(s) to {provider}: {e}")
+                return 0, f"{provider} write failed for {len(batch)} record(s): {e}"
+
+        outcomes = await asyncio.gather(*(send_batch(batch) for batch in batches))
+        return sum(written for written, _ in outcomes), [error for _, error in outcomes if error]
+
+    async def map_tables(self, table_types: List[str],
+                         sync_table: Callable[[str], Awaitable[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Sync up to `table_parallelism` tables at a time; results keep the order of table_types"""
+        semaphore = asyncio.Semaphore(self.table_parallelism)
+
+        async def run(table_type):
+            async with semaphore:
+                return await sync_table(table_type)
+
+        return list(await asyncio.gather(*(run(table_type) for table_type in table_types)))
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            'table_parallelism': self.table_parallelism,
+            'providers': {
+                provider: {
+                    'requests_per_second': limits.requests_per_second,
+                    'batch_size': limits.batch_size,
+                    'concurrency': limits.concurrency,
+                    **self._stats.get(provider, {'requests': 0, 'retries': 0, 'failures': 0}),
+                }
+                for provider, limits in self.provider_limits.items()
+            },
+        }
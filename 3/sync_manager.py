@@ -7,27 +7,14 @@ import logging
 from typing import Dict, List, Optional, Any
 from datetime import datetime, timedelta
 from dataclasses import dataclass, asdict
-from enum import Enum
 import traceback
 
 from sync_service import CollaborationSyncService, SyncConfig, SyncDirection, SyncStatus
+from sync_executor import RetryConfig, SyncExecutor, classify_error, retry_delay
 from config import settings
 
 logger = logging.getLogger(__name__)
 
-class RetryStrategy(Enum):
-    LINEAR = "linear"
-    EXPONENTIAL = "exponential"
-    FIXED = "fixed"
-
-@dataclass
-class RetryConfig:
-    max_retries: int = 3
-    initial_delay: float = 1.0
-    max_delay: float = 60.0
-    strategy: RetryStrategy = RetryStrategy.EXPONENTIAL
-    backoff_factor: float = 2.0
-
 @dataclass
 class SyncTask:
     id: str
@@ -52,6 +39,10 @@ class SyncManager:
         self.sync_queue: List[SyncTask] = []
         self.sync_history: List[SyncTask] = []
         self.error_handlers: Dict[str, callable] = {}
+        # Sync tasks run side by side, but never two that touch the same table
+        self.max_workers = getattr(settings, 'SYNC_MAX_WORKERS', 4)
+        self.running_tasks: Dict[str, asyncio.Task] = {}
+        self.table_metrics: Dict[str, Dict[str, Any]] = {}
         
     def initialize(self) -> bool:
         """Initialize the sync manager with configuration"""
@@ -76,10 +67,15 @@ class SyncManager:
                 notion_project_db_id=settings.NOTION_PROJECT_DB_ID,
                 sync_direction=SyncDirection(settings.SYNC_DIRECTION),
                 sync_interval_minutes=settings.SYNC_INTERVAL_MINUTES,
-                conflict_resolution=settings.CONFLICT_RESOLUTION
+                conflict_resolution=settings.CONFLICT_RESOLUTION,
+                table_parallelism=getattr(settings, 'SYNC_TABLE_PARALLELISM', 2),
+                sync_mode=getattr(settings, 'SYNC_MODE', 'full'),
+                state_path=getattr(settings, 'SYNC_STATE_PATH', None)
             )
 
-            self.sync_service = CollaborationSyncService(sync_config)
+            executor = SyncExecutor(retry_config=self.retry_config,
+                                    table_parallelism=sync_config.table_parallelism)
+            self.sync_service = CollaborationSyncService(sync_config, executor=executor)
             
             # Register default error handlers
             self.register_error_handler("connection_error", self._handle_connection_error)
@@ -155,13 +151,33 @@ class SyncManager:
         logger.info(f"Sync task scheduled: {task.id} for {table_types}")
         return task.id
 
-    async def _process_sync_queue(self):
-        """Process all pending sync tasks"""
+    def _busy_tables(self) -> set:
+        return {table for task in self.sync_queue if task.status == SyncStatus.IN_PROGRESS
+                for table in task.table_types}
+
+    def _start_due_tasks(self):
+        """Start due tasks up to max_workers, skipping tasks whose tables are already syncing"""
         current_time = datetime.now()
-        
-        for task in self.sync_queue[:]:  # Create a copy to iterate over
-            if task.scheduled_time <= current_time and task.status == SyncStatus.PENDING:
-                await self._execute_sync_task(task)
+        busy = self._busy_tables()
+        for task in sorted(self.sync_queue, key=lambda t: t.scheduled_time):
+            if len(self.running_tasks) >= self.max_workers:
+                break
+            if task.status != SyncStatus.PENDING or task.scheduled_time > current_time:
+                continue
+            if busy.intersection(task.table_types):
+                continue
+            busy.update(task.table_types)
+            task.status = SyncStatus.IN_PROGRESS
+            self.running_tasks[task.id] = asyncio.create_task(self._execute_sync_task(task))
+
+    async def _process_sync_queue(self):
+        """Process all due sync tasks with a bounded pool of workers"""
+        self._start_due_tasks()
+        while self.running_tasks:
+            done, _ = await asyncio.wait(self.running_tasks.values(), return_when=asyncio.FIRST_COMPLETED)
+            for task_id in [task_id for task_id, running in self.running_tasks.items() if running in done]:
+                self.running_tasks.pop(task_id)
+            self._start_due_tasks()
 
     async def _execute_sync_task(self, task: SyncTask):
         """Execute a single sync task with retry logic"""
@@ -176,6 +192,7 @@ class SyncManager:
             
             task.status = SyncStatus.COMPLETED
             task.result = result
+            self._record_table_metrics(task, result)
             logger.info(f"Sync task completed successfully: {task.id}")
             
         except Exception as e:
@@ -202,20 +219,24 @@ class SyncManager:
                 if len(self.sync_history) > 100:
                     self.sync_history = self.sync_history[-100:]
 
+    def _record_table_metrics(self, task: SyncTask, result: Dict[str, Any]):
+        """Keep the latest throughput and lag (scheduled to finished) for each synced table"""
+        for table_result in result.get("tables_synced", []):
+            completed_at = datetime.fromisoformat(table_result.get("completed_at", datetime.now().isoformat()))
+            self.table_metrics[table_result["table_type"]] = {
+                "task_id": task.id,
+                "completed_at": completed_at.isoformat(),
+                "lag_seconds": round((completed_at - task.scheduled_time).total_seconds(), 3),
+                "duration_seconds": table_result.get("duration_seconds"),
+                "records_processed": table_result.get("records_processed", 0),
+                "records_written": table_result.get("records_written", 0),
+                "records_per_second": table_result.get("records_per_second"),
+                "failed": table_result.get("failed", 0),
+            }
+
     def _classify_error(self, error: Exception) -> str:
         """Classify error type for appropriate handling"""
-        error_message = str(error).lower()
-        
-        if "connection" in error_message or "timeout" in error_message:
-            return "connection_error"
-        elif "rate limit" in error_message or "429" in error_message:
-            return "rate_limit_error"
-        elif "unauthorized" in error_message or "401" in error_message:
-            return "auth_error"
-        elif "validation" in error_message or "400" in error_message:
-            return "validation_error"
-        else:
-            return "unknown_error"
+        return classify_error(error)
 
     async def _handle_error(self, task: SyncTask, error_type: str, error_message: str) -> bool:
         """Handle specific error types and return whether to retry"""
@@ -239,20 +260,7 @@ class SyncManager:
 
     def _calculate_retry_delay(self, retry_count: int, error_type: str) -> float:
         """Calculate retry delay based on strategy and error type"""
-        base_delay = self.retry_config.initial_delay
-        
-        # Longer delays for rate limit errors
-        if error_type == "rate_limit_error":
-            base_delay *= 5
-        
-        if self.retry_config.strategy == RetryStrategy.LINEAR:
-            delay = base_delay * retry_count
-        elif self.retry_config.strategy == RetryStrategy.EXPONENTIAL:
-            delay = base_delay * (self.retry_config.backoff_factor ** (retry_count - 1))
-        else:  # FIXED
-            delay = base_delay
-        
-        return min(delay, self.retry_config.max_delay)
+        return retry_delay(self.retry_config, retry_count, error_type)
 
     def register_error_handler(self, error_type: str, handler: callable):
         """Register a custom error handler"""
@@ -261,12 +269,12 @@ class SyncManager:
     async def _handle_connection_error(self, task: SyncTask, error_message: str) -> bool:
         """Handle connection errors"""
         logger.warning(f"Connection error for task {task.id}: {error_message}")
-        return True  # Always retry connection errors
+        return False  # Already retried per request by the SyncExecutor
 
     async def _handle_rate_limit_error(self, task: SyncTask, error_message: str) -> bool:
         """Handle rate limit errors"""
         logger.warning(f"Rate limit error for task {task.id}: {error_message}")
-        return True  # Always retry rate limit errors with longer delay
+        return False  # Already retried per request by the SyncExecutor, with longer delays
 
     async def _handle_auth_error(self, task: SyncTask, error_message: str) -> bool:
         """Handle authentication errors"""
@@ -295,8 +303,11 @@ class SyncManager:
                 "sync_enabled": settings.SYNC_ENABLED,
                 "queue_size": len(self.sync_queue),
                 "history_size": len(self.sync_history),
+                "max_workers": self.max_workers,
+                "running_tasks": len(self.running_tasks),
                 "retry_config": asdict(self.retry_config)
             },
+            "table_metrics": self.table_metrics,
             "queued_tasks": [asdict(task) for task in self.sync_queue],
             "recent_history": [asdict(task) for task in self.sync_history[-10:]]
         }
@@ -4,13 +4,17 @@ Bidirectional sync service for Airtable and Notion integration
 import asyncio
 import json
 from typing import Dict, List, Optional, Any, Tuple
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from dataclasses import dataclass, asdict
 import logging
+import os
+import time
 from enum import Enum
 
 from airtable_client import AirtableClient
 from notion_client import NotionClient
+from sync_executor import SyncExecutor, ProviderLimits
+from sync_state import SyncStateStore, content_hash
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +44,27 @@ class SyncConfig:
     batch_size: int = 50
     conflict_resolution: str = "notion_wins"  # or "airtable_wins" or "manual"
     field_mappings: Dict[str, Dict] = None
+    table_parallelism: int = 2  # Tables synced at the same time
+    airtable_requests_per_second: float = 5.0
+    notion_requests_per_second: float = 3.0
+    sync_mode: str = "full"  # or "delta": fetch only records changed since the table's cursor
+    state_path: Optional[str] = None  # Delta state file; defaults to sync_state.json next to this module
+    cursor_overlap_seconds: int = 120  # Re-read window for clock skew and Notion's minute-level timestamps
+
+# Normalized record fields and the field/property names both providers use for them
+PROVIDER_FIELD_NAMES = {
+    'volunteers': {
+        'name': 'Name', 'email': 'Email', 'phone': 'Phone', 'skills': 'Skills', 'interests': 'Interests',
+        'availability': 'Availability', 'branch_preference': 'Branch Preference',
+        'experience_level': 'Experience Level', 'member_status': 'Member Status'
+    },
+    'projects': {
+        'title': 'Title', 'description': 'Description', 'category': 'Category', 'branch': 'Branch',
+        'skills_needed': 'Skills Needed', 'time_commitment': 'Time Commitment', 'status': 'Status',
+        'contact_person': 'Contact Person', 'start_date': 'Start Date', 'end_date': 'End Date',
+        'volunteers_needed': 'Volunteers Needed', 'volunteers_assigned': 'Volunteers Assigned'
+    }
+}
 
 @dataclass
 class SyncRecord:
@@ -53,11 +78,26 @@ class SyncRecord:
     conflict_data: Optional[Dict] = None
 
 class CollaborationSyncService:
-    def __init__(self, config: SyncConfig):
+    def __init__(self, config: SyncConfig, executor: Optional[SyncExecutor] = None,
+                 airtable_client_factory=AirtableClient, notion_client_factory=NotionClient):
         self.config = config
         self.sync_history: List[Dict] = []
         self.conflict_queue: List[SyncRecord] = []
-        self.is_syncing = False
+        self.syncing_tables: set = set()
+        # Provider calls share rate-limit buckets across tables synced in parallel
+        self.executor = executor or SyncExecutor(
+            provider_limits={
+                'airtable': ProviderLimits(config.airtable_requests_per_second, batch_size=10, concurrency=4),
+                'notion': ProviderLimits(config.notion_requests_per_second, batch_size=1, concurrency=3),
+            },
+            table_parallelism=config.table_parallelism
+        )
+        self.airtable_client_factory = airtable_client_factory
+        self.notion_client_factory = notion_client_factory
+        self.state_store: Optional[SyncStateStore] = None
+        if config.sync_mode == "delta":
+            self.state_store = SyncStateStore(config.state_path or os.path.join(
+                os.path.dirname(os.path.abspath(__file__)), 'sync_state.json'))
         
         # Property mappings for different platforms
         self.volunteer_property_mappings = {
@@ -106,13 +146,22 @@ class CollaborationSyncService:
             }
         }
 
-    async def start_sync_process(self, table_types: List[str] = None) -> Dict[str, Any]:
-        """Start the bidirectional sync process"""
-        if self.is_syncing:
-            return {"status": "error", "message": "Sync already in progress"}
+    @property
+    def is_syncing(self) -> bool:
+        return bool(self.syncing_tables)
+
+    async def start_sync_process(self, table_types: List[str] = None,
+                                 full_refresh: bool = False) -> Dict[str, Any]:
+        """Start the bidirectional sync process; tables are synced in parallel.
 
-        self.is_syncing = True
+        In delta mode only records changed since each table's cursor are read,
+        unless `full_refresh` is set.
+        """
         table_types = table_types or ['volunteers', 'projects']
+        if self.syncing_tables.intersection(table_types):
+            return {"status": "error", "message": "Sync already in progress"}
+
+        self.syncing_tables.update(table_types)
         
         try:
             sync_results = {
@@ -123,12 +172,14 @@ class CollaborationSyncService:
                 "errors": []
             }
 
-            async with AirtableClient(self.config.airtable_api_key, 
-                                    self.config.airtable_base_id) as airtable:
-                async with NotionClient(self.config.notion_api_key) as notion:
+            async with self.airtable_client_factory(self.config.airtable_api_key, 
+                                                    self.config.airtable_base_id) as airtable:
+                async with self.notion_client_factory(self.config.notion_api_key) as notion:
                     
-                    for table_type in table_types:
-                        table_result = await self._sync_table(airtable, notion, table_type)
+                    table_results = await self.executor.map_tables(
+                        table_types, lambda table_type: self._sync_table(airtable, notion, table_type, full_refresh)
+                    )
+                    for table_result in table_results:
                         sync_results["tables_synced"].append(table_result)
                         sync_results["records_processed"] += table_result.get("records_processed", 0)
                         sync_results["conflicts_detected"] += table_result.get("conflicts_detected", 0)
@@ -155,10 +206,10 @@ class CollaborationSyncService:
                 "end_time": datetime.now().isoformat()
             }
         finally:
-            self.is_syncing = False
+            self.syncing_tables.difference_update(table_types)
 
     async def _sync_table(self, airtable: AirtableClient, notion: NotionClient, 
-                         table_type: str) -> Dict[str, Any]:
+                         table_type: str, full_refresh: bool = False) -> Dict[str, Any]:
         """Sync a specific table between Airtable and Notion"""
         logger.info(f"Starting sync for {table_type} table")
         
@@ -169,60 +220,62 @@ class CollaborationSyncService:
             "errors": [],
             "created": 0,
             "updated": 0,
-            "skipped": 0
+            "skipped": 0,
+            "failed": 0,
+            "mode": "full"
         }
+        start = time.perf_counter()
+        # Delta state: what was last synced for each record, and where the last complete sync left off
+        known = self.state_store.records(table_type) if self.state_store else None
+        cursor = None if (self.state_store is None or full_refresh) else self.state_store.cursor(table_type)
+        fetch_started = datetime.now(timezone.utc)
 
         try:
-            # Get data from both sources
-            if table_type == 'volunteers':
-                airtable_records = await airtable.get_table_records(
-                    self.config.volunteer_table_name
-                )
-                notion_pages = await notion.get_database_pages(
-                    self.config.notion_volunteer_db_id
-                )
-                airtable_normalized = airtable.normalize_volunteer_data(airtable_records)
-                notion_normalized = notion.normalize_volunteer_data(notion_pages)
-                
-            elif table_type == 'projects':
-                airtable_records = await airtable.get_table_records(
-                    self.config.project_table_name
-                )
-                notion_pages = await notion.get_database_pages(
-                    self.config.notion_project_db_id
-                )
-                airtable_normalized = airtable.normalize_project_data(airtable_records)
-                notion_normalized = notion.normalize_project_data(notion_pages)
-            else:
-                raise ValueError(f"Unknown table type: {table_type}")
+            since = cursor - timedelta(seconds=self.config.cursor_overlap_seconds) if cursor else None
+            if since:
+                result["mode"] = "delta"
+            airtable_normalized, notion_normalized = await self._fetch_table(airtable, notion, table_type, since)
 
             # Create lookup maps
             airtable_map = {record.get('name', '') + record.get('email', ''): record 
                            for record in airtable_normalized}
             notion_map = {record.get('name', '') + record.get('email', ''): record 
                          for record in notion_normalized}
+            if since:
+                # Unchanged records were not fetched; their IDs come from the state store
+                for key, entry in known.items():
+                    if entry.get('airtable_id') and key not in airtable_map:
+                        airtable_map[key] = {'id': entry['airtable_id']}
+                    if entry.get('notion_id') and key not in notion_map:
+                        notion_map[key] = {'id': entry['notion_id']}
 
             # Sync from Airtable to Notion
             if self.config.sync_direction in [SyncDirection.AIRTABLE_TO_NOTION, 
                                             SyncDirection.BIDIRECTIONAL]:
                 airtable_result = await self._sync_direction(
                     airtable, notion, airtable_normalized, notion_map, 
-                    'airtable_to_notion', table_type
+                    'airtable_to_notion', table_type, known
                 )
                 result["created"] += airtable_result["created"]
                 result["updated"] += airtable_result["updated"]
+                result["skipped"] += airtable_result["skipped"]
+                result["failed"] += airtable_result["failed"]
                 result["conflicts_detected"] += airtable_result["conflicts"]
+                result["errors"].extend(airtable_result["errors"])
 
             # Sync from Notion to Airtable
             if self.config.sync_direction in [SyncDirection.NOTION_TO_AIRTABLE, 
                                             SyncDirection.BIDIRECTIONAL]:
                 notion_result = await self._sync_direction(
                     airtable, notion, notion_normalized, airtable_map, 
-                    'notion_to_airtable', table_type
+                    'notion_to_airtable', table_type, known
                 )
                 result["created"] += notion_result["created"]
                 result["updated"] += notion_result["updated"]
+                result["skipped"] += notion_result["skipped"]
+                result["failed"] += notion_result["failed"]
                 result["conflicts_detected"] += notion_result["conflicts"]
+                result["errors"].extend(notion_result["errors"])
 
             result["records_processed"] = len(airtable_normalized) + len(notion_normalized)
 
@@ -230,18 +283,89 @@ class CollaborationSyncService:
             logger.error(f"Error syncing {table_type} table: {e}")
             result["errors"].append(str(e))
 
+        if self.state_store is not None:
+            # The cursor only moves past a table sync with no failures, so failed records are read again
+            complete = not result["errors"] and not result["failed"]
+            await asyncio.to_thread(self.state_store.commit, table_type, known,
+                                    fetch_started if complete else None)
+
+        # Throughput for this table
+        duration = time.perf_counter() - start
+        written = result["created"] + result["updated"]
+        result["duration_seconds"] = round(duration, 3)
+        result["records_written"] = written
+        result["records_per_second"] = round(written / duration, 1) if duration > 0 else None
+        result["completed_at"] = datetime.now().isoformat()
         return result
 
+    async def _fetch_table(self, airtable: AirtableClient, notion: NotionClient, table_type: str,
+                           since: Optional[datetime] = None) -> Tuple[List[Dict], List[Dict]]:
+        """Read a table from both sources at once, only records changed after `since` when given"""
+        if table_type == 'volunteers':
+            table_name, database_id = self.config.volunteer_table_name, self.config.notion_volunteer_db_id
+        elif table_type == 'projects':
+            table_name, database_id = self.config.project_table_name, self.config.notion_project_db_id
+        else:
+            raise ValueError(f"Unknown table type: {table_type}")
+
+        if since:
+            airtable_records, notion_pages = await asyncio.gather(
+                self.executor.call('airtable', airtable.get_records_modified_since, table_name, since),
+                self.executor.call('notion', notion.get_pages_edited_since, database_id, since)
+            )
+        else:
+            airtable_records, notion_pages = await asyncio.gather(
+                self.executor.call('airtable', airtable.get_table_records, table_name),
+                self.executor.call('notion', notion.get_database_pages, database_id)
+            )
+
+        if table_type == 'volunteers':
+            return airtable.normalize_volunteer_data(airtable_records), notion.normalize_volunteer_data(notion_pages)
+        return airtable.normalize_project_data(airtable_records), notion.normalize_project_data(notion_pages)
+
     async def _sync_direction(self, airtable: AirtableClient, notion: NotionClient,
                             source_records: List[Dict], target_map: Dict[str, Dict],
-                            direction: str, table_type: str) -> Dict[str, int]:
-        """Sync records in one direction"""
-        result = {"created": 0, "updated": 0, "conflicts": 0}
+                            direction: str, table_type: str,
+                            known: Optional[Dict[str, Dict]] = None) -> Dict[str, Any]:
+        """Sync records in one direction: plan creates and updates, then write them in batches.
+
+        With delta state (`known`), records whose content hash matches what was
+        last synced are skipped, and successful writes update that state.
+        """
+        result = {"created": 0, "updated": 0, "skipped": 0, "conflicts": 0, "failed": 0, "errors": []}
+        planning_errors: List[str] = []
+        creates: List[Dict] = []
+        updates: List[Tuple[str, Dict]] = []
+        hashes: Dict[str, str] = {}
+        source, target = direction.split('_to_')
+
+        def remember(record: Dict, target_id: Optional[str]):
+            if known is None:
+                return
+            key = record.get('name', '') + record.get('email', '')
+            entry = known.setdefault(key, {})
+            entry['hash'] = hashes[key]
+            entry[f'{source}_id'] = record.get('id')
+            if target_id:
+                entry[f'{target}_id'] = target_id
         
         for record in source_records:
             try:
                 key = record.get('name', '') + record.get('email', '')
                 existing_record = target_map.get(key)
+
+                if known is not None:
+                    hashes[key] = content_hash(record)
+                    # Unchanged since the last sync, or the echo of a write this sync made
+                    if known.get(key, {}).get('hash') == hashes[key]:
+                        result["skipped"] += 1
+                        continue
+                    # Both sides already hold the same content
+                    if existing_record and len(existing_record) > 1 and content_hash(existing_record) == hashes[key]:
+                        known[key] = {'hash': hashes[key], f'{source}_id': record.get('id'),
+                                      f'{target}_id': existing_record.get('id')}
+                        result["skipped"] += 1
+                        continue
                 
                 if existing_record:
                     # Check for conflicts
@@ -249,28 +373,49 @@ class CollaborationSyncService:
                         await self._handle_conflict(record, existing_record, direction, table_type)
                         result["conflicts"] += 1
                         continue
-                    
-                    # Update existing record
-                    if direction == 'airtable_to_notion':
-                        await self._update_notion_record(notion, existing_record['id'], 
-                                                       record, table_type)
-                    else:
-                        await self._update_airtable_record(airtable, existing_record['id'], 
-                                                         record, table_type)
-                    result["updated"] += 1
+                    updates.append((existing_record['id'], record))
                 else:
-                    # Create new record
-                    if direction == 'airtable_to_notion':
-                        await self._create_notion_record(notion, record, table_type)
-                    else:
-                        await self._create_airtable_record(airtable, record, table_type)
-                    result["created"] += 1
-                    
-                await asyncio.sleep(0.1)  # Rate limiting
+                    creates.append(record)
                 
             except Exception as e:
+                # Counted as failed so a delta sync keeps its cursor and reads the record again
                 logger.error(f"Error processing record {record.get('name', 'unknown')}: {e}")
-                
+                planning_errors.append(f"Failed to process {record.get('name', 'unknown')}: {e}")
+        
+        async def create_notion(batch):
+            page = await self._create_notion_record(notion, batch[0], table_type)
+            remember(batch[0], (page or {}).get('id'))
+
+        async def update_notion(batch):
+            page_id, record = batch[0]
+            await self._update_notion_record(notion, page_id, record, table_type)
+            remember(record, page_id)
+
+        async def create_airtable(batch):
+            created_records = await self._create_airtable_records(airtable, batch, table_type)
+            for record, created_record in zip(batch, created_records or []):
+                remember(record, created_record.get('id'))
+
+        async def update_airtable(batch):
+            await self._update_airtable_records(airtable, batch, table_type)
+            for record_id, record in batch:
+                remember(record, record_id)
+
+        if direction == 'airtable_to_notion':
+            # Notion has no batch endpoint: one page per request, concurrently under its rate limit.
+            # Creates are not retried: a timed-out create may have been saved and would be duplicated
+            created, create_errors = await self.executor.write_batches('notion', creates, create_notion,
+                                                                       max_retries=0)
+            updated, update_errors = await self.executor.write_batches('notion', updates, update_notion)
+        else:
+            created, create_errors = await self.executor.write_batches('airtable', creates, create_airtable,
+                                                                       max_retries=0)
+            updated, update_errors = await self.executor.write_batches('airtable', updates, update_airtable)
+        
+        result["created"] = created
+        result["updated"] = updated
+        result["failed"] = len(planning_errors) + len(creates) + len(updates) - created - updated
+        result["errors"] = planning_errors + create_errors + update_errors
         return result
 
     async def _has_conflict(self, record1: Dict, record2: Dict) -> bool:
@@ -328,11 +473,12 @@ class CollaborationSyncService:
         property_mapping = (self.volunteer_property_mappings['notion'] if table_type == 'volunteers'
                           else self.project_property_mappings['notion'])
         
-        properties = notion.convert_to_notion_properties(record, property_mapping)
+        properties = notion.convert_to_notion_properties(self._provider_fields(record, table_type),
+                                                         property_mapping)
         properties['Sync Status'] = {"select": {"name": "synced_from_airtable"}}
         properties['Last Updated'] = {"date": {"start": datetime.now().isoformat()}}
         
-        await notion.create_page(database_id, properties)
+        return await notion.create_page(database_id, properties)
 
     async def _update_notion_record(self, notion: NotionClient, page_id: str, 
                                   record: Dict, table_type: str):
@@ -340,36 +486,42 @@ class CollaborationSyncService:
         property_mapping = (self.volunteer_property_mappings['notion'] if table_type == 'volunteers'
                           else self.project_property_mappings['notion'])
         
-        properties = notion.convert_to_notion_properties(record, property_mapping)
+        properties = notion.convert_to_notion_properties(self._provider_fields(record, table_type),
+                                                         property_mapping)
         properties['Sync Status'] = {"select": {"name": "synced_from_airtable"}}
         properties['Last Updated'] = {"date": {"start": datetime.now().isoformat()}}
         
         await notion.update_page(page_id, properties)
 
-    async def _create_airtable_record(self, airtable: AirtableClient, record: Dict, table_type: str):
-        """Create a new record in Airtable"""
-        table_name = (self.config.volunteer_table_name if table_type == 'volunteers' 
-                     else self.config.project_table_name)
-        
-        # Convert record to Airtable format
-        fields = dict(record)
-        fields['Sync Status'] = 'synced_from_notion'
-        fields['Last Updated'] = datetime.now().isoformat()
-        
-        await airtable.create_record(table_name, fields)
+    def _provider_fields(self, record: Dict, table_type: str) -> Dict[str, Any]:
+        """Rename a normalized record's fields to the names the providers read back"""
+        names = PROVIDER_FIELD_NAMES.get(table_type, {})
+        return {names[field]: value for field, value in record.items() if field in names}
 
-    async def _update_airtable_record(self, airtable: AirtableClient, record_id: str,
-                                    record: Dict, table_type: str):
-        """Update an existing record in Airtable"""
-        table_name = (self.config.volunteer_table_name if table_type == 'volunteers' 
-                     else self.config.project_table_name)
-        
-        # Convert record to Airtable format
-        fields = dict(record)
+    def _airtable_fields(self, record: Dict, table_type: str) -> Dict[str, Any]:
+        """Convert record to Airtable format"""
+        fields = self._provider_fields(record, table_type)
         fields['Sync Status'] = 'synced_from_notion'
         fields['Last Updated'] = datetime.now().isoformat()
-        
-        await airtable.update_record(table_name, record_id, fields)
+        return fields
+
+    def _airtable_table_name(self, table_type: str) -> str:
+        return (self.config.volunteer_table_name if table_type == 'volunteers' 
+                else self.config.project_table_name)
+
+    async def _create_airtable_records(self, airtable: AirtableClient, records: List[Dict], table_type: str):
+        """Create up to 10 records in Airtable with one request"""
+        return await airtable.create_records(
+            self._airtable_table_name(table_type), [self._airtable_fields(record, table_type) for record in records]
+        )
+
+    async def _update_airtable_records(self, airtable: AirtableClient, updates: List[Tuple[str, Dict]],
+                                     table_type: str):
+        """Update up to 10 existing records in Airtable with one request"""
+        await airtable.update_records(
+            self._airtable_table_name(table_type),
+            [{'id': record_id, 'fields': self._airtable_fields(record, table_type)} for record_id, record in updates]
+        )
 
     async def get_sync_status(self) -> Dict[str, Any]:
         """Get current sync status and statistics"""
@@ -378,7 +530,10 @@ class CollaborationSyncService:
             "last_sync": self.sync_history[-1] if self.sync_history else None,
             "total_syncs": len(self.sync_history),
             "conflicts_pending": len(self.conflict_queue),
-            "conflict_queue": [asdict(record) for record in self.conflict_queue]
+            "conflict_queue": [asdict(record) for record in self.conflict_queue],
+            "syncing_tables": sorted(self.syncing_tables),
+            "sync_mode": self.config.sync_mode,
+            "executor": self.executor.get_metrics()
         }
 
     async def resolve_conflict(self, conflict_id: str, resolution: str, 
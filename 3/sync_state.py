@@ -0,0 +1,94 @@
+"""
+Local state for delta syncs between Airtable and Notion
+Keeps a last-modified cursor per table and, per record, a content hash and the record's ID on each side
+"""
+from typing import Any, Dict, Optional
+from datetime import datetime
+import hashlib
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Fields that change on every sync or differ between providers without the content changing
+VOLATILE_FIELDS = {'id', 'last_updated', 'created_time', 'sync_status'}
+
+def content_hash(record: Dict[str, Any]) -> str:
+    """Hash of a normalized record's content, independent of which provider it came from"""
+    # Providers return empty fields as null or as an empty string
+    content = {field: '' if value is None else value
+               for field, value in record.items() if field not in VOLATILE_FIELDS}
+    encoded = json.dumps(content, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+class SyncStateStore:
+    """JSON file holding each table's cursor and synced records.
+
+    Layout: {"tables": {table_type: {"cursor": iso, "records": {key: {"hash",
+    "airtable_id", "notion_id"}}}}}. Each commit and reset rewrites the file
+    through a temporary file and an atomic rename, so an interrupted write
+    leaves the previous state in place.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._state: Optional[Dict[str, Any]] = None
+
+    def _load(self) -> Dict[str, Any]:
+        if self._state is None:
+            self._state = {'tables': {}}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as state_file:
+                        self._state = json.load(state_file)
+                except ValueError:
+                    logger.warning(f"Unreadable sync state at {self.path}; starting with a full sync")
+        return self._state
+
+    def _table(self, table_type: str) -> Dict[str, Any]:
+        return self._load()['tables'].get(table_type, {})
+
+    def cursor(self, table_type: str) -> Optional[datetime]:
+        """High-water mark of the last complete sync of the table, if any"""
+        with self._lock:
+            cursor = self._table(table_type).get('cursor')
+        return datetime.fromisoformat(cursor) if cursor else None
+
+    def records(self, table_type: str) -> Dict[str, Dict[str, Any]]:
+        """Copy of the table's synced records, keyed like the sync's record maps"""
+        with self._lock:
+            return {key: dict(entry) for key, entry in self._table(table_type).get('records', {}).items()}
+
+    def commit(self, table_type: str, records: Dict[str, Dict[str, Any]], cursor: Optional[datetime] = None):
+        """Replace the table's records and, when given, advance its cursor; then write the file"""
+        with self._lock:
+            state = self._load()
+            table = state['tables'].setdefault(table_type, {})
+            table['records'] = records
+            if cursor is not None:
+                table['cursor'] = cursor.isoformat()
+            self._write()
+
+    def reset(self, table_type: Optional[str] = None):
+        """Forget one table's state (or all of it) so the next sync is a full one"""
+        with self._lock:
+            tables = self._load()['tables']
+            if table_type:
+                tables.pop(table_type, None)
+            else:
+                tables.clear()
+            if os.path.exists(self.path):
+                self._write()
+
+    def _write(self):
+        """Write the state through a temporary file and an atomic rename; call with the lock held"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as state_file:
+            json.dump(self._state, state_file)
+            state_file.flush()
+            os.fsync(state_file.fileno())
+        os.replace(temp_path, self.path)
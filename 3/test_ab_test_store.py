@@ -0,0 +1,182 @@
+"""
+Tests for the indexed A/B assignment and event store
+"""
+import asyncio
+import sys
+import os
+import random
+import subprocess
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from ab_test_framework import ABTestFramework, MetricType
+from ab_test_store import ABTestStore, stable_bucket
+
+EVENT_TYPES = ['message_sent', 'message_opened', 'clicked', 'registered', 'attended', 'attended']
+
+
+def make_test_config():
+    return {
+        'name': 'Store Test',
+        'description': 'Indexed store',
+        'test_type': 'message',
+        'start_date': datetime.now().isoformat(),
+        'end_date': (datetime.now() + timedelta(days=14)).isoformat(),
+        'sample_size': 1000,
+        'primary_metric': 'turnout_rate',
+        'secondary_metrics': ['engagement_rate', 'retention_rate', 'conversion_rate'],
+        'message_variants': [
+            {'id': f'variant_{i}', 'name': f'Variant {i}', 'subject_line': 'Volunteer with us',
+             'content': 'Join us', 'call_to_action': 'Sign up', 'tone': 'friendly',
+             'personalization_level': 'basic', 'message_length': 'short'}
+            for i in range(3)
+        ],
+        'created_by': 'tester'
+    }
+
+
+async def started_framework():
+    framework = ABTestFramework()
+    test_id = await framework.create_test(make_test_config())
+    await framework.start_test(test_id)
+    return framework, test_id
+
+
+def test_assignment_hash_is_stable_across_processes():
+    """Variant buckets do not depend on the interpreter's hash seed"""
+    print("\n🧪 Testing stable assignment hashing...")
+
+    keys = [f"user_{i}_test-123" for i in range(200)]
+    local = [stable_bucket(key, 3) for key in keys]
+
+    script = (
+        "import sys; sys.path.insert(0, %r)\n"
+        "from ab_test_store import stable_bucket\n"
+        "print(','.join(str(stable_bucket(f'user_{i}_test-123', 3)) for i in range(200)))"
+    ) % os.path.dirname(os.path.abspath(__file__))
+    for seed in ('1', '2'):
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True,
+                                env={**os.environ, 'PYTHONHASHSEED': seed}, check=True).stdout
+        assert [int(bucket) for bucket in output.strip().split(',')] == local
+
+    counts = [local.count(bucket) for bucket in range(3)]
+    assert min(counts) > 40  # Roughly even split
+
+    print(f"✅ Same buckets under different hash seeds; split {counts}")
+
+
+def test_store_indexes_assignments_and_events():
+    """Assignments and events are reachable by (test, user) and (test, variant)"""
+    print("\n🧪 Testing store indexes...")
+
+    framework, test_id = asyncio.run(started_framework())
+    variants = [framework.assign_participant(test_id, f'user_{i}') for i in range(300)]
+
+    assert framework.assign_participant(test_id, 'user_5') == variants[5]
+    assert framework.store.participant_count(test_id) == 300
+    assert len(framework.participant_assignments[test_id]) == 300
+    for variant_id in set(variants):
+        assert framework.store.variant_users(test_id, variant_id) == \
+            [f'user_{i}' for i, v in enumerate(variants) if v == variant_id]
+
+    asyncio.run(framework.track_event(test_id, 'user_5', 'clicked'))
+    asyncio.run(framework.track_event(test_id, 'unassigned_user', 'clicked'))
+    assert framework.store.accumulator(test_id, variants[5]).event_counts == {'clicked': 1}
+    assert len(framework.test_events) == 1
+
+    assert ABTestStore().variant_users('missing', 'missing') == []
+
+    print("✅ Lookups served from (test, user) and (test, variant) indexes")
+
+
+def test_results_match_brute_force_metrics():
+    """Results from the accumulators equal metrics computed by scanning every event"""
+    print("\n🧪 Testing results against a brute-force scan...")
+
+    framework, test_id = asyncio.run(started_framework())
+    rng = random.Random(11)
+    for i in range(2000):
+        framework.assign_participant(test_id, f'user_{i}')
+
+    async def track():
+        for _ in range(6000):
+            await framework.track_event(test_id, f'user_{rng.randrange(2000)}', rng.choice(EVENT_TYPES))
+    asyncio.run(track())
+
+    results = {r.variant_id: r for r in asyncio.run(framework.calculate_results(test_id))}
+
+    for variant_id, result in results.items():
+        users = [a.user_id for a in framework.participant_assignments[test_id] if a.variant_id == variant_id]
+        events = [e for e in framework.test_events if e.user_id in set(users)]
+        attended = [e.user_id for e in events if e.event_type == 'attended']
+        assert result.sample_size == len(users)
+        assert result.primary_metric_value == len(set(attended)) / len(users)
+        retained = sum(1 for user in set(attended) if attended.count(user) > 1)
+        assert result.secondary_metrics[MetricType.RETENTION_RATE.value] == retained / len(users)
+        engaged = {e.user_id for e in events if e.event_type in ('message_opened', 'clicked')}
+        assert result.secondary_metrics[MetricType.ENGAGEMENT_RATE.value] == len(engaged) / len(users)
+
+    print(f"✅ {len(results)} variants match the brute-force metrics")
+
+
+def test_live_results_follow_tracked_events():
+    """Accumulators update on every event and match a scan of the events"""
+    print("\n🧪 Testing live accumulator results...")
+
+    framework, test_id = asyncio.run(started_framework())
+    rng = random.Random(5)
+    for i in range(500):
+        framework.assign_participant(test_id, f'user_{i}')
+
+    async def track():
+        for _ in range(1500):
+            await framework.track_event(test_id, f'user_{rng.randrange(500)}', 'attended',
+                                        {'hours_contributed': rng.randint(1, 6)})
+        await framework.track_event(test_id, 'user_0', 'registered')
+    asyncio.run(track())
+
+    live = {v['variant_id']: v for v in framework.get_live_results(test_id)}
+    results = {r.variant_id: r for r in asyncio.run(framework.calculate_results(test_id))}
+    assert sum(v['participants'] for v in live.values()) == 500
+
+    for variant_id, variant in live.items():
+        events = [e for e in framework.test_events if e.variant_id == variant_id and e.event_type == 'attended']
+        hours = [e.metadata['hours_contributed'] for e in events]
+        summary = variant['continuous_metrics']['hours_contributed']
+        assert variant['event_counts'].get('attended', 0) == len(events)
+        assert summary['count'] == len(hours) and summary['sum'] == sum(hours)
+        mean = sum(hours) / len(hours)
+        std = (sum((h - mean) ** 2 for h in hours) / (len(hours) - 1)) ** 0.5
+        assert abs(summary['mean'] - mean) < 1e-9 and abs(summary['std'] - std) < 1e-9
+        assert variant['metrics']['turnout_rate'] == results[variant_id].primary_metric_value
+        assert variant['metrics']['retention_rate'] == \
+            results[variant_id].secondary_metrics[MetricType.RETENTION_RATE.value]
+
+    registered = framework.store.get_variant(test_id, 'user_0')
+    assert live[registered]['metrics']['conversion_rate'] == 1 / live[registered]['participants']
+    assert framework.get_live_results('missing') == []
+
+    print(f"✅ Live metrics for {len(live)} variants match the tracked events")
+
+
+def test_live_endpoint_rejects_unknown_tests():
+    """GET /live answers 404 for a test id the framework does not know"""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from api_endpoints import setup_ab_test_endpoints
+
+    app = FastAPI()
+    setup_ab_test_endpoints(app)
+
+    response = TestClient(app).get('/api/ab-tests/missing-test/live')
+    assert response.status_code == 404
+    assert response.json()['detail'] == 'Test not found'
+
+
+if __name__ == "__main__":
+    test_assignment_hash_is_stable_across_processes()
+    test_store_indexes_assignments_and_events()
+    test_results_match_brute_force_metrics()
+    test_live_results_follow_tracked_events()
+    test_live_endpoint_rejects_unknown_tests()
@@ -0,0 +1,95 @@
+"""
+Tests for the keyset-paginated audit log export
+Uses the in-memory Supabase stand-in from fake_supabase
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from audit_logger import AuditLogger, AuditResource
+from audit_sink import AuditSink
+from fake_supabase import FakeDatabase
+
+
+def make_logs(count=23, tie_size=5):
+    """Audit rows where every tie_size consecutive rows share a timestamp"""
+    return [{
+        'id': f'log-{i:03d}',
+        'timestamp': f'2024-03-01T10:00:{i // tie_size:02d}',
+        'user_id': f'u{i % 3}',
+        'action': 'update',
+        'resource': 'user' if i % 2 else 'course',
+        'resource_id': f'r{i}',
+        'changes': json.dumps({'hours': {'old': i, 'new': i + 1}}),
+        'metadata': None,
+    } for i in range(count)]
+
+
+def make_logger(tmp, logs):
+    database = FakeDatabase()
+    # Stored in reverse so the result order comes from order(), not insertion order
+    database.supabase.tables['audit_logs'] = [dict(row) for row in reversed(logs)]
+    sink = AuditSink(database, spool_path=os.path.join(tmp, 'spool.jsonl'))
+    return database, AuditLogger(database, sink=sink)
+
+
+def collect(iterator):
+    async def run():
+        return [item async for item in iterator]
+    return asyncio.run(run())
+
+
+def test_pages_cross_timestamp_ties_without_gaps():
+    """Pages that end inside a run of equal timestamps resume at the next id"""
+    print("\n🧪 Testing keyset audit pagination...")
+
+    logs = make_logs()
+    with tempfile.TemporaryDirectory() as tmp:
+        database, audit_logger = make_logger(tmp, logs)
+        pages = collect(audit_logger.iter_audit_log_pages(page_size=4))
+
+        assert [len(page) for page in pages] == [4, 4, 4, 4, 4, 3]
+        ids = [row['id'] for page in pages for row in page]
+        assert ids == [row['id'] for row in logs]
+        assert database.supabase.reads.count('audit_logs') == 6
+
+        # Filters and a column subset still page on (timestamp, id)
+        pages = collect(audit_logger.iter_audit_log_pages(columns=['resource_id'],
+                                                          resource=AuditResource.USER, page_size=3))
+        rows = [row for page in pages for row in page]
+        assert [row['id'] for row in rows] == [row['id'] for row in logs if row['resource'] == 'user']
+
+    print(f"✅ {len(ids)} rows paged in order across timestamp ties")
+
+
+def test_ndjson_stream_has_one_decoded_row_per_line():
+    """NDJSON chunks hold one JSON object per line with JSON columns decoded"""
+    print("\n🧪 Testing NDJSON audit stream...")
+
+    logs = make_logs()
+    with tempfile.TemporaryDirectory() as tmp:
+        _, audit_logger = make_logger(tmp, logs)
+        chunks = collect(audit_logger.stream_audit_logs('ndjson', page_size=5))
+
+        assert len(chunks) == 5
+        assert all(chunk.endswith('\n') for chunk in chunks)
+        lines = ''.join(chunks).splitlines()
+        assert len(lines) == len(logs)
+        for line, expected in zip(lines, logs):
+            row = json.loads(line)
+            assert row == dict(expected, changes=json.loads(expected['changes']))
+
+        chunks = collect(audit_logger.stream_audit_logs('ndjson', columns=['id', 'changes'], page_size=10))
+        rows = [json.loads(line) for line in ''.join(chunks).splitlines()]
+        assert rows[7] == {'id': 'log-007', 'changes': {'hours': {'old': 7, 'new': 8}}}
+
+    print(f"✅ {len(lines)} NDJSON lines streamed in {len(logs) // 5 + 1} chunks")
+
+
+if __name__ == "__main__":
+    test_pages_cross_timestamp_ties_without_gaps()
+    test_ndjson_stream_has_one_decoded_row_per_line()
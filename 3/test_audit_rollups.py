@@ -0,0 +1,206 @@
+"""
+Tests for the daily audit rollups
+Uses the in-memory Supabase stand-in from fake_supabase with a local increment function
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from audit_rollups import AuditRollupStore
+from audit_sink import AuditSink
+from fake_supabase import FakeDatabase
+
+
+ROLLUPS = 'audit_daily_rollups'
+
+
+def make_database():
+    """Fake database whose increment_audit_rollups function adds deltas to the rollup rows"""
+    database = FakeDatabase()
+    supabase = database.supabase
+    supabase.primary_keys[ROLLUPS] = 'day,dimension,key'
+    supabase.rpc_down = False
+
+    def increment(params):
+        if supabase.rpc_down:
+            raise ConnectionError("rpc unavailable")
+        rows = supabase.tables.setdefault(ROLLUPS, [])
+        for delta in params['deltas']:
+            key = (delta['day'], delta['dimension'], delta['key'])
+            row = next((row for row in rows if (row['day'], row['dimension'], row['key']) == key), None)
+            if row is None:
+                rows.append(dict(delta))
+            else:
+                row['count'] += delta['count']
+        return None
+
+    def replace(params):
+        start_day, end_day = params['start_day'], params['end_day']
+        supabase.tables[ROLLUPS] = [
+            row for row in supabase.tables.get(ROLLUPS, [])
+            if (start_day is not None and row['day'] < start_day) or (end_day is not None and row['day'] > end_day)
+        ] + [dict(row) for row in params['counters']]
+        return None
+
+    supabase.rpc_handlers['increment_audit_rollups'] = increment
+    supabase.rpc_handlers['replace_audit_rollups'] = replace
+    return database
+
+
+def counter(database, day, dimension, key):
+    return next(row['count'] for row in database.supabase.tables[ROLLUPS]
+                if (row['day'], row['dimension'], row['key']) == (day, dimension, key))
+
+
+def make_rows(count, day):
+    actions = ['create', 'update', 'delete']
+    return [
+        {'id': f'{day}-{i}', 'timestamp': f'{day}T12:00:00', 'action': actions[i % 3],
+         'resource': 'user', 'user_id': f'u{i % 4}'}
+        for i in range(count)
+    ]
+
+
+def test_counters_follow_sink_writes():
+    """Rollups are incremented from batches the sink writes"""
+    print("\n🧪 Testing audit rollups from sink writes...")
+
+    today = datetime.utcnow().date().isoformat()
+    yesterday = (datetime.utcnow() - timedelta(days=1)).date().isoformat()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = make_database()
+        rollups = AuditRollupStore(database)
+        sink = AuditSink(database, batch_size=50, spool_path=os.path.join(tmp, 'spool.jsonl'))
+        sink.add_listener(rollups.record_batch)
+
+        async def scenario():
+            for row in make_rows(120, today) + make_rows(30, yesterday):
+                sink.enqueue(row)
+            await sink.stop()
+            return await rollups.get_statistics(days=7)
+
+        stats = asyncio.run(scenario())
+
+    assert stats['total_activities'] == 150
+    assert stats['activity_by_action'] == {'create': 50, 'update': 50, 'delete': 50}
+    assert stats['activity_by_resource'] == {'user': 150}
+    assert stats['daily_activity'] == {yesterday: 30, today: 120}
+    assert stats['unique_users'] == 4
+    assert stats['top_users'][0]['activity_count'] >= stats['top_users'][-1]['activity_count']
+    # One statistics call reads one page of counters, regardless of 150 raw rows
+    assert database.supabase.reads.count(ROLLUPS) == 1
+
+    print("✅ Statistics served from rollups")
+
+
+def test_failed_increments_are_retried():
+    """Deltas stay pending when the increment fails and are still visible to reads"""
+    print("\n🧪 Testing pending rollup deltas...")
+
+    today = datetime.utcnow().date().isoformat()
+    database = make_database()
+    rollups = AuditRollupStore(database)
+
+    async def scenario():
+        database.supabase.rpc_down = True
+        await rollups.record_batch(make_rows(10, today))
+        pending_stats = await rollups.get_statistics(days=1)
+
+        database.supabase.rpc_down = False
+        await rollups.record_batch(make_rows(5, today))
+        return pending_stats
+
+    pending_stats = asyncio.run(scenario())
+
+    assert pending_stats['total_activities'] == 10
+    assert counter(database, today, 'total', '') == 15
+    assert not rollups._pending
+
+    print("✅ Pending deltas retried with the next batch")
+
+
+def test_rebuild_overwrites_counters():
+    """A rebuild replaces every counter in its range, including ones with no rows left"""
+    print("\n🧪 Testing audit rollup rebuild...")
+
+    day, before = '2024-03-01', '2024-02-28'
+    database = make_database()
+    database.supabase.tables[ROLLUPS] = [
+        {'day': day, 'dimension': 'total', 'key': '', 'count': 999},
+        {'day': day, 'dimension': 'user', 'key': 'u9', 'count': 4},
+        {'day': before, 'dimension': 'total', 'key': '', 'count': 7},
+    ]
+    rollups = AuditRollupStore(database, page_size=4)
+    rollups._pending[(day, 'total', '')] = 2
+    rollups._pending[(before, 'total', '')] = 1
+
+    async def pages():
+        rows = make_rows(10, day)
+        for offset in range(0, len(rows), 3):
+            yield rows[offset:offset + 3]
+
+    written = asyncio.run(rollups.rebuild(pages(), start_day=day))
+
+    assert written == 1 + 3 + 1 + 4
+    assert counter(database, day, 'total', '') == 10
+    assert counter(database, day, 'user', 'u0') == 3
+    assert not any(row['key'] == 'u9' for row in database.supabase.tables[ROLLUPS])
+    # Counters before the range and their pending deltas are left alone
+    assert counter(database, before, 'total', '') == 7
+    assert dict(rollups._pending) == {(before, 'total', ''): 1}
+    assert [name for name, _ in database.supabase.rpc_calls] == ['replace_audit_rollups']
+
+    counters = asyncio.run(rollups.get_daily_counters(day, day))
+    assert counters[(day, 'action', 'create')] == 4
+    assert database.supabase.reads.count(ROLLUPS) == 3
+
+    print("✅ Rollups rebuilt from raw rows")
+
+
+def test_rebuild_does_not_count_rows_written_meanwhile():
+    """Rows enqueued during a rebuild are written after it and counted once"""
+    print("\n🧪 Testing audit rollup rebuild with a paused sink...")
+
+    day = datetime.utcnow().date().isoformat()
+    with tempfile.TemporaryDirectory() as tmp:
+        database = make_database()
+        rollups = AuditRollupStore(database)
+        sink = AuditSink(database, batch_size=5, flush_interval=0.01, spool_path=os.path.join(tmp, 'spool.jsonl'))
+        sink.add_listener(rollups.record_batch)
+        late_rows = make_rows(20, day)[10:]
+
+        async def pages():
+            yield list(database.supabase.tables['audit_logs'])
+            for row in late_rows:
+                sink.enqueue(row)
+            await asyncio.sleep(0.05)
+            assert await sink.flush() == 0
+            # Next keyset page: anything written after the first one
+            yield database.supabase.tables['audit_logs'][10:]
+
+        async def scenario():
+            for row in make_rows(20, day)[:10]:
+                sink.enqueue(row)
+            await sink.flush()
+            async with sink.paused():
+                await rollups.rebuild(pages(), start_day=day)
+            await sink.stop()
+
+        asyncio.run(scenario())
+
+    assert len(database.supabase.tables['audit_logs']) == 20
+    assert counter(database, day, 'total', '') == 20
+
+    print("✅ 10 rows held during the rebuild and counted once afterwards")
+
+
+if __name__ == "__main__":
+    test_counters_follow_sink_writes()
+    test_failed_increments_are_retried()
+    test_rebuild_overwrites_counters()
+    test_rebuild_does_not_count_rows_written_meanwhile()
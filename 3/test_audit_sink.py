@@ -0,0 +1,214 @@
+"""
+Tests for the batched audit sink with file spool
+Uses the in-memory Supabase stand-in from fake_supabase
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from audit_sink import AuditSink
+from fake_supabase import FakeDatabase
+
+
+def make_row(i):
+    return {'id': f'audit-{i}', 'action': 'update', 'resource': 'user', 'user_id': f'u{i % 7}'}
+
+
+def test_rows_are_written_in_batches():
+    """Full batches flush immediately and the remainder flushes on the interval"""
+    print("\n🧪 Testing batched audit writes...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = FakeDatabase()
+        sink = AuditSink(database, batch_size=50, flush_interval=0.02,
+                         spool_path=os.path.join(tmp, 'spool.jsonl'))
+
+        async def scenario():
+            for i in range(120):
+                sink.enqueue(make_row(i))
+            assert sink.get_metrics()['queue_depth'] == 120
+            await asyncio.sleep(0.1)
+
+        asyncio.run(scenario())
+
+        metrics = sink.get_metrics()
+        assert len(database.supabase.tables['audit_logs']) == 120
+        assert database.supabase.writes == [('audit_logs', 50), ('audit_logs', 50), ('audit_logs', 20)]
+        assert metrics['queue_depth'] == 0
+        assert metrics['written'] == 120
+        assert metrics['avg_flush_ms'] is not None
+
+    print("✅ Audit rows written in 3 batches")
+
+
+def test_spool_and_replay_on_recovery():
+    """Rows written while the database is down are spooled and replayed later"""
+    print("\n🧪 Testing audit spool and replay...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        spool_path = os.path.join(tmp, 'spool.jsonl')
+        database = FakeDatabase()
+        sink = AuditSink(database, batch_size=10, flush_interval=0.01, spool_path=spool_path)
+
+        async def scenario():
+            database.supabase.down = True
+            for i in range(25):
+                sink.enqueue(make_row(i))
+            assert await sink.flush() == 0
+            with open(spool_path) as spool:
+                assert len(spool.readlines()) == 25
+
+            database.supabase.down = False
+            sink.enqueue(make_row(25))
+            await sink.stop()
+
+        asyncio.run(scenario())
+
+        metrics = sink.get_metrics()
+        assert len(database.supabase.tables['audit_logs']) == 26
+        assert metrics['spooled'] == 25
+        assert metrics['replayed'] == 25
+        assert metrics['failed_flushes'] >= 1
+        assert metrics['spool_bytes'] == 0
+        assert not os.path.exists(spool_path)
+
+    print("✅ Spooled rows replayed after recovery")
+
+
+def test_slow_writes_are_spooled_and_replay_is_idempotent():
+    """A batch that times out is spooled; replaying it does not duplicate rows"""
+    print("\n🧪 Testing slow audit writes...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        spool_path = os.path.join(tmp, 'spool.jsonl')
+        database = FakeDatabase()
+        sink = AuditSink(database, batch_size=10, write_timeout=0.05, spool_path=spool_path)
+
+        async def scenario():
+            database.supabase.delay = 0.1
+            for i in range(5):
+                sink.enqueue(make_row(i))
+            assert await sink.flush() == 0
+            # The timed-out insert still lands once the worker thread finishes
+            await asyncio.sleep(0.1)
+
+            database.supabase.delay = 0.0
+            return await sink.replay_spool()
+
+        replayed = asyncio.run(scenario())
+
+        assert replayed == 5
+        assert len(database.supabase.tables['audit_logs']) == 5
+        assert sink.get_metrics()['slow_flushes'] == 1
+
+    print("✅ Slow batches spooled and replayed without duplicates")
+
+
+def test_interrupted_replay_and_torn_lines():
+    """A leftover replay file is finished and a torn last line is skipped"""
+    print("\n🧪 Testing interrupted spool replay...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        spool_path = os.path.join(tmp, 'spool.jsonl')
+        with open(spool_path + '.replaying', 'w') as spool:
+            spool.write(json.dumps(make_row(1)) + '\n')
+            spool.write(json.dumps(make_row(2)) + '\n')
+            spool.write('{"id": "audit-3", "act')
+
+        database = FakeDatabase()
+        sink = AuditSink(database, spool_path=spool_path)
+
+        assert asyncio.run(sink.replay_spool()) == 2
+        assert sorted(row['id'] for row in database.supabase.tables['audit_logs']) == ['audit-1', 'audit-2']
+        assert sink.spool_size() == 0
+
+    print("✅ Interrupted replay recovered")
+
+
+def test_spool_replays_on_startup_and_on_a_timer():
+    """A spool left by a previous run and rows spooled during an outage drain without new writes"""
+    print("\n🧪 Testing scheduled audit spool replay...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        spool_path = os.path.join(tmp, 'spool.jsonl')
+        with open(spool_path, 'w') as spool:
+            for i in range(3):
+                spool.write(json.dumps(make_row(i)) + '\n')
+
+        database = FakeDatabase()
+        database._is_available = lambda: not database.supabase.down
+        sink = AuditSink(database, batch_size=10, flush_interval=0.01, replay_interval=0.02,
+                         spool_path=spool_path)
+
+        async def scenario():
+            sink.start()
+            await asyncio.sleep(0.01)
+            assert len(database.supabase.tables['audit_logs']) == 3
+
+            database.supabase.down = True
+            for i in range(3, 8):
+                sink.enqueue(make_row(i))
+            await sink.flush()
+            await asyncio.sleep(0.05)
+            assert sink.spool_size() > 0  # Health check fails, nothing is replayed
+
+            database.supabase.down = False
+            await asyncio.sleep(0.05)
+            assert sink.spool_size() == 0
+            await sink.stop()
+
+        asyncio.run(scenario())
+
+        assert len(database.supabase.tables['audit_logs']) == 8
+        assert sink.get_metrics()['replayed'] == 8
+
+    print("✅ Spool replayed at startup and after the outage")
+
+
+def test_degraded_mode_spools_in_batches_off_the_loop():
+    """Rows beyond max_queue_size are spooled a batch at a time in a worker thread"""
+    print("\n🧪 Testing degraded-mode audit spooling...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = FakeDatabase()
+        sink = AuditSink(database, batch_size=10, max_queue_size=10,
+                         spool_path=os.path.join(tmp, 'spool.jsonl'))
+        spool_writes = []
+        append_to_spool = sink._append_to_spool
+
+        def recording_append(rows):
+            spool_writes.append((len(rows), threading.current_thread() is threading.main_thread()))
+            append_to_spool(rows)
+
+        sink._append_to_spool = recording_append
+
+        async def scenario():
+            for i in range(35):
+                sink.enqueue(make_row(i))
+            assert sink.get_metrics()['overflow_depth'] == 25
+            assert spool_writes == []  # Nothing touches the disk from enqueue()
+            await sink.flush()
+
+        asyncio.run(scenario())
+
+        assert spool_writes == [(25, False)]
+        assert len(database.supabase.tables['audit_logs']) == 35
+        metrics = sink.get_metrics()
+        assert metrics['spooled'] == 25 and metrics['replayed'] == 25
+        assert metrics['overflow_depth'] == 0 and metrics['spool_bytes'] == 0
+
+    print("✅ 25 overflow rows spooled in one write and replayed")
+
+
+if __name__ == "__main__":
+    test_rows_are_written_in_batches()
+    test_spool_and_replay_on_recovery()
+    test_slow_writes_are_spooled_and_replay_is_idempotent()
+    test_interrupted_replay_and_torn_lines()
+    test_spool_replays_on_startup_and_on_a_timer()
+    test_degraded_mode_spools_in_batches_off_the_loop()
@@ -3,6 +3,8 @@ Test script for the Audit Log system
 Tests audit logging functionality, diff generation, and export features
 """
 import asyncio
+import csv
+import io
 import json
 from datetime import datetime, timedelta
 from database import VolunteerDatabase
@@ -178,6 +180,27 @@ async def test_audit_system():
         json_data = json.loads(json_export)
         print(f"✅ JSON export successful ({len(json_data)} records)")
         
+        # Test streaming exports (keyset paginated)
+        csv_chunks = [chunk async for chunk in audit_logger.stream_audit_logs(
+            format_type="csv",
+            user_id='test-user-123',
+            page_size=2
+        )]
+        streamed_rows = list(csv.DictReader(io.StringIO(''.join(csv_chunks))))
+        assert len(streamed_rows) == len(json_data), "Streamed CSV row count differs from JSON export"
+        print(f"✅ Streaming CSV export successful ({len(streamed_rows)} records in {len(csv_chunks)} chunks)")
+        
+        ndjson_lines = [
+            line
+            async for chunk in audit_logger.stream_audit_logs(
+                format_type="ndjson",
+                columns=['id', 'action', 'changes'],
+                user_id='test-user-123'
+            )
+            for line in chunk.splitlines()
+        ]
+        print(f"✅ Streaming NDJSON export successful ({len(ndjson_lines)} records)")
+        
         # Test Excel export (if pandas/openpyxl are available)
         try:
             excel_export = await audit_logger.export_audit_logs(
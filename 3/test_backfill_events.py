@@ -0,0 +1,112 @@
+"""
+Tests for the event-driven backfill bus
+Uses a stand-in engine that records runs instead of touching the database
+"""
+import asyncio
+import sys
+import os
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from backfill_events import BackfillEventBus
+
+
+class FakeEngine:
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.runs = []
+        self.active = set()
+        self.overlaps = 0
+        self.max_parallel = 0
+
+    async def run(self, trigger_reason, course_ids=None, wait_for_notifications=True):
+        course_id = course_ids[0]
+        if course_id in self.active:
+            self.overlaps += 1
+        self.active.add(course_id)
+        self.max_parallel = max(self.max_parallel, len(self.active))
+        self.runs.append((course_id, trigger_reason))
+        await asyncio.sleep(self.delay)
+        self.active.discard(course_id)
+        if course_id == 'broken':
+            raise RuntimeError('database unavailable')
+        return {'results': [{'course_id': course_id,
+                             'result': {'success': True, 'enrolled_count': 1, 'run': len(self.runs)}}]}
+
+
+def test_events_are_deduplicated_per_course():
+    """A burst of events for a few courses runs each course once, in parallel"""
+    print("\n🧪 Testing de-duplicated event backfills...")
+
+    async def scenario():
+        engine = FakeEngine()
+        bus = BackfillEventBus(engine, workers=4)
+        futures = [bus.publish(f'c{i % 3}', 'no_show') for i in range(30)]
+        start = time.perf_counter()
+        results = await asyncio.gather(*futures)
+        return engine, bus, results, time.perf_counter() - start
+
+    engine, bus, results, elapsed = asyncio.run(scenario())
+
+    assert sorted(course_id for course_id, _ in engine.runs) == ['c0', 'c1', 'c2']
+    assert all(result['success'] for result in results)
+    assert engine.max_parallel == 3
+    # Three 50 ms runs side by side, not thirty after one another
+    assert elapsed < 0.5
+
+    metrics = bus.get_metrics()
+    assert metrics['published'] == 30 and metrics['coalesced'] == 27 and metrics['runs'] == 3
+
+    print(f"✅ 30 events backfilled 3 courses in {elapsed * 1000:.0f} ms")
+
+
+def test_events_during_a_run_schedule_one_follow_up():
+    """Events for a course that is being backfilled wait for it, then share a single re-run"""
+    print("\n🧪 Testing per-course serialization...")
+
+    async def scenario():
+        engine = FakeEngine()
+        bus = BackfillEventBus(engine, workers=4)
+        first = bus.publish('c1', 'student_drop_user_requested')
+        await asyncio.sleep(0.01)  # c1 is now running
+        later = [bus.publish('c1', reason) for reason in ('no_show', 'capacity_changed', 'no_show')]
+        results = await asyncio.gather(first, *later)
+        await bus.close()
+        return engine, results
+
+    engine, results = asyncio.run(scenario())
+
+    assert engine.runs == [('c1', 'student_drop_user_requested'), ('c1', 'no_show')]
+    assert engine.overlaps == 0
+    assert results[0]['run'] == 1
+    assert [result['run'] for result in results[1:]] == [2, 2, 2]
+
+    print("✅ 4 events for one course ran twice, never concurrently")
+
+
+def test_failed_backfill_resolves_with_error():
+    """An engine error resolves the waiting callers and leaves the workers running"""
+    print("\n🧪 Testing failed event backfill...")
+
+    async def scenario():
+        engine = FakeEngine(delay=0)
+        bus = BackfillEventBus(engine, workers=2)
+        failed = await bus.publish('broken', 'no_show')
+        succeeded = await bus.publish('c1', 'no_show')
+        return bus, failed, succeeded
+
+    bus, failed, succeeded = asyncio.run(scenario())
+
+    assert failed['success'] is False
+    assert 'database unavailable' in failed['message']
+    assert succeeded['success'] is True
+    assert bus.get_metrics()['failed_runs'] == 1
+
+    print("✅ Failed backfill reported, next event still processed")
+
+
+if __name__ == "__main__":
+    test_events_are_deduplicated_per_course()
+    test_events_during_a_run_schedule_one_follow_up()
+    test_failed_backfill_resolves_with_error()
@@ -0,0 +1,125 @@
+"""
+Tests for the shared background batch writer
+Uses a local writer whose backend is a list with a configurable delay
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from batch_writer import BatchWriter
+
+
+class ListWriter(BatchWriter):
+    """Writes batches to a list; set fail to make writes raise"""
+
+    def __init__(self, batch_size=10, flush_interval=0.01, max_backoff=0.08, write_delay=0.0):
+        super().__init__(batch_size, flush_interval, max_backoff)
+        self.write_delay = write_delay
+        self.fail = False
+        self.written = []
+        self.attempts = []
+
+    def enqueue(self, row):
+        self._queue.append(row)
+        self._queued()
+
+    async def flush(self):
+        written = 0
+        async with self._flush_lock:
+            while self._queue:
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                start = time.perf_counter()
+                self.attempts.append(start)
+                await asyncio.sleep(self.write_delay)
+                if self.fail:
+                    self._queue.extendleft(reversed(batch))
+                    self._record_failure()
+                    break
+                self.written.extend(batch)
+                self._record_success(start)
+                written += len(batch)
+        return written
+
+
+def test_full_batches_flush_early_and_stop_drains():
+    """A full batch is written without waiting for the interval; stop writes the rest"""
+    print("\n🧪 Testing batch writer flush loop...")
+
+    writer = ListWriter(batch_size=10, flush_interval=60)
+
+    async def scenario():
+        for i in range(9):
+            writer.enqueue(i)
+        await asyncio.sleep(0.01)
+        partial = list(writer.written)
+        writer.enqueue(9)
+        await asyncio.sleep(0.01)
+        full = list(writer.written)
+        for i in range(10, 15):
+            writer.enqueue(i)
+        await writer.stop()
+        return partial, full
+
+    partial, full = asyncio.run(scenario())
+
+    assert partial == [] and full == list(range(10))
+    assert writer.written == list(range(15))
+    metrics = writer._latency_metrics()
+    assert metrics['backoff_seconds'] == 0.0 and metrics['p95_flush_ms'] is not None
+
+    print("✅ Full batch written early, the remainder on stop")
+
+
+def test_stop_waits_for_a_write_in_progress():
+    """Stopping mid-write lets the batch finish instead of cancelling and resending it"""
+    print("\n🧪 Testing batch writer stop during a write...")
+
+    writer = ListWriter(batch_size=5, write_delay=0.05)
+
+    async def scenario():
+        for i in range(5):
+            writer.enqueue(i)
+        await asyncio.sleep(0.02)
+        await writer.stop()
+
+    asyncio.run(scenario())
+
+    assert writer.written == list(range(5))
+    assert len(writer.attempts) == 1
+
+    print("✅ In-flight batch written once")
+
+
+def test_failures_back_off_up_to_the_limit():
+    """Retries wait flush_interval, then twice as long, capped at max_backoff"""
+    print("\n🧪 Testing batch writer backoff...")
+
+    writer = ListWriter(batch_size=100, flush_interval=0.01, max_backoff=0.04)
+
+    async def scenario():
+        writer.fail = True
+        writer.enqueue('row')
+        await asyncio.sleep(0.25)
+        backoff = writer._backoff
+        writer.fail = False
+        await writer.stop()
+        return backoff
+
+    backoff = asyncio.run(scenario())
+
+    gaps = [later - earlier for earlier, later in zip(writer.attempts, writer.attempts[1:])]
+    assert backoff == 0.04
+    assert 3 <= len(writer.attempts) <= 10
+    assert all(gap >= 0.01 for gap in gaps)
+    assert writer.written == ['row'] and writer._backoff == 0.0
+
+    print(f"✅ {len(writer.attempts)} attempts with backoff capped at {backoff}s")
+
+
+if __name__ == "__main__":
+    test_full_batches_flush_early_and_stop_drains()
+    test_stop_waits_for_a_write_in_progress()
+    test_failures_back_off_up_to_the_limit()
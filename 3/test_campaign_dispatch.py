@@ -0,0 +1,243 @@
+"""
+Tests for concurrent campaign dispatch
+Uses the local FakeDeliveryProvider and the in-memory Supabase stand-in from fake_supabase
+"""
+import asyncio
+import sys
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from ab_test_framework import ABTestFramework
+from campaign_manager import CampaignManager
+from campaign_dispatch import CampaignDispatcher, FakeDeliveryProvider, TokenBucket
+from fake_supabase import FakeDatabase
+
+
+def make_recipients(count):
+    return {
+        f'user_{i}': {'first_name': f'Vol{i}', 'city': 'Cincinnati', 'interests': 'youth development',
+                      'volunteer_history': {'previous_hours': i % 30}}
+        for i in range(count)
+    }
+
+
+async def make_campaign(provider):
+    manager = CampaignManager(ABTestFramework(), delivery_provider=provider)
+    campaign_id = await manager.create_volunteer_campaign({
+        'name': 'Dispatch Test',
+        'description': 'Concurrent dispatch',
+        'channel': 'email',
+        'start_date': datetime.now().isoformat(),
+        'end_date': (datetime.now() + timedelta(days=30)).isoformat(),
+        'created_by': 'tester'
+    })
+    await manager.launch_campaign(campaign_id)
+    return manager, campaign_id
+
+
+def test_dispatch_batches_writes_and_sends_each_user_once():
+    """Every eligible recipient gets one message and executions are written per batch"""
+    print("\n🧪 Testing concurrent campaign dispatch...")
+
+    async def scenario(checkpoint_dir):
+        provider = FakeDeliveryProvider(latency_seconds=0.002)
+        manager, campaign_id = await make_campaign(provider)
+        database = manager.database = FakeDatabase(async_client=True)
+        dispatcher = CampaignDispatcher(manager, concurrency=100, batch_size=250,
+                                        channel_rate_limits={'email': 100000}, checkpoint_dir=checkpoint_dir)
+        summary = await dispatcher.dispatch(campaign_id, make_recipients(2000))
+        return manager, provider, database, summary
+
+    with tempfile.TemporaryDirectory() as checkpoint_dir:
+        manager, provider, database, summary = asyncio.run(scenario(checkpoint_dir))
+
+    assert summary['delivered'] + summary['no_message_variant'] == 2000
+    assert summary['delivered'] > 0 and summary['failed'] == 0
+    assert len(provider.deliveries) == summary['delivered']
+    assert set(provider.deliveries.values()) == {1}
+    assert len(manager.executions) == summary['delivered']
+
+    execution_writes = [size for table, size in database.supabase.writes if table == 'campaign_executions']
+    assert sum(execution_writes) == summary['delivered']
+    assert max(execution_writes) <= 250
+    assert len(database.supabase.tables['campaign_executions']) == summary['delivered']
+
+    test_id = manager.campaigns[summary['campaign_id']].test_id
+    sent_events = [e for e in manager.ab_framework.test_events if e.event_type == 'message_sent']
+    assert len(sent_events) == summary['delivered']
+    assert len(manager.ab_framework.participant_assignments[test_id]) == 2000
+
+    print(f"✅ Delivered {summary['delivered']} messages in {len(execution_writes)} batched writes "
+          f"({summary['messages_per_second']} msg/s)")
+
+
+def test_interrupted_dispatch_resumes_without_double_sending():
+    """A cancelled dispatch resumes from its checkpoint and never resends a delivered message"""
+    print("\n🧪 Testing dispatch checkpoint and resume...")
+
+    async def scenario(checkpoint_dir):
+        provider = FakeDeliveryProvider(latency_seconds=0.005)
+        manager, campaign_id = await make_campaign(provider)
+        options = dict(concurrency=20, batch_size=50, channel_rate_limits={'email': 100000},
+                       checkpoint_dir=checkpoint_dir)
+        recipients = make_recipients(1000)
+
+        task = asyncio.create_task(CampaignDispatcher(manager, **options).dispatch(campaign_id, recipients))
+        while len(provider.deliveries) < 150:
+            await asyncio.sleep(0.005)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        delivered_before_resume = len(provider.deliveries)
+
+        resumed = await CampaignDispatcher(manager, **options).dispatch(campaign_id, recipients)
+        again = await CampaignDispatcher(manager, **options).dispatch(campaign_id, recipients)
+        return provider, delivered_before_resume, resumed, again
+
+    with tempfile.TemporaryDirectory() as checkpoint_dir:
+        provider, delivered_before_resume, resumed, again = asyncio.run(scenario(checkpoint_dir))
+
+    assert resumed['skipped_already_sent'] == delivered_before_resume
+    assert set(provider.deliveries.values()) == {1}
+    assert again['delivered'] == 0
+    assert again['skipped_already_sent'] == len(provider.deliveries)
+
+    print(f"✅ Resumed after {delivered_before_resume} deliveries with no duplicates")
+
+
+def test_failed_and_erroring_sends():
+    """Provider errors are retried; failed sends are not checkpointed and go out on the next dispatch"""
+    print("\n🧪 Testing retries and failed deliveries...")
+
+    class FlakyProvider(FakeDeliveryProvider):
+        def __init__(self):
+            super().__init__(latency_seconds=0)
+            self.attempts = {}
+            self.reject = True
+
+        async def send(self, execution, channel):
+            self.attempts[execution.user_id] = self.attempts.get(execution.user_id, 0) + 1
+            if execution.user_id.endswith('3') and self.attempts[execution.user_id] == 1:
+                raise ConnectionError("provider timeout")
+            if execution.user_id.endswith('7') and self.reject:
+                return False
+            return await super().send(execution, channel)
+
+    async def scenario(checkpoint_dir):
+        provider = FlakyProvider()
+        manager, campaign_id = await make_campaign(provider)
+        dispatcher = CampaignDispatcher(manager, concurrency=10, batch_size=20, checkpoint_dir=checkpoint_dir,
+                                        channel_rate_limits={'email': 100000}, retry_backoff_seconds=0)
+        first = await dispatcher.dispatch(campaign_id, make_recipients(200))
+        provider.reject = False
+        second = await dispatcher.dispatch(campaign_id, make_recipients(200))
+        return provider, first, second
+
+    with tempfile.TemporaryDirectory() as checkpoint_dir:
+        provider, first, second = asyncio.run(scenario(checkpoint_dir))
+
+    assert first['retries'] > 0
+    assert first['failed'] > 0
+    assert second['delivered'] == first['failed']
+    assert set(provider.deliveries.values()) == {1}
+
+    print(f"✅ {first['retries']} retries, {first['failed']} failures re-sent on the next dispatch")
+
+
+def test_checkpoint_advances_only_after_executions_are_saved():
+    """A transient save failure is retried; a batch that cannot be saved is sent again next time"""
+    print("\n🧪 Testing dispatch checkpoint after failed execution writes...")
+
+    async def scenario(checkpoint_dir):
+        provider = FakeDeliveryProvider(latency_seconds=0)
+        manager, campaign_id = await make_campaign(provider)
+        database = manager.database = FakeDatabase(async_client=True)
+        dispatcher = CampaignDispatcher(manager, concurrency=10, batch_size=50, checkpoint_dir=checkpoint_dir,
+                                        channel_rate_limits={'email': 100000}, retry_backoff_seconds=0)
+        recipients = make_recipients(200)
+
+        save = manager._save_executions_to_db
+        save_attempts = []
+
+        async def flaky_save(executions):
+            save_attempts.append(len(executions))
+            if len(save_attempts) == 1:
+                return False
+            return await save(executions)
+
+        manager._save_executions_to_db = flaky_save
+        first = await dispatcher.dispatch(campaign_id, recipients)
+
+        database.supabase.fail_writes = True
+        second_recipients = make_recipients(260)
+        second = await dispatcher.dispatch(campaign_id, second_recipients)
+
+        database.supabase.fail_writes = False
+        third = await dispatcher.dispatch(campaign_id, second_recipients)
+        return manager, provider, database, first, second, third, save_attempts
+
+    with tempfile.TemporaryDirectory() as checkpoint_dir:
+        manager, provider, database, first, second, third, save_attempts = asyncio.run(scenario(checkpoint_dir))
+
+    # The first batch failed once and was saved on the retry
+    assert first['uncommitted'] == 0
+    assert save_attempts[0] == save_attempts[1]
+    assert second['delivered'] > 0 and second['uncommitted'] == second['delivered']
+    assert third['skipped_already_sent'] == first['delivered']
+    assert third['delivered'] == second['delivered']
+    # Sent twice under the same execution id, saved once
+    assert set(provider.deliveries.values()) == {1, 2}
+    assert len(database.supabase.tables['campaign_executions']) == first['delivered'] + third['delivered']
+    assert len(manager.executions) == first['delivered'] + third['delivered']
+
+    print(f"✅ {second['uncommitted']} unsaved executions kept out of the checkpoint and re-sent")
+
+
+def test_dispatch_campaign_rejects_different_options():
+    """The manager's shared dispatcher keeps the options it was created with"""
+
+    async def scenario(checkpoint_dir):
+        manager, campaign_id = await make_campaign(FakeDeliveryProvider(latency_seconds=0))
+        options = dict(channel_rate_limits={'email': 100000}, checkpoint_dir=checkpoint_dir)
+        await manager.dispatch_campaign(campaign_id, make_recipients(10), **options)
+        await manager.dispatch_campaign(campaign_id, make_recipients(20))
+        await manager.dispatch_campaign(campaign_id, make_recipients(30), **options)
+        try:
+            await manager.dispatch_campaign(campaign_id, make_recipients(30), concurrency=5, **options)
+        except ValueError:
+            return True
+        return False
+
+    with tempfile.TemporaryDirectory() as checkpoint_dir:
+        assert asyncio.run(scenario(checkpoint_dir))
+
+
+def test_token_bucket_limits_rate():
+    """Sends beyond the burst capacity wait for tokens"""
+    print("\n🧪 Testing token bucket rate limit...")
+
+    async def scenario():
+        bucket = TokenBucket(rate=200, capacity=10)
+        start = time.perf_counter()
+        await asyncio.gather(*(bucket.acquire() for _ in range(60)))
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(scenario())
+    assert elapsed >= 0.24
+
+    print(f"✅ 60 tokens at 200/s with a burst of 10 took {elapsed * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    test_dispatch_batches_writes_and_sends_each_user_once()
+    test_interrupted_dispatch_resumes_without_double_sending()
+    test_failed_and_erroring_sends()
+    test_checkpoint_advances_only_after_executions_are_saved()
+    test_dispatch_campaign_rejects_different_options()
+    test_token_bucket_limits_rate()
@@ -0,0 +1,172 @@
+"""
+Tests for delta sync: change cursors, content hashes and the local state store
+Uses the in-memory Airtable and Notion stand-ins from fake_sync_providers, which track when each record last changed
+"""
+import asyncio
+import sys
+import os
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sync_state import SyncStateStore, content_hash
+from fake_sync_providers import FakeAirtable, FakeNotion, make_service
+
+
+def seed_volunteers(airtable, count):
+    for n in range(count):
+        airtable.put(f'rec{n}', {'Name': f'Volunteer {n}', 'Email': f'v{n}@example.org', 'Phone': f'555-01{n:02d}',
+                                 'Skills': ['First Aid'], 'Last Updated': '2025-01-01T00:00:00'})
+
+
+def make_delta_service(airtable, notion, state_path):
+    return make_service(airtable, notion, sync_mode='delta', state_path=state_path, cursor_overlap_seconds=0)
+
+
+def sync(service):
+    return asyncio.run(service.start_sync_process(['volunteers']))['tables_synced'][0]
+
+
+def page_for(notion, name):
+    return next(page_id for page_id, (properties, _) in notion.pages.items()
+                if properties['Name']['title'][0]['plain_text'] == name)
+
+
+def test_delta_sync_reads_and_writes_only_changes():
+    """After the first full sync, each run reads only changed records and skips its own echoes"""
+    print("\n🧪 Testing delta sync...")
+
+    airtable, notion = FakeAirtable(), FakeNotion()
+    seed_volunteers(airtable, 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        service = make_delta_service(airtable, notion, os.path.join(tmp, 'sync_state.json'))
+
+        first = sync(service)
+        assert first['mode'] == 'full' and first['created'] == 50 and len(notion.pages) == 50
+
+        # The 50 pages written by the first run come back once and are recognised by their hash
+        echo = sync(service)
+        assert echo['mode'] == 'delta' and echo['records_processed'] == 50 and echo['skipped'] == 50
+        assert echo['created'] == echo['updated'] == 0
+
+        quiet = sync(service)
+        assert quiet['records_processed'] == 0 and airtable.full_reads == notion.full_reads == 1
+
+        # Two edits in Airtable and one in Notion
+        for n in (3, 7):
+            fields = dict(airtable.records[f'rec{n}'][0], Phone='555-9999')
+            airtable.put(f'rec{n}', fields)
+        page_id = page_for(notion, 'Volunteer 12')
+        properties = dict(notion.pages[page_id][0])
+        properties['Interests'] = {'type': 'multi_select', 'multi_select': [{'name': 'Youth Sports'}]}
+        notion.put(page_id, properties)
+        airtable_writes, notion_writes = airtable.writes, notion.writes
+
+        changes = sync(service)
+        assert changes['records_processed'] == 3 and changes['updated'] == 3
+        assert notion.writes - notion_writes == 2 and airtable.writes - airtable_writes == 1
+        assert airtable.records['rec12'][0]['Interests'] == ['Youth Sports']
+        assert notion.pages[page_for(notion, 'Volunteer 3')][0]['Phone']['phone_number'] == '555-9999'
+
+        settled = sync(service)
+        assert settled['skipped'] == 3 and settled['created'] == settled['updated'] == 0
+
+    print(f"✅ 3 edits synced with {changes['records_processed']} records read instead of 100")
+
+
+def test_failed_writes_keep_the_cursor():
+    """A table with a failed write keeps its cursor, so the change is read and written again next run"""
+    print("\n🧪 Testing delta sync after a failed write...")
+
+    airtable, notion = FakeAirtable(), FakeNotion()
+    seed_volunteers(airtable, 5)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        state_path = os.path.join(tmp, 'sync_state.json')
+        service = make_delta_service(airtable, notion, state_path)
+        sync(service)
+        sync(service)
+        cursor = SyncStateStore(state_path).cursor('volunteers')
+
+        for n in (1, 2):
+            airtable.put(f'rec{n}', dict(airtable.records[f'rec{n}'][0], Phone='555-0000'))
+        notion.failing_pages.add(page_for(notion, 'Volunteer 2'))
+
+        failed = sync(service)
+        assert failed['updated'] == 1 and failed['failed'] == 1 and failed['errors']
+        assert SyncStateStore(state_path).cursor('volunteers') == cursor
+
+        notion.failing_pages.clear()
+        notion_writes = notion.writes
+        retried = sync(service)
+        # Volunteer 1 was already written, so only Volunteer 2 goes out
+        assert retried['updated'] == 1 and notion.writes - notion_writes == 1
+        assert SyncStateStore(state_path).cursor('volunteers') > cursor
+
+    print("✅ Failed write retried on the next run without resending the rest")
+
+
+def test_records_that_fail_planning_keep_the_cursor():
+    """A record that cannot be compared counts as failed, so the cursor does not skip past it"""
+    print("\n🧪 Testing delta sync after a planning error...")
+
+    airtable, notion = FakeAirtable(), FakeNotion()
+    seed_volunteers(airtable, 3)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        state_path = os.path.join(tmp, 'sync_state.json')
+        service = make_delta_service(airtable, notion, state_path)
+        sync(service)
+        sync(service)
+        cursor = SyncStateStore(state_path).cursor('volunteers')
+
+        # An unparseable timestamp breaks the conflict check for this record
+        airtable.put('rec1', dict(airtable.records['rec1'][0], Phone='555-1234', **{'Last Updated': 'yesterday'}))
+        failed = sync(service)
+        assert failed['failed'] == 1 and failed['errors'] and failed['updated'] == 0
+        assert SyncStateStore(state_path).cursor('volunteers') == cursor
+
+        SyncStateStore(state_path).reset('volunteers')
+        assert SyncStateStore(state_path).cursor('volunteers') is None
+        assert not os.path.exists(state_path + '.tmp')
+
+    print("✅ Unprocessed record kept the cursor in place")
+
+
+def test_state_survives_restarts_and_full_refresh_skips_identical_records():
+    """A new service picks up the saved cursor; a full refresh re-reads everything but writes nothing unchanged"""
+    print("\n🧪 Testing delta sync state persistence...")
+
+    airtable, notion = FakeAirtable(), FakeNotion()
+    seed_volunteers(airtable, 20)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        state_path = os.path.join(tmp, 'sync_state.json')
+        sync(make_delta_service(airtable, notion, state_path))
+        sync(make_delta_service(airtable, notion, state_path))
+
+        restarted = make_delta_service(airtable, notion, state_path)
+        assert sync(restarted)['records_processed'] == 0
+
+        writes = airtable.writes + notion.writes
+        refreshed = asyncio.run(restarted.start_sync_process(['volunteers'], full_refresh=True))['tables_synced'][0]
+        assert refreshed['mode'] == 'full' and refreshed['records_processed'] == 40
+        assert refreshed['skipped'] == 40 and airtable.writes + notion.writes == writes
+
+    print("✅ Cursor reloaded after restart; full refresh wrote nothing")
+
+
+def test_content_hash_ignores_provider_metadata():
+    record = {'id': 'rec1', 'name': 'Ada', 'phone': None, 'last_updated': '2025-01-01', 'sync_status': 'synced'}
+    same = {'id': 'page9', 'name': 'Ada', 'phone': '', 'last_updated': '2025-06-01', 'sync_status': 'synced'}
+    assert content_hash(record) == content_hash(same)
+    assert content_hash(record) != content_hash(dict(same, name='Grace'))
+
+
+if __name__ == "__main__":
+    test_delta_sync_reads_and_writes_only_changes()
+    test_failed_writes_keep_the_cursor()
+    test_records_that_fail_planning_keep_the_cursor()
+    test_state_survives_restarts_and_full_refresh_skips_identical_records()
+    test_content_hash_ignores_provider_metadata()
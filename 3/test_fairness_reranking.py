@@ -0,0 +1,92 @@
+"""
+Tests for the precomputed fairness baselines and vectorized re-ranking
+"""
+import pandas as pd
+import sys
+import os
+
+# Add current directory to path for imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fairness_constraints import FairnessConstraintsEngine
+
+def create_small_dataset() -> dict:
+    """Two projects at two branches with a deliberately skewed gender mix"""
+    volunteers_df = pd.DataFrame([
+        {'contact_id': 'v1', 'gender': 'Male', 'age': 30, 'race_ethnicity': 'White', 'branches_volunteered': 'Blue Ash'},
+        {'contact_id': 'v2', 'gender': 'Male', 'age': 45, 'race_ethnicity': 'Black', 'branches_volunteered': 'Blue Ash'},
+        {'contact_id': 'v3', 'gender': 'Male', 'age': 52, 'race_ethnicity': 'White', 'branches_volunteered': 'YDE'},
+        {'contact_id': 'v4', 'gender': 'Female', 'age': 22, 'race_ethnicity': 'Hispanic', 'branches_volunteered': 'YDE'},
+    ])
+    projects_df = pd.DataFrame([
+        {'project_id': 'p1', 'branch': 'Blue Ash', 'category': 'General'},
+        {'project_id': 'p2', 'branch': 'YDE', 'category': 'Youth Development'},
+    ])
+    interactions_df = pd.DataFrame([
+        {'contact_id': 'v1', 'project_id': 'p1', 'hours': 4.0},
+        {'contact_id': 'v2', 'project_id': 'p1', 'hours': 3.0},
+        {'contact_id': 'v3', 'project_id': 'p1', 'hours': 5.0},
+        {'contact_id': 'v4', 'project_id': 'p2', 'hours': 1.0},
+    ])
+    return {'volunteers': volunteers_df, 'projects': projects_df, 'interactions': interactions_df}
+
+def test_baseline_tables_built_once_per_data_version():
+    """Lookup arrays are reused across requests and rebuilt after update_data"""
+    print("\n🧪 Testing baseline table caching...")
+
+    engine = FairnessConstraintsEngine(create_small_dataset())
+    matches = [{'project_id': 'p1', 'branch': 'Blue Ash', 'category': 'General', 'score': 0.5}]
+
+    engine.apply_fairness_constraints(matches, {'gender': 'Female', 'age': 30})
+    tables = engine._baseline_tables
+    engine.apply_fairness_constraints(matches, {'gender': 'Female', 'age': 30})
+    assert engine._baseline_tables is tables
+
+    # p1 has no female volunteers, so a female user gets the parity boost there
+    demographics = engine._get_project_demographics()
+    assert 'Female' not in demographics['p1']['gender']
+    assert abs(demographics['p1']['gender']['Male'] - 1.0) < 1e-9
+
+    engine.update_data(create_small_dataset())
+    assert engine.data_version == 1
+    engine.apply_fairness_constraints(matches, {'gender': 'Female', 'age': 30})
+    assert engine._baseline_tables is not tables
+    assert all(key[0] == 1 for key in engine._adjustment_cache)
+
+    print("✅ Baseline tables cached per data version")
+
+def test_vectorized_reranking():
+    """Adjustments are applied per match and results come back re-sorted"""
+    print("\n🧪 Testing vectorized re-ranking...")
+
+    engine = FairnessConstraintsEngine(create_small_dataset())
+    matches = [
+        {'project_id': 'p1', 'branch': 'Blue Ash', 'category': 'General', 'score': 0.9},
+        {'project_id': 'p1', 'branch': 'Blue Ash', 'category': 'General', 'score': 0.85},
+        {'project_id': 'p1', 'branch': 'Blue Ash', 'category': 'General', 'score': 0.8},
+        {'project_id': 'p1', 'branch': 'Blue Ash', 'category': 'General', 'score': 0.75},
+        {'project_id': 'p2', 'branch': 'YDE', 'category': 'Youth Development', 'score': 0.7},
+        {'project_id': 'unknown', 'branch': 'Clippard', 'category': 'General', 'score': 0.6},
+    ]
+
+    adjusted = engine.apply_fairness_constraints(matches, {'gender': 'Male', 'age': 40})
+
+    assert len(adjusted) == len(matches)
+    assert all('fairness_adjusted_score' not in match for match in matches), "Input matches were mutated"
+
+    scores = [match['fairness_adjusted_score'] for match in adjusted]
+    assert scores == sorted(scores, reverse=True)
+
+    # Unknown projects never get a parity adjustment
+    unknown = next(match for match in adjusted if match['project_id'] == 'unknown')
+    assert 'demographic_parity_adjustment' not in unknown
+
+    # The third and later Blue Ash matches are penalized for lack of diversity
+    blue_ash_penalties = [match.get('diversity_penalty', 0) for match in adjusted if match['branch'] == 'Blue Ash']
+    assert sum(1 for penalty in blue_ash_penalties if penalty > 0) == 2
+
+    print(f"✅ Re-ranked {len(adjusted)} matches")
+
+if __name__ == "__main__":
+    test_baseline_tables_built_once_per_data_version()
+    test_vectorized_reranking()
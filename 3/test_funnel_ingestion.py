@@ -0,0 +1,151 @@
+"""
+Tests for batched funnel event ingestion
+Runs against the in-memory stand-in backend
+"""
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from funnel_ingestion import FunnelEventBuffer, InMemoryFunnelBackend
+
+BASE_TIME = datetime(2025, 3, 1, 12, 0, 0)
+
+
+def make_event(user_id, stage, minutes=0, intervention=None):
+    return {
+        'user_id': user_id,
+        'stage': stage,
+        'timestamp': (BASE_TIME + timedelta(minutes=minutes)).isoformat(),
+        'intervention_applied': intervention,
+    }
+
+
+def test_repeated_hits_are_deduplicated():
+    """Page-view style repeats of the same stage are written once"""
+    print("\n🧪 Testing funnel event deduplication...")
+
+    backend = InMemoryFunnelBackend()
+    buffer = FunnelEventBuffer(backend, batch_size=100, flush_interval=0.01)
+
+    async def scenario():
+        results = [await buffer.submit(make_event('u1', 'interest_expressed', i)) for i in range(20)]
+        results.append(await buffer.submit(make_event('u1', 'profile_created', 30)))
+        results.append(await buffer.submit(make_event('u1', 'interest_expressed', 31, 'email_reminder')))
+        await buffer.stop()
+        return results
+
+    results = asyncio.run(scenario())
+
+    assert results.count(True) == 3
+    assert len(backend.events) == 3
+    assert buffer.get_metrics()['deduplicated'] == 19
+
+    print("✅ 20 interest hits stored as one event")
+
+
+def test_current_stage_tracked_and_batched():
+    """Current stage follows the latest event and is written once per batch"""
+    print("\n🧪 Testing batched current stage updates...")
+
+    backend = InMemoryFunnelBackend()
+    buffer = FunnelEventBuffer(backend, batch_size=50, flush_interval=0.01)
+    stages = ['interest_expressed', 'profile_created', 'matched_opportunities']
+
+    async def scenario():
+        for user in range(40):
+            for minutes, stage in enumerate(stages):
+                await buffer.submit(make_event(f'u{user}', stage, minutes))
+        # A late, older event does not move the user backwards
+        await buffer.submit(make_event('u0', 'application_started', -60))
+        await asyncio.sleep(0.05)
+        await buffer.stop()
+
+    asyncio.run(scenario())
+
+    assert len(backend.events) == 121
+    assert buffer.get_current_stage('u5') == 'matched_opportunities'
+    assert buffer.get_current_stage('u0') == 'matched_opportunities'
+    assert backend.current_stages['u39'] == 'matched_opportunities'
+    assert backend.current_stages['u0'] == 'matched_opportunities'
+    # Three batches, each one insert plus one stage upsert
+    assert backend.calls == 6
+
+    print(f"✅ 121 events written with {backend.calls} backend calls")
+
+
+def test_backpressure_and_failure_recovery():
+    """A full buffer waits for a flush; failed batches are retried and shed events can be resent"""
+    print("\n🧪 Testing back-pressure and retries...")
+
+    backend = InMemoryFunnelBackend()
+    buffer = FunnelEventBuffer(backend, batch_size=10, flush_interval=0.01, max_pending=25)
+
+    async def scenario():
+        backend.fail = True
+        for user in range(25):
+            await buffer.submit(make_event(f'u{user}', 'interest_expressed'))
+        assert await buffer.flush() == 0
+        assert buffer.get_metrics()['pending'] == 25
+
+        # Buffer is full and the backend is down: the oldest event is shed
+        await buffer.submit(make_event('u-extra', 'interest_expressed'))
+        assert buffer.get_metrics()['dropped'] == 1
+
+        backend.fail = False
+        await buffer.submit(make_event('u-late', 'interest_expressed'))
+        # The shed event is not remembered as seen, so the client can resend it
+        assert await buffer.submit(make_event('u0', 'interest_expressed')) is True
+        assert await buffer.submit(make_event('u1', 'interest_expressed')) is False
+        await buffer.stop()
+
+    asyncio.run(scenario())
+
+    metrics = buffer.get_metrics()
+    assert len(backend.events) == 27
+    assert sum(event['user_id'] == 'u0' for event in backend.events) == 1
+    assert metrics['backpressure_waits'] == 2
+    assert metrics['failed_flushes'] >= 2
+    assert metrics['pending'] == 0
+
+    print("✅ Back-pressure applied and failed batches retried")
+
+
+def test_load_with_simulated_latency():
+    """10k events from concurrent producers with 5 ms round trips"""
+    print("\n🧪 Load testing funnel ingestion...")
+
+    backend = InMemoryFunnelBackend(latency_seconds=0.005)
+    buffer = FunnelEventBuffer(backend, batch_size=500, flush_interval=0.05)
+    stages = ['interest_expressed', 'profile_created', 'matched_opportunities', 'application_started']
+
+    async def producer(offset):
+        for user in range(offset, offset + 250):
+            for minutes, stage in enumerate(stages):
+                await buffer.submit(make_event(f'u{user}', stage, minutes))
+                await buffer.submit(make_event(f'u{user}', stage, minutes))  # repeat hit
+
+    async def scenario():
+        start = time.perf_counter()
+        await asyncio.gather(*(producer(i * 250) for i in range(10)))
+        await buffer.stop()
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(scenario())
+
+    assert len(backend.events) == 10000
+    assert buffer.get_metrics()['deduplicated'] == 10000
+    # Per-event writes would need 20,000+ round trips (100+ s at 5 ms)
+    assert backend.calls <= 60
+
+    print(f"✅ 20,000 submissions ingested in {elapsed:.2f}s with {backend.calls} backend calls")
+
+
+if __name__ == "__main__":
+    test_repeated_hits_are_deduplicated()
+    test_current_stage_tracked_and_batched()
+    test_backpressure_and_failure_recovery()
+    test_load_with_simulated_latency()
@@ -0,0 +1,189 @@
+"""
+Tests for funnel metrics derived from the (user, stage) aggregate
+Compares get_funnel_analytics with the per-query implementation it replaced,
+using the in-memory Supabase stand-in from fake_supabase
+"""
+import asyncio
+import random
+import sys
+import os
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import funnel_tracker
+from funnel_tracker import VolunteerFunnelTracker, FunnelStage, track_user_interest, add_funnel_shutdown_handler
+from funnel_ingestion import FunnelEventBuffer, InMemoryFunnelBackend
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from fake_supabase import FakeDatabase
+
+STAGES = [stage.value for stage in FunnelStage]
+
+
+def seed(database, users=60):
+    """Each user walks a prefix of the funnel; many events share a timestamp across users"""
+    rng = random.Random(7)
+    start = datetime.now() - timedelta(days=5)
+    events = []
+    for user in range(users):
+        timestamp = start + timedelta(hours=rng.randint(0, 3))
+        for step, stage in enumerate(STAGES[:rng.randint(1, len(STAGES))]):
+            events.append({'id': f'e{user:03d}-{step}', 'user_id': f'u{user}', 'stage': stage,
+                           'timestamp': timestamp.isoformat()})
+            timestamp += timedelta(hours=rng.choice([1, 2, 6]))
+    # Outside the 30-day window
+    events.append({'id': 'e-old', 'user_id': 'u0', 'stage': 'active_volunteer',
+                   'timestamp': (start - timedelta(days=60)).isoformat()})
+    database.supabase.tables['funnel_events'] = events
+    database.supabase.tables['funnel_interventions'] = []
+    database.supabase.tables['funnel_cohorts'] = []
+    return [event for event in events if event['id'] != 'e-old']
+
+
+def stage_times_rpc(database):
+    """get_funnel_user_stage_times: MIN/MAX timestamp per (user, stage) since start_date"""
+    def handler(params):
+        grouped = {}
+        for event in database.supabase.tables['funnel_events']:
+            if event['timestamp'] >= params['start_date']:
+                key = (event['user_id'], event['stage'])
+                first_at, last_at = grouped.get(key, (event['timestamp'], event['timestamp']))
+                grouped[key] = (min(first_at, event['timestamp']), max(last_at, event['timestamp']))
+        return [{'user_id': user_id, 'stage': stage, 'first_at': first_at, 'last_at': last_at}
+                for (user_id, stage), (first_at, last_at) in grouped.items()]
+    return handler
+
+
+def legacy_metrics(events):
+    """Conversions, drop-offs and progression times as the old per-query code computed them"""
+    conversions = {}
+    for current_stage, next_stage in zip(STAGES, STAGES[1:]):
+        current_count = len({e['user_id'] for e in events if e['stage'] == current_stage})
+        next_count = len({e['user_id'] for e in events if e['stage'] == next_stage})
+        rate = (next_count / current_count * 100) if current_count > 0 else 0
+        conversions[f"{current_stage}_to_{next_stage}"] = round(rate, 2)
+
+    last_stages, processed_users = {}, set()
+    for event in sorted(events, key=lambda e: e['timestamp'], reverse=True):
+        if event['user_id'] not in processed_users:
+            last_stages[event['stage']] = last_stages.get(event['stage'], 0) + 1
+            processed_users.add(event['user_id'])
+    dropoffs = {
+        'total_users_in_period': len(processed_users),
+        'dropoff_by_stage': last_stages,
+        'dropoff_percentages': {stage: round(count / len(processed_users) * 100, 2)
+                                for stage, count in last_stages.items()},
+    }
+
+    progression, user_events = {}, {}
+    for event in sorted(events, key=lambda e: (e['user_id'], e['timestamp'])):
+        user_events.setdefault(event['user_id'], []).append(event)
+    for user_event_list in user_events.values():
+        for current_event, next_event in zip(user_event_list, user_event_list[1:]):
+            hours = (datetime.fromisoformat(next_event['timestamp'])
+                     - datetime.fromisoformat(current_event['timestamp'])).total_seconds() / 3600
+            progression.setdefault(f"{current_event['stage']}_to_{next_event['stage']}", []).append(hours)
+    progression_times = {transition: round(sum(times) / len(times), 2) for transition, times in progression.items()}
+
+    return conversions, dropoffs, progression_times
+
+
+def make_tracker(database):
+    return VolunteerFunnelTracker(database, ingestion_buffer=FunnelEventBuffer(InMemoryFunnelBackend()))
+
+
+def test_analytics_match_the_per_query_implementation():
+    """The RPC path and the paged fallback both reproduce the old conversion, drop-off and timing numbers"""
+    print("\n🧪 Testing funnel metrics against the old implementation...")
+
+    for use_rpc in (True, False):
+        database = FakeDatabase()
+        events = seed(database)
+        database.supabase.rpc_handlers['get_stage_distribution'] = lambda params: [{'stage': 'interest_expressed'}]
+        if use_rpc:
+            database.supabase.rpc_handlers['get_funnel_user_stage_times'] = stage_times_rpc(database)
+
+        analytics = asyncio.run(make_tracker(database).get_funnel_analytics(days=30))
+        conversions, dropoffs, progression_times = legacy_metrics(events)
+
+        assert analytics['conversion_rates'] == conversions
+        assert analytics['dropoff_analysis'] == dropoffs
+        assert analytics['progression_times'] == progression_times
+        assert analytics['stage_distribution'] == [{'stage': 'interest_expressed'}]
+        assert dropoffs['total_users_in_period'] == 60
+
+    print(f"✅ RPC and fallback match the old output for {len(events)} events")
+
+
+def test_fallback_pages_do_not_skip_tied_events():
+    """Paging with many equal timestamps still sees every event exactly once"""
+    print("\n🧪 Testing funnel fallback paging across timestamp ties...")
+
+    database = FakeDatabase()
+    events = seed(database)
+    tracker = make_tracker(database)
+    start_date = (datetime.now() - timedelta(days=30)).isoformat()
+
+    paged = tracker._aggregate_events_since(start_date, page_size=7)
+    whole = stage_times_rpc(database)({'start_date': start_date})
+
+    def by_key(rows):
+        return {(row['user_id'], row['stage']): (tracker._parse_timestamp(row['first_at']),
+                                                 tracker._parse_timestamp(row['last_at'])) for row in rows}
+
+    assert by_key(paged) == by_key(whole)
+    assert len(paged) == len(events)
+    assert database.supabase.reads.count('funnel_events') == len(events) // 7 + 1
+
+    print(f"✅ {len(events)} events aggregated over {len(events) // 7 + 1} pages")
+
+
+def test_failed_section_does_not_blank_the_report():
+    """A failing fetch empties only its own section"""
+    print("\n🧪 Testing funnel analytics with a failing section...")
+
+    database = FakeDatabase()
+    events = seed(database)
+    database.supabase.rpc_handlers['get_funnel_user_stage_times'] = stage_times_rpc(database)
+    # get_stage_distribution is not installed
+
+    analytics = asyncio.run(make_tracker(database).get_funnel_analytics(days=30))
+
+    assert 'error' not in analytics
+    assert analytics['stage_distribution'] == {}
+    assert analytics['conversion_rates'] == legacy_metrics(events)[0]
+
+    print("✅ Missing stage distribution left the other sections intact")
+
+
+def test_shutdown_handler_flushes_the_default_tracker():
+    """Events buffered by the convenience functions are written when the app stops"""
+    print("\n🧪 Testing funnel flush on app shutdown...")
+
+    backend = InMemoryFunnelBackend()
+    funnel_tracker._default_tracker = VolunteerFunnelTracker(
+        FakeDatabase(), ingestion_buffer=FunnelEventBuffer(backend, flush_interval=60)
+    )
+    app = add_funnel_shutdown_handler(FastAPI())
+
+    @app.post("/interest/{user_id}")
+    async def interest(user_id: str):
+        return await track_user_interest(user_id)
+
+    with TestClient(app) as client:
+        for user in range(5):
+            assert client.post(f"/interest/u{user}").json() is True
+        assert backend.events == []
+
+    assert len(backend.events) == 5
+    assert funnel_tracker._default_tracker is None
+
+    print("✅ 5 buffered events written on shutdown")
+
+
+if __name__ == "__main__":
+    test_analytics_match_the_per_query_implementation()
+    test_fallback_pages_do_not_skip_tied_events()
+    test_failed_section_does_not_blank_the_report()
+    test_shutdown_handler_flushes_the_default_tracker()
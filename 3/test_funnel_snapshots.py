@@ -0,0 +1,181 @@
+"""
+Tests for cached funnel analytics snapshots
+Uses the in-memory Supabase stand-in from fake_supabase
+"""
+import asyncio
+import sys
+import os
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from funnel_analytics import FunnelAnalyticsEngine
+from funnel_tracker import VolunteerFunnelTracker
+from funnel_ingestion import FunnelEventBuffer, InMemoryFunnelBackend
+from fake_supabase import FakeDatabase
+
+
+def seed(database, users=40):
+    stages = ['interest_expressed', 'profile_created', 'matched_opportunities', 'application_started']
+    now = datetime.now()
+    events = []
+    for user in range(users):
+        # Users progress through 1-4 stages, an hour apart
+        for step, stage in enumerate(stages[:user % 4 + 1]):
+            timestamp = (now - timedelta(days=2) + timedelta(hours=step)).isoformat()
+            events.append({'id': f'e{user}-{step}', 'user_id': f'u{user}', 'stage': stage, 'timestamp': timestamp})
+    database.supabase.tables['funnel_events'] = events
+    database.supabase.tables['funnel_interventions'] = [
+        {'intervention_type': 'email_reminder', 'target_stage': 'profile_created', 'successful': i % 2 == 0,
+         'time_to_progression_hours': 12, 'applied_at': (now - timedelta(days=1)).isoformat()}
+        for i in range(10)
+    ]
+    database.supabase.tables['funnel_cohorts'] = [
+        {'user_id': f'u{i}', 'cohort_name': 'welcome_call', 'is_control_group': i % 2 == 0,
+         'current_stage': 'active_volunteer' if i % 3 == 0 else 'profile_created',
+         'entry_date': (now - timedelta(days=3)).isoformat()}
+        for i in range(40)
+    ]
+
+
+def stage_times_rpc(database):
+    """get_funnel_user_stage_times: MIN/MAX timestamp per (user, stage) in [start_date, end_date)"""
+    def handler(params):
+        grouped = {}
+        for event in database.supabase.tables['funnel_events']:
+            if event['timestamp'] >= params['start_date'] and event['timestamp'] < params.get('end_date', '9999'):
+                key = (event['user_id'], event['stage'])
+                first_at, last_at = grouped.get(key, (event['timestamp'], event['timestamp']))
+                grouped[key] = (min(first_at, event['timestamp']), max(last_at, event['timestamp']))
+        return [{'user_id': user_id, 'stage': stage, 'first_at': first_at, 'last_at': last_at}
+                for (user_id, stage), (first_at, last_at) in grouped.items()]
+    return handler
+
+
+def make_engine(database):
+    tracker = VolunteerFunnelTracker(database, ingestion_buffer=FunnelEventBuffer(InMemoryFunnelBackend()))
+    return FunnelAnalyticsEngine(tracker, database)
+
+
+def test_report_sections_share_one_snapshot():
+    """A report reads each funnel table once, and a repeat is served from the cache"""
+    print("\n🧪 Testing snapshot-backed comprehensive report...")
+
+    database = FakeDatabase()
+    seed(database)
+    engine = make_engine(database)
+
+    async def scenario():
+        first = await engine.generate_comprehensive_report(days=7)
+        reads_after_first = list(database.supabase.calls)
+        second = await engine.generate_comprehensive_report(days=7)
+        return first, reads_after_first, second
+
+    first, reads, second = asyncio.run(scenario())
+
+    assert 'error' not in first
+    assert reads.count('funnel_interventions') == 1
+    assert reads.count('funnel_cohorts') == 1
+    assert first['snapshot']['event_count'] == 100
+    assert first['funnel_metrics']['dropoff_analysis']['total_users_in_period'] == 40
+    assert first['roi_analysis']['roi_by_intervention']['email_reminder']['conversion_count'] == 5
+    assert 'welcome_call' in first['cohort_comparison']
+    assert second == first
+
+    # Only the event-count check touches the database on a warm read
+    assert database.supabase.calls[len(reads):] == ['funnel_events']
+    stats = engine.snapshots.get_stats()
+    assert stats['builds'] == 1 and stats['hits'] == 1
+
+    print(f"✅ Report built from one snapshot; warm read issued {len(database.supabase.calls) - len(reads)} query")
+
+
+def test_new_events_and_ttl_invalidate_snapshot():
+    """New events in the window or an expired TTL force a rebuild"""
+    print("\n🧪 Testing snapshot invalidation...")
+
+    database = FakeDatabase()
+    seed(database)
+    engine = make_engine(database)
+
+    async def scenario():
+        before = await engine.analyze_critical_dropoffs(days=7)
+
+        database.supabase.tables['funnel_events'].append({
+            'id': 'late', 'user_id': 'u100', 'stage': 'interest_expressed',
+            'timestamp': datetime.now().isoformat()
+        })
+        after_event = await engine.get_funnel_metrics(days=7)
+
+        engine.snapshots.ttl_seconds = 0
+        await engine.get_funnel_metrics(days=7)
+        return before, after_event
+
+    before, after_event = asyncio.run(scenario())
+
+    assert before
+    assert after_event['dropoff_analysis']['total_users_in_period'] == 41
+    stats = engine.snapshots.get_stats()
+    assert stats['invalidated'] == 1
+    assert stats['expired'] == 1
+    assert stats['builds'] == 3
+
+    print("✅ Snapshot rebuilt after new events and after TTL expiry")
+
+
+def test_past_as_of_date_uses_closed_window():
+    """Snapshots for a past date only include events up to the end of that day"""
+    print("\n🧪 Testing as-of snapshots...")
+
+    database = FakeDatabase()
+    seed(database)
+    engine = make_engine(database)
+
+    as_of = (datetime.now() - timedelta(days=5)).date()
+    snapshot = asyncio.run(engine.snapshots.get(7, as_of=as_of))
+
+    assert snapshot.end_date is not None
+    assert snapshot.event_count == 0
+    assert asyncio.run(engine.snapshots.get(7)).event_count == 100
+    assert engine.snapshots.get_stats()['cached_snapshots'] == 2
+
+    print("✅ Past and current windows cached separately")
+
+
+def test_snapshot_aggregates_in_the_database():
+    """With the stage-times function installed a build never pages raw events"""
+    print("\n🧪 Testing snapshot built from aggregated stage times...")
+
+    database = FakeDatabase()
+    seed(database)
+    database.supabase.rpc_handlers['get_funnel_user_stage_times'] = stage_times_rpc(database)
+    engine = make_engine(database)
+
+    async def scenario():
+        snapshot = await engine.snapshots.get(7)
+        dropoffs = await engine.analyze_critical_dropoffs(days=7, snapshot=snapshot)
+        past = await engine.snapshots.get(7, as_of=(datetime.now() - timedelta(days=5)).date())
+        return snapshot, dropoffs, past
+
+    snapshot, dropoffs, past = asyncio.run(scenario())
+
+    assert not hasattr(snapshot, 'events')
+    assert snapshot.event_count == 100 and len(snapshot.user_stage_times) == 40
+    # Only the two count queries touched funnel_events
+    assert database.supabase.reads.count('funnel_events') == 2
+    stage_time_calls = [params for name, params in database.supabase.rpc_calls if name == 'get_funnel_user_stage_times']
+    assert past.user_stage_times == {} and 'end_date' in stage_time_calls[-1]
+
+    by_stage = {insight.stage: insight for insight in dropoffs}
+    assert by_stage['interest_expressed'].dropoff_count == 10
+    assert by_stage['profile_created'].avg_time_at_stage == 1.0
+    assert by_stage['application_started'].dropoff_percentage == 100.0
+
+    print(f"✅ Snapshot of {snapshot.event_count} events built from {len(snapshot.user_stage_times)} users' stage times")
+
+
+if __name__ == "__main__":
+    test_report_sections_share_one_snapshot()
+    test_new_events_and_ttl_invalidate_snapshot()
+    test_past_as_of_date_uses_closed_window()
+    test_snapshot_aggregates_in_the_database()
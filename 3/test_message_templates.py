@@ -0,0 +1,107 @@
+"""
+Tests for compiled template rendering and bulk rendering
+"""
+import sys
+import os
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from message_templates import MessageTemplateEngine, CompiledTemplate
+from email_sms_drafting import PersonalizationContext
+
+
+def make_volunteer(index):
+    return PersonalizationContext(
+        contact_id=str(index),
+        name=f"Volunteer{index} Smith",
+        age=20 + index % 50,
+        is_ymca_member=index % 2 == 0,
+        member_branch="Blue Ash YMCA" if index % 3 else "M.E. Lyons YMCA",
+        volunteer_history={
+            'total_hours': index % 120,
+            'sessions': index % 15,
+            'top_categories': {'Youth Development': 5, 'Fitness & Wellness': 2}
+        },
+        preferences={'interests': 'youth development, fitness'},
+        engagement_level='champion' if index % 10 == 0 else 'active'
+    )
+
+
+def test_compiled_template_segments():
+    """Templates are split once into literals and slots; missing slots render empty"""
+    print("\n🧪 Testing template compilation...")
+
+    compiled = CompiledTemplate.compile("Hi {first_name},\n\n{missing}\n\n\nSee you at {branch_name}!")
+
+    assert compiled.slots == ['first_name', 'missing', 'branch_name']
+    assert len(compiled.literals) == 4
+    rendered = compiled.render({'first_name': 'Alex', 'branch_name': 'Blue Ash YMCA'})
+    assert rendered == "Hi Alex,\n\nSee you at Blue Ash YMCA!"
+
+    print("✅ Compiled template renders slots and collapses blank lines")
+
+
+def test_render_many_matches_render_template():
+    """Bulk rendering produces the same messages as one-at-a-time rendering"""
+    print("\n🧪 Testing render_many...")
+
+    engine = MessageTemplateEngine()
+    volunteers = [make_volunteer(i) for i in range(50)]
+    context_data = {'opportunity': {'project_name': 'Youth Mentoring', 'category': 'Youth Development',
+                                    'branch': 'Blue Ash YMCA'}}
+
+    for template_id in engine.templates:
+        bulk = engine.render_many(template_id, volunteers, context_data=context_data)
+        single = [engine.render_template(template_id, v, context_data=context_data) for v in volunteers]
+        assert bulk == single, template_id
+
+    overrides = [{'first_name': f'Friend{i}'} for i in range(len(volunteers))]
+    bulk = engine.render_many('welcome_new_email_welcoming', volunteers, per_recipient_variables=overrides)
+    assert bulk[3]['content'].startswith('Hi Friend3,')
+
+    print(f"✅ render_many matches render_template across {len(engine.templates)} templates")
+
+
+def test_personalization_is_memoized_per_volunteer():
+    """Profile-derived values are computed once per volunteer and refreshed when the profile changes"""
+    print("\n🧪 Testing personalization memoization...")
+
+    engine = MessageTemplateEngine()
+    volunteer = make_volunteer(7)
+
+    engine.render_template('appreciation_email_heartfelt', volunteer)
+    engine.render_template('welcome_new_email_welcoming', volunteer)
+    stats = engine.get_personalization_cache_stats()
+    assert stats['misses'] == 1 and stats['hits'] == 1
+
+    volunteer.volunteer_history = {**volunteer.volunteer_history, 'total_hours': 500}
+    rendered = engine.render_template('appreciation_email_heartfelt', volunteer)
+    assert '500 volunteer hours' in rendered['content']
+    assert engine.get_personalization_cache_stats()['misses'] == 2
+
+    print("✅ Personalization values reused and refreshed on profile change")
+
+
+def test_bulk_render_throughput():
+    """Thousands of personalized messages render in one call"""
+    print("\n🧪 Testing bulk render throughput...")
+
+    engine = MessageTemplateEngine()
+    volunteers = [make_volunteer(i) for i in range(5000)]
+
+    start = time.perf_counter()
+    rendered = engine.render_many('welcome_new_email_welcoming', volunteers)
+    elapsed = time.perf_counter() - start
+
+    assert len(rendered) == 5000
+    assert all(message['content'] for message in rendered)
+
+    print(f"✅ Rendered {len(rendered)} messages in {elapsed * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    test_compiled_template_segments()
+    test_render_many_matches_render_template()
+    test_personalization_is_memoized_per_volunteer()
+    test_bulk_render_throughput()
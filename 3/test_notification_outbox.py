@@ -0,0 +1,191 @@
+"""
+Tests for the notification outbox
+Uses the in-memory Supabase stand-in from fake_supabase and local channel senders
+"""
+import asyncio
+import sys
+import os
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from notification_outbox import NotificationOutbox, ChannelPolicy, coalesce
+from fake_supabase import FakeDatabase
+
+
+class RecordingSender:
+    def __init__(self, latency=0.002, fail_first=(), always_fail=()):
+        self.latency = latency
+        self.fail_first = set(fail_first)
+        self.always_fail = set(always_fail)
+        self.sent = []
+        self.attempts = {}
+
+    async def __call__(self, message):
+        await asyncio.sleep(self.latency)
+        self.attempts[message.recipient] = self.attempts.get(message.recipient, 0) + 1
+        if message.recipient in self.always_fail:
+            raise ConnectionError('mailbox unavailable')
+        if message.recipient in self.fail_first and self.attempts[message.recipient] == 1:
+            return False
+        self.sent.append(message)
+        return True
+
+
+def notification(user, channel, notification_type='course_reminder', **extra):
+    return {
+        'channel': channel,
+        'recipient': f'user{user}@example.org' if channel == 'email' else f'u{user}',
+        'user_id': f'u{user}',
+        'notification_type': notification_type,
+        'subject': f'{notification_type} for u{user}',
+        'body': f'Hello u{user}',
+        **extra,
+    }
+
+
+FAST = {
+    'email': ChannelPolicy(rate_per_second=10000.0, workers=20, retry_backoff_seconds=0),
+    'in_app': ChannelPolicy(rate_per_second=10000.0, workers=20, retry_backoff_seconds=0),
+}
+
+
+def test_bulk_reminders_are_coalesced_and_fast():
+    """Thousands of reminders are written in bulk and delivered as one message per user and channel"""
+    print("\n🧪 Testing bulk outbox dispatch...")
+
+    database = FakeDatabase()
+    email, in_app = RecordingSender(), RecordingSender()
+    delivered_rows = []
+
+    async def on_delivered(rows):
+        delivered_rows.extend(rows)
+
+    outbox = NotificationOutbox(database, {'email': email, 'in_app': in_app}, policies=FAST,
+                                on_delivered=on_delivered)
+    # 1500 users, each enrolled in two courses starting tomorrow
+    notifications = [notification(user, channel, course_id=f'c{course}')
+                     for course in range(2) for user in range(1500) for channel in ('email', 'in_app')]
+
+    async def scenario():
+        await outbox.enqueue(notifications)
+        return await outbox.dispatch_pending()
+
+    start = time.perf_counter()
+    result = asyncio.run(scenario())
+    elapsed = time.perf_counter() - start
+
+    assert result['claimed'] == 6000 and result['delivered'] == 6000
+    assert result['messages'] == 3000  # Two reminders per user and channel, merged
+    assert len(email.sent) == len(in_app.sent) == 1500
+    assert email.sent[0].notification_type == 'digest' and 'c0' not in email.sent[0].subject
+    assert len(delivered_rows) == 6000
+    assert all(row['status'] == 'sent' for row in database.supabase.tables['notification_outbox'])
+    # 12 inserts, 12 claims, 12 status updates and the stale-claim sweep
+    assert len(database.supabase.writes) == 37
+    assert elapsed < 3
+
+    print(f"✅ 6000 notifications delivered as {result['messages']} messages in {elapsed:.2f}s")
+
+
+def test_failures_are_retried_then_requeued():
+    """Provider errors are retried in-run; a recipient that keeps failing is re-queued, then marked failed"""
+    print("\n🧪 Testing outbox retries...")
+
+    database = FakeDatabase()
+    email = RecordingSender(fail_first={'user1@example.org'}, always_fail={'user2@example.org'})
+    outbox = NotificationOutbox(database, {'email': email}, policies=FAST, max_dispatches=2,
+                                requeue_delay_seconds=0)
+
+    async def scenario():
+        await outbox.enqueue([notification(user, 'email') for user in range(3)])
+        first = await outbox.dispatch_pending()
+        second = await outbox.dispatch_pending()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert first['delivered'] == 2 and first['requeued'] == 1 and first['failed'] == 0
+    assert email.attempts['user1@example.org'] == 2  # Rejected once, then retried in the same run
+    assert second['claimed'] == 1 and second['failed'] == 1
+
+    rows = {row['recipient']: row for row in database.supabase.tables['notification_outbox']}
+    assert rows['user2@example.org']['status'] == 'failed'
+    assert rows['user2@example.org']['attempts'] == 2
+    assert rows['user2@example.org']['last_error'] == 'mailbox unavailable'
+    assert outbox.get_metrics()['retries'] == 1 + 2 * 2
+
+    print("✅ Flaky delivery retried; failing recipient gave up after 2 dispatches")
+
+
+def test_duplicates_and_concurrent_dispatchers_send_once():
+    """Dedupe keys drop repeat notifications and two dispatchers never claim the same row"""
+    print("\n🧪 Testing outbox dedupe and claims...")
+
+    database = FakeDatabase()
+    email = RecordingSender()
+    outbox = NotificationOutbox(database, {'email': email}, policies=FAST)
+
+    async def scenario():
+        confirmation = notification(7, 'email', 'enrollment_confirmed', dedupe_key='enrollment_confirmed:e7:email')
+        await outbox.enqueue([confirmation])
+        await outbox.enqueue([confirmation])
+        await outbox.enqueue([notification(user, 'email') for user in range(200)])
+        return await asyncio.gather(outbox.dispatch_pending(), outbox.dispatch_pending())
+
+    results = asyncio.run(scenario())
+
+    assert len(database.supabase.tables['notification_outbox']) == 201
+    assert sum(result['delivered'] for result in results) == 201
+    assert len(email.sent) == len({message.recipient for message in email.sent}) == 200  # u7 coalesced
+
+    print("✅ 201 notifications delivered exactly once across two dispatchers")
+
+
+def test_enqueue_returns_queued_ids_and_replaces_failed_duplicates():
+    """Skipped duplicates get no id back; a dedupe key that failed for good can be queued again"""
+    print("\n🧪 Testing outbox dedupe after a failed delivery...")
+
+    database = FakeDatabase()
+    email = RecordingSender(always_fail={'user2@example.org'})
+    outbox = NotificationOutbox(database, {'email': email}, policies=FAST, max_dispatches=1)
+    confirmation = notification(2, 'email', 'enrollment_confirmed', dedupe_key='enrollment_confirmed:e2:email')
+
+    async def scenario():
+        first_ids = await outbox.enqueue([confirmation])
+        duplicate_ids = await outbox.enqueue([confirmation, notification(3, 'email')])
+        failed = await outbox.dispatch_pending()
+
+        email.always_fail.clear()
+        retry_ids = await outbox.enqueue([confirmation])
+        retried = await outbox.dispatch_pending(ids=retry_ids)
+        return first_ids, duplicate_ids, failed, retry_ids, retried
+
+    first_ids, duplicate_ids, failed, retry_ids, retried = asyncio.run(scenario())
+
+    assert len(first_ids) == 1 and len(duplicate_ids) == 1
+    assert duplicate_ids[0] not in first_ids  # Only the new user3 row was written
+    assert failed['failed'] == 1
+    assert len(retry_ids) == 1 and retry_ids != first_ids
+    assert retried['sent_ids'] == retry_ids
+    rows = [row for row in database.supabase.tables['notification_outbox'] if row['recipient'] == 'user2@example.org']
+    assert len(rows) == 1 and rows[0]['status'] == 'sent'
+    assert outbox.get_metrics()['enqueued'] == 3
+
+    print("✅ Duplicate skipped; failed confirmation queued again and delivered")
+
+
+def test_coalesce_keeps_single_notifications_intact():
+    """A lone notification is delivered as written"""
+    message, = coalesce([dict(notification(1, 'email'), created_at=datetime.now().isoformat())])
+    assert message.subject == 'course_reminder for u1'
+    assert message.notification_type == 'course_reminder'
+
+
+if __name__ == "__main__":
+    test_bulk_reminders_are_coalesced_and_fast()
+    test_failures_are_retried_then_requeued()
+    test_duplicates_and_concurrent_dispatchers_send_once()
+    test_enqueue_returns_queued_ids_and_replaces_failed_duplicates()
+    test_coalesce_keeps_single_notifications_intact()
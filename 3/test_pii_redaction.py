@@ -13,7 +13,8 @@ from pii_redaction import (
     ViewPermissionLevel, 
     PIIField, 
     PIIFieldType,
-    PIIRedactionMiddleware
+    PIIRedactionMiddleware,
+    MAX_KEY_LOOKUP_SIZE
 )
 from pii_config import pii_config_manager, ENDPOINT_PII_POLICIES
 
@@ -289,6 +290,54 @@ class TestPIIRedactionMiddleware:
         assert masked_list[0]['last_name'] == 'Smith'
         assert '***' in masked_list[0]['email']
 
+    def test_redaction_plan_cache(self):
+        """Responses of the same shape reuse cached redaction plans"""
+        def make_response(i):
+            return {
+                'status': 'success',
+                'volunteer': {'first_name': f'V{i}', 'ssn': '123-45-6789', 'notes': f'call 513-555-{1000 + i}'},
+                'shifts': [{'branch': 'Blue Ash', 'phone': '5135551234'}]
+            }
+
+        public_context = UserContext(permission_level=ViewPermissionLevel.PUBLIC)
+        for i in range(10):
+            response = make_response(i)
+            assert self.middleware.process_response(response, public_context) == \
+                self.engine.mask_data(response, public_context)
+
+        stats = self.middleware.get_plan_stats()
+        assert stats['plan_misses'] == 3  # response, volunteer and shift shapes
+        assert stats['plan_hits'] == 27
+        assert stats['cached_plans'] == 3
+        assert stats['responses_processed'] == 10
+        assert stats['avg_redaction_ms'] >= 0
+
+        # A different permission level gets its own plans
+        self.middleware.process_response(make_response(0), UserContext(permission_level=ViewPermissionLevel.ADMIN))
+        assert self.middleware.get_plan_stats()['cached_plans'] == 6
+
+    def test_redaction_plans_invalidated_on_field_registration(self):
+        """Registering a PII field drops plans built from the old configuration"""
+        public_context = UserContext(permission_level=ViewPermissionLevel.PUBLIC)
+        response = {'badge_number': 'B-1234', 'branch': 'Blue Ash'}
+
+        assert self.middleware.process_response(response, public_context)['badge_number'] == 'B-1234'
+
+        self.engine.register_pii_field(
+            PIIField('badge_number', PIIFieldType.FULL_NAME, ViewPermissionLevel.COORDINATOR)
+        )
+        assert self.middleware.process_response(response, public_context)['badge_number'] != 'B-1234'
+
+    def test_redaction_plan_cache_is_bounded(self):
+        """Dicts keyed by data do not grow the plan cache without bound"""
+        middleware = PIIRedactionMiddleware(self.engine, max_cached_plans=2)
+        context = UserContext(permission_level=ViewPermissionLevel.PUBLIC)
+
+        for i in range(5):
+            middleware.process_response({f'user_{i}': {'email': 'a@b.com'}}, context)
+
+        assert middleware.get_plan_stats()['cached_plans'] == 2
+
 
 class TestPIIConfigManager:
     """Test cases for PII configuration management"""
@@ -446,6 +495,94 @@ class TestIntegrationScenarios:
         assert admin_export == export_data  # Should be identical
 
 
+class TestBulkMasking:
+    """Test cases for the plan-based bulk masking path"""
+
+    def setup_method(self):
+        """Setup test environment"""
+        self.engine = PIIRedactionEngine()
+        self.records = [
+            {
+                'first_name': f'Volunteer{i}',
+                'Email': f'volunteer{i}@email.com',
+                'ssn': '123-45-6789',
+                'notes': f'Reach me at 513-555-{1000 + i}',
+                'branch': 'Blue Ash YMCA',
+                'skills': ['tutoring', {'phone': '5135551234'}]
+            }
+            for i in range(20)
+        ]
+
+    def test_mask_records_matches_mask_data(self):
+        """Bulk masking gives the same result as masking record by record"""
+        for level in ViewPermissionLevel:
+            context = UserContext(permission_level=level)
+            expected = [self.engine.mask_data(record, context) for record in self.records]
+            assert self.engine.mask_records(self.records, context) == expected
+
+    def test_mask_plan_cached_per_permission_level(self):
+        """Permission checks are resolved once per level and reset on registration"""
+        context = UserContext(user_id='a', permission_level=ViewPermissionLevel.VOLUNTEER)
+        other_context = UserContext(user_id='b', permission_level=ViewPermissionLevel.VOLUNTEER)
+
+        plan = self.engine.get_mask_plan(context)
+        assert self.engine.get_mask_plan(other_context) is plan
+        assert 'ssn' in plan.masked_fields
+        assert 'email' in plan.visible_fields
+
+        self.engine.register_pii_field(
+            PIIField('volunteer_id', PIIFieldType.FULL_NAME, ViewPermissionLevel.COORDINATOR)
+        )
+        new_plan = self.engine.get_mask_plan(context)
+        assert new_plan is not plan
+        assert 'volunteer_id' in new_plan.masked_fields
+
+    def test_key_lookup_is_bounded(self):
+        """Dicts keyed by data do not grow a mask plan's key lookup without bound"""
+        context = UserContext(permission_level=ViewPermissionLevel.PUBLIC)
+        records = [{'Email': 'jane@example.org'}] + [
+            {f'user_{i}': 'call 513-555-1234'} for i in range(MAX_KEY_LOOKUP_SIZE + 50)
+        ]
+
+        masked = self.engine.mask_records(records, context)
+
+        plan = self.engine.get_mask_plan(context)
+        assert len(plan.key_lookup) == MAX_KEY_LOOKUP_SIZE
+        assert masked[0]['Email'] != 'jane@example.org'
+        assert '513-555-1234' not in masked[-1][f'user_{MAX_KEY_LOOKUP_SIZE + 49}']
+
+    def test_combined_text_scanner(self):
+        """One scanner pass masks every hidden PII type in free text"""
+        public_context = UserContext(permission_level=ViewPermissionLevel.PUBLIC)
+        text = 'Email jane@example.org, call 513-555-1234, SSN 123-45-6789'
+
+        masked = self.engine._mask_text_content(text, public_context)
+
+        assert 'jane@example.org' not in masked
+        assert '513-555-1234' not in masked
+        assert '123-45-6789' not in masked
+
+        # Admins have no hidden types, so no scanner is compiled at all
+        admin_context = UserContext(permission_level=ViewPermissionLevel.ADMIN)
+        assert self.engine.get_mask_plan(admin_context).text_scanner is None
+        assert self.engine._mask_text_content(text, admin_context) == text
+
+    def test_mask_dataframe(self):
+        """DataFrames are masked column-wise"""
+        pd = pytest.importorskip('pandas')
+        df = pd.DataFrame([
+            {'first_name': 'John', 'ssn': '123-45-6789', 'notes': 'call 513-555-1234', 'hours': 4}
+        ])
+
+        masked = self.engine.mask_dataframe(df, UserContext(permission_level=ViewPermissionLevel.VOLUNTEER))
+
+        assert masked.loc[0, 'first_name'] == 'John'
+        assert masked.loc[0, 'ssn'] != '123-45-6789'
+        assert masked.loc[0, 'notes'] == 'call 513-555-1234'  # phones are visible to volunteers
+        assert masked.loc[0, 'hours'] == 4
+        assert df.loc[0, 'ssn'] == '123-45-6789'
+
+
 def test_audit_logging():
     """Test that PII masking operations are logged"""
     engine = PIIRedactionEngine()
@@ -0,0 +1,133 @@
+"""
+Tests for vectorized branch distances and cached proximity scoring
+"""
+import sys
+import os
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from proximity_matcher import ProximityMatcher
+from geo_index import Gazetteer, SpatialIndex
+
+USER_PREFS = {
+    'interests': 'youth development fitness',
+    'transportation': {'has_car': True, 'prefers_transit': False}
+}
+
+def test_vectorized_distances_match_haversine():
+    """The distance array agrees with the scalar haversine for every branch"""
+    print("\n🧪 Testing vectorized branch distances...")
+
+    matcher = ProximityMatcher()
+    distances = matcher.branch_distances(39.1031, -84.5120)
+
+    for i, (branch_name, location) in enumerate(matcher.branch_locations.items()):
+        expected = matcher.haversine_distance(39.1031, -84.5120, location.lat, location.lng)
+        assert abs(distances[i] - expected) < 1e-9, branch_name
+
+    print(f"✅ {len(distances)} branch distances computed in one pass")
+
+def test_batch_scoring_uses_caches():
+    """One geocode and one travel table per location, shared by all matches"""
+    print("\n🧪 Testing batch proximity scoring...")
+
+    matcher = ProximityMatcher()
+    geocode_calls = []
+    original_geocode = matcher.geocode_address
+    matcher.geocode_address = lambda address: geocode_calls.append(address) or original_geocode(address)
+
+    matches = [
+        {'branch': 'Blue Ash YMCA', 'score': 0.6, 'reasons': []},
+        {'branch': 'Central Community YMCA', 'score': 0.7, 'reasons': []},
+        {'branch': 'Blue Ash YMCA', 'score': 0.5, 'reasons': []},
+    ]
+
+    enhanced = matcher.enhance_project_matches(matches, 'Downtown Cincinnati', USER_PREFS)
+    matcher.enhance_project_matches(matches, 'downtown cincinnati ', USER_PREFS)
+
+    assert geocode_calls == ['Downtown Cincinnati']
+    assert len(matcher._travel_cache) == 1
+    assert [m['score'] for m in enhanced] == sorted((m['score'] for m in enhanced), reverse=True)
+
+    single = matcher.calculate_proximity_score('Downtown Cincinnati', 'Central Community YMCA', USER_PREFS)
+    batch = matcher.score_branches('Downtown Cincinnati', ['Central Community YMCA', 'Unknown YMCA'], USER_PREFS)
+    assert batch['Central Community YMCA'] == single
+    assert {'driving', 'transit', 'walking', 'bicycling'} == {t['mode'] for t in single['travel_options']}
+    assert batch['Unknown YMCA']['reasons'] == ["Branch location unknown"]
+
+    # Returned options are copies; editing them must not leak into the cache
+    single['travel_options'][0]['distance_km'] = -1
+    again = matcher.calculate_proximity_score('Downtown Cincinnati', 'Central Community YMCA', USER_PREFS)
+    assert again['travel_options'][0]['distance_km'] >= 0
+
+    print("✅ Proximity scores served from cached travel tables")
+
+def test_gazetteer_resolution():
+    """ZIP codes beat neighborhoods, which beat cities; unknown addresses resolve to None"""
+    print("\n🧪 Testing gazetteer resolution...")
+
+    gazetteer = Gazetteer.from_csv()
+
+    assert gazetteer.resolve('4449 Cooper Rd, Blue Ash, OH 45242').name == '45242'
+    assert gazetteer.resolve('Oakley, Cincinnati').name == 'oakley'
+    assert gazetteer.resolve('Over-the-Rhine').name == 'over-the-rhine'
+    assert gazetteer.resolve('Newport KY').name == 'newport'
+    # Names only match on word boundaries
+    assert gazetteer.resolve('Hamason Road') is None
+    assert gazetteer.resolve('somewhere else') is None
+    assert [place.name for place in gazetteer.complete('walnut')] == ['walnut hills']
+
+    matcher = ProximityMatcher()
+    assert matcher.geocode_address('somewhere else') == ProximityMatcher.DEFAULT_COORDS
+    assert matcher.geocode_batch(['Clifton', 'somewhere else']) == [(39.1353, -84.5183), None]
+
+    print("✅ Addresses resolved from the offline gazetteer")
+
+def test_spatial_index_matches_brute_force():
+    """Radius and k-nearest queries agree with a full haversine scan"""
+    print("\n🧪 Testing spatial index queries...")
+
+    rng = random.Random(7)
+    matcher = ProximityMatcher()
+    volunteers = [
+        {'contact_id': f'v{i}', 'lat': 39.1 + rng.uniform(-0.3, 0.3), 'lng': -84.5 + rng.uniform(-0.3, 0.3)}
+        for i in range(2000)
+    ]
+    volunteers.append({'contact_id': 'v-zip', 'location': 'Cincinnati, OH 45236'})
+    volunteers.append({'contact_id': 'v-unknown', 'location': 'unknown'})
+
+    stats = matcher.index_volunteers(volunteers)
+    assert stats == {'indexed': 2001, 'skipped': 1}
+
+    branch = matcher.branch_locations['Blue Ash YMCA']
+    brute_force = sorted(
+        (matcher.haversine_distance(branch.lat, branch.lng, v['lat'], v['lng']), v['contact_id'])
+        for v in volunteers if 'lat' in v
+    )
+
+    within = matcher.volunteers_within('Blue Ash YMCA', 8)
+    expected = [volunteer_id for distance, volunteer_id in brute_force if distance <= 8] + ['v-zip']
+    assert sorted(v['volunteer_id'] for v in within) == sorted(expected)
+    assert [v['distance_km'] for v in within] == sorted(v['distance_km'] for v in within)
+
+    nearest = matcher.nearest_volunteers('Blue Ash YMCA', k=5)
+    assert len(nearest) == 5
+    assert abs(nearest[-1]['distance_km'] - round(sorted(
+        [d for d, _ in brute_force] + [matcher.haversine_distance(branch.lat, branch.lng, 39.2092, -84.3975)]
+    )[4], 2)) < 0.01
+
+    report = matcher.get_branch_accessibility_report()
+    assert report['branches']['Blue Ash YMCA']['volunteers_within_10km'] == \
+        matcher.volunteer_index.count_within(branch.lat, branch.lng, 10)
+    assert report['branches']['Blue Ash YMCA']['nearest_branch']['name'] == 'East Community YMCA'
+
+    assert SpatialIndex([], [], []).nearest(39.1, -84.5, 3) == []
+
+    print(f"✅ {len(within)} volunteers within 8 km of Blue Ash YMCA")
+
+if __name__ == "__main__":
+    test_vectorized_distances_match_haversine()
+    test_batch_scoring_uses_caches()
+    test_gazetteer_resolution()
+    test_spatial_index_matches_brute_force()
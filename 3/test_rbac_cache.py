@@ -0,0 +1,144 @@
+"""
+Tests for memoized RBAC permission resolution and batched access logging
+Uses the in-memory Supabase stand-in from fake_supabase
+"""
+import asyncio
+import sys
+import os
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from rbac_models import (
+    RBACService, RBACContext, Role, Permission, UserBranchRole,
+    PermissionOverride, AccessLogWriter
+)
+from fake_supabase import FakeDatabase
+
+
+def make_role(name, permission_names):
+    return Role(id=name, name=name, permissions=[Permission.from_name(p) for p in permission_names])
+
+
+def test_compiled_permissions_are_memoized_per_branch():
+    """Permission sets are built once per branch and reused"""
+    print("\n🧪 Testing compiled permission memoization...")
+
+    role = make_role('staff', ['volunteers.read.branch'])
+    context = RBACContext(
+        user_id='u1',
+        user_roles=[UserBranchRole(user_id='u1', role_id='staff', role=role, branch='Blue Ash')]
+    )
+
+    assert context.has_permission('volunteers.read.branch', 'Blue Ash')
+    assert not context.has_permission('volunteers.read.branch', 'YDE')
+
+    compiled = context.get_compiled_permissions('Blue Ash')
+    assert isinstance(compiled, frozenset)
+    assert context.get_compiled_permissions('Blue Ash') is compiled
+
+    # In-place role edits need an explicit invalidation
+    role.add_permission(Permission.from_name('volunteers.manage.branch'))
+    assert not context.has_permission('volunteers.manage.branch', 'Blue Ash')
+    context.invalidate_permission_cache()
+    assert context.has_permission('volunteers.manage.branch', 'Blue Ash')
+
+    print("✅ Compiled permissions cached per branch")
+
+
+def test_compiled_permissions_expire_with_earliest_override():
+    """A cached set is rebuilt once a role or override expires"""
+    print("\n🧪 Testing compiled permission expiry...")
+
+    role = make_role('volunteer', ['users.read.own'])
+    context = RBACContext(
+        user_id='u1',
+        user_roles=[UserBranchRole(user_id='u1', role_id='volunteer', role=role)],
+        permission_overrides=[PermissionOverride(
+            user_id='u1', permission_id='p1', granted=True,
+            permission=Permission.from_name('analytics.export.branch'),
+            expires_at=datetime.now() + timedelta(milliseconds=50)
+        )]
+    )
+
+    assert context.has_permission('analytics.export.branch')
+    assert context.get_valid_until() is not None
+
+    asyncio.run(asyncio.sleep(0.06))
+    assert not context.has_permission('analytics.export.branch')
+    assert context.has_permission('users.read.own')
+
+    print("✅ Expired overrides dropped from compiled permissions")
+
+
+def test_service_caches_contexts_and_invalidates_on_role_change():
+    """check_permission hits the database once per user until roles change"""
+    print("\n🧪 Testing RBAC context cache...")
+
+    database = FakeDatabase(async_client=True)
+    database.supabase.tables['user_branch_roles'] = [{
+        'user_id': 'u1', 'role_id': 'r1', 'branch': None, 'is_active': True,
+        'roles': {'id': 'r1', 'name': 'staff', 'role_permissions': [
+            {'permissions': {'name': 'projects.read.branch', 'resource': 'projects', 'action': 'read'}}
+        ]}
+    }]
+    service = RBACService(database)
+
+    async def scenario():
+        for _ in range(5):
+            assert await service.check_permission('u1', 'projects.read.branch', 'Blue Ash')
+        context_loads = database.supabase.calls.count('user_branch_roles')
+
+        await service.assign_role_to_user('u1', 'r2', branch='YDE')
+        await service.check_permission('u1', 'projects.read.branch', 'Blue Ash')
+        await service.access_log_writer.stop()
+        return context_loads
+
+    context_loads = asyncio.run(scenario())
+
+    assert context_loads == 1
+    assert service.context_cache.get_stats()['hits'] == 4
+    # Reloaded after the assignment invalidated the cache (one insert plus one select)
+    assert database.supabase.calls.count('user_branch_roles') == 3
+    assert len(database.supabase.tables['access_logs']) == 7
+
+    print("✅ Contexts cached until roles change")
+
+
+def test_access_log_writer_batches_and_retries():
+    """Queued entries are written in batches and survive a failed flush"""
+    print("\n🧪 Testing batched access log writer...")
+
+    database = FakeDatabase(async_client=True)
+    writer = AccessLogWriter(database, batch_size=10, flush_interval=0.01)
+
+    async def scenario():
+        for i in range(25):
+            writer.enqueue({'user_id': f'u{i}', 'resource': 'users', 'action': 'read', 'granted': True})
+        await asyncio.sleep(0.05)
+        assert database.supabase.calls.count('access_logs') == 3
+
+        database.supabase.fail_writes = True
+        writer.enqueue({'user_id': 'late', 'resource': 'users', 'action': 'read', 'granted': False})
+        assert await writer.flush() == 0
+        assert writer.get_stats()['queue_depth'] == 1
+
+        database.supabase.fail_writes = False
+        await writer.stop()
+
+    asyncio.run(scenario())
+
+    stats = writer.get_stats()
+    assert stats['written'] == 26
+    assert stats['failed_batches'] >= 1
+    assert stats['queue_depth'] == 0
+    assert len(database.supabase.tables['access_logs']) == 26
+
+    print("✅ Access logs written in batches")
+
+
+if __name__ == "__main__":
+    test_compiled_permissions_are_memoized_per_branch()
+    test_compiled_permissions_expire_with_earliest_override()
+    test_service_caches_contexts_and_invalidates_on_role_change()
+    test_access_log_writer_batches_and_retries()
@@ -0,0 +1,187 @@
+"""
+Tests for the bulk Salesforce contact and campaign sync
+Runs SalesforceNonprofitCloudSync against the local mock Salesforce server
+"""
+import asyncio
+import json
+import sys
+import os
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from salesforce_integration import SalesforceNonprofitCloudSync, SalesforceConfig
+from salesforce_bulk import SalesforceBulkSync
+from salesforce_mock_server import MockSalesforceServer
+from sync_executor import SyncExecutor, ProviderLimits, RetryConfig
+
+
+def make_config(server, cache_path=None, **overrides):
+    return SalesforceConfig(instance_url=server.base_url, client_id='id', client_secret='secret',
+                            username='sync@ymca.org', password='pw', security_token='tok',
+                            id_cache_path=cache_path, **overrides)
+
+
+def volunteer(n, **extra):
+    return {'first_name': f'Vol{n}', 'last_name': f'Unteer{n}', 'email': f'volunteer{n}@example.org',
+            'phone': f'555-{n:04d}', 'skills': 'Coaching', **extra}
+
+
+def fast_retries(client):
+    """Same pipeline, with retry delays short enough for a test"""
+    client.bulk = SalesforceBulkSync(client, client.id_cache, executor=SyncExecutor(
+        retry_config=RetryConfig(initial_delay=0.01),
+        provider_limits={'salesforce': ProviderLimits(1000.0, batch_size=200, concurrency=4)}))
+
+
+def test_contacts_sync_in_collections_with_one_query_per_chunk():
+    """1000 volunteers go out as 5 chunks: one SOQL query and at most two collection calls each"""
+    print("\n🧪 Testing bulk Salesforce contact sync...")
+
+    async def scenario(cache_path):
+        server = MockSalesforceServer(latency=0.02)
+        await server.start()
+        for n in range(300):
+            server.insert('Contact', {'FirstName': f'Vol{n}', 'LastName': f'Unteer{n}',
+                                      'Email': f'Volunteer{n}@Example.org'})
+        # A repeated volunteer is sent once
+        volunteers = [volunteer(n) for n in range(1000)] + [volunteer(5, phone='555-9999')]
+        progress = []
+
+        async with SalesforceNonprofitCloudSync(make_config(server, cache_path)) as client:
+            first = await client.bulk_sync_contacts(volunteers, progress_callback=progress.append)
+        first_calls = list(server.requests)
+
+        server.requests.clear()
+        async with SalesforceNonprofitCloudSync(make_config(server, cache_path)) as client:
+            second = await client.bulk_sync_contacts(volunteers)
+
+        await server.stop()
+        return server, first, first_calls, second, progress
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = os.path.join(tmp, 'salesforce_id_cache.json')
+        server, first, first_calls, second, progress = asyncio.run(scenario(cache_path))
+        with open(cache_path) as cache_file:
+            cached = json.load(cache_file)
+
+    assert first['successful'] == 1000 and first['failed'] == 0
+    assert first['updated'] == 300 and first['created'] == 700 and first['resolved_by_query'] == 300
+    assert len(server.records['Contact']) == 1000
+    assert server.find('Contact', 'Email', 'volunteer5@example.org')[0]['Phone'] == '555-9999'
+
+    queries = [call for call in first_calls if call[0] == 'GET']
+    writes = [call for call in first_calls if call[0] != 'GET']
+    assert len(queries) == 5 and first['chunks'] == 5
+    assert len(writes) == 6 and max(size for _, _, size in writes) == 200
+    assert first['requests'] == 11
+    assert 1 < server.max_in_flight <= 4
+    assert len(progress) == 5 and progress[-1]['records_done'] == 1000
+    assert first['duration_seconds'] > 0 and first['records_per_second'] > 0
+
+    # The saved ID map resolves every volunteer on the next run
+    assert len(cached['Contact']) == 1000
+    assert second['cache_hits'] == 1000 and second['updated'] == 1000
+    assert server.count('GET') == 0 and server.count('PATCH', 'composite') == 5
+
+    print(f"✅ 1000 contacts synced with {first['requests']} API calls in {first['duration_seconds']:.2f}s")
+
+
+def test_stale_ids_rate_limits_and_record_errors():
+    """Deleted contacts are looked up again, a 429 is retried and a bad record fails on its own"""
+    print("\n🧪 Testing bulk sync error handling...")
+
+    async def scenario():
+        server = MockSalesforceServer()
+        await server.start()
+        async with SalesforceNonprofitCloudSync(make_config(server)) as client:
+            fast_retries(client)
+            await client.bulk_sync_contacts([volunteer(n) for n in range(10)])
+
+            # Two contacts are deleted in Salesforce; one is re-entered by staff under the same email
+            for n in (1, 2):
+                server.delete('Contact', client.id_cache.get('Contact', f'volunteer{n}@example.org'))
+            replacement = server.insert('Contact', {'LastName': 'Unteer2', 'Email': 'volunteer2@example.org'})
+            server.fail_next.append(429)
+
+            result = await client.bulk_sync_contacts(
+                [volunteer(n) for n in range(10)] + [volunteer(10, last_name=None)])
+            retries = client.bulk.executor.get_metrics()['providers']['salesforce']['retries']
+            cached_replacement = client.id_cache.get('Contact', 'volunteer2@example.org')
+        await server.stop()
+        return server, result, retries, replacement, cached_replacement
+
+    server, result, retries, replacement, cached_replacement = asyncio.run(scenario())
+
+    assert retries == 1
+    assert result['updated'] == 9 and result['created'] == 1 and result['failed'] == 1
+    assert cached_replacement == replacement
+    assert len(server.find('Contact', 'Email', 'volunteer1@example.org')) == 1
+    assert result['errors'] == ["Failed to sync volunteer10@example.org: REQUIRED_FIELD_MISSING: "
+                                "Required fields are missing: ['LastName']"]
+
+    print("✅ Stale IDs re-resolved, 429 retried, 1 invalid record reported")
+
+
+def test_failed_create_request_is_not_retried_or_double_counted():
+    """When the create request fails after the updates went through, only the creates count as failed"""
+    print("\n🧪 Testing bulk sync with a failed create request...")
+
+    async def scenario():
+        server = MockSalesforceServer()
+        await server.start()
+        async with SalesforceNonprofitCloudSync(make_config(server)) as client:
+            fast_retries(client)
+            await client.bulk_sync_contacts([volunteer(n) for n in range(10)])
+
+            server.requests.clear()
+            server.fail_next.append(('POST', 429))
+            result = await client.bulk_sync_contacts([volunteer(n) for n in range(15)])
+        await server.stop()
+        return server, result
+
+    server, result = asyncio.run(scenario())
+
+    assert result['updated'] == result['successful'] == 10
+    assert result['created'] == 0 and result['failed'] == 5
+    assert result['errors'][0].startswith('Contact chunk failed with 5 of 15 records unsynced')
+    # The create is sent once: a lost response could mean the records were saved
+    assert server.count('POST', 'composite') == 1
+    assert len(server.records['Contact']) == 10
+
+    print("✅ 10 updates kept, 5 creates failed without a retry")
+
+
+def test_campaigns_match_by_name_case_insensitively():
+    """Campaign names with quotes are matched with an escaped SOQL IN query"""
+    print("\n🧪 Testing bulk Salesforce campaign sync...")
+
+    async def scenario():
+        server = MockSalesforceServer(query_page_size=1)
+        await server.start()
+        existing = server.insert('Campaign', {'Name': "Kids' Swim Lessons", 'Status': 'Active'})
+        server.insert('Campaign', {'Name': 'Food Drive', 'Status': 'Active'})
+        projects = [{'name': "kids' swim lessons", 'description': 'Saturday mornings', 'branch': 'Blue Ash'},
+                    {'name': 'Food Drive', 'description': 'Canned goods'},
+                    {'name': 'Park Cleanup', 'description': 'Trail work'}]
+        async with SalesforceNonprofitCloudSync(make_config(server)) as client:
+            result = await client.bulk_sync_campaigns(projects)
+        await server.stop()
+        return server, result, existing
+
+    server, result, existing = asyncio.run(scenario())
+
+    assert result['updated'] == 2 and result['created'] == 1 and result['failed'] == 0
+    assert server.records['Campaign'][existing]['Location__c'] == 'Blue Ash'
+    assert len(server.records['Campaign']) == 3
+    # The two matches came back one per page, following nextRecordsUrl
+    assert server.count('GET', 'query') == 2
+
+    print("✅ 2 campaigns updated by name, 1 created")
+
+
+if __name__ == "__main__":
+    test_contacts_sync_in_collections_with_one_query_per_chunk()
+    test_stale_ids_rate_limits_and_record_errors()
+    test_failed_create_request_is_not_retried_or_double_counted()
+    test_campaigns_match_by_name_case_insensitively()
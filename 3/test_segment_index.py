@@ -0,0 +1,128 @@
+"""
+Tests for the bitmap segment index behind audience segmentation
+"""
+import sys
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from email_campaigns import (
+    AudienceSegmentationEngine, EmailCampaignManager, SegmentCriteria, SegmentationType, SegmentTemplates
+)
+
+BRANCHES = ['Blue Ash', 'M.E. Lyons', 'Campbell County', 'Clippard']
+CATEGORIES = ['Youth Development', 'Fitness', 'Special Events', 'Administrative']
+
+
+def make_volunteer_data(count, seed=7):
+    rng = random.Random(seed)
+    volunteers, interactions = [], []
+    for i in range(count):
+        volunteers.append({
+            'contact_id': i, 'email': f'volunteer{i}@example.org', 'first_name': f'First{i}',
+            'last_name': f'Last{i}', 'age': rng.randint(16, 80), 'member_branch': rng.choice(BRANCHES),
+            'experience_level': rng.randint(1, 3), 'is_ymca_member': rng.random() < 0.5
+        })
+        if i % 5 == 0:
+            continue  # Never volunteered
+        for _ in range(rng.randint(1, 6)):
+            interactions.append({
+                'contact_id': i, 'hours': rng.randint(1, 20), 'project_id': rng.randint(1, 40),
+                'project_category': rng.choice(CATEGORIES), 'branch_short': rng.choice(BRANCHES),
+                'date': (datetime.now() - timedelta(days=rng.randint(0, 700))).strftime('%Y-%m-%d')
+            })
+    return {'volunteers': volunteers, 'interactions': interactions, 'projects': []}
+
+
+def reference_totals(data):
+    """Per-volunteer hours and last activity computed directly from the raw interactions"""
+    hours, last = {}, {}
+    for row in data['interactions']:
+        hours[row['contact_id']] = hours.get(row['contact_id'], 0) + row['hours']
+        last[row['contact_id']] = max(last.get(row['contact_id'], ''), row['date'])
+    return hours, last
+
+
+def test_segments_match_direct_filters():
+    """Bitmap segments select the same volunteers as filtering the raw data"""
+    print("\n🧪 Testing segment bitmaps against direct filters...")
+
+    data = make_volunteer_data(2000)
+    engine = AudienceSegmentationEngine(data)
+    hours, last = reference_totals(data)
+    today = datetime.now()
+
+    high = set(engine.create_segment(SegmentTemplates.high_engagement_volunteers())['contact_id'])
+    assert high == {cid for cid, total in hours.items() if total >= 20}
+
+    inactive = set(engine.create_segment(SegmentTemplates.inactive_volunteers(90))['contact_id'])
+    assert inactive == {cid for cid, day in last.items() if (today - datetime.fromisoformat(day)).days >= 90}
+
+    young_blue_ash = set(engine.create_segment(
+        SegmentTemplates.youth_demographic(35) +
+        [SegmentCriteria(SegmentationType.DEMOGRAPHIC, 'member_branch', 'eq', 'Blue Ash')]
+    )['contact_id'])
+    assert young_blue_ash == {v['contact_id'] for v in data['volunteers']
+                              if v['age'] <= 35 and v['member_branch'] == 'Blue Ash'}
+
+    print(f"✅ {len(high)} high-engagement, {len(inactive)} inactive, {len(young_blue_ash)} young Blue Ash volunteers")
+
+
+def test_combined_segments_and_buckets():
+    """Segments union with OR, and tier/recency buckets partition the volunteers"""
+    print("\n🧪 Testing combined segments and bucket bitmaps...")
+
+    data = make_volunteer_data(2000)
+    engine = AudienceSegmentationEngine(data)
+
+    fitness = SegmentTemplates.category_interested('Fitness')
+    youth = SegmentTemplates.category_interested('Youth Development')
+    either = set(engine.create_combined_segment([fitness, youth])['contact_id'])
+    assert either == set(engine.create_segment(fitness)['contact_id']) | set(engine.create_segment(youth)['contact_id'])
+
+    tiers = engine.get_audience_breakdown('engagement_tier')
+    assert sum(tiers.values()) == 2000
+    assert tiers['none'] == 400  # Every fifth volunteer has no interactions
+    champions = engine.get_audience_size(SegmentTemplates.engagement_tier('champion'))
+    assert champions == tiers['champion']
+    assert engine.get_audience_size(SegmentTemplates.engagement_tier('engaged', 'champion')) == \
+        engine.get_audience_size(SegmentTemplates.high_engagement_volunteers())
+
+    recency = engine.get_audience_breakdown('activity_bucket')
+    assert sum(recency.values()) == 2000 and recency['never'] == 400
+    assert engine.get_audience_size(SegmentTemplates.activity_window('active_30d')) == \
+        engine.get_audience_size(SegmentTemplates.new_volunteers(30))
+
+    print(f"✅ Engagement tiers {tiers}")
+
+
+def test_audience_sizes_are_cached():
+    """Repeated criteria are answered from cached bitmaps"""
+    print("\n🧪 Testing audience size caching...")
+
+    data = make_volunteer_data(5000)
+    manager = EmailCampaignManager(data)
+    segments = SegmentTemplates.high_engagement_volunteers() + SegmentTemplates.branch_specific('Clippard')
+
+    first = manager.preview_audience(segments)
+    start = time.perf_counter()
+    for _ in range(100):
+        again = manager.preview_audience(segments)
+    elapsed_ms = (time.perf_counter() - start) * 1000 / 100
+
+    assert again == first
+    assert first['audience_size'] == sum(first['by_engagement_tier'].values())
+    assert {branch for branch, size in first['by_branch'].items() if size} == {'Clippard'}
+    stats = manager.segmentation_engine.index.get_stats()
+    assert stats['misses'] == 2 and stats['builds'] == 1
+
+    print(f"✅ Preview of {first['audience_size']} volunteers in {elapsed_ms:.2f} ms once cached")
+
+
+if __name__ == "__main__":
+    test_segments_match_direct_filters()
+    test_combined_segments_and_buckets()
+    test_audience_sizes_are_cached()
@@ -0,0 +1,110 @@
+"""
+Tests for the vectorized Bayesian, sequential and multi-variant analysis
+"""
+import sys
+import os
+import random
+
+import numpy as np
+from scipy.stats import chi2_contingency
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from statistical_analysis import ABTestAnalyzer, StatisticalAnalyzer
+from statistical_kernels import group_sequential_boundaries, sample_beta_comparison
+
+
+def test_bayesian_integration_matches_sampling():
+    """Integrated posterior summaries agree with a large Monte Carlo run"""
+    print("\n🧪 Testing Bayesian integration against sampling...")
+
+    analyzer = StatisticalAnalyzer()
+    for counts in [(50, 1000, 70, 1000), (5, 25, 3, 43), (500, 10000, 520, 10000)]:
+        result = analyzer.bayesian_analysis(*counts)
+        c, n, v, m = counts
+        sampled = sample_beta_comparison(1 + c, 1 + n - c, 1 + v, 1 + m - v, n_simulations=1000000,
+                                         rng=np.random.default_rng(3))
+
+        assert abs(result.probability_variant_better - sampled['prob_variant_better']) < 0.003
+        assert abs(result.risk_of_loss - (1 - sampled['prob_variant_better'])) < 0.003
+        assert abs(result.expected_lift - sampled['expected_lift'] * 100) < 0.5
+        assert abs(result.credible_interval[0] - sampled['ci_lower'] * 100) < 0.5
+        assert abs(result.credible_interval[1] - sampled['ci_upper'] * 100) < 0.5
+
+    # A control with no conversions cannot be integrated and falls back to sampling
+    fallback = analyzer.bayesian_analysis(0, 100, 5, 100)
+    assert fallback.probability_variant_better > 0.95
+
+    batch = analyzer.bayesian_analysis_batch([50, 5], [1000, 25], [70, 3], [1000, 43])
+    assert batch[0] == analyzer.bayesian_analysis(50, 1000, 70, 1000)
+
+    print(f"✅ P(variant better) {result.probability_variant_better:.4f} vs sampled "
+          f"{sampled['prob_variant_better']:.4f}")
+
+
+def test_sequential_p_values_and_boundaries():
+    """Vectorized look-by-look p-values equal chi2_contingency, and boundaries spend alpha as planned"""
+    print("\n🧪 Testing sequential analysis...")
+
+    rng = random.Random(8)
+    points = [{'control_conversions': rng.randint(0, 8), 'control_total': 50,
+               'variant_conversions': rng.randint(2, 10), 'variant_total': 50} for _ in range(60)]
+    analyzer = StatisticalAnalyzer()
+    result = analyzer.sequential_analysis(points)
+
+    totals = np.cumsum([[p['control_conversions'], p['control_total'], p['variant_conversions'],
+                         p['variant_total']] for p in points], axis=0)
+    expected = [chi2_contingency([[c, n - c], [v, m - v]])[1] for c, n, v, m in totals]
+    assert np.allclose(result['p_values'], expected, rtol=1e-12, atol=0)
+
+    # Lan-DeMets Pocock-type boundaries for five equally spaced looks
+    pocock = group_sequential_boundaries([0.2, 0.4, 0.6, 0.8, 1.0], spending='pocock')
+    assert np.allclose(pocock, [2.438, 2.427, 2.410, 2.397, 2.386], atol=2e-3)
+
+    # Simulated null tests cross the O'Brien-Fleming boundaries about alpha of the time
+    fractions = np.array([0.2, 0.4, 0.6, 0.8, 1.0])
+    boundaries = group_sequential_boundaries(fractions)
+    paths = np.random.default_rng(1).standard_normal((200000, 5)) * np.sqrt(np.diff(fractions, prepend=0))
+    z_scores = paths.cumsum(axis=1) / np.sqrt(fractions)
+    assert abs((np.abs(z_scores) >= boundaries).any(axis=1).mean() - 0.05) < 0.003
+
+    planned = analyzer.sequential_analysis(points, planned_sample_size=12000)
+    assert len(planned['boundaries']) == len(points)
+    assert planned['recommendation'] in ('stop_early', 'continue')
+    assert planned['information_fraction'] == 6000 / 12000
+
+    print(f"✅ {len(points)} looks; O'Brien-Fleming boundaries {np.round(boundaries, 2).tolist()}")
+
+
+def test_multi_variant_and_many_tests():
+    """Pairwise comparisons run in one pass, and many tests are analyzed together"""
+    print("\n🧪 Testing multi-variant and batched analysis...")
+
+    analyzer = StatisticalAnalyzer()
+    variants = {'a': {'conversions': 50, 'total': 1000}, 'b': {'conversions': 80, 'total': 1000},
+                'c': {'conversions': 55, 'total': 900}}
+    result = analyzer.multi_variant_analysis(variants)
+
+    single = analyzer.analyze_conversion_rate(50, 1000, 80, 1000)
+    assert result['pairwise_comparisons']['a_vs_b']['p_value'] == single.p_value
+    assert result['pairwise_comparisons']['a_vs_b']['adjusted_p_value'] == min(1.0, single.p_value * 3)
+    assert result['best_variant'] == 'b'
+    assert 0 < result['overall_test']['p_value'] < 0.05
+
+    tests = {f'test_{i}': {'control_conversions': 40 + i, 'control_total': 1000,
+                           'variant_conversions': 50 + 2 * i, 'variant_total': 1000} for i in range(50)}
+    analyzer = ABTestAnalyzer()
+    batched = analyzer.analyze_tests(tests)
+    for test_id in ('test_0', 'test_49'):
+        one = analyzer.comprehensive_analysis(tests[test_id])
+        assert batched[test_id]['conversion_analysis'] == one['conversion_analysis']
+        assert batched[test_id]['bayesian_analysis'] == one['bayesian_analysis']
+        assert batched[test_id]['recommendation'] == one['recommendation']
+
+    print(f"✅ {len(batched)} tests analyzed in one batch")
+
+
+if __name__ == "__main__":
+    test_bayesian_integration_matches_sampling()
+    test_sequential_p_values_and_boundaries()
+    test_multi_variant_and_many_tests()
@@ -0,0 +1,137 @@
+"""
+Tests for the sync executor and the batched Airtable/Notion sync
+Uses the in-memory Airtable and Notion stand-ins from fake_sync_providers
+"""
+import asyncio
+import sys
+import os
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sync_executor import SyncExecutor, ProviderLimits, RetryConfig
+from fake_sync_providers import FakeAirtable, FakeNotion, airtable_volunteer, notion_volunteer, make_service
+
+
+def test_airtable_writes_use_batches_of_ten():
+    """New and changed Notion records reach Airtable 10 per request; a 429 on an update is retried"""
+    print("\n🧪 Testing batched Airtable writes...")
+
+    airtable = FakeAirtable({'Volunteers': [airtable_volunteer(n) for n in range(3)]}, rate_limited_updates=1)
+    notion = FakeNotion({'vol-db': [notion_volunteer(n) for n in range(25)]})
+    service = make_service(airtable, notion)
+
+    result = asyncio.run(service.start_sync_process(['volunteers']))
+    table = result['tables_synced'][0]
+
+    creates = sorted(size for method, _, size in airtable.write_requests if method == 'post')
+    updates = [size for method, _, size in airtable.write_requests if method == 'patch']
+    assert creates == [2, 10, 10] and updates == [3]
+    assert len(notion.updated) == 3  # Airtable's 3 records pushed back one page at a time
+    assert table['created'] == 22 and table['updated'] == 6 and table['failed'] == 0
+    assert table['records_written'] == 28 and table['records_per_second'] > 0
+    assert service.executor.get_metrics()['providers']['airtable']['retries'] == 1
+    assert not service.is_syncing
+
+    print(f"✅ 25 records written to Airtable in {len(airtable.write_requests)} requests")
+
+
+def test_creates_are_sent_once_and_updates_retried():
+    """A create that times out is not resent, since the server may have saved it; an update is"""
+    print("\n🧪 Testing retries of create and update batches...")
+
+    executor = SyncExecutor(retry_config=RetryConfig(initial_delay=0.01),
+                            provider_limits={'notion': ProviderLimits(1000.0)})
+    sent = []
+
+    async def send(batch):
+        sent.append(batch)
+        if len(sent) == 1:
+            raise asyncio.TimeoutError()
+
+    assert asyncio.run(executor.write_batches('notion', ['create'], send, max_retries=0))[0] == 0
+    assert len(sent) == 1
+
+    sent.clear()
+    assert asyncio.run(executor.write_batches('notion', ['update'], send)) == (1, [])
+    assert len(sent) == 2
+
+    airtable = FakeAirtable(rate_limited_writes=1)
+    notion = FakeNotion({'vol-db': [notion_volunteer(n) for n in range(5)]})
+    table = asyncio.run(make_service(airtable, notion).start_sync_process(['volunteers']))['tables_synced'][0]
+    assert table['created'] == 0 and table['failed'] == 5 and airtable.write_requests == []
+
+    print("✅ Timed-out create sent once, timed-out update retried")
+
+
+def test_batch_create_records_splits_and_waits_out_rate_limits():
+    """batch_create_records sends 10 records per create_records call and resends a rate-limited batch"""
+    print("\n🧪 Testing Airtable batch_create_records...")
+
+    airtable = FakeAirtable(rate_limited_writes=2)
+    created = asyncio.run(airtable.batch_create_records('Volunteers', [{'Name': f'V{n}'} for n in range(25)]))
+
+    assert len(created) == 25
+    assert [size for _, _, size in airtable.write_requests] == [10, 10, 5]
+
+    print("✅ 25 records created in 3 requests after 2 rate-limited attempts")
+
+
+def test_tables_sync_in_parallel():
+    """Volunteers and projects are fetched and synced at the same time"""
+    print("\n🧪 Testing per-table parallelism...")
+
+    airtable = FakeAirtable({'Volunteers': [airtable_volunteer(1)], 'Projects': []}, fetch_delay=0.2)
+    notion = FakeNotion()
+
+    async def scenario(service):
+        start = time.perf_counter()
+        sync = asyncio.create_task(service.start_sync_process(['volunteers', 'projects']))
+        await asyncio.sleep(0.05)
+        busy = await service.start_sync_process(['projects'])
+        status = await service.get_sync_status()
+        result = await sync
+        return result, busy, status, time.perf_counter() - start
+
+    result, busy, status, elapsed = asyncio.run(scenario(make_service(airtable, notion)))
+    assert airtable.max_fetching == 2
+    assert elapsed < 0.35
+    assert [table['table_type'] for table in result['tables_synced']] == ['volunteers', 'projects']
+    assert busy['status'] == 'error' and status['syncing_tables'] == ['projects', 'volunteers']
+
+    airtable.max_fetching = 0
+    asyncio.run(make_service(airtable, notion, table_parallelism=1)
+                .start_sync_process(['volunteers', 'projects']))
+    assert airtable.max_fetching == 1
+
+    print(f"✅ 2 tables synced in {elapsed * 1000:.0f} ms")
+
+
+def test_notion_requests_respect_provider_limits():
+    """Page writes stay within Notion's request rate and concurrency"""
+    print("\n🧪 Testing per-provider rate limits...")
+
+    airtable = FakeAirtable({'Volunteers': [airtable_volunteer(n) for n in range(40)]})
+    notion = FakeNotion(write_delay=0.01)
+    service = make_service(airtable, notion, notion_rate=20.0)
+
+    start = time.perf_counter()
+    result = asyncio.run(service.start_sync_process(['volunteers']))
+    elapsed = time.perf_counter() - start
+
+    assert result['tables_synced'][0]['created'] == 40 and len(notion.created) == 40
+    # 41 requests with a burst of 20 at 20/s
+    assert elapsed >= 0.95
+    assert notion.max_in_flight <= 3
+    window = [t for t in notion.request_times if t - notion.request_times[0] < 0.5]
+    assert len(window) <= 20 + 11
+
+    print(f"✅ 41 Notion requests paced over {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    test_airtable_writes_use_batches_of_ten()
+    test_creates_are_sent_once_and_updates_retried()
+    test_batch_create_records_splits_and_waits_out_rate_limits()
+    test_tables_sync_in_parallel()
+    test_notion_requests_respect_provider_limits()
@@ -0,0 +1,173 @@
+"""
+Tests for the batch waitlist backfill engine
+Uses the in-memory Supabase stand-in from fake_supabase
+"""
+import asyncio
+import sys
+import os
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from waitlist_backfill import BatchBackfillEngine
+from fake_supabase import FakeDatabase as BaseFakeDatabase
+
+
+class FakeDatabase(BaseFakeDatabase):
+    """Fake database with the waitlist helpers and, when installed, the promote_waitlist_candidates function"""
+
+    def __init__(self, rpc_installed=True):
+        super().__init__()
+        self.supabase.relations['course_enrollments'] = {'users': ('user_id', 'users')}
+        if rpc_installed:
+            self.supabase.rpc_handlers['promote_waitlist_candidates'] = self._promote
+        self.audit_log = []
+        self.reordered = []
+
+    def _promote(self, params):
+        time.sleep(0.05)  # One database round trip per course
+        enrollments = {row['id']: row for row in self.supabase.tables['course_enrollments']}
+        promoted = []
+        for enrollment_id in params['p_enrollment_ids']:
+            enrollments[enrollment_id]['enrollment_status'] = 'enrolled'
+            promoted.append({'enrollment_id': enrollment_id})
+        return promoted
+
+    async def log_waitlist_action(self, course_id, user_id, action, previous_status, new_status, reason,
+                                  performed_by='system'):
+        self.audit_log.append((course_id, user_id, action))
+
+    async def reorder_waitlist_positions(self, course_id):
+        self.reordered.append(course_id)
+
+
+def seed(database, courses=4, waitlisted=6):
+    start = (datetime.now().astimezone() + timedelta(days=7)).isoformat()
+    tables = database.supabase.tables
+    tables['courses'] = [
+        {'id': f'c{i}', 'course_name': f'Course {i}', 'status': 'open', 'max_capacity': 10,
+         'current_enrolled': 8, 'start_date': start}
+        for i in range(courses)
+    ]
+    tables['courses'][0]['current_enrolled'] = 10  # Full
+    # Already started
+    tables['courses'][1]['start_date'] = (datetime.now().astimezone() - timedelta(days=1)).isoformat()
+    tables['users'] = [
+        {'id': f'u{i}', 'first_name': f'First{i}', 'last_name': f'Last{i}', 'email': f'user{i}@example.org'}
+        for i in range(courses * waitlisted)
+    ]
+    tables['course_enrollments'] = [
+        {'id': f'e{c}-{w}', 'course_id': f'c{c}', 'user_id': f'u{c * waitlisted + w}',
+         'enrollment_status': 'waitlisted', 'waitlist_priority': 5 - w % 3, 'waitlist_position': w + 1,
+         'enrollment_date': f'2025-01-{w + 1:02d}'}
+        for c in range(courses) for w in range(waitlisted)
+    ]
+
+
+def make_engine(database, sent):
+    async def notify(user, course, enrollment):
+        await asyncio.sleep(0.01)
+        sent.append((course['id'], user['id']))
+    return BatchBackfillEngine(database, notify)
+
+
+def test_scheduled_run_promotes_by_rank():
+    """Open courses with seats promote their best-ranked candidates in one transaction each"""
+    print("\n🧪 Testing scheduled batch backfill...")
+
+    database, sent = FakeDatabase(), []
+    seed(database)
+    engine = make_engine(database, sent)
+    result = asyncio.run(engine.run())
+
+    by_course = {entry['course_id']: entry['result'] for entry in result['results']}
+    assert set(by_course) == {'c1', 'c2', 'c3'}  # c0 is full
+    assert by_course['c1']['enrolled_count'] == 0  # Started; everyone skipped
+    assert by_course['c2']['enrolled_count'] == 2
+    # Priority 3 candidates (w = 2, 5) outrank the rest; earlier enrollment breaks the tie
+    assert [user['user_id'] for user in by_course['c2']['enrolled_users']] == ['u14', 'u17']
+
+    assert database.supabase.calls == ['courses', 'course_enrollments']
+    rpc_by_course = {params['p_course_id']: params for _, params in database.supabase.rpc_calls}
+    assert len(rpc_by_course['c1']['p_skipped_user_ids']) == 6
+    assert rpc_by_course['c1']['p_skip_reason'] == 'Course has already started'
+    assert rpc_by_course['c3']['p_enrollment_ids'] == ['e3-2', 'e3-5']
+
+    assert sorted(sent) == [('c2', 'u14'), ('c2', 'u17'), ('c3', 'u20'), ('c3', 'u23')]
+    assert engine.get_metrics()['notifications']['sent'] == 4
+
+    print(f"✅ Promoted {len(sent)} candidates across {result['courses_processed']} courses with 2 queries")
+
+
+def test_tied_candidates_page_without_gaps():
+    """Candidates with the same priority and enrollment date are each read once across pages"""
+    print("\n🧪 Testing paged waitlist reads with ties...")
+
+    database, sent = FakeDatabase(), []
+    seed(database)
+    for row in database.supabase.tables['course_enrollments']:
+        row.update(waitlist_priority=3, enrollment_date='2025-01-01')
+    engine = BatchBackfillEngine(database, make_engine(database, sent).notifications.send, page_size=5)
+
+    asyncio.run(engine.run())
+
+    rpc_by_course = {params['p_course_id']: params for _, params in database.supabase.rpc_calls}
+    assert sorted(rpc_by_course['c1']['p_skipped_user_ids']) == sorted(f'u{i}' for i in range(6, 12))
+    assert rpc_by_course['c2']['p_enrollment_ids'] == ['e2-0', 'e2-1']
+    assert rpc_by_course['c3']['p_enrollment_ids'] == ['e3-0', 'e3-1']
+    assert database.supabase.calls.count('course_enrollments') == 4
+
+    print("✅ 18 tied candidates read once each over 4 pages")
+
+
+def test_courses_are_processed_concurrently():
+    """Independent courses commit in parallel, not one after another"""
+    print("\n🧪 Testing concurrent course backfill...")
+
+    database, sent = FakeDatabase(), []
+    seed(database, courses=20)
+    engine = make_engine(database, sent)
+
+    start = time.perf_counter()
+    result = asyncio.run(engine.run())
+    elapsed = time.perf_counter() - start
+
+    assert result['courses_processed'] == 19
+    assert len(sent) == 18 * 2
+    # 19 commits of 50 ms each would take ~1 s one at a time
+    assert elapsed < 0.6
+
+    print(f"✅ {result['courses_processed']} courses backfilled in {elapsed * 1000:.0f} ms")
+
+
+def test_single_course_without_rpc_falls_back():
+    """Without the Postgres function, promotions use a bulk update and the audit helpers"""
+    print("\n🧪 Testing fallback commit without the transaction function...")
+
+    database, sent = FakeDatabase(rpc_installed=False), []
+    seed(database)
+    engine = make_engine(database, sent)
+
+    result = asyncio.run(engine.run('student_drop_user_requested', course_ids=['c2']))
+    course_result = result['results'][0]['result']
+
+    assert course_result['enrolled_count'] == 2
+    statuses = {row['id']: row['enrollment_status'] for row in database.supabase.tables['course_enrollments']}
+    assert statuses['e2-2'] == statuses['e2-5'] == 'enrolled'
+    assert sum(status == 'enrolled' for status in statuses.values()) == 2
+    assert database.audit_log == [('c2', 'u14', 'auto_enrolled'), ('c2', 'u17', 'auto_enrolled')]
+    assert database.reordered == ['c2']
+    assert engine.get_metrics()['transactional'] is False
+
+    missing = asyncio.run(engine.run('no_show', course_ids=['missing']))
+    assert missing['results'][0]['result'] == {'success': False, 'message': 'Course not found'}
+
+    print("✅ Fallback promoted 2 candidates and logged each promotion")
+
+
+if __name__ == "__main__":
+    test_scheduled_run_promotes_by_rank()
+    test_tied_candidates_page_without_gaps()
+    test_courses_are_processed_concurrently()
+    test_single_course_without_rpc_falls_back()
@@ -0,0 +1,237 @@
+"""
+Tests for the async webhook dispatcher
+Runs against a local aiohttp server that records requests and can be told to fail
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import sys
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from aiohttp import web
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from webhook_service import WebhookService, WebhookConfig, WebhookEvent
+from webhook_dispatcher import WebhookDispatcher
+
+
+class RecordingEndpoint:
+    """Local webhook receiver; `/fail` answers 503 until `healthy` is set"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.requests = []
+        self.peers = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.healthy = False
+        self.runner = None
+        self.base_url = None
+
+    async def handle(self, request):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            body = await request.read()
+            self.requests.append((request.path, body, dict(request.headers)))
+            self.peers.add(request.transport.get_extra_info('peername'))
+            await asyncio.sleep(self.delay)
+            if request.path == '/fail' and not self.healthy:
+                return web.Response(status=503, text='maintenance')
+            return web.json_response({'status': 'received'})
+        finally:
+            self.in_flight -= 1
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post('/{name}', self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f'http://127.0.0.1:{port}'
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+def make_event(n=0):
+    return WebhookEvent(event_type='volunteer.rsvp', data={'rsvp_id': f'r{n}', 'hours_pledged': 4.0},
+                        timestamp=datetime(2025, 10, 1, 12, 0))
+
+
+def test_fan_out_is_concurrent_signed_and_pooled():
+    """Subscribers are called in parallel over reused connections with a signature over the sent bytes"""
+    print("\n🧪 Testing concurrent webhook fan-out...")
+
+    async def scenario(tmp):
+        endpoint = RecordingEndpoint(delay=0.1)
+        await endpoint.start()
+        service = WebhookService(WebhookDispatcher(retry_path=os.path.join(tmp, 'retries.jsonl')))
+        for i in range(20):
+            await service.register_webhook(f'hook-{i}', WebhookConfig(
+                url=f'{endpoint.base_url}/hook{i}', event_types=['volunteer.rsvp'], secret=f'secret-{i}'))
+        await service.register_webhook('other', WebhookConfig(
+            url=f'{endpoint.base_url}/other', event_types=['volunteer.registered']))
+
+        start = time.perf_counter()
+        results = await service.trigger_webhook(make_event())
+        elapsed = time.perf_counter() - start
+        for n in range(1, 3):
+            await service.trigger_webhook(make_event(n))
+        await service.cleanup()
+        await endpoint.stop()
+        return endpoint, results, elapsed
+
+    with tempfile.TemporaryDirectory() as tmp:
+        endpoint, results, elapsed = asyncio.run(scenario(tmp))
+
+    assert len(results) == 20 and all(result['success'] for result in results.values())
+    # 20 subscribers that each take 100 ms, called side by side
+    assert elapsed < 1.0
+    # 60 deliveries over the 20 keep-alive connections opened by the first event
+    assert len(endpoint.requests) == 60
+    assert len(endpoint.peers) <= 20
+
+    path, body, headers = endpoint.requests[0]
+    webhook_id = 'hook-' + path[len('/hook'):]
+    payload = json.loads(body)
+    assert payload['webhook_id'] == webhook_id and payload['data']['rsvp_id'] == 'r0'
+    assert body == json.dumps(payload, sort_keys=True).encode('utf-8')
+    expected = base64.b64encode(hmac.new(f'secret-{webhook_id[5:]}'.encode(), body, hashlib.sha256).digest()).decode()
+    assert headers['X-Webhook-Signature'] == expected
+    assert headers['User-Agent'] == 'YMCA-VolunteerPathfinder-Webhook/1.0'
+
+    print(f"✅ 20 subscribers notified in {elapsed * 1000:.0f} ms over {len(endpoint.peers)} connections")
+
+
+def test_per_endpoint_concurrency_cap():
+    """No endpoint sees more than `per_endpoint_concurrency` requests at once"""
+    print("\n🧪 Testing per-endpoint concurrency cap...")
+
+    async def scenario(tmp):
+        endpoint = RecordingEndpoint(delay=0.05)
+        await endpoint.start()
+        service = WebhookService(WebhookDispatcher(per_endpoint_concurrency=2,
+                                                   retry_path=os.path.join(tmp, 'retries.jsonl')))
+        await service.register_webhook('crm', WebhookConfig(url=f'{endpoint.base_url}/crm',
+                                                            event_types=['volunteer.rsvp']))
+        results = await asyncio.gather(*(service.trigger_webhook(make_event(n)) for n in range(10)))
+        await service.cleanup()
+        await endpoint.stop()
+        return endpoint, results
+
+    with tempfile.TemporaryDirectory() as tmp:
+        endpoint, results = asyncio.run(scenario(tmp))
+
+    assert all(result['crm']['success'] for result in results)
+    assert endpoint.max_in_flight == 2
+
+    print("✅ 10 concurrent events delivered at most 2 at a time")
+
+
+def test_failures_are_persisted_retried_and_short_circuited():
+    """A failing endpoint trips its circuit; queued deliveries survive a restart and go out once it recovers"""
+    print("\n🧪 Testing webhook retries and circuit breaker...")
+
+    def make_service(tmp):
+        return WebhookService(WebhookDispatcher(
+            retry_path=os.path.join(tmp, 'retries.jsonl'), base_backoff=0.05,
+            failure_threshold=3, reset_timeout=0.2))
+
+    async def failing_run(tmp, endpoint):
+        service = make_service(tmp)
+        await service.register_webhook('flaky', WebhookConfig(url=f'{endpoint.base_url}/fail',
+                                                              event_types=['volunteer.rsvp']))
+        results = [(await service.trigger_webhook(make_event(n)))['flaky'] for n in range(5)]
+        metrics = service.get_webhook_stats()['delivery']
+        await service.cleanup()
+        return results, metrics
+
+    async def recovered_run(tmp, endpoint):
+        # A new service, as after a restart, reading the same retry file
+        service = make_service(tmp)
+        await service.register_webhook('flaky', WebhookConfig(url=f'{endpoint.base_url}/fail',
+                                                              event_types=['volunteer.rsvp']))
+        endpoint.healthy = True
+        await asyncio.sleep(0.25)  # Past the backoff and the circuit's reset timeout
+        summary = await service.dispatcher.process_retries(service.webhooks.get)
+        await service.cleanup()
+        return summary
+
+    async def scenario(tmp):
+        endpoint = RecordingEndpoint()
+        await endpoint.start()
+        results, metrics = await failing_run(tmp, endpoint)
+        sent_while_failing = len(endpoint.requests)
+        summary = await recovered_run(tmp, endpoint)
+        await endpoint.stop()
+        return endpoint, results, metrics, sent_while_failing, summary
+
+    with tempfile.TemporaryDirectory() as tmp:
+        endpoint, results, metrics, sent_while_failing, summary = asyncio.run(scenario(tmp))
+
+    assert all(result['queued_for_retry'] for result in results)
+    assert results[0]['status_code'] == 503
+    assert results[4]['error'].startswith('Circuit open')
+    # The circuit opened after 3 failures, so events 4 and 5 were queued without a request
+    assert sent_while_failing == 3
+    assert metrics['short_circuited'] == 2 and metrics['pending_retries'] == 5
+    assert metrics['open_circuits'] == ['flaky']
+
+    assert summary['due'] == 5 and summary['delivered'] == 5 and summary['pending'] == 0
+    delivered_ids = sorted(json.loads(body)['data']['rsvp_id'] for _, body, _ in endpoint.requests[3:])
+    assert delivered_ids == ['r0', 'r1', 'r2', 'r3', 'r4']
+
+    print("✅ 5 failed deliveries persisted, then delivered after the endpoint recovered")
+
+
+def test_cancelled_probe_frees_the_circuit():
+    """A half-open probe that is cancelled mid-request lets the next delivery probe again"""
+    print("\n🧪 Testing cancelled circuit breaker probe...")
+
+    async def scenario(tmp):
+        endpoint = RecordingEndpoint(delay=1.0)
+        await endpoint.start()
+        service = WebhookService(WebhookDispatcher(retry_path=os.path.join(tmp, 'retries.jsonl'),
+                                                   failure_threshold=1, reset_timeout=0.05))
+        await service.register_webhook('slow', WebhookConfig(url=f'{endpoint.base_url}/slow',
+                                                             event_types=['volunteer.rsvp']))
+        breaker = service.dispatcher.breaker('slow')
+        breaker.record_failure()
+        await asyncio.sleep(0.06)
+
+        probe = asyncio.create_task(service.trigger_webhook(make_event()))
+        await asyncio.sleep(0.1)
+        probing = breaker.state == 'half_open' and not breaker.allow()
+        probe.cancel()
+        try:
+            await probe
+        except asyncio.CancelledError:
+            pass
+        allowed_after_cancel = breaker.allow()
+        await service.cleanup()
+        await endpoint.stop()
+        return probing, allowed_after_cancel
+
+    with tempfile.TemporaryDirectory() as tmp:
+        probing, allowed_after_cancel = asyncio.run(scenario(tmp))
+
+    assert probing
+    assert allowed_after_cancel
+
+    print("✅ Cancelled probe released the half-open slot")
+
+
+if __name__ == "__main__":
+    test_fan_out_is_concurrent_signed_and_pooled()
+    test_per_endpoint_concurrency_cap()
+    test_failures_are_persisted_retried_and_short_circuited()
+    test_cancelled_probe_frees_the_circuit()
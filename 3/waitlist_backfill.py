@@ -0,0 +1,317 @@
+"""
+Batch waitlist backfill
+Loads open courses and their ranked waitlists in bulk, picks the candidates to promote in memory,
+commits each course's promotions in one transaction and queues the notifications
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from collections import deque
+from datetime import datetime
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Postgres function that promotes, logs and reorders a course's waitlist in one transaction
+PROMOTE_RPC = 'promote_waitlist_candidates'
+
+def _is_missing_function(error: Exception) -> bool:
+    """PostgREST's error for an RPC that is not installed"""
+    message = str(error)
+    return 'PGRST202' in message or 'Could not find the function' in message
+
+def check_enrollment_eligibility(course: Dict[str, Any], now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Whether a course accepts enrollments right now.
+
+    Every rule depends on the course alone, so a backfill evaluates it once per course.
+    """
+    if course['status'] != 'open':
+        return {'eligible': False, 'reason': 'Course is not open for enrollment'}
+
+    if course.get('start_date'):
+        start_date = datetime.fromisoformat(course['start_date'].replace('Z', '+00:00'))
+        if start_date <= (now or datetime.now().astimezone()):
+            return {'eligible': False, 'reason': 'Course has already started'}
+
+    return {'eligible': True, 'reason': 'User is eligible'}
+
+class NotificationQueue:
+    """Async queue drained by a few workers, so promotions never wait on email or SMS.
+
+    `send(user, course, enrollment)` is awaited for each queued notification;
+    failures are logged and counted, not retried.
+    """
+
+    def __init__(self, send: Callable[[Dict, Dict, Dict], Awaitable[Any]], workers: int = 4):
+        self.send = send
+        self.workers = workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._loop = None
+        self._stats = {'queued': 0, 'sent': 0, 'failed': 0}
+        self._latencies_ms = deque(maxlen=1000)
+
+    def _ensure_workers(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._queue, self._tasks, self._loop = asyncio.Queue(), [], loop
+        self._tasks = [task for task in self._tasks if not task.done()]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def put(self, user: Dict[str, Any], course: Dict[str, Any], enrollment: Dict[str, Any]):
+        self._ensure_workers()
+        self._stats['queued'] += 1
+        await self._queue.put((user, course, enrollment))
+
+    async def _worker(self):
+        while True:
+            user, course, enrollment = await self._queue.get()
+            start = time.perf_counter()
+            try:
+                await self.send(user, course, enrollment)
+                self._stats['sent'] += 1
+            except Exception as e:
+                self._stats['failed'] += 1
+                logger.error(f"❌ Error sending backfill notification to {user.get('email')}: {e}")
+            finally:
+                self._latencies_ms.append((time.perf_counter() - start) * 1000)
+                self._queue.task_done()
+
+    async def join(self):
+        """Wait until every queued notification has been handled"""
+        if self._queue is not None and self._loop is asyncio.get_running_loop():
+            await self._queue.join()
+
+    async def close(self):
+        await self.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def get_metrics(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies_ms)
+        return {
+            **self._stats,
+            'pending': self._queue.qsize() if self._queue is not None else 0,
+            'avg_send_ms': sum(latencies) / len(latencies) if latencies else 0,
+            'p95_send_ms': latencies[int(len(latencies) * 0.95)] if latencies else 0,
+        }
+
+class BatchBackfillEngine:
+    """Fills open course seats from the waitlists of many courses at once.
+
+    One query loads the courses and a paged query loads every waitlist, with
+    each candidate's user row embedded. Eligibility and ranking happen in
+    memory, each course's promotions are committed by PROMOTE_RPC in a single
+    transaction, and courses are processed concurrently up to
+    `max_concurrent_courses`.
+    """
+
+    def __init__(self, db, notify: Callable[[Dict, Dict, Dict], Awaitable[Any]],
+                 max_concurrent_courses: int = 8, notification_workers: int = 4, page_size: int = 1000):
+        self.db = db
+        self.notifications = NotificationQueue(notify, workers=notification_workers)
+        self.max_concurrent_courses = max_concurrent_courses
+        self.page_size = page_size
+        self._rpc_available = True
+        self._stats = {'runs': 0, 'courses': 0, 'promoted': 0, 'skipped': 0, 'fallback_commits': 0}
+        self._run_latencies_ms = deque(maxlen=200)
+
+    async def run(self, trigger_reason: str = 'scheduled_check', course_ids: Optional[List[str]] = None,
+                  wait_for_notifications: bool = True) -> Dict[str, Any]:
+        """Backfill the given courses, or every open course with free seats and a waitlist.
+
+        Notifications are sent by the queue's workers while other courses are still
+        being processed; by default the run returns once they have all been handled.
+        """
+        start = time.perf_counter()
+        courses = await asyncio.to_thread(self._load_courses, course_ids)
+        if course_ids is None:
+            courses = [course for course in courses if course['max_capacity'] - course['current_enrolled'] > 0]
+        waitlists = await asyncio.to_thread(self._load_waitlists, [course['id'] for course in courses])
+        if course_ids is None:
+            courses = [course for course in courses if waitlists.get(course['id'])]
+
+        semaphore = asyncio.Semaphore(self.max_concurrent_courses)
+
+        async def backfill(course):
+            async with semaphore:
+                try:
+                    return await self.backfill_course(course, waitlists.get(course['id'], []), trigger_reason)
+                except Exception as e:
+                    logger.error(f"❌ Error in auto-backfill for course {course['id']}: {e}")
+                    return {'success': False, 'message': f'Auto-backfill error: {e}'}
+
+        course_results = await asyncio.gather(*(backfill(course) for course in courses))
+        results = [
+            {'course_id': course['id'], 'course_name': course.get('course_name'), 'result': result}
+            for course, result in zip(courses, course_results)
+        ]
+        if course_ids is not None:
+            found = {course['id'] for course in courses}
+            results.extend({'course_id': course_id, 'course_name': None,
+                            'result': {'success': False, 'message': 'Course not found'}}
+                           for course_id in course_ids if course_id not in found)
+
+        if wait_for_notifications:
+            await self.notifications.join()
+
+        self._stats['runs'] += 1
+        self._stats['courses'] += len(courses)
+        self._run_latencies_ms.append((time.perf_counter() - start) * 1000)
+        return {'success': True, 'courses_processed': len(courses), 'results': results}
+
+    async def backfill_course(self, course: Dict[str, Any], candidates: List[Dict[str, Any]],
+                              trigger_reason: str) -> Dict[str, Any]:
+        """Promote the best eligible candidates into a course's free seats"""
+        available_spots = course['max_capacity'] - course['current_enrolled']
+        if available_spots <= 0:
+            return {'success': False, 'message': 'No available spots'}
+        if not candidates:
+            return {'success': False, 'message': 'No waitlist candidates'}
+
+        winners, skipped, skip_reason = self.select_candidates(course, candidates, available_spots)
+        promoted_ids = await self._commit(course, winners, skipped, skip_reason, trigger_reason)
+        promoted = [candidate for candidate in winners if candidate['id'] in promoted_ids]
+
+        for candidate in promoted:
+            await self.notifications.put(candidate['users'], course, candidate)
+
+        self._stats['promoted'] += len(promoted)
+        self._stats['skipped'] += len(skipped)
+        logger.info(f"✅ Auto-enrolled {len(promoted)} users from waitlist for course {course['id']}")
+
+        return {
+            'success': True,
+            'enrolled_count': len(promoted),
+            'enrolled_users': [{
+                'user_id': candidate['user_id'],
+                'user_name': f"{candidate['users']['first_name']} {candidate['users']['last_name']}",
+                'email': candidate['users']['email'],
+                'priority': candidate['waitlist_priority'],
+                'waitlist_position': candidate['waitlist_position']
+            } for candidate in promoted],
+            'available_spots': available_spots,
+            'message': f'Successfully auto-enrolled {len(promoted)} candidate(s) from waitlist'
+        }
+
+    @staticmethod
+    def select_candidates(course: Dict[str, Any], candidates: List[Dict[str, Any]],
+                          available_spots: int) -> Tuple[List[Dict], List[Dict], Optional[str]]:
+        """Split ranked candidates into (to promote, skipped as ineligible, skip reason).
+
+        Candidates without a user row are passed over silently; nobody is
+        skipped once the seats are filled.
+        """
+        eligibility = check_enrollment_eligibility(course)
+        with_users = [candidate for candidate in candidates if candidate.get('users')]
+        if not eligibility['eligible']:
+            return [], with_users, eligibility['reason']
+        return with_users[:available_spots], [], None
+
+    async def _commit(self, course: Dict[str, Any], winners: List[Dict], skipped: List[Dict],
+                      skip_reason: Optional[str], trigger_reason: str) -> set:
+        """Promote winners and log skips for one course; returns the promoted enrollment ids"""
+        if not winners and not skipped:
+            return set()
+
+        if self._rpc_available:
+            try:
+                result = await asyncio.to_thread(
+                    lambda: self.db.supabase.rpc(PROMOTE_RPC, {
+                        'p_course_id': course['id'],
+                        'p_enrollment_ids': [candidate['id'] for candidate in winners],
+                        'p_skipped_user_ids': [candidate['user_id'] for candidate in skipped],
+                        'p_skip_reason': skip_reason,
+                        'p_trigger_reason': trigger_reason,
+                    }).execute()
+                )
+                return {row['enrollment_id'] if isinstance(row, dict) else row for row in result.data or []}
+            except Exception as e:
+                if not _is_missing_function(e):
+                    raise
+                self._rpc_available = False
+                logger.warning(f"⚠️ {PROMOTE_RPC} unavailable, committing backfills without a transaction: {e}")
+
+        return await self._commit_without_transaction(course, winners, skipped, skip_reason, trigger_reason)
+
+    async def _commit_without_transaction(self, course: Dict[str, Any], winners: List[Dict], skipped: List[Dict],
+                                          skip_reason: Optional[str], trigger_reason: str) -> set:
+        """Bulk update and per-candidate audit log for databases without PROMOTE_RPC"""
+        self._stats['fallback_commits'] += 1
+        course_id = course['id']
+        for candidate in skipped:
+            await self.db.log_waitlist_action(
+                course_id, candidate['user_id'], 'skipped_ineligible', 'waitlisted', 'waitlisted', skip_reason
+            )
+        if not winners:
+            return set()
+
+        result = await asyncio.to_thread(
+            lambda: self.db.supabase.table('course_enrollments')
+            .update({
+                'enrollment_status': 'enrolled',
+                'waitlist_position': None,
+                'notification_sent': False,
+                'updated_at': datetime.now().isoformat()
+            })
+            .in_('id', [candidate['id'] for candidate in winners])
+            .eq('enrollment_status', 'waitlisted')
+            .execute()
+        )
+        promoted_ids = {row['id'] for row in result.data or []}
+
+        for candidate in winners:
+            if candidate['id'] in promoted_ids:
+                await self.db.log_waitlist_action(
+                    course_id, candidate['user_id'], 'auto_enrolled', 'waitlisted', 'enrolled',
+                    f'Auto-promoted from waitlist due to {trigger_reason}', 'system'
+                )
+        if promoted_ids:
+            await self.db.reorder_waitlist_positions(course_id)
+        return promoted_ids
+
+    def _load_courses(self, course_ids: Optional[List[str]]) -> List[Dict[str, Any]]:
+        query = self.db.supabase.table('courses').select('*')
+        query = query.in_('id', course_ids) if course_ids is not None else query.eq('status', 'open')
+        return query.execute().data or []
+
+    def _load_waitlists(self, course_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Ranked waitlisted enrollments (with their user rows) grouped by course"""
+        waitlists: Dict[str, List[Dict[str, Any]]] = {course_id: [] for course_id in course_ids}
+        if not course_ids:
+            return waitlists
+
+        offset = 0
+        while True:
+            rows = self.db.supabase.table('course_enrollments')\
+                .select('*, users(*)')\
+                .in_('course_id', course_ids)\
+                .eq('enrollment_status', 'waitlisted')\
+                .order('course_id')\
+                .order('waitlist_priority')\
+                .order('enrollment_date')\
+                .order('id')\
+                .range(offset, offset + self.page_size - 1)\
+                .execute().data or []
+            for row in rows:
+                waitlists[row['course_id']].append(row)
+            if len(rows) < self.page_size:
+                break
+            offset += self.page_size
+
+        for candidates in waitlists.values():
+            candidates.sort(key=lambda row: (row['waitlist_priority'], row['enrollment_date'], row['id']))
+        return waitlists
+
+    def get_metrics(self) -> Dict[str, Any]:
+        latencies = sorted(self._run_latencies_ms)
+        return {
+            **self._stats,
+            'transactional': self._rpc_available,
+            'avg_run_ms': sum(latencies) / len(latencies) if latencies else 0,
+            'p95_run_ms': latencies[int(len(latencies) * 0.95)] if latencies else 0,
+            'notifications': self.notifications.get_metrics(),
+        }
@@ -0,0 +1,72 @@
+-- Batch waitlist backfill
+-- Promotes a course's chosen waitlist candidates, writes their audit log entries and renumbers the
+-- remaining waitlist in one transaction. Called by BatchBackfillEngine (waitlist_backfill.py).
+
+CREATE OR REPLACE FUNCTION promote_waitlist_candidates(
+    p_course_id UUID,
+    p_enrollment_ids UUID[],
+    p_skipped_user_ids UUID[],
+    p_skip_reason TEXT,
+    p_trigger_reason TEXT
+)
+RETURNS TABLE (enrollment_id UUID) AS $$
+DECLARE
+    v_available INTEGER;
+BEGIN
+    -- Serialize backfills of the same course and re-check capacity under the lock
+    SELECT max_capacity - current_enrolled INTO v_available
+    FROM courses
+    WHERE id = p_course_id
+    FOR UPDATE;
+
+    IF v_available IS NULL THEN
+        RETURN;
+    END IF;
+
+    -- Candidates passed over because the course is not accepting enrollments
+    INSERT INTO waitlist_audit_log (course_id, user_id, action, previous_status, new_status, reason, performed_by)
+    SELECT p_course_id, skipped.user_id, 'skipped_ineligible', 'waitlisted', 'waitlisted', p_skip_reason, 'system'
+    FROM unnest(COALESCE(p_skipped_user_ids, '{}')) AS skipped(user_id);
+
+    -- Promote in the order given, only while seats remain and the row is still waitlisted
+    RETURN QUERY
+    WITH chosen AS (
+        SELECT e.id, e.user_id
+        FROM unnest(p_enrollment_ids) WITH ORDINALITY AS requested(id, rank)
+        JOIN course_enrollments e ON e.id = requested.id
+        WHERE e.course_id = p_course_id
+          AND e.enrollment_status = 'waitlisted'
+        ORDER BY requested.rank
+        LIMIT GREATEST(v_available, 0)
+    ),
+    promoted AS (
+        UPDATE course_enrollments e
+        SET enrollment_status = 'enrolled',
+            waitlist_position = NULL,
+            notification_sent = FALSE,
+            updated_at = NOW()
+        FROM chosen
+        WHERE e.id = chosen.id
+        RETURNING e.id, e.user_id
+    ),
+    logged AS (
+        INSERT INTO waitlist_audit_log (course_id, user_id, action, previous_status, new_status, reason, performed_by)
+        SELECT p_course_id, promoted.user_id, 'auto_enrolled', 'waitlisted', 'enrolled',
+               'Auto-promoted from waitlist due to ' || p_trigger_reason, 'system'
+        FROM promoted
+    )
+    SELECT promoted.id FROM promoted;
+
+    -- Renumber whoever is still waiting
+    UPDATE course_enrollments e
+    SET waitlist_position = ranked.position
+    FROM (
+        SELECT id, ROW_NUMBER() OVER (ORDER BY waitlist_priority, enrollment_date, id) AS position
+        FROM course_enrollments
+        WHERE course_id = p_course_id
+          AND enrollment_status = 'waitlisted'
+    ) ranked
+    WHERE e.id = ranked.id
+      AND e.waitlist_position IS DISTINCT FROM ranked.position;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,397 @@
+"""
+Async webhook dispatcher
+Fans events out to subscribers over a pooled keep-alive HTTP client, with per-endpoint concurrency caps,
+a persistent retry queue with exponential backoff and a circuit breaker per endpoint
+"""
+from typing import Any, Callable, Dict, List, Optional
+from collections import deque
+from datetime import datetime
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "YMCA-VolunteerPathfinder-Webhook/1.0"
+
+# Responses worth retrying; any other 4xx is the subscriber rejecting the payload
+RETRYABLE_STATUS_CODES = {408, 425, 429}
+
+def encode_event(event) -> str:
+    """The event's JSON, serialized once and shared by every subscriber"""
+    return json.dumps({
+        "event_type": event.event_type,
+        "timestamp": event.timestamp.isoformat(),
+        "data": event.data,
+    }, sort_keys=True)
+
+def body_for(event_json: str, webhook_id: str) -> bytes:
+    """Subscriber payload: the shared event JSON plus its webhook id.
+
+    Equal to json.dumps(payload, sort_keys=True), since "webhook_id" sorts last.
+    """
+    return (event_json[:-1] + ', "webhook_id": ' + json.dumps(webhook_id) + '}').encode('utf-8')
+
+def sign(body: bytes, secret: str) -> str:
+    """Base64 HMAC-SHA256 of the exact bytes sent (X-Webhook-Signature)"""
+    return base64.b64encode(hmac.new(secret.encode('utf-8'), body, hashlib.sha256).digest()).decode('utf-8')
+
+class CircuitBreaker:
+    """Stops calling an endpoint after `failure_threshold` consecutive failures.
+
+    After `reset_timeout` seconds one probe request is let through
+    (half-open); success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if time.monotonic() - self.opened_at >= self.reset_timeout else 'open'
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == 'closed':
+            return True
+        if state == 'half_open' and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def retry_after(self) -> float:
+        """Seconds until the next probe is allowed"""
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def end_probe(self):
+        """Free the half-open slot even if the probe never recorded an outcome (e.g. it was cancelled)"""
+        self._probing = False
+
+class WebhookRetryQueue:
+    """Deliveries waiting for a retry, journaled to a JSON lines file.
+
+    Each change is an appended line ("add" with the full entry, or "done"
+    with its id), so pending retries survive a restart. The file is
+    compacted once more than half of it is finished entries.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._finished_lines = 0
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is not None:
+            return self._entries
+        self._entries = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as journal:
+                for line in journal:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn final line from a crash mid-write
+                        logger.warning("Skipping unreadable webhook retry line")
+                        continue
+                    if record.get('op') == 'add':
+                        self._entries[record['entry']['id']] = record['entry']
+                    elif record.get('op') == 'done':
+                        self._entries.pop(record['id'], None)
+                        self._finished_lines += 1
+        return self._entries
+
+    def _append(self, record: Dict[str, Any]):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as journal:
+            journal.write(json.dumps(record) + '\n')
+            journal.flush()
+            os.fsync(journal.fileno())
+
+    def add(self, entry: Dict[str, Any]):
+        with self._lock:
+            self._load()[entry['id']] = entry
+            self._append({'op': 'add', 'entry': entry})
+
+    def complete(self, entry_id: str):
+        with self._lock:
+            if self._load().pop(entry_id, None) is None:
+                return
+            self._append({'op': 'done', 'id': entry_id})
+            self._finished_lines += 1
+            if self._finished_lines > max(100, len(self._entries)):
+                self._compact()
+
+    def _compact(self):
+        temp_path = self.path + '.compacting'
+        with open(temp_path, 'w', encoding='utf-8') as journal:
+            for entry in self._entries.values():
+                journal.write(json.dumps({'op': 'add', 'entry': entry}) + '\n')
+            journal.flush()
+            os.fsync(journal.fileno())
+        os.replace(temp_path, self.path)
+        self._finished_lines = 0
+
+    def due(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        now = now if now is not None else time.time()
+        with self._lock:
+            return sorted((entry for entry in self._load().values() if entry['next_attempt_at'] <= now),
+                          key=lambda entry: entry['next_attempt_at'])
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._load())
+
+class WebhookDispatcher:
+    """Delivers webhook payloads concurrently over one pooled HTTP client.
+
+    - The aiohttp session keeps up to `max_connections` keep-alive
+      connections, so repeat deliveries skip the TCP/TLS handshake
+    - Each endpoint has at most `per_endpoint_concurrency` requests in flight
+    - Network errors, 5xx, 408 and 429 responses go to the retry queue with
+      exponential backoff (`base_backoff` doubling up to `max_backoff`),
+      until `max_attempts` deliveries have been made
+    - An endpoint's circuit opens after `failure_threshold` consecutive
+      failures; deliveries to an open circuit are queued, not sent
+    """
+
+    def __init__(self, max_connections: int = 100, per_endpoint_concurrency: int = 4, timeout: float = 10.0,
+                 max_attempts: int = 6, base_backoff: float = 2.0, max_backoff: float = 600.0,
+                 failure_threshold: int = 5, reset_timeout: float = 60.0, retry_path: Optional[str] = None,
+                 retry_poll_interval: float = 5.0):
+        self.max_connections = max_connections
+        self.per_endpoint_concurrency = per_endpoint_concurrency
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.retry_poll_interval = retry_poll_interval
+        self.retry_queue = WebhookRetryQueue(retry_path or os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), 'webhook_retry_queue.jsonl'
+        ))
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._retry_task: Optional[asyncio.Task] = None
+        self._latencies_ms = deque(maxlen=1000)
+        self._stats = {
+            'events': 0,
+            'delivered': 0,
+            'failed': 0,
+            'queued_for_retry': 0,
+            'retried': 0,
+            'dead_lettered': 0,
+            'short_circuited': 0,
+        }
+
+    def _client(self) -> aiohttp.ClientSession:
+        """Session for the running loop; semaphores are tied to it too"""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+            self._loop = loop
+            self._semaphores = {}
+        return self._session
+
+    def breaker(self, webhook_id: str) -> CircuitBreaker:
+        if webhook_id not in self._breakers:
+            self._breakers[webhook_id] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return self._breakers[webhook_id]
+
+    async def dispatch(self, event, subscribers: Dict[str, Any], retry: bool = True) -> Dict[str, Dict[str, Any]]:
+        """Send one event to every subscriber (webhook_id -> WebhookConfig) concurrently"""
+        self._stats['events'] += 1
+        event_json = encode_event(event)
+        webhook_ids = list(subscribers)
+        results = await asyncio.gather(*(
+            self._deliver(webhook_id, subscribers[webhook_id], body_for(event_json, webhook_id),
+                          event.event_type, attempt=1, retry=retry)
+            for webhook_id in webhook_ids
+        ))
+        return dict(zip(webhook_ids, results))
+
+    async def _deliver(self, webhook_id: str, config, body: bytes, event_type: str,
+                       attempt: int, retry: bool, entry_id: Optional[str] = None) -> Dict[str, Any]:
+        breaker = self.breaker(webhook_id)
+        if not breaker.allow():
+            self._stats['short_circuited'] += 1
+            result = {"success": False, "error": "Circuit open: endpoint is failing"}
+            # The open circuit does not count as an attempt
+            return await self._after_failure(webhook_id, body, event_type, attempt - 1, retry, entry_id, result,
+                                             delay=max(breaker.retry_after(), self.base_backoff))
+
+        try:
+            result = await self._post(webhook_id, config, body)
+            if result['success']:
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+        finally:
+            breaker.end_probe()
+
+        retryable = result.pop('retryable')
+        if result['success']:
+            self._stats['delivered'] += 1
+            if entry_id:
+                await asyncio.to_thread(self.retry_queue.complete, entry_id)
+            return result
+
+        self._stats['failed'] += 1
+        if not retryable:
+            if entry_id:
+                await asyncio.to_thread(self.retry_queue.complete, entry_id)
+            return result
+        return await self._after_failure(webhook_id, body, event_type, attempt, retry, entry_id, result)
+
+    async def _after_failure(self, webhook_id: str, body: bytes, event_type: str, attempts_made: int, retry: bool,
+                             entry_id: Optional[str], result: Dict[str, Any],
+                             delay: Optional[float] = None) -> Dict[str, Any]:
+        """Queue (or re-queue) a failed delivery, unless it has used up its attempts"""
+        if not retry:
+            return result
+        if attempts_made >= self.max_attempts:
+            self._stats['dead_lettered'] += 1
+            logger.error(f"❌ Giving up on webhook {webhook_id} ({event_type}) after {attempts_made} attempts")
+            if entry_id:
+                await asyncio.to_thread(self.retry_queue.complete, entry_id)
+            return result
+
+        if delay is None:
+            delay = min(self.max_backoff, self.base_backoff * (2 ** max(attempts_made - 1, 0)))
+        entry = {
+            'id': entry_id or str(uuid.uuid4()),
+            'webhook_id': webhook_id,
+            'event_type': event_type,
+            'body': body.decode('utf-8'),
+            'attempts': attempts_made,
+            'next_attempt_at': time.time() + delay,
+            'last_error': result.get('error'),
+            'queued_at': datetime.now().isoformat(),
+        }
+        await asyncio.to_thread(self.retry_queue.add, entry)
+        if not entry_id:
+            self._stats['queued_for_retry'] += 1
+        return {**result, "queued_for_retry": True, "retry_in_seconds": round(delay, 1)}
+
+    async def _post(self, webhook_id: str, config, body: bytes) -> Dict[str, Any]:
+        headers = {"Content-Type": "application/json", "User-Agent": USER_AGENT}
+        if config.headers:
+            headers.update(config.headers)
+        if config.secret:
+            headers["X-Webhook-Signature"] = sign(body, config.secret)
+
+        session = self._client()
+        semaphore = self._semaphores.setdefault(webhook_id, asyncio.Semaphore(self.per_endpoint_concurrency))
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                async with session.post(config.url, data=body, headers=headers) as response:
+                    response_text = (await response.text(errors='replace'))[:500]
+                    if response.status < 400:
+                        return {"success": True, "status_code": response.status, "response": response_text,
+                                "retryable": False}
+                    return {
+                        "success": False,
+                        "status_code": response.status,
+                        "error": f"HTTP Error: {response.status} - {response.reason}",
+                        "retryable": response.status >= 500 or response.status in RETRYABLE_STATUS_CODES,
+                    }
+            except asyncio.TimeoutError:
+                return {"success": False, "error": f"Request error: timed out after {self.timeout}s",
+                        "retryable": True}
+            except aiohttp.ClientError as e:
+                return {"success": False, "error": f"URL Error: {e}", "retryable": True}
+            finally:
+                self._latencies_ms.append((time.perf_counter() - start) * 1000)
+
+    async def process_retries(self, get_config: Callable[[str], Any]) -> Dict[str, int]:
+        """Re-send every due retry; `get_config(webhook_id)` returns the current config or None"""
+        due = await asyncio.to_thread(self.retry_queue.due)
+        delivered = dropped = 0
+
+        async def resend(entry):
+            nonlocal delivered, dropped
+            config = get_config(entry['webhook_id'])
+            if config is None or not config.active:
+                # Unregistered or paused since the delivery failed
+                dropped += 1
+                await asyncio.to_thread(self.retry_queue.complete, entry['id'])
+                return
+            self._stats['retried'] += 1
+            result = await self._deliver(entry['webhook_id'], config, entry['body'].encode('utf-8'),
+                                         entry['event_type'], attempt=entry['attempts'] + 1, retry=True,
+                                         entry_id=entry['id'])
+            if result['success']:
+                delivered += 1
+
+        await asyncio.gather(*(resend(entry) for entry in due))
+        return {'due': len(due), 'delivered': delivered, 'dropped': dropped, 'pending': len(self.retry_queue)}
+
+    def start_retry_worker(self, get_config: Callable[[str], Any]):
+        """Process the retry queue every `retry_poll_interval` seconds on the running loop"""
+        if self._retry_task is not None and not self._retry_task.done():
+            return
+
+        async def loop():
+            while True:
+                try:
+                    await self.process_retries(get_config)
+                except Exception as e:
+                    logger.error(f"❌ Error processing webhook retries: {e}")
+                await asyncio.sleep(self.retry_poll_interval)
+
+        self._retry_task = asyncio.create_task(loop())
+
+    async def close(self):
+        if self._retry_task is not None:
+            self._retry_task.cancel()
+            await asyncio.gather(self._retry_task, return_exceptions=True)
+            self._retry_task = None
+        if self._session is not None and not self._session.closed and self._loop is asyncio.get_running_loop():
+            await self._session.close()
+        self._session = None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies_ms)
+        return {
+            **self._stats,
+            'pending_retries': len(self.retry_queue),
+            'open_circuits': [webhook_id for webhook_id, breaker in self._breakers.items()
+                              if breaker.state != 'closed'],
+            'avg_request_ms': sum(latencies) / len(latencies) if latencies else None,
+            'p95_request_ms': latencies[int(0.95 * (len(latencies) - 1))] if latencies else None,
+        }
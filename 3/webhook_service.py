@@ -2,18 +2,12 @@
 Webhook Service for Zapier/Make Integration
 Handles webhook triggers for volunteer and RSVP events
 """
-import asyncio
-import json
 import logging
-import urllib.request
-import urllib.parse
-import urllib.error
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
-import hmac
-import hashlib
-import base64
+
+from webhook_dispatcher import WebhookDispatcher
 
 logger = logging.getLogger(__name__)
 
@@ -34,8 +28,10 @@ class WebhookConfig:
         self.headers = headers or {}
 
 class WebhookService:
-    def __init__(self):
+    def __init__(self, dispatcher: Optional[WebhookDispatcher] = None):
         self.webhooks: Dict[str, WebhookConfig] = {}
+        # Pooled HTTP client, per-endpoint limits, retry queue and circuit breakers
+        self.dispatcher = dispatcher or WebhookDispatcher()
     
     async def register_webhook(self, webhook_id: str, config: WebhookConfig) -> bool:
         """Register a new webhook endpoint"""
@@ -60,82 +56,37 @@ class WebhookService:
             return False
     
     async def trigger_webhook(self, event: WebhookEvent) -> Dict[str, Any]:
-        """Trigger all registered webhooks for a specific event type"""
-        results = {}
-        
-        for webhook_id, config in self.webhooks.items():
-            if not config.active or event.event_type not in config.event_types:
-                continue
-            
-            try:
-                result = await self._send_webhook(webhook_id, config, event)
-                results[webhook_id] = result
-            except Exception as e:
-                logger.error(f"Failed to send webhook {webhook_id}: {e}")
-                results[webhook_id] = {"success": False, "error": str(e)}
-        
-        return results
-    
-    async def _send_webhook(self, webhook_id: str, config: WebhookConfig, event: WebhookEvent) -> Dict[str, Any]:
-        """Send webhook to a specific endpoint"""
-        payload = {
-            "event_type": event.event_type,
-            "timestamp": event.timestamp.isoformat(),
-            "data": event.data,
-            "webhook_id": webhook_id
+        """Trigger all registered webhooks for a specific event type, concurrently"""
+        subscribers = {
+            webhook_id: config for webhook_id, config in self.webhooks.items()
+            if config.active and event.event_type in config.event_types
         }
+        if not subscribers:
+            return {}
         
-        headers = {
-            "Content-Type": "application/json",
-            "User-Agent": "YMCA-VolunteerPathfinder-Webhook/1.0"
-        }
-        
-        if config.headers:
-            headers.update(config.headers)
-        
-        if config.secret:
-            message = json.dumps(payload, sort_keys=True).encode('utf-8')
-            signature = hmac.new(
-                config.secret.encode('utf-8'),
-                message,
-                hashlib.sha256
-            ).digest()
-            headers["X-Webhook-Signature"] = base64.b64encode(signature).decode('utf-8')
+        # Failed deliveries are queued for retry; make sure something drains the queue
+        self.start_retry_worker()
         
         try:
-            # Run in thread pool to avoid blocking
-            return await asyncio.get_event_loop().run_in_executor(
-                None, self._send_sync_webhook, config.url, payload, headers
-            )
-            
+            return await self.dispatcher.dispatch(event, subscribers)
         except Exception as e:
-            return {"success": False, "error": f"Request error: {str(e)}"}
+            logger.error(f"Failed to send webhooks for {event.event_type}: {e}")
+            return {webhook_id: {"success": False, "error": str(e)} for webhook_id in subscribers}
     
-    def _send_sync_webhook(self, url: str, payload: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-        """Synchronous webhook sending using urllib"""
+    async def _send_webhook(self, webhook_id: str, config: WebhookConfig, event: WebhookEvent,
+                            retry: bool = True) -> Dict[str, Any]:
+        """Send webhook to a specific endpoint"""
         try:
-            data = json.dumps(payload).encode('utf-8')
-            req = urllib.request.Request(url, data=data, headers=headers, method='POST')
+            results = await self.dispatcher.dispatch(event, {webhook_id: config}, retry=retry)
+            return results[webhook_id]
             
-            with urllib.request.urlopen(req, timeout=30) as response:
-                response_text = response.read().decode('utf-8')[:500]
-                return {
-                    "success": response.status < 400,
-                    "status_code": response.status,
-                    "response": response_text
-                }
-                
-        except urllib.error.HTTPError as e:
-            return {
-                "success": False,
-                "status_code": e.code,
-                "error": f"HTTP Error: {e.code} - {e.reason}"
-            }
-        except urllib.error.URLError as e:
-            return {"success": False, "error": f"URL Error: {str(e)}"}
         except Exception as e:
             return {"success": False, "error": f"Request error: {str(e)}"}
     
+    def start_retry_worker(self):
+        """Start re-sending queued deliveries on the running event loop"""
+        self.dispatcher.start_retry_worker(self.webhooks.get)
+    
     async def test_webhook(self, webhook_id: str) -> Dict[str, Any]:
         """Send a test event to a webhook"""
         if webhook_id not in self.webhooks:
@@ -149,7 +100,8 @@ class WebhookService:
         )
         
         config = self.webhooks[webhook_id]
-        return await self._send_webhook(webhook_id, config, test_event)
+        # A failed test is reported, not retried
+        return await self._send_webhook(webhook_id, config, test_event, retry=False)
     
     def get_webhook_stats(self) -> Dict[str, Any]:
         """Get webhook statistics"""
@@ -162,12 +114,12 @@ class WebhookService:
         return {
             "total_webhooks": len(self.webhooks),
             "active_webhooks": active_webhooks,
-            "supported_event_types": list(event_types)
+            "supported_event_types": list(event_types),
+            "delivery": self.dispatcher.get_metrics()
         }
     
     async def cleanup(self):
         """Cleanup resources"""
-        # No cleanup needed for urllib
-        pass
+        await self.dispatcher.close()
 
 webhook_service = WebhookService()
\ No newline at end of file